@@ -1,133 +1,156 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
-from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
-from flask_bcrypt import Bcrypt
-from flask_cors import CORS
-from models import db, User, Chat, Message
+import importlib
 import os
+from flask import Flask, session, g
+from config import Config
 
-# Flask app init
-app = Flask(__name__, template_folder="templates", static_folder="static")
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///oleg_messenger.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SECRET_KEY'] = "supersecretkey"
+# Блюпринты подключаются по строке «модуль:атрибут»: модуль с маршрутами и все,
+# что он тянет (сервисы, модели), импортируется только внутри create_app
+BLUEPRINTS = (
+    "views:api",
+    "routes.auth:bp",
+    "health:health",
+)
 
-# Extensions
-db.init_app(app)
-migrate = Migrate(app, db)
-bcrypt = Bcrypt(app)
-CORS(app)
+def _load_object(path: str):
+    module_name, _, attr = path.partition(":")
+    return getattr(importlib.import_module(module_name), attr)
 
-# ---------------------------
-# ROUTES
-# ---------------------------
+def _bind_db_actor():
+    from db_router import set_actor
+    g.db_actor_token = set_actor(session.get("user_id"))
 
-@app.route("/")
-def home():
-    return {"message": "Hello from Oleg Messenger!"}
+def _unbind_db_actor(exc=None):
+    from db_router import reset_actor
+    token = g.pop("db_actor_token", None)
+    if token is not None:
+        reset_actor(token)
 
-# ---------------------------
-# AUTH
-# ---------------------------
-@app.route("/api/register", methods=["POST"])
-def register():
-    data = request.json
-    if not data.get("username") or not data.get("password"):
-        return jsonify({"error": "Missing fields"}), 400
-    
-    if User.query.filter_by(username=data["username"]).first():
-        return jsonify({"error": "User already exists"}), 400
-    
-    hashed_pw = bcrypt.generate_password_hash(data["password"]).decode("utf-8")
-    new_user = User(username=data["username"], password=hashed_pw)
-    db.session.add(new_user)
-    db.session.commit()
-    
-    return jsonify({"message": "User registered successfully"})
-
-@app.route("/api/login", methods=["POST"])
-def login():
-    data = request.json
-    user = User.query.filter_by(username=data.get("username")).first()
-    if not user or not bcrypt.check_password_hash(user.password, data.get("password")):
-        return jsonify({"error": "Invalid credentials"}), 401
-    
-    session["user_id"] = user.id
-    return jsonify({"message": "Login successful", "user_id": user.id})
-
-@app.route("/api/logout", methods=["POST"])
-def logout():
-    session.pop("user_id", None)
-    return jsonify({"message": "Logged out"})
+def create_app(config=None) -> Flask:
+    """Фабрика приложения.
 
-# ---------------------------
-# CHATS
-# ---------------------------
-@app.route("/api/chats", methods=["GET"])
-def get_chats():
-    chats = Chat.query.all()
-    return jsonify([{"id": c.id, "name": c.name} for c in chats])
-
-@app.route("/api/chats", methods=["POST"])
-def create_chat():
-    data = request.json
-    if not data.get("name"):
-        return jsonify({"error": "Chat name required"}), 400
-    
-    new_chat = Chat(name=data["name"])
-    db.session.add(new_chat)
-    db.session.commit()
-    
-    return jsonify({"message": "Chat created", "id": new_chat.id})
+    config — класс/объект настроек или словарь, поверх Config. Тяжелые
+    зависимости загружаются по требованию: Flask-Migrate (alembic) — только
+    для CLI `flask db` или при MIGRATE=True, Socket.IO — при SOCKETIO=True,
+    алгоритмы хеширования (argon2/bcrypt) — при первом хешировании пароля.
+    Фоновые задачи планировщика не регистрируются при TESTING.
+    """
+    app = Flask(__name__, template_folder="templates", static_folder="static")
+    app.config.from_object(Config)
+    if isinstance(config, dict):
+        app.config.update(config)
+    elif config is not None:
+        app.config.from_object(config)
 
-# ---------------------------
-# MESSAGES
-# ---------------------------
-@app.route("/api/messages/<int:chat_id>", methods=["GET"])
-def get_messages(chat_id):
-    messages = Message.query.filter_by(chat_id=chat_id).order_by(Message.timestamp).all()
-    return jsonify([
-        {"id": m.id, "user": m.user.username, "content": m.content, "timestamp": m.timestamp.isoformat()}
-        for m in messages
-    ])
-
-@app.route("/api/messages/<int:chat_id>", methods=["POST"])
-def send_message(chat_id):
-    if "user_id" not in session:
-        return jsonify({"error": "Unauthorized"}), 401
-    
-    data = request.json
-    new_msg = Message(content=data.get("content"), user_id=session["user_id"], chat_id=chat_id)
-    db.session.add(new_msg)
-    db.session.commit()
-    
-    return jsonify({"message": "Message sent", "id": new_msg.id})
-
-@app.route("/api/messages/<int:msg_id>", methods=["PUT"])
-def edit_message(msg_id):
-    msg = Message.query.get_or_404(msg_id)
-    if msg.user_id != session.get("user_id"):
-        return jsonify({"error": "Unauthorized"}), 403
-    
-    data = request.json
-    msg.content = data.get("content", msg.content)
-    db.session.commit()
-    return jsonify({"message": "Message updated"})
-
-@app.route("/api/messages/<int:msg_id>", methods=["DELETE"])
-def delete_message(msg_id):
-    msg = Message.query.get_or_404(msg_id)
-    if msg.user_id != session.get("user_id"):
-        return jsonify({"error": "Unauthorized"}), 403
-    
-    db.session.delete(msg)
-    db.session.commit()
-    return jsonify({"message": "Message deleted"})
+    from flask_cors import CORS
+    from models import db, bind_database
+    from tokens import jwt
+
+    # Одна настройка БД (DATABASE_URL или SQLALCHEMY_DATABASE_URI из config) для
+    # Flask-SQLAlchemy и для SessionLocal сервисных модулей. URL берется у движка
+    # Flask-SQLAlchemy: относительный путь SQLite он разрешает в app.instance_path
+    db.init_app(app)
+    with app.app_context():
+        bind_database(db.engine.url.render_as_string(hide_password=False))
+    CORS(app)
+    # Выдача и проверка access/refresh JWT (routes/auth.py, сокеты /chat)
+    jwt.init_app(app)
+    if app.config.get("MIGRATE", os.getenv("FLASK_RUN_FROM_CLI") == "true"):
+        from flask_migrate import Migrate
+        Migrate(app, db)
+
+    # Пользователь запроса для read-your-writes при чтении с реплик
+    app.before_request(_bind_db_actor)
+    app.teardown_request(_unbind_db_actor)
+
+    for path in app.config.get("BLUEPRINTS", BLUEPRINTS):
+        app.register_blueprint(_load_object(path))
+
+    from queries import init_query_tracking
+    init_query_tracking(app)
+    init_instrumentation(app)
+    if not app.testing:
+        init_background_jobs(app)
+    if app.config.get("SOCKETIO"):
+        init_sockets(app)
+    return app
+
+def init_instrumentation(app) -> None:
+    """SQLite-профиль движков, Prometheus /metrics и журнал медленных запросов"""
+    from models import db, engine as sessions_engine, router
+    from metrics import init_metrics
+    from slow_queries import init_slow_query_log
+    from sqlite_tuning import configure_sqlite, sqlite_pragmas
+
+    with app.app_context():
+        # SQLite: PRAGMA-профиль и очередь писателей на движке Flask-SQLAlchemy
+        if app.config.get("SQLITE_TUNING"):
+            configure_sqlite(db.engine, sqlite_pragmas(Config))
+        # Задержки, SQL-запросы на запрос, кэши, пулы соединений
+        engines = {"flask": db.engine, "sessions": sessions_engine}
+        engines.update({f"replica{i}": replica for i, replica in enumerate(router.replicas)})
+        init_metrics(app, engines)
+    init_slow_query_log(app)
+
+def init_background_jobs(app) -> None:
+    """Периодические задачи общего планировщика; сам планировщик запускается при старте сервера"""
+    from sqlalchemy.exc import SQLAlchemyError
+    from models import db, engine as sessions_engine, SessionLocal
+    from archive import schedule_archiving
+    from emojis_stickers_polls import schedule_open_polls
+    from guilds import schedule_invite_purge
+    from sqlite_tuning import schedule_sqlite_maintenance
+    from tokens import init_token_revocation
+
+    # Отзывы токенов — в памяти каждого процесса, чистка нужна каждому воркеру
+    init_token_revocation(app.config.get("JWT_REVOCATION_REDIS_URL"))
+    if not app.config.get("SINGLETON_JOBS", True):
+        return
+    # Дальше — задачи над общей БД: при нескольких воркерах только на одном из них
+    if app.config.get("SQLITE_TUNING"):
+        # Периодический checkpoint WAL для движка Flask-SQLAlchemy и движка SessionLocal
+        with app.app_context():
+            for tuned_engine in (db.engine, sessions_engine):
+                schedule_sqlite_maintenance(tuned_engine, Config.SQLITE_MAINTENANCE_INTERVAL)
+    # Закрытие опросов, чей срок наступит (или уже наступил) после перезапуска
+    polls_db = SessionLocal()
+    try:
+        schedule_open_polls(polls_db)
+    except SQLAlchemyError as e:
+        print(f"[app] Расписание опросов не восстановлено: {e}")
+    finally:
+        polls_db.close()
+    # Перенос старой истории каналов и DM в сжатый архив
+    schedule_archiving(Config.ARCHIVE_INTERVAL)
+    # Пакетное удаление истекших и исчерпанных приглашений
+    schedule_invite_purge(Config.INVITE_PURGE_INTERVAL)
+
+def init_sockets(app):
+    """Socket.IO с обработчиками /chat"""
+    from extensions import socketio
+    importlib.import_module("sockets.events")
+    socketio.init_app(app)
+    return socketio
+
+def __getattr__(name):
+    # Совместимость с `from app import app`: приложение по умолчанию создается
+    # при первом обращении, а не при импорте модуля
+    if name == "app":
+        globals()["app"] = create_app()
+        return globals()["app"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # ---------------------------
 # RUN
 # ---------------------------
 if __name__ == "__main__":
+    from scheduler import scheduler
+
+    app = create_app()
     with app.app_context():
+        from models import db
         db.create_all()
-    app.run(debug=True)
+    scheduler.start()
+    if app.config.get("SOCKETIO"):
+        app.extensions["socketio"].run(app, debug=True)
+    else:
+        app.run(debug=True)
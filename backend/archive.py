@@ -0,0 +1,178 @@
+import zlib
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload, load_only
+from sqlalchemy.orm.attributes import set_committed_value
+
+from config import Config
+from models import Message, MessageArchive, Poll, File, User, SessionLocal
+from wire import packb, unpackb, pack_rows, unpack_rows
+
+ARCHIVE_COLUMNS = ("id", "user_id", "content", "timestamp", "pinned")
+
+# Горячая таблица message хранит последние MESSAGE_HOT_DAYS дней. Более старые
+# сообщения переносятся сегментами (контейнер × месяц, не больше
+# ARCHIVE_SEGMENT_SIZE строк) в message_archive: колонки + MessagePack + zlib.
+# Сегмент неизменяем; страница истории распаковывает не больше двух сегментов.
+
+def encode_segment(rows: List[dict]) -> bytes:
+    return zlib.compress(packb(pack_rows(rows, ARCHIVE_COLUMNS)), 6)
+
+def decode_segment(payload: bytes) -> List[dict]:
+    rows = unpack_rows(unpackb(zlib.decompress(payload)))
+    for row in rows:
+        row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+    return rows
+
+def _period(ts: datetime) -> str:
+    return ts.strftime("%Y-%m")
+
+def _scope(model, channel_id=None, dm_channel_id=None):
+    if channel_id is not None:
+        return model.channel_id == channel_id
+    return model.dm_channel_id == dm_channel_id
+
+def _archivable(db, cutoff):
+    """Старые сообщения каналов и DM, на которые не ссылаются опросы и файлы; закрепленные остаются"""
+    return db.query(Message).filter(
+        Message.timestamp < cutoff,
+        Message.chat_id.is_(None),
+        Message.pinned.is_(False),
+        ~Message.id.in_(select(Poll.message_id)),
+        ~Message.id.in_(select(File.message_id).where(File.message_id.isnot(None))),
+    )
+
+def _write_segment(db, scope, chunk):
+    rows = [{
+        "id": m.id, "user_id": m.user_id, "content": m.content,
+        "timestamp": m.timestamp.isoformat(), "pinned": False,
+    } for m in chunk]
+    db.add(MessageArchive(
+        period=_period(chunk[0].timestamp),
+        first_id=chunk[0].id, last_id=chunk[-1].id,
+        first_at=chunk[0].timestamp, last_at=chunk[-1].timestamp,
+        count=len(chunk), payload=encode_segment(rows), **scope,
+    ))
+    db.query(Message).filter(Message.id.in_([m.id for m in chunk])).delete(synchronize_session=False)
+
+def archive_messages(older_than: Optional[datetime] = None,
+                     segment_size: int = Config.ARCHIVE_SEGMENT_SIZE) -> int:
+    """Перенести старые сообщения в архив. Один сегмент — одна транзакция. Возвращает число сообщений"""
+    cutoff = older_than or datetime.utcnow() - timedelta(days=Config.MESSAGE_HOT_DAYS)
+    db = SessionLocal()
+    archived = 0
+    try:
+        containers = _archivable(db, cutoff).with_entities(
+            Message.channel_id, Message.dm_channel_id).distinct().all()
+        for channel_id, dm_channel_id in containers:
+            scope = {"channel_id": channel_id} if channel_id is not None else {"dm_channel_id": dm_channel_id}
+            while True:
+                batch = _archivable(db, cutoff).filter_by(**scope).options(
+                    load_only(Message.id, Message.user_id, Message.content, Message.timestamp)
+                ).order_by(Message.id).limit(segment_size).all()
+                if not batch:
+                    break
+                # Сегмент не пересекает границу месяца
+                period = _period(batch[0].timestamp)
+                chunk = [m for m in batch if _period(m.timestamp) == period]
+                _write_segment(db, scope, chunk)
+                db.commit()
+                archived += len(chunk)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    return archived
+
+def archived_count(db, channel_id=None, dm_channel_id=None) -> int:
+    total = db.query(MessageArchive.count).filter(_scope(MessageArchive, channel_id, dm_channel_id)).all()
+    return sum(count for (count,) in total)
+
+def read_archived(db, limit: int, skip: int = 0, before=None, channel_id=None, dm_channel_id=None) -> List[Message]:
+    """Страница архивной истории от новых к старым, как отсоединенные объекты Message.
+
+    Сегменты, целиком попадающие в skip, не распаковываются: нужен только их count.
+    before — курсор: только сообщения с id < before.
+    """
+    if limit <= 0:
+        return []
+    query = db.query(MessageArchive.id, MessageArchive.count, MessageArchive.last_id).filter(
+        _scope(MessageArchive, channel_id, dm_channel_id))
+    if before is not None:
+        query = query.filter(MessageArchive.first_id < before)
+    segments = query.order_by(MessageArchive.last_id.desc()).all()
+    rows = []
+    for segment_id, count, last_id in segments:
+        partial = before is not None and last_id >= before
+        if not partial and skip >= count:
+            skip -= count
+            continue
+        (payload,) = db.query(MessageArchive.payload).filter(MessageArchive.id == segment_id).one()
+        newest_first = decode_segment(payload)[::-1]
+        if partial:
+            newest_first = [row for row in newest_first if row["id"] < before]
+            if skip >= len(newest_first):
+                skip -= len(newest_first)
+                continue
+        rows.extend(newest_first[skip:skip + limit - len(rows)])
+        skip = 0
+        if len(rows) >= limit:
+            break
+    if not rows:
+        return []
+    users = {u.id: u for u in db.query(User).options(load_only(User.id, User.username)).filter(
+        User.id.in_({row["user_id"] for row in rows}))}
+    messages = []
+    for row in rows:
+        message = Message(id=row["id"], user_id=row["user_id"], content=row["content"],
+                          timestamp=row["timestamp"], pinned=False,
+                          channel_id=channel_id, dm_channel_id=dm_channel_id)
+        set_committed_value(message, "user", users.get(row["user_id"]))
+        messages.append(message)
+    return messages
+
+def with_archive(db, hot: list, limit: int, offset: int, before=None, channel_id=None, dm_channel_id=None) -> list:
+    """Страница истории с учетом архива: горячие и архивные сообщения по id от новых к старым.
+
+    hot — та же страница только по горячей таблице (offset/limit). Закрепленные,
+    сообщения с опросами и файлами не архивируются и могут быть старше архивных:
+    ниже границы архива горячие и архивные строки сливаются по id.
+    """
+    archive = db.query(func.max(MessageArchive.last_id)).filter(_scope(MessageArchive, channel_id, dm_channel_id))
+    if before is not None:
+        archive = archive.filter(MessageArchive.first_id < before)
+    newest_archived = archive.scalar()
+    if newest_archived is None or (len(hot) >= limit and hot[-1].id > newest_archived):
+        return hot
+    # Горячие сообщения новее архива стоят на своих местах
+    head = [m for m in hot if m.id > newest_archived]
+    scope = _scope(Message, channel_id, dm_channel_id)
+    if head or not offset:
+        newer_total = offset + len(head)
+    else:
+        query = db.query(Message.id).filter(scope, Message.id > newest_archived)
+        if before is not None:
+            query = query.filter(Message.id < before)
+        newer_total = query.count()
+    # Хвост: позиции skip..skip+wanted в слиянии старых горячих и архивных строк
+    skip = max(offset - newer_total, 0)
+    wanted = limit - len(head)
+    older = db.query(Message).options(joinedload(Message.user)).filter(scope, Message.id <= newest_archived)
+    if before is not None:
+        older = older.filter(Message.id < before)
+    older = older.order_by(Message.id.desc()).limit(skip + wanted).all()
+    # Перед страницей стоит не больше len(older) старых горячих строк, поэтому
+    # первые archive_skip архивных строк заведомо до нее и не распаковываются
+    archive_skip = max(skip - len(older), 0)
+    archived = read_archived(db, skip + wanted - archive_skip, archive_skip, before=before,
+                             channel_id=channel_id, dm_channel_id=dm_channel_id)
+    merged = sorted(older + archived, key=lambda m: m.id, reverse=True)
+    start = skip - archive_skip
+    return head + merged[start:start + wanted]
+
+def schedule_archiving(interval: float = Config.ARCHIVE_INTERVAL):
+    from scheduler import scheduler
+    return scheduler.every(interval, archive_messages, key="message_archive")
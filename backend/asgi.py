@@ -0,0 +1,300 @@
+"""
+Режим asyncio: ASGI-приложение с асинхронным сервером Socket.IO (/chat) и
+асинхронными сессиями SQLAlchemy для сообщений, истории и присутствия.
+
+HTTP API — то же Flask-приложение (create_app), смонтированное через
+WsgiToAsgi: его обработчики выполняются в пуле потоков. События /chat
+обрабатываются в цикле событий; модели, права комнат, формат wire,
+очереди рассылки (FanoutManager) и трекер присутствия — общие с
+синхронным режимом (sockets/events.py). Аутентификация сокета — только
+access JWT в auth.token (cookie Flask-сессии здесь не читается).
+
+Запуск (из backend/):
+    uvicorn asgi:create_asgi_app --factory --host 0.0.0.0 --port 5000
+"""
+
+import asyncio
+
+import socketio
+from flask_jwt_extended import decode_token
+from socketio.exceptions import ConnectionRefusedError
+
+from app import create_app
+from async_db import init_async_db, run_session, dispose_async_db
+from db_router import acting_as
+from emojis_stickers_polls import vote_poll, get_poll_results, on_poll_closed, poll_room
+from fanout import (FanoutManager, FANOUT_PUMP_INTERVAL, merge_presence_diffs, ROOM_CHANNEL,
+                    encode_room_event, decode_room_event)
+from messages import get_messages_async, history_rows, HISTORY_COLUMNS
+from metrics import registry, socket_event
+from models import SessionLocal
+from presence import presence, guild_presence, PRESENCE_FLUSH_INTERVAL
+from scheduler import scheduler
+from shared_state import shared
+from snowflake import next_message_id, to_wire
+from socket_sessions import socket_sessions, authorized_rooms, ACCESS_CHANNEL
+from tokens import revocations
+from wire import WirePayload, WIRE_FORMATS, JSON, pack_rows
+
+NAMESPACE = "/chat"
+
+sio = socketio.AsyncServer(async_mode="asgi", cors_allowed_origins="*",
+                           http_compression=True, compression_threshold=1024)
+
+# Задачи отправки держим до завершения, иначе цикл событий может их потерять
+_pending_sends = set()
+# Цикл событий сервера: в него передают рассылку потоки планировщика и HTTP
+_loop = None
+
+def _spawn(coro):
+    task = asyncio.get_running_loop().create_task(coro)
+    _pending_sends.add(task)
+    task.add_done_callback(_pending_sends.discard)
+
+def _send(sid, event, payload):
+    sess = socket_sessions.get(sid)
+    wire_format = sess.wire_format if sess is not None else JSON
+    # AsyncServer.emit клиенту только кладет пакет в очередь Engine.IO
+    _spawn(sio.emit(event, payload.encode(wire_format), to=sid, namespace=NAMESPACE))
+
+def _transport_depth(sid):
+    eio_sid = sio.manager.eio_sid_from_sid(sid, NAMESPACE)
+    eio_socket = sio.eio.sockets.get(eio_sid) if eio_sid else None
+    return eio_socket.queue.qsize() if eio_socket is not None else 0
+
+def _disconnect_slow(sid):
+    _spawn(sio.disconnect(sid, namespace=NAMESPACE))
+
+fanout = FanoutManager(_send, _transport_depth, _disconnect_slow)
+
+def publish_room(room, event, payload, merge=None, relay=True, **kwargs):
+    """Разослать событие участникам комнаты через очереди fanout (и другим воркерам)"""
+    if relay:
+        shared.publish(ROOM_CHANNEL, encode_room_event(room, event, payload, merge, **kwargs))
+    sids = [sid for sid, _ in sio.manager.get_participants(NAMESPACE, room)]
+    if merge is not None:
+        kwargs["merge"] = lambda old, new: WirePayload(merge(old.data, new.data))
+    fanout.publish_many(sids, event, WirePayload(payload), **kwargs)
+
+async def emit_to_client(sid, event, payload):
+    sess = socket_sessions.get(sid)
+    await sio.emit(event, WirePayload(payload).encode(sess.wire_format if sess is not None else JSON),
+                   to=sid, namespace=NAMESPACE)
+
+def authenticate_socket(flask_app, auth):
+    token = (auth or {}).get("token") if isinstance(auth, dict) else None
+    if not token:
+        return None
+    try:
+        with flask_app.app_context():
+            claims = decode_token(token)
+    except Exception:
+        return None
+    if claims.get("type") != "access" or revocations.is_revoked(claims["jti"]):
+        return None
+    return int(claims["sub"])
+
+def authenticated(f):
+    """Передает обработчику SocketSession, привязанную при подключении"""
+    async def wrapper(sid, data=None):
+        sess = socket_sessions.get(sid)
+        if sess is None:
+            await sio.disconnect(sid, namespace=NAMESPACE)
+            return
+        with acting_as(sess.user_id), socket_event(f.__name__.replace("handle_", "", 1)):
+            return await f(sess, data or {})
+    wrapper.__name__ = f.__name__
+    return wrapper
+
+def register_handlers(flask_app):
+    @sio.on("connect", namespace=NAMESPACE)
+    async def handle_connect(sid, environ, auth=None):
+        user_id = authenticate_socket(flask_app, auth)
+        if not user_id:
+            raise ConnectionRefusedError("unauthorized")
+        wire_format = (auth or {}).get("format", JSON)
+        if wire_format not in WIRE_FORMATS:
+            wire_format = JSON
+        rooms = await run_session(authorized_rooms, user_id)
+        socket_sessions.bind(sid, user_id, rooms, wire_format)
+        await sio.enter_room(sid, f"user:{user_id}", namespace=NAMESPACE)
+        await run_session(guild_presence, user_id, rooms)
+        presence.connect(sid, user_id)
+        await emit_to_client(sid, "system", {"message": "Connected to chat"})
+
+    @sio.on("disconnect", namespace=NAMESPACE)
+    async def handle_disconnect(sid, *args):
+        socket_sessions.unbind(sid)
+        presence.disconnect(sid)
+        fanout.forget(sid)
+
+    @sio.on("join", namespace=NAMESPACE)
+    @authenticated
+    async def handle_join(sess, data):
+        room = data.get("room")
+        if not sess.can_access(room):
+            await emit_to_client(sess.sid, "permission_error", {"room": room, "error": "Нет доступа к комнате"})
+            return
+        await sio.enter_room(sess.sid, room, namespace=NAMESPACE)
+        publish_room(room, "system", {"message": f"Joined room {room}"})
+
+    @sio.on("leave", namespace=NAMESPACE)
+    @authenticated
+    async def handle_leave(sess, data):
+        await sio.leave_room(sess.sid, data.get("room"), namespace=NAMESPACE)
+
+    @sio.on("message", namespace=NAMESPACE)
+    @authenticated
+    async def handle_message(sess, data):
+        room = data.get("room")
+        if not sess.can_access(room):
+            await emit_to_client(sess.sid, "permission_error", {"room": room, "error": "Нет доступа к комнате"})
+            return
+        publish_room(room, "message", {"id": to_wire(next_message_id()), "room": room,
+                                       "user_id": sess.user_id, "message": data.get("message")})
+
+    @sio.on("history", namespace=NAMESPACE)
+    @authenticated
+    async def handle_history(sess, data):
+        channel_id = data.get("channel_id")
+        if not sess.can_access(f"channel:{channel_id}"):
+            await emit_to_client(sess.sid, "permission_error",
+                                 {"room": f"channel:{channel_id}", "error": "Нет доступа к комнате"})
+            return
+        limit = min(int(data.get("limit", 50)), 100)
+        before = int(data["before"]) if data.get("before") else None
+        msgs = await get_messages_async(channel_id, limit=limit, offset=int(data.get("offset", 0)), before=before)
+        payload = pack_rows(history_rows(msgs), HISTORY_COLUMNS)
+        payload["channel_id"] = channel_id
+        await emit_to_client(sess.sid, "history", payload)
+
+    @sio.on("heartbeat", namespace=NAMESPACE)
+    @authenticated
+    async def handle_heartbeat(sess, data):
+        presence.heartbeat(sess.sid, away=bool(data.get("away")))
+
+    @sio.on("presence_subscribe", namespace=NAMESPACE)
+    @authenticated
+    async def handle_presence_subscribe(sess, data):
+        guild_id = data.get("guild_id")
+        if not sess.can_access(f"guild:{guild_id}"):
+            return
+        presence.add_member(guild_id, sess.user_id)
+        await sio.enter_room(sess.sid, f"guild:{guild_id}", namespace=NAMESPACE)
+        await emit_to_client(sess.sid, "presence_snapshot", presence.snapshot(guild_id))
+
+    @sio.on("typing", namespace=NAMESPACE)
+    @authenticated
+    async def handle_typing(sess, data):
+        channel_id = data.get("channel_id")
+        if not sess.can_access(f"channel:{channel_id}"):
+            return
+        if data.get("stop"):
+            presence.stop_typing(channel_id, sess.user_id)
+        else:
+            presence.start_typing(channel_id, sess.user_id)
+
+    @sio.on("poll_subscribe", namespace=NAMESPACE)
+    @authenticated
+    async def handle_poll_subscribe(sess, data):
+        poll_id = data.get("poll_id")
+        if await _poll_access_error(sess, poll_id):
+            return
+        results = await run_session(get_poll_results, poll_id)
+        if results is None:
+            await emit_to_client(sess.sid, "poll_error", {"poll_id": poll_id, "error": "Опрос не найден"})
+            return
+        await sio.enter_room(sess.sid, f"poll:{poll_id}", namespace=NAMESPACE)
+        await emit_to_client(sess.sid, "poll_results", results)
+
+    @sio.on("poll_vote", namespace=NAMESPACE)
+    @authenticated
+    async def handle_poll_vote(sess, data):
+        poll_id = data.get("poll_id")
+        if await _poll_access_error(sess, poll_id):
+            return
+        results, error = await run_session(vote_poll, poll_id, sess.user_id, str(data.get("option_id")))
+        if error:
+            await emit_to_client(sess.sid, "poll_error", {"poll_id": poll_id, "error": error})
+            return
+        publish_room(f"poll:{poll_id}", "poll_results", results, critical=False,
+                     coalesce_key=("poll_results", poll_id))
+
+async def _poll_access_error(sess, poll_id):
+    """Доступ к опросу — доступ к каналу (или DM) его сообщения"""
+    room = await run_session(poll_room, poll_id)
+    if room is None:
+        await emit_to_client(sess.sid, "poll_error", {"poll_id": poll_id, "error": "Опрос не найден"})
+        return True
+    if not sess.can_access(room):
+        await emit_to_client(sess.sid, "permission_error",
+                             {"room": f"poll:{poll_id}", "error": "Нет доступа к комнате"})
+        return True
+    return False
+
+@on_poll_closed
+def broadcast_poll_closed(results):
+    # Опрос закрывает поток планировщика: рассылка — в цикле событий
+    if _loop is not None:
+        _loop.call_soon_threadsafe(lambda: publish_room(f"poll:{results['poll_id']}", "poll_closed", results))
+
+def flush_presence():
+    for room, event, payload in presence.flush():
+        if event == "presence_update":
+            publish_room(room, event, payload, critical=False,
+                         coalesce_key=(event, payload["guild_id"]), merge=merge_presence_diffs)
+        else:
+            publish_room(room, event, payload, critical=False, coalesce_key=(event, room))
+
+async def _every(interval, fn):
+    # Насос очередей и рассылка присутствия работают в цикле событий, а не в потоке планировщика
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            fn()
+        except Exception as e:
+            print(f"[asgi] Ошибка фоновой задачи {fn.__name__}: {e}")
+
+def create_asgi_app(config=None):
+    """ASGI-приложение: Socket.IO /chat поверх Flask HTTP API"""
+    from asgiref.wsgi import WsgiToAsgi
+
+    # create_app подключает JWT: при подключении сокета access-токен проверяется
+    # через кэш проверенных токенов и список отзыва
+    flask_app = create_app(dict(config or {}, SOCKETIO=False))
+    # Та же БД, что у SessionLocal (относительный путь SQLite уже разрешен create_app)
+    init_async_db(flask_app.config.get("ASYNC_DATABASE_URL")
+                  or SessionLocal.kw["bind"].url.render_as_string(hide_password=False))
+    register_handlers(flask_app)
+    registry.register_collector("fanout", lambda: [
+        (f"fanout_{key}", "counter" if key in ("sent", "dropped", "coalesced", "slow_disconnects") else "gauge",
+         f"Очереди рассылки сокетам: {key}", [({}, value)])
+        for key, value in fanout.stats().items()
+    ])
+    tasks = []
+
+    async def on_startup():
+        global _loop
+        scheduler.start()
+        loop = _loop = asyncio.get_running_loop()
+
+        def relay_room_event(data):
+            # Слушатель общего состояния — отдельный поток; рассылка — в цикле событий
+            room, event, payload, kwargs = decode_room_event(data)
+            loop.call_soon_threadsafe(lambda: publish_room(room, event, payload, relay=False, **kwargs))
+
+        shared.subscribe(ROOM_CHANNEL, relay_room_event)
+        # Права сокетов меняются под блокировкой реестра, прямо в потоке слушателя
+        shared.subscribe(ACCESS_CHANNEL, socket_sessions.apply_relayed)
+        tasks.append(asyncio.create_task(_every(FANOUT_PUMP_INTERVAL, fanout.pump)))
+        tasks.append(asyncio.create_task(_every(PRESENCE_FLUSH_INTERVAL, flush_presence)))
+
+    async def on_shutdown():
+        global _loop
+        _loop = None
+        for task in tasks:
+            task.cancel()
+        await dispose_async_db()
+
+    return socketio.ASGIApp(sio, other_asgi_app=WsgiToAsgi(flask_app), socketio_path="socket.io",
+                            on_startup=on_startup, on_shutdown=on_shutdown)
@@ -0,0 +1,77 @@
+from typing import Callable, Optional
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+
+from config import Config
+from db_router import track_writes
+from models import router
+from sqlite_tuning import configure_sqlite, sqlite_pragmas
+
+# Асинхронный доступ к БД для режима asyncio (asgi.py). Модели и бизнес-логика
+# общие с синхронным приложением: функции вида fn(db, ...) из messages.py и
+# socket_sessions.py выполняются в AsyncSession.run_sync — SQLAlchemy
+# исполняет их в greenlet, а запросы идут через асинхронный драйвер.
+
+# Синхронный драйвер -> асинхронный для той же БД
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'sqlite+pysqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+psycopg',
+    'postgresql+psycopg2': 'postgresql+psycopg',
+    'postgresql+psycopg': 'postgresql+psycopg',
+}
+
+ASYNC_ONLY_DRIVERS = ('sqlite+aiosqlite', 'postgresql+asyncpg')
+
+_engine: Optional[AsyncEngine] = None
+_sessionmaker = None
+
+class TrackedSession(Session):
+    """Синхронная сторона AsyncSession: записи отмечаются за пользователем (acting_as),
+    как у SessionLocal, чтобы его следующие чтения шли в основную БД"""
+
+track_writes(TrackedSession, router)
+
+def async_url(url: str):
+    """URL основной БД с асинхронным драйвером (psycopg 3 умеет оба режима)"""
+    parsed = make_url(url)
+    if parsed.drivername in ASYNC_ONLY_DRIVERS:
+        return parsed
+    driver = ASYNC_DRIVERS.get(parsed.drivername)
+    if driver is None:
+        raise ValueError(f"Нет асинхронного драйвера для {parsed.drivername}")
+    return parsed.set(drivername=driver)
+
+def init_async_db(url: Optional[str] = None, **engine_kwargs) -> AsyncEngine:
+    """Создать асинхронный движок и фабрику сессий (повторный вызов пересоздает их)"""
+    global _engine, _sessionmaker
+    target = async_url(url or Config.ASYNC_DATABASE_URL or Config.SQLALCHEMY_DATABASE_URI)
+    if target.get_backend_name() != 'sqlite':
+        engine_kwargs.setdefault('pool_size', Config.ASYNC_POOL_SIZE)
+        engine_kwargs.setdefault('max_overflow', Config.ASYNC_POOL_SIZE)
+    engine = create_async_engine(target, **engine_kwargs)
+    if Config.SQLITE_TUNING:
+        # PRAGMA те же, но без очереди писателей: ее блокировка остановила бы цикл событий
+        configure_sqlite(engine.sync_engine, sqlite_pragmas(Config), write_gate=False)
+    _engine = engine
+    _sessionmaker = async_sessionmaker(engine, expire_on_commit=False, sync_session_class=TrackedSession)
+    return engine
+
+def get_async_engine() -> AsyncEngine:
+    if _engine is None:
+        init_async_db()
+    return _engine
+
+async def run_session(fn: Callable, *args, **kwargs):
+    """fn(db, *args, **kwargs) в асинхронной сессии; сессия закрывается после вызова"""
+    get_async_engine()
+    async with _sessionmaker() as session:
+        return await session.run_sync(fn, *args, **kwargs)
+
+async def dispose_async_db() -> None:
+    global _engine, _sessionmaker
+    if _engine is not None:
+        await _engine.dispose()
+    _engine = _sessionmaker = None
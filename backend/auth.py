@@ -1,9 +1,11 @@
 import uuid
-import time
 from functools import wraps
 from flask import request, session, jsonify, make_response
-from werkzeug.security import generate_password_hash, check_password_hash
 from models import User, SessionLocal
+from passwords import hash_password, verify_password, HashingBusy
+from config import Config
+from ratelimit import create_limiter
+from scheduler import scheduler
 import secrets
 
 def get_csrf_token():
@@ -34,27 +36,33 @@ def require_csrf(f):
         return f(*args, **kwargs)
     return wrapper
 
-RATE_LIMIT = {}
 RATE_LIMIT_WINDOW = 60
 RATE_LIMIT_MAX = 120
 
+# Лимитер с ограниченной памятью (или общий через Redis, см. Config.RATE_LIMIT_*)
+limiter = create_limiter(Config.RATE_LIMIT_STORAGE_URL, Config.RATE_LIMIT_ALGORITHM, Config.RATE_LIMIT_MAX_KEYS)
+scheduler.every(RATE_LIMIT_WINDOW, limiter.backend.purge_idle, RATE_LIMIT_WINDOW * 2, key='ratelimit_purge')
+
+def _client_ip():
+    forwarded = request.headers.get('X-Forwarded-For')
+    if forwarded:
+        return forwarded.split(',')[0].strip()
+    return request.remote_addr or 'ip'
+
 # Для REST
 
-def rate_limited(key_suffix=''):
+def rate_limited(key_suffix='', max_requests=RATE_LIMIT_MAX, window=RATE_LIMIT_WINDOW):
     def deco(f):
         @wraps(f)
         def wrapper(*args, **kwargs):
-            ip = request.headers.get('X-Forwarded-For', request.remote_addr) or 'ip'
-            key = f"{ip}:{request.path}:{key_suffix}"
-            now = int(time.time())
-            bucket = RATE_LIMIT.get(key, {'start': now, 'count': 0})
-            if now - bucket['start'] > RATE_LIMIT_WINDOW:
-                bucket = {'start': now, 'count': 0}
-            bucket['count'] += 1
-            RATE_LIMIT[key] = bucket
-            if bucket['count'] > RATE_LIMIT_MAX:
-                return jsonify({'error': 'Too many requests'}), 429
-            return f(*args, **kwargs)
+            key = f"{_client_ip()}:{request.path}:{key_suffix}"
+            result = limiter.hit(key, max_requests, window)
+            if not result.allowed:
+                resp = make_response(jsonify({'error': 'Too many requests'}), 429)
+            else:
+                resp = make_response(f(*args, **kwargs))
+            resp.headers.update(result.headers())
+            return resp
         return wrapper
     return deco
 
@@ -64,16 +72,9 @@ def rate_limited_socketio(event_name='', max_per_min=60):
     def deco(f):
         @wraps(f)
         def wrapper(*args, **kwargs):
-            ip = request.headers.get('X-Forwarded-For', request.remote_addr) or 'ip'
             username = session.get('username', 'anon')
-            key = f"SOCKET:{event_name}:{ip}:{username}"
-            now = int(time.time())
-            bucket = RATE_LIMIT.get(key, {'start': now, 'count': 0})
-            if now - bucket['start'] > 60:
-                bucket = {'start': now, 'count': 0}
-            bucket['count'] += 1
-            RATE_LIMIT[key] = bucket
-            if bucket['count'] > max_per_min:
+            key = f"SOCKET:{event_name}:{_client_ip()}:{username}"
+            if not limiter.hit(key, max_per_min, 60).allowed:
                 return False  # Socket.IO: просто игнорировать событие
             return f(*args, **kwargs)
         return wrapper
@@ -87,7 +88,12 @@ def register_user(username, password):
     if db.query(User).filter_by(username=username).first():
         db.close()
         return False, 'Пользователь уже существует'
-    user = User(username=username, password=generate_password_hash(password))
+    try:
+        password_hash = hash_password(password)
+    except HashingBusy:
+        db.close()
+        return False, 'Сервер перегружен, повторите попытку позже'
+    user = User(username=username, password=password_hash)
     db.add(user)
     db.commit()
     db.refresh(user)
@@ -100,9 +106,18 @@ def login_user(username, password):
     if not user:
         db.close()
         return False, 'Пользователь не найден'
-    if not check_password_hash(user.password, password):
+    try:
+        ok, new_hash = verify_password(user.password, password)
+    except HashingBusy:
+        db.close()
+        return False, 'Сервер перегружен, повторите попытку позже'
+    if not ok:
         db.close()
         return False, 'Неверный пароль'
+    if new_hash:
+        # Прозрачный перехеш устаревшего хеша настроенным алгоритмом
+        user.password = new_hash
+        db.commit()
     session['username'] = username
     session['user_id'] = user.id
     db.close()
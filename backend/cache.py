@@ -1,6 +1,8 @@
+import pickle
 import time
 from functools import wraps
-from typing import Any, Callable, Optional
+from typing import Any, Callable, List, Optional
+from config import Config
 
 class SimpleCache:
     """Простой in-memory кэш с TTL"""
@@ -8,15 +10,23 @@ class SimpleCache:
     def __init__(self, default_ttl: int = 300):  # 5 минут по умолчанию
         self.cache = {}
         self.default_ttl = default_ttl
+        # Счетчики для /metrics (cache_hits_total, cache_hit_ratio)
+        self.hits = 0
+        self.misses = 0
+    
+    def __len__(self):
+        return len(self.cache)
     
     def get(self, key: str) -> Optional[Any]:
         """Получить значение из кэша"""
         if key in self.cache:
             value, expiry = self.cache[key]
             if time.time() < expiry:
+                self.hits += 1
                 return value
             else:
                 del self.cache[key]
+        self.misses += 1
         return None
     
     def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
@@ -35,6 +45,9 @@ class SimpleCache:
         """Очистить весь кэш"""
         self.cache.clear()
     
+    def keys(self) -> List[str]:
+        return list(self.cache.keys())
+    
     def cleanup_expired(self) -> None:
         """Удалить истекшие записи"""
         current_time = time.time()
@@ -45,8 +58,58 @@ class SimpleCache:
         for key in expired_keys:
             del self.cache[key]
 
+class RedisCache:
+    """Кэш с тем же интерфейсом в Redis: общий для всех воркеров (supervisor.py).
+
+    TTL выставляет сам Redis, поэтому cleanup_expired ничего не делает.
+    Значения сериализуются pickle — Redis должен быть доступен только приложению.
+    """
+    
+    def __init__(self, client, default_ttl: int = 300, prefix: str = "cache:"):
+        self._redis = client
+        self.default_ttl = default_ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+    
+    def __len__(self):
+        return len(self.keys())
+    
+    def get(self, key: str) -> Optional[Any]:
+        raw = self._redis.get(self.prefix + key)
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pickle.loads(raw)
+    
+    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        self._redis.set(self.prefix + key, pickle.dumps(value), ex=max(1, int(ttl or self.default_ttl)))
+    
+    def delete(self, key: str) -> None:
+        self._redis.delete(self.prefix + key)
+    
+    def clear(self) -> None:
+        keys = [self.prefix + key for key in self.keys()]
+        if keys:
+            self._redis.delete(*keys)
+    
+    def keys(self) -> List[str]:
+        return [k.decode()[len(self.prefix):] if isinstance(k, bytes) else k[len(self.prefix):]
+                for k in self._redis.scan_iter(match=self.prefix + '*', count=1000)]
+    
+    def cleanup_expired(self) -> None:
+        pass
+
+def create_cache(url: Optional[str] = None, default_ttl: int = 300):
+    """SimpleCache (memory://, по умолчанию) или RedisCache (redis://...)"""
+    if url and url.startswith(('redis://', 'rediss://', 'unix://')):
+        import redis
+        return RedisCache(redis.Redis.from_url(url), default_ttl)
+    return SimpleCache(default_ttl)
+
 # Глобальный экземпляр кэша
-cache = SimpleCache()
+cache = create_cache(Config.SHARED_STATE_URL)
 
 def cached(ttl: int = 300, key_prefix: str = ""):
     """Декоратор для кэширования результатов функций"""
@@ -71,7 +134,7 @@ def cached(ttl: int = 300, key_prefix: str = ""):
 
 def invalidate_cache(pattern: str) -> None:
     """Инвалидировать кэш по паттерну"""
-    keys_to_delete = [key for key in cache.cache.keys() if pattern in key]
+    keys_to_delete = [key for key in cache.keys() if pattern in key]
     for key in keys_to_delete:
         cache.delete(key)
 
@@ -100,6 +163,26 @@ def get_cached_channel_messages(channel_id: int, page: int) -> Optional[dict]:
     """Получить кэшированные сообщения канала"""
     return cache.get(f"messages:{channel_id}:{page}")
 
+def cache_poll_results(poll_id: str, data: dict, ttl: int = 30) -> None:
+    """Кэшировать живые результаты опроса"""
+    cache.set(f"poll:{poll_id}:results", data, ttl)
+
+def get_cached_poll_results(poll_id: str) -> Optional[dict]:
+    """Получить кэшированные результаты опроса"""
+    return cache.get(f"poll:{poll_id}:results")
+
+def cache_invite(code: str, data: dict, ttl: int = Config.INVITE_CACHE_TTL) -> None:
+    """Кэшировать гильдию и срок действия приглашения"""
+    cache.set(f"invite:{code}", data, ttl)
+
+def get_cached_invite(code: str) -> Optional[dict]:
+    """Получить кэшированное приглашение"""
+    return cache.get(f"invite:{code}")
+
+def invalidate_invite_cache(code: str) -> None:
+    """Инвалидировать кэш приглашения (один ключ, без перебора)"""
+    cache.delete(f"invite:{code}")
+
 def invalidate_user_cache(user_id: int) -> None:
     """Инвалидировать кэш пользователя"""
     invalidate_cache(f"user:{user_id}")
@@ -113,17 +196,11 @@ def invalidate_channel_cache(channel_id: int) -> None:
     invalidate_cache(f"messages:{channel_id}")
 
 # Периодическая очистка кэша
-def start_cache_cleanup():
-    """Запустить периодическую очистку кэша"""
-    import threading
-    import time
-    
-    def cleanup_loop():
-        while True:
-            time.sleep(300)  # Очистка каждые 5 минут
-            cache.cleanup_expired()
-    
-    cleanup_thread = threading.Thread(target=cleanup_loop, daemon=True)
-    cleanup_thread.start()
+def start_cache_cleanup(interval: int = 300):
+    """Запустить периодическую очистку кэша (каждые 5 минут) через общий планировщик"""
+    from scheduler import scheduler
+    
+    scheduler.every(interval, cache.cleanup_expired, key="cache_cleanup")
+    scheduler.start()
 
 
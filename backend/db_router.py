@@ -0,0 +1,100 @@
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Hashable, Iterable, Optional
+
+from sqlalchemy import event
+
+# Кто выполняет текущую единицу работы (user_id): HTTP-запрос или сокет-событие
+current_actor = ContextVar('db_actor', default=None)
+
+def set_actor(actor: Optional[Hashable]):
+    return current_actor.set(actor)
+
+def reset_actor(token) -> None:
+    current_actor.reset(token)
+
+@contextmanager
+def acting_as(actor: Optional[Hashable]):
+    token = current_actor.set(actor)
+    try:
+        yield
+    finally:
+        current_actor.reset(token)
+
+class ReplicaRouter:
+    """Выбор движка для чтения: реплики по кругу, основная БД после своей записи.
+
+    Запись всегда идет в основную БД. Чтения, открытые через
+    ReadSessionLocal, уходят на реплики, кроме случая, когда тот же
+    пользователь писал в последние sticky_seconds секунд: его реплика могла
+    еще не догнать основную БД, поэтому он читает основную (read-your-writes).
+    """
+
+    def __init__(self, replicas: Iterable = (), sticky_seconds: float = 5.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.sticky_seconds = sticky_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._last_write = {}
+        self.set_replicas(replicas)
+        self.replica_reads = 0
+        self.primary_reads = 0
+
+    def set_replicas(self, replicas: Iterable) -> None:
+        with self._lock:
+            self.replicas = list(replicas)
+            self._cycle = itertools.cycle(self.replicas) if self.replicas else None
+
+    def note_write(self, actor: Optional[Hashable]) -> None:
+        if actor is None or not self.replicas:
+            return
+        now = self.clock()
+        with self._lock:
+            self._last_write[actor] = now
+            if len(self._last_write) > 10000:
+                self._purge(now)
+
+    def _purge(self, now):
+        expired = [a for a, at in self._last_write.items() if now - at > self.sticky_seconds]
+        for actor in expired:
+            del self._last_write[actor]
+
+    def is_sticky(self, actor: Optional[Hashable]) -> bool:
+        if actor is None:
+            return False
+        last = self._last_write.get(actor)
+        return last is not None and self.clock() - last < self.sticky_seconds
+
+    def reader_for(self, actor: Optional[Hashable] = None):
+        """Движок реплики для чтения или None — читать основную БД"""
+        if self._cycle is None or self.is_sticky(actor):
+            self.primary_reads += 1
+            return None
+        with self._lock:
+            engine = next(self._cycle)
+        self.replica_reads += 1
+        return engine
+
+def track_writes(session_factory, router: ReplicaRouter) -> None:
+    """Отмечать в роутере пользователя, чья сессия закоммитила изменения"""
+
+    @event.listens_for(session_factory, 'after_flush')
+    def _flushed(session, flush_context):
+        session.info['wrote'] = True
+
+    @event.listens_for(session_factory, 'do_orm_execute')
+    def _executed(orm_execute_state):
+        if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+            orm_execute_state.session.info['wrote'] = True
+
+    @event.listens_for(session_factory, 'after_commit')
+    def _committed(session):
+        if session.info.pop('wrote', False):
+            router.note_write(current_actor.get())
+
+    @event.listens_for(session_factory, 'after_rollback')
+    def _rolled_back(session):
+        session.info.pop('wrote', None)
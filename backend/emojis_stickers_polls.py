@@ -1,7 +1,10 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_
-from models import CustomEmoji, Sticker, Poll, PollVote, Guild, User, Message
+from sqlalchemy.exc import IntegrityError
+from models import CustomEmoji, Sticker, Poll, PollOption, PollVote, Guild, User, Message, SessionLocal
 from files import allowed_file, save_file
+from cache import cache_poll_results, get_cached_poll_results
+from scheduler import scheduler
 import os
 import uuid
 from datetime import datetime, timedelta
@@ -89,13 +92,12 @@ def create_poll(db: Session, message_id: int, question: str, options: list, expi
     if len(options) > 10:
         return None, "Максимум 10 вариантов ответа"
     
-    # Форматируем опции
+    # Форматируем опции (счетчики голосов живут в отдельных строках PollOption)
     formatted_options = []
     for i, option_text in enumerate(options):
         formatted_options.append({
             "id": str(i + 1),
-            "text": option_text,
-            "votes": 0
+            "text": option_text
         })
     
     expires_at = None
@@ -109,64 +111,182 @@ def create_poll(db: Session, message_id: int, question: str, options: list, expi
         expires_at=expires_at,
         allow_multiple=allow_multiple
     )
+    poll.counters = [PollOption(option_id=opt["id"], votes=0) for opt in formatted_options]
     
     db.add(poll)
     db.commit()
     db.refresh(poll)
     
+    if expires_at:
+        schedule_poll_expiry(poll.id, expires_at)
+    
     return poll, None
 
 def vote_poll(db: Session, poll_id: str, user_id: int, option_id: str):
-    """Голосовать в опросе"""
+    """Голосовать в опросе.
+
+    Голос вставляется в PollVote, а счетчик варианта увеличивается атомарным
+    UPDATE ... SET votes = votes + 1 в той же транзакции, поэтому параллельные
+    голоса не теряются. Повторный голос отсекает уникальный индекс uq_poll_vote_choice.
+    Возвращает (результаты опроса, ошибка).
+    """
     poll = db.query(Poll).filter(Poll.id == poll_id).first()
     if not poll:
         return None, "Опрос не найден"
     
-    # Проверяем, не истек ли опрос
-    if poll.expires_at and poll.expires_at < datetime.utcnow():
+    # Итоги замораживает планировщик (close_poll), но срок проверяется и здесь:
+    # после перезапуска или в процессе без планировщика закрытие могло не случиться
+    if poll.closed_at is not None or (poll.expires_at is not None and poll.expires_at <= datetime.utcnow()):
         return None, "Опрос истек"
     
-    # Проверяем, голосовал ли уже пользователь
-    existing_vote = db.query(PollVote).filter(
-        and_(PollVote.poll_id == poll_id, PollVote.user_id == user_id)
-    ).first()
-    
-    if existing_vote and not poll.allow_multiple:
-        return None, "Вы уже голосовали в этом опросе"
-    
     # Проверяем, существует ли вариант ответа
     option_exists = any(opt["id"] == option_id for opt in poll.options)
     if not option_exists:
         return None, "Неверный вариант ответа"
     
-    # Если не разрешено множественное голосование, удаляем предыдущие голоса
-    if existing_vote and not poll.allow_multiple:
-        db.delete(existing_vote)
-        # Уменьшаем счетчик голосов для предыдущего варианта
-        for opt in poll.options:
-            if opt["id"] == existing_vote.option_id:
-                opt["votes"] -= 1
-                break
-    
-    # Создаем новый голос
     vote = PollVote(
         poll_id=poll_id,
         user_id=user_id,
-        option_id=option_id
+        option_id=option_id,
+        choice_slot=option_id if poll.allow_multiple else ""
     )
     
-    db.add(vote)
-    
-    # Увеличиваем счетчик голосов
-    for opt in poll.options:
-        if opt["id"] == option_id:
-            opt["votes"] += 1
-            break
+    try:
+        db.add(vote)
+        db.flush()
+        db.query(PollOption).filter(
+            and_(PollOption.poll_id == poll_id, PollOption.option_id == option_id)
+        ).update({PollOption.votes: PollOption.votes + 1}, synchronize_session=False)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        if poll.allow_multiple:
+            return None, "Вы уже голосовали за этот вариант"
+        return None, "Вы уже голосовали в этом опросе"
     
+    return refresh_poll_results(db, poll), None
+
+def _build_poll_results(db: Session, poll: Poll):
+    """Собрать результаты опроса из строк-счетчиков"""
+    counts = dict(
+        db.query(PollOption.option_id, PollOption.votes)
+        .filter(PollOption.poll_id == poll.id)
+        .all()
+    )
+    options = [
+        {"id": opt["id"], "text": opt["text"], "votes": counts.get(opt["id"], 0)}
+        for opt in poll.options
+    ]
+    return {
+        "poll_id": poll.id,
+        "question": poll.question,
+        "allow_multiple": poll.allow_multiple,
+        "expires_at": poll.expires_at.isoformat() if poll.expires_at else None,
+        "options": options,
+        "total_votes": sum(opt["votes"] for opt in options)
+    }
+
+def refresh_poll_results(db: Session, poll: Poll):
+    """Пересчитать результаты опроса и обновить живой кэш"""
+    results = _build_poll_results(db, poll)
+    cache_poll_results(poll.id, results)
+    return results
+
+def get_poll_results(db: Session, poll_id: str):
+    """Получить результаты опроса (из кэша, при промахе — из счетчиков или снимка)"""
+    results = get_cached_poll_results(poll_id)
+    if results is not None:
+        return results
+    poll = db.query(Poll).filter(Poll.id == poll_id).first()
+    if not poll:
+        return None
+    if poll.final_results is not None:
+        results = expand_poll_snapshot(poll)
+        cache_poll_results(poll.id, results, ttl=3600)
+        return results
+    return refresh_poll_results(db, poll)
+
+def poll_room(db: Session, poll_id: str):
+    """Комната сообщения с опросом (channel:<id> или dm:<id>); None — опроса нет"""
+    row = db.query(Message.channel_id, Message.dm_channel_id).join(
+        Poll, Poll.message_id == Message.id
+    ).filter(Poll.id == poll_id).first()
+    if row is None:
+        return None
+    return f"channel:{row.channel_id}" if row.channel_id is not None else f"dm:{row.dm_channel_id}"
+
+# Закрытие опросов по расписанию
+
+# Обработчики закрытия опроса, например рассылка через Socket.IO: handler(results)
+poll_closed_handlers = []
+
+def on_poll_closed(handler):
+    """Зарегистрировать обработчик закрытия опроса"""
+    poll_closed_handlers.append(handler)
+    return handler
+
+def expand_poll_snapshot(poll: Poll):
+    """Развернуть компактный снимок final_results в формат результатов"""
+    votes = poll.final_results["v"]
+    options = [
+        {"id": opt["id"], "text": opt["text"], "votes": votes[i] if i < len(votes) else 0}
+        for i, opt in enumerate(poll.options)
+    ]
+    return {
+        "poll_id": poll.id,
+        "question": poll.question,
+        "allow_multiple": poll.allow_multiple,
+        "expires_at": poll.expires_at.isoformat() if poll.expires_at else None,
+        "closed_at": poll.closed_at.isoformat() if poll.closed_at else None,
+        "options": options,
+        "total_votes": poll.final_results["t"]
+    }
+
+def close_poll(db: Session, poll_id: str):
+    """Закрыть опрос и заморозить итоговые голоса в компактный снимок"""
+    poll = db.query(Poll).filter(Poll.id == poll_id).first()
+    if not poll:
+        return None, "Опрос не найден"
+    if poll.closed_at is not None:
+        return expand_poll_snapshot(poll), None
+    
+    results = _build_poll_results(db, poll)
+    poll.closed_at = datetime.utcnow()
+    poll.final_results = {
+        "t": results["total_votes"],
+        "v": [opt["votes"] for opt in results["options"]]
+    }
     db.commit()
-    db.refresh(poll)
     
-    return poll, None
+    results = expand_poll_snapshot(poll)
+    cache_poll_results(poll.id, results, ttl=3600)
+    return results, None
+
+def _expire_poll(poll_id: str):
+    """Задача планировщика: закрыть опрос и оповестить обработчики"""
+    db = SessionLocal()
+    try:
+        results, error = close_poll(db, poll_id)
+    finally:
+        db.close()
+    if error:
+        return
+    for handler in poll_closed_handlers:
+        handler(results)
+
+def schedule_poll_expiry(poll_id: str, expires_at: datetime):
+    """Поставить закрытие опроса в планировщик на момент expires_at (UTC)"""
+    delay = (expires_at - datetime.utcnow()).total_seconds()
+    return scheduler.schedule_in(delay, _expire_poll, poll_id, key=f"poll:{poll_id}")
+
+def schedule_open_polls(db: Session):
+    """Восстановить расписание незакрытых опросов (после перезапуска процесса)"""
+    polls = db.query(Poll.id, Poll.expires_at).filter(
+        and_(Poll.expires_at.isnot(None), Poll.closed_at.is_(None))
+    ).all()
+    for poll_id, expires_at in polls:
+        schedule_poll_expiry(poll_id, expires_at)
+    return len(polls)
 
 def get_poll(db: Session, poll_id: str):
     """Получить опрос"""
@@ -1,9 +1,13 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
-from flask_jwt_extended import JWTManager
 from flask_socketio import SocketIO
+# JWT-менеджер (список отзыва, кэш проверенных токенов) создается в tokens.py:
+# create_app подключает его без загрузки Socket.IO и Flask-Migrate
+from tokens import jwt
+
 
 db = SQLAlchemy()
 migrate = Migrate()
-jwt = JWTManager()
-socketio = SocketIO(cors_allowed_origins="*")
+# Сжатие HTTP long-polling ответов; для WebSocket permessage-deflate согласует eventlet
+socketio = SocketIO(cors_allowed_origins="*", http_compression=True, compression_threshold=1024)
+
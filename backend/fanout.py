@@ -0,0 +1,201 @@
+import threading
+import time
+from collections import deque
+from typing import Callable, Hashable, Iterable, Optional
+
+FANOUT_PUMP_INTERVAL = 0.05
+
+class _Outbound:
+    """Очередь исходящих событий одного соединения"""
+
+    __slots__ = ('items', 'keyed', 'backlogged_since', 'max_depth')
+
+    def __init__(self):
+        self.items = deque()
+        self.keyed = {}
+        self.backlogged_since = None
+        self.max_depth = 0
+
+class FanoutManager:
+    """Рассылка событий сокетам через ограниченные очереди на соединение.
+
+    События уходят в транспорт (очередь Engine.IO) только пока ее глубина
+    ниже transport_high_water, остальное ждет в нашей очереди, где к нему
+    применяются политики:
+
+    - некритичные события (typing, presence) с coalesce_key заменяют или
+      сливаются с уже ожидающим событием с тем же ключом;
+    - при переполнении max_queue некритичные события отбрасываются, а
+      критичные вытесняют некритичные; если вытеснять нечего — клиент
+      отключается как медленный;
+    - клиент, чья очередь не опустошается дольше slow_grace секунд, тоже
+      отключается.
+    """
+
+    def __init__(self, send: Callable, transport_depth: Callable[[str], int], disconnect: Callable[[str], None],
+                 max_queue: int = 256, transport_high_water: int = 64, slow_grace: float = 30,
+                 clock: Callable[[], float] = time.monotonic):
+        self.send = send
+        self.transport_depth = transport_depth
+        self.disconnect = disconnect
+        self.max_queue = max_queue
+        self.transport_high_water = transport_high_water
+        self.slow_grace = slow_grace
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._queues = {}
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.slow_disconnects = 0
+
+    def publish(self, sid: str, event: str, payload, critical: bool = True,
+                coalesce_key: Optional[Hashable] = None, merge: Optional[Callable] = None) -> bool:
+        """Поставить событие в очередь соединения. False — событие отброшено"""
+        slow = False
+        direct = False
+        with self._lock:
+            q = self._queues.get(sid)
+            if q is None:
+                q = self._queues[sid] = _Outbound()
+            if coalesce_key is not None:
+                item = q.keyed.get(coalesce_key)
+                if item is not None:
+                    item[1] = merge(item[1], payload) if merge else payload
+                    self.coalesced += 1
+                    return True
+            if not q.items and self._transport_has_room(sid):
+                direct = True
+            elif len(q.items) >= self.max_queue:
+                if not critical:
+                    self.dropped += 1
+                    return False
+                if not self._evict_noncritical(q):
+                    slow = True
+            if not direct and not slow:
+                item = [event, payload, critical, coalesce_key]
+                q.items.append(item)
+                if coalesce_key is not None:
+                    q.keyed[coalesce_key] = item
+                q.max_depth = max(q.max_depth, len(q.items))
+        if slow:
+            self._disconnect_slow(sid)
+            return False
+        if direct:
+            self.send(sid, event, payload)
+            self.sent += 1
+        return True
+
+    def publish_many(self, sids: Iterable[str], event: str, payload, **kwargs) -> None:
+        for sid in sids:
+            self.publish(sid, event, payload, **kwargs)
+
+    def _transport_has_room(self, sid):
+        try:
+            return self.transport_depth(sid) < self.transport_high_water
+        except Exception:
+            return True
+
+    def _evict_noncritical(self, q):
+        for item in q.items:
+            if not item[2]:
+                q.items.remove(item)
+                if item[3] is not None:
+                    q.keyed.pop(item[3], None)
+                self.dropped += 1
+                return True
+        return False
+
+    def _disconnect_slow(self, sid):
+        with self._lock:
+            if self._queues.pop(sid, None) is None:
+                return
+            self.slow_disconnects += 1
+        self.disconnect(sid)
+
+    def pump(self) -> int:
+        """Передать ожидающие события в транспорт, отключить медленных клиентов"""
+        now = self.clock()
+        ready = []
+        slow = []
+        with self._lock:
+            for sid, q in self._queues.items():
+                if not q.items:
+                    continue
+                try:
+                    budget = self.transport_high_water - self.transport_depth(sid)
+                except Exception:
+                    budget = self.transport_high_water
+                while budget > 0 and q.items:
+                    event, payload, _, key = q.items.popleft()
+                    if key is not None:
+                        q.keyed.pop(key, None)
+                    ready.append((sid, event, payload))
+                    budget -= 1
+                if not q.items:
+                    q.backlogged_since = None
+                elif q.backlogged_since is None:
+                    q.backlogged_since = now
+                elif now - q.backlogged_since > self.slow_grace:
+                    slow.append(sid)
+        for sid, event, payload in ready:
+            self.send(sid, event, payload)
+        self.sent += len(ready)
+        for sid in slow:
+            self._disconnect_slow(sid)
+        return len(ready)
+
+    def forget(self, sid: str) -> None:
+        """Удалить очередь отключившегося соединения"""
+        with self._lock:
+            self._queues.pop(sid, None)
+
+    def depth(self, sid: str) -> int:
+        q = self._queues.get(sid)
+        return len(q.items) if q is not None else 0
+
+    def stats(self) -> dict:
+        """Метрики: глубина очередей, отправлено, отброшено, слито, отключено"""
+        with self._lock:
+            depths = [len(q.items) for q in self._queues.values()]
+        return {
+            'connections': len(depths),
+            'queued': sum(depths),
+            'max_queue_depth': max(depths) if depths else 0,
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+            'slow_disconnects': self.slow_disconnects,
+        }
+
+def merge_presence_diffs(old: dict, new: dict) -> dict:
+    """Слить два diff присутствия: для каждого пользователя побеждает последний статус"""
+    latest = {}
+    for diff in (old, new):
+        for status in ('online', 'idle', 'offline'):
+            for user_id in diff.get(status, ()):
+                latest[user_id] = status
+    merged = {'guild_id': new.get('guild_id', old.get('guild_id')), 'online': [], 'idle': [], 'offline': []}
+    for user_id, status in latest.items():
+        merged[status].append(user_id)
+    return merged
+
+# Событие комнаты для других воркеров (shared_state, канал ROOM_CHANNEL):
+# функция слияния передается по имени, ключ слияния — списком
+ROOM_CHANNEL = 'socket_rooms'
+ROOM_MERGERS = {'presence': merge_presence_diffs}
+
+def encode_room_event(room: str, event: str, payload, merge: Optional[Callable] = None,
+                      critical: bool = True, coalesce_key: Optional[Hashable] = None) -> dict:
+    merger = next((name for name, func in ROOM_MERGERS.items() if func is merge), None)
+    return {'room': room, 'event': event, 'payload': payload, 'merge': merger,
+            'critical': critical, 'coalesce_key': coalesce_key}
+
+def decode_room_event(data: dict):
+    """(room, event, payload, kwargs для publish_room)"""
+    coalesce_key = data.get('coalesce_key')
+    return data['room'], data['event'], data['payload'], {
+        'merge': ROOM_MERGERS.get(data.get('merge')),
+        'critical': data.get('critical', True),
+        'coalesce_key': tuple(coalesce_key) if isinstance(coalesce_key, list) else coalesce_key,
+    }
@@ -1,10 +1,18 @@
-import uuid
-from models import Guild, Channel, User, Role, Permission, Category, SessionLocal
+import secrets
+from datetime import datetime, timedelta
+from models import (Guild, GuildMember, Channel, User, Role, Permission, Category, ReadState, Invite,
+                    SessionLocal, ReadSessionLocal)
+from sqlalchemy import and_, exists, func, literal, or_, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import joinedload
+from cache import cache_invite, get_cached_invite, invalidate_invite_cache
+from config import Config
+from presence import presence
+from scheduler import scheduler
+from socket_sessions import socket_sessions
 
 guilds = {}
 member_of_guild = {}
-invites = {}
 
 # Гильдии
 
@@ -26,10 +34,11 @@ def create_guild(owner_username, name):
     db.commit()
     db.refresh(guild)
     db.close()
+    socket_sessions.grant_room(owner.id, f"guild:{guild.id}")
     return guild.id, guild
 
 def get_guild(gid):
-    db = SessionLocal()
+    db = ReadSessionLocal()
     guild = db.query(Guild).options(joinedload(Guild.channels)).filter_by(id=gid).first()
     db.close()
     return guild
@@ -40,13 +49,16 @@ def delete_guild(gid):
     if not guild:
         db.close()
         return False
+    rooms = _guild_rooms(db, gid)
     db.delete(guild)
     db.commit()
     db.close()
+    # Владелец и участники: у их сокетов есть комната гильдии
+    socket_sessions.revoke_rooms_from_holders(f"guild:{gid}", rooms)
     return True
 
 def list_guilds():
-    db = SessionLocal()
+    db = ReadSessionLocal()
     guilds = db.query(Guild).all()
     db.close()
     return guilds
@@ -59,47 +71,115 @@ def create_channel(gid, name, read_only=False):
     if not guild:
         db.close()
         return None, 'Гильдия не найдена'
-    if len(guild.channels) >= MAX_CHANNELS:
+    # Считаем каналы в БД, а не загружаем guild.channels целиком
+    channel_count = db.query(func.count(Channel.id)).filter(Channel.guild_id == gid).scalar()
+    if channel_count >= MAX_CHANNELS:
         db.close()
         return None, f'Лимит каналов в гильдии: {MAX_CHANNELS}'
-    channel = Channel(name=name, guild=guild, read_only=read_only)
+    owner_id = guild.owner_id
+    channel = Channel(name=name, guild_id=gid, read_only=read_only)
     db.add(channel)
+    db.flush()
+    # Счетчики непрочитанного владельцу и всем участникам одним INSERT ... SELECT
+    readers = select(literal(owner_id), literal(channel.id)).union(
+        select(GuildMember.user_id, literal(channel.id)).where(GuildMember.guild_id == gid)).subquery()
+    db.execute(ReadState.__table__.insert().from_select(['user_id', 'channel_id'], select(readers)))
     db.commit()
     db.refresh(channel)
     db.close()
+    # Канал открывается всем сокетам участников гильдии, не только владельцу
+    socket_sessions.grant_room_to_holders(f"guild:{gid}", f"channel:{channel.id}")
     return channel.id, channel
 
 def get_channel(gid, cid):
-    db = SessionLocal()
+    db = ReadSessionLocal()
     channel = db.query(Channel).filter_by(id=cid, guild_id=gid).first()
     db.close()
     return channel
 
 def list_channels(gid):
-    db = SessionLocal()
+    db = ReadSessionLocal()
     channels = db.query(Channel).filter_by(guild_id=gid).all()
     db.close()
     return channels
 
-# Членство (упрощённо: просто список пользователей-гильдий)
+# Членство: строки GuildMember; владелец — участник по Guild.owner_id
+
+def _guild_rooms(db, gid):
+    """Комнаты сокетов гильдии: сама гильдия и ее каналы"""
+    return [f"guild:{gid}"] + [f"channel:{cid}" for (cid,) in db.query(Channel.id).filter_by(guild_id=gid)]
+
+def _insert_member(db, gid, user_id):
+    """Строка guild_member и счетчики непрочитанного по каналам гильдии, в транзакции вызывающего.
+
+    Повторное участие отсекает uq_guild_member: flush бросает IntegrityError.
+    """
+    db.add(GuildMember(guild_id=gid, user_id=user_id))
+    db.flush()
+    # Счетчики, оставшиеся от прошлого участия, не дублируются
+    channels = select(literal(user_id), Channel.id).where(
+        Channel.guild_id == gid,
+        ~exists().where(ReadState.user_id == user_id, ReadState.channel_id == Channel.id))
+    db.execute(ReadState.__table__.insert().from_select(['user_id', 'channel_id'], channels))
+
+def _grant_member(gid, user_id, rooms):
+    """Комнаты гильдии сокетам нового участника; присутствие — если трекер уже знает гильдию"""
+    for room in rooms:
+        socket_sessions.grant_room(user_id, room)
+    if presence.tracks_guild(gid):
+        presence.add_member(gid, user_id)
+
 def add_member(gid, username):
+    """Добавить пользователя в гильдию; повторное добавление — не ошибка"""
     db = SessionLocal()
     guild = db.query(Guild).filter_by(id=gid).first()
     user = db.query(User).filter_by(username=username).first()
     if not guild or not user:
         db.close()
         return False
-    # В реальной Discord — отдельная таблица membership, здесь можно реализовать позже
+    user_id = user.id
+    if guild.owner_id != user_id:
+        try:
+            _insert_member(db, gid, user_id)
+            db.commit()
+        except IntegrityError:
+            # Уже участник (uq_guild_member)
+            db.rollback()
+    rooms = _guild_rooms(db, gid)
     db.close()
+    _grant_member(gid, user_id, rooms)
     return True
 
 def remove_member(gid, username):
-    # Аналогично add_member — реализовать через отдельную таблицу membership
-    return True
+    db = SessionLocal()
+    user_id = db.query(User.id).filter_by(username=username).scalar()
+    if user_id is None:
+        db.close()
+        return False
+    deleted = db.query(GuildMember).filter_by(guild_id=gid, user_id=user_id).delete(synchronize_session=False)
+    db.commit()
+    rooms = _guild_rooms(db, gid)
+    db.close()
+    if deleted:
+        for room in rooms:
+            socket_sessions.revoke_room(user_id, room)
+        # Исключенный участник больше не входит в рассылку присутствия гильдии
+        presence.remove_member(gid, user_id)
+    return bool(deleted)
+
+def is_member(db, gid, user_id):
+    """Владелец или участник гильдии"""
+    if db.query(Guild.id).filter_by(id=gid, owner_id=user_id).first():
+        return True
+    return db.query(GuildMember.id).filter_by(guild_id=gid, user_id=user_id).first() is not None
 
 def get_members(gid):
-    # Аналогично — реализовать через отдельную таблицу membership
-    return []
+    """Имена участников гильдии (без владельца)"""
+    db = ReadSessionLocal()
+    names = [name for (name,) in db.query(User.username).join(GuildMember, GuildMember.user_id == User.id)
+             .filter(GuildMember.guild_id == gid).order_by(GuildMember.id)]
+    db.close()
+    return names
 
 # Роли и права
 
@@ -117,7 +197,7 @@ def create_role(gid, name, color='#99aab5'):
     return role.id, role
 
 def get_roles(gid):
-    db = SessionLocal()
+    db = ReadSessionLocal()
     roles = db.query(Role).filter_by(guild_id=gid).order_by(Role.position).all()
     db.close()
     return roles
@@ -167,21 +247,145 @@ def create_category(gid, name):
     return category.id, category
 
 def get_categories(gid):
-    db = SessionLocal()
+    db = ReadSessionLocal()
     categories = db.query(Category).filter_by(guild_id=gid).order_by(Category.position).all()
     db.close()
     return categories
 
 # Инвайты
 
-def create_invite(gid, creator):
-    code = str(uuid.uuid4())[:8]
-    invites.setdefault(gid, set()).add(code)
-    return code
+# 6 случайных байт — 8 символов base64url
+INVITE_CODE_BYTES = 6
+# Пределы параметров приглашения (POST /api/guilds/<id>/invites)
+MAX_INVITE_USES = 10000
+MAX_INVITE_HOURS = 24 * 365
 
-def use_invite(gid, code, username):
-    if code in invites.get(gid, set()):
-        add_member(gid, username)
-        invites[gid].discard(code)
-        return True
-    return False
+def _invite_entry(invite):
+    return {"guild_id": invite.guild_id, "expires_at": invite.expires_at}
+
+def create_invite(gid, creator, max_age=None, max_uses=None):
+    """Приглашение на max_age секунд и max_uses входов (None — без предела). Возвращает (invite, ошибка)"""
+    db = SessionLocal()
+    if not db.query(Guild.id).filter_by(id=gid).first():
+        db.close()
+        return None, 'Гильдия не найдена'
+    creator_id = db.query(User.id).filter_by(username=creator).scalar()
+    expires_at = datetime.utcnow() + timedelta(seconds=max_age) if max_age else None
+    # Совпадение кода с существующим отсекает первичный ключ — выдаем другой
+    for _ in range(3):
+        invite = Invite(code=secrets.token_urlsafe(INVITE_CODE_BYTES), guild_id=gid, creator_id=creator_id,
+                        max_uses=max_uses or None, uses=0, expires_at=expires_at)
+        db.add(invite)
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            continue
+        db.refresh(invite)
+        db.close()
+        cache_invite(invite.code, _invite_entry(invite))
+        return invite, None
+    db.close()
+    return None, 'Не удалось выдать код приглашения'
+
+def resolve_invite(code):
+    """Гильдия приглашения по коду (кэш, при промахе — первичный ключ); None — нет или истекло.
+
+    Число использований в кэше не хранится: исчерпанность проверяет use_invite.
+    """
+    entry = get_cached_invite(code)
+    if entry is None:
+        db = SessionLocal()
+        invite = db.query(Invite).filter_by(code=code).first()
+        db.close()
+        if invite is None:
+            return None
+        entry = _invite_entry(invite)
+        cache_invite(code, entry)
+    if entry["expires_at"] is not None and entry["expires_at"] <= datetime.utcnow():
+        return None
+    return entry["guild_id"]
+
+def use_invite(code, username):
+    """Вход по приглашению. Возвращает (guild_id, ошибка).
+
+    Срок, лимит и увеличение uses — один условный UPDATE в одной транзакции с
+    добавлением участника, поэтому конкурирующие входы (в том числе из разных
+    воркеров) не превышают max_uses, а повторный вход того же пользователя
+    откатывается на uq_guild_member вместе со своим использованием.
+    """
+    gid = resolve_invite(code)
+    if gid is None:
+        return None, 'Приглашение недействительно'
+    db = SessionLocal()
+    try:
+        user_id = db.query(User.id).filter_by(username=username).scalar()
+        if user_id is None:
+            return None, 'Пользователь не найден'
+        if is_member(db, gid, user_id):
+            # Уже в гильдии: использование приглашения не расходуется
+            return gid, None
+        used = db.query(Invite).filter(
+            Invite.code == code,
+            or_(Invite.max_uses.is_(None), Invite.uses < Invite.max_uses),
+            or_(Invite.expires_at.is_(None), Invite.expires_at > datetime.utcnow()),
+        ).update({Invite.uses: Invite.uses + 1}, synchronize_session=False)
+        if not used:
+            db.rollback()
+            invalidate_invite_cache(code)
+            return None, 'Приглашение недействительно'
+        try:
+            _insert_member(db, gid, user_id)
+            db.commit()
+        except IntegrityError:
+            # Параллельный вход того же пользователя уже добавил его
+            db.rollback()
+            return gid, None
+        rooms = _guild_rooms(db, gid)
+    finally:
+        db.close()
+    _grant_member(gid, user_id, rooms)
+    return gid, None
+
+def delete_invite(code):
+    db = SessionLocal()
+    deleted = db.query(Invite).filter_by(code=code).delete(synchronize_session=False)
+    db.commit()
+    db.close()
+    invalidate_invite_cache(code)
+    return bool(deleted)
+
+def purge_invites(batch_size=Config.INVITE_PURGE_BATCH, now=None):
+    """Удалить истекшие и исчерпанные приглашения пачками, одна транзакция на пачку.
+
+    Удаленные коды вытесняются из кэша, чтобы resolve_invite не находил их до
+    истечения INVITE_CACHE_TTL. Возвращает число удаленных.
+    """
+    now = now or datetime.utcnow()
+    stale = select(Invite.code).where(or_(
+        Invite.expires_at <= now,
+        and_(Invite.max_uses.isnot(None), Invite.uses >= Invite.max_uses),
+    )).limit(batch_size)
+    db = SessionLocal()
+    purged = 0
+    try:
+        while True:
+            codes = [code for (code,) in db.execute(stale)]
+            if not codes:
+                break
+            db.query(Invite).filter(Invite.code.in_(codes)).delete(synchronize_session=False)
+            db.commit()
+            for code in codes:
+                invalidate_invite_cache(code)
+            purged += len(codes)
+            if len(codes) < batch_size:
+                break
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    return purged
+
+def schedule_invite_purge(interval=Config.INVITE_PURGE_INTERVAL):
+    return scheduler.every(interval, purge_invites, key="invite_purge")
@@ -0,0 +1,35 @@
+import os
+import time
+from flask import Blueprint, jsonify
+from sqlalchemy import text
+from config import Config
+from models import db
+from scheduler import scheduler
+from shared_state import shared
+from socket_sessions import socket_sessions
+
+# Состояние воркера для supervisor.py и балансировщика; 503 — воркер выводится из ротации
+health = Blueprint("health", __name__)
+
+STARTED_AT = time.time()
+
+@health.route("/health")
+def health_check():
+    checks = {}
+    try:
+        db.session.execute(text("SELECT 1"))
+        checks["database"] = "ok"
+    except Exception as e:
+        checks["database"] = f"error: {e}"
+    checks["shared_state"] = "ok" if shared.ping() else "error"
+    healthy = all(value == "ok" for value in checks.values())
+    return jsonify({
+        "status": "ok" if healthy else "error",
+        "worker": Config.WORKER_INDEX,
+        "pid": os.getpid(),
+        "uptime": round(time.time() - STARTED_AT, 1),
+        "sockets": len(socket_sessions),
+        "scheduled_jobs": scheduler.pending(),
+        "shared_state": shared.url,
+        "checks": checks,
+    }), 200 if healthy else 503
@@ -1,42 +1,88 @@
+import re
 import uuid
 from datetime import datetime
-from models import Message, Channel, User, DMChannel, SessionLocal
+from models import Message, Channel, User, DMChannel, DMInbox, ReadState, SessionLocal, ReadSessionLocal
+from sqlalchemy import and_, case, func, or_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import joinedload
+from socket_sessions import socket_sessions
+from archive import with_archive, archived_count
+from snowflake import next_message_id, snowflake_time, to_wire
+from queries import query_helper
 
 messages = {}
 threads_index = {}
 
 # Сообщения
-
-MAX_MESSAGES_PER_CHANNEL = 10000
+# Лимита сообщений на канал нет: старая история уходит в сжатый архив (archive.py)
 
 def create_message(channel_id, username, text, file=None):
     db = SessionLocal()
+    try:
+        return insert_message(db, channel_id, username, text)
+    finally:
+        db.close()
+
+@query_helper
+def insert_message(db, channel_id, username, text):
+    """Создание сообщения канала в сессии db; общая часть для create_message и create_message_async"""
     user = db.query(User).filter_by(username=username).first()
     channel = db.query(Channel).filter_by(id=channel_id).first()
     if not user or not channel:
-        db.close()
         return None
-    msg_count = db.query(Message).filter_by(channel_id=channel_id).count()
-    if msg_count >= MAX_MESSAGES_PER_CHANNEL:
-        db.close()
-        return None  # Можно вернуть ошибку "Лимит сообщений в канале"
-    message = Message(channel=channel, user=user, content=text, timestamp=datetime.now(), pinned=False)
+    message_id = next_message_id()
+    message = Message(id=message_id, channel=channel, user=user, content=text,
+                      timestamp=snowflake_time(message_id), pinned=False)
     db.add(message)
+    db.flush()
+    bump_read_states(db, message)
     db.commit()
     db.refresh(message)
-    db.close()
     return message
 
-def get_messages(channel_id, limit=50, offset=0):
-    db = SessionLocal()
-    msgs = db.query(Message).options(joinedload(Message.user)).filter_by(channel_id=channel_id).order_by(Message.timestamp.desc()).offset(offset).limit(limit).all()
-    db.close()
-    return msgs
+def get_messages(channel_id, limit=50, offset=0, before=None):
+    """Страница истории от новых к старым; before — курсор (id), вместо offset"""
+    db = ReadSessionLocal()
+    try:
+        return query_messages(db, channel_id, limit, offset, before)
+    finally:
+        db.close()
+
+@query_helper
+def query_messages(db, channel_id, limit=50, offset=0, before=None):
+    query = db.query(Message).options(joinedload(Message.user)).filter_by(channel_id=channel_id)
+    if before is not None:
+        query = query.filter(Message.id < before)
+    msgs = query.order_by(Message.id.desc()).offset(offset).limit(limit).all()
+    return with_archive(db, msgs, limit, offset, before=before, channel_id=channel_id)
+
+# Режим asyncio (asgi.py): та же логика в AsyncSession.run_sync, ввод-вывод БД
+# идет через асинхронный драйвер и не блокирует цикл событий
+
+async def create_message_async(channel_id, username, text):
+    from async_db import run_session
+    return await run_session(insert_message, channel_id, username, text)
+
+async def get_messages_async(channel_id, limit=50, offset=0, before=None):
+    from async_db import run_session
+    return await run_session(query_messages, channel_id, limit, offset, before)
+
+HISTORY_COLUMNS = ("id", "user_id", "username", "content", "timestamp", "pinned")
+
+def history_rows(msgs):
+    """Строки страницы истории для сокет-события history (id — строкой, см. snowflake.to_wire)"""
+    return [{
+        "id": to_wire(m.id),
+        "user_id": m.user_id,
+        "username": m.user.username,
+        "content": m.content,
+        "timestamp": m.timestamp.isoformat() if m.timestamp else None,
+        "pinned": m.pinned,
+    } for m in msgs]
 
 def get_messages_count(channel_id):
-    db = SessionLocal()
-    count = db.query(Message).filter_by(channel_id=channel_id).count()
+    db = ReadSessionLocal()
+    count = db.query(Message).filter_by(channel_id=channel_id).count() + archived_count(db, channel_id=channel_id)
     db.close()
     return count
 
@@ -57,6 +103,7 @@ def delete_message(channel_id, message_id):
     if not msg:
         db.close()
         return False
+    drop_read_states(db, msg)
     db.delete(msg)
     db.commit()
     db.close()
@@ -101,6 +148,13 @@ def get_threads(gid, cid):
     return []
 
 # DM каналы
+
+DM_PREVIEW_LENGTH = 100
+
+def dm_pair(user_a_id, user_b_id):
+    """Каноничный порядок пары для DMChannel: (меньший id, больший id)"""
+    return (user_a_id, user_b_id) if user_a_id < user_b_id else (user_b_id, user_a_id)
+
 def create_dm_channel(user1_username, user2_username):
     """Создать или найти DM канал между двумя пользователями"""
     db = SessionLocal()
@@ -110,22 +164,39 @@ def create_dm_channel(user1_username, user2_username):
         
         if not user1 or not user2:
             return None, "Пользователь не найден"
+        if user1.id == user2.id:
+            return None, "Нельзя создать DM с самим собой"
+        
+        low, high = dm_pair(user1.id, user2.id)
         
         # Проверяем, существует ли уже DM канал
-        existing_dm = db.query(DMChannel).filter(
-            ((DMChannel.user1_id == user1.id) & (DMChannel.user2_id == user2.id)) |
-            ((DMChannel.user1_id == user2.id) & (DMChannel.user2_id == user1.id))
-        ).first()
+        existing_dm = db.query(DMChannel).filter_by(user1_id=low, user2_id=high).first()
         
         if existing_dm:
             return existing_dm.id, existing_dm
         
         # Создаем новый DM канал
-        dm_channel = DMChannel(user1_id=user1.id, user2_id=user2.id)
+        dm_channel = DMChannel(user1_id=low, user2_id=high)
         db.add(dm_channel)
+        try:
+            db.flush()
+        except IntegrityError:
+            # Параллельный запрос уже создал канал этой пары (uq_dm_channel_pair)
+            db.rollback()
+            existing_dm = db.query(DMChannel).filter_by(user1_id=low, user2_id=high).first()
+            if existing_dm is None:
+                raise
+            return existing_dm.id, existing_dm
+        now = datetime.utcnow()
+        for user_id, other_id in ((low, high), (high, low)):
+            db.add(ReadState(user_id=user_id, dm_channel_id=dm_channel.id))
+            db.add(DMInbox(user_id=user_id, dm_channel_id=dm_channel.id, other_user_id=other_id, last_message_at=now))
         db.commit()
         db.refresh(dm_channel)
         
+        for user_id in (user1.id, user2.id):
+            socket_sessions.grant_room(user_id, f"dm:{dm_channel.id}")
+        
         return dm_channel.id, dm_channel
     except Exception as e:
         db.rollback()
@@ -143,14 +214,23 @@ def create_dm_message(dm_channel_id, username, text, file=None):
         if not user or not dm_channel:
             return None
         
+        message_id = next_message_id()
         message = Message(
+            id=message_id,
             dm_channel=dm_channel,
             user=user,
             content=text,
-            timestamp=datetime.now(),
+            timestamp=snowflake_time(message_id),
             pinned=False
         )
         db.add(message)
+        db.flush()
+        bump_read_states(db, message)
+        db.query(DMInbox).filter_by(dm_channel_id=dm_channel.id).update({
+            DMInbox.last_message_id: message.id,
+            DMInbox.last_message_preview: text[:DM_PREVIEW_LENGTH],
+            DMInbox.last_message_at: message.timestamp,
+        }, synchronize_session=False)
         db.commit()
         db.refresh(message)
         
@@ -161,17 +241,18 @@ def create_dm_message(dm_channel_id, username, text, file=None):
     finally:
         db.close()
 
-def get_dm_messages(dm_channel_id, limit=50, offset=0):
+def get_dm_messages(dm_channel_id, limit=50, offset=0, before=None):
     """Получить сообщения из DM канала"""
-    db = SessionLocal()
+    db = ReadSessionLocal()
     try:
-        messages = db.query(Message).options(
+        query = db.query(Message).options(
             joinedload(Message.user)
-        ).filter_by(dm_channel_id=dm_channel_id).order_by(
-            Message.timestamp.desc()
-        ).offset(offset).limit(limit).all()
+        ).filter_by(dm_channel_id=dm_channel_id)
+        if before is not None:
+            query = query.filter(Message.id < before)
+        messages = query.order_by(Message.id.desc()).offset(offset).limit(limit).all()
         
-        return messages
+        return with_archive(db, messages, limit, offset, before=before, dm_channel_id=dm_channel_id)
     except Exception as e:
         return []
     finally:
@@ -179,7 +260,7 @@ def get_dm_messages(dm_channel_id, limit=50, offset=0):
 
 def get_dm_channel_by_users(user1_username, user2_username):
     """Найти DM канал между двумя пользователями"""
-    db = SessionLocal()
+    db = ReadSessionLocal()
     try:
         user1 = db.query(User).filter_by(username=user1_username).first()
         user2 = db.query(User).filter_by(username=user2_username).first()
@@ -187,13 +268,142 @@ def get_dm_channel_by_users(user1_username, user2_username):
         if not user1 or not user2:
             return None
         
-        dm_channel = db.query(DMChannel).filter(
-            ((DMChannel.user1_id == user1.id) & (DMChannel.user2_id == user2.id)) |
-            ((DMChannel.user1_id == user2.id) & (DMChannel.user2_id == user1.id))
-        ).first()
-        
-        return dm_channel
+        low, high = dm_pair(user1.id, user2.id)
+        return db.query(DMChannel).filter_by(user1_id=low, user2_id=high).first()
     except Exception as e:
         return None
     finally:
         db.close()
+
+def get_dm_inbox(user_id, limit=50, before=None):
+    """Список DM пользователя по свежести одним запросом (индекс user_id, last_message_at).
+
+    before — курсор (last_message_at, dm_channel_id) последней строки
+    предыдущей страницы: у нескольких DM время бывает одинаковым, поэтому
+    порядок и курсор дополнены id канала.
+    """
+    db = ReadSessionLocal()
+    try:
+        query = db.query(DMInbox, User.username, ReadState.unread_count).join(
+            User, User.id == DMInbox.other_user_id
+        ).outerjoin(ReadState, (ReadState.user_id == DMInbox.user_id) &
+                    (ReadState.dm_channel_id == DMInbox.dm_channel_id)
+        ).filter(DMInbox.user_id == user_id)
+        if before is not None:
+            before_at, before_id = before
+            query = query.filter(or_(DMInbox.last_message_at < before_at,
+                                     and_(DMInbox.last_message_at == before_at,
+                                          DMInbox.dm_channel_id < before_id)))
+        rows = query.order_by(DMInbox.last_message_at.desc(), DMInbox.dm_channel_id.desc()).limit(limit).all()
+    finally:
+        db.close()
+    return [{
+        'dm_channel_id': entry.dm_channel_id,
+        'user_id': entry.other_user_id,
+        'username': username,
+        'last_message_id': entry.last_message_id,
+        'last_message_preview': entry.last_message_preview,
+        'last_message_at': entry.last_message_at.isoformat(),
+        'unread': unread or 0,
+    } for entry, username, unread in rows]
+
+# Непрочитанные и упоминания
+
+MENTION_RE = re.compile(r'@(\w+)')
+
+def _read_state_scope(message):
+    if message.channel_id is not None:
+        return ReadState.channel_id == message.channel_id
+    return ReadState.dm_channel_id == message.dm_channel_id
+
+def _mentioned_user_ids(db, text):
+    names = set(MENTION_RE.findall(text or ''))
+    if not names:
+        return []
+    return [uid for (uid,) in db.query(User.id).filter(User.username.in_(names))]
+
+def bump_read_states(db, message):
+    """Учесть новое сообщение в счетчиках всех читателей канала (в транзакции вызывающего).
+
+    Один UPDATE на всех читателей и еще один для упомянутых, без подсчета сообщений.
+    """
+    scope = _read_state_scope(message)
+    db.query(ReadState).filter(scope, ReadState.user_id != message.user_id).update(
+        {ReadState.unread_count: ReadState.unread_count + 1}, synchronize_session=False)
+    mentioned = _mentioned_user_ids(db, message.content)
+    if mentioned:
+        db.query(ReadState).filter(
+            scope, ReadState.user_id != message.user_id, ReadState.user_id.in_(mentioned)
+        ).update({ReadState.mention_count: ReadState.mention_count + 1}, synchronize_session=False)
+
+def drop_read_states(db, message):
+    """Вычесть удаляемое сообщение у тех, кто его еще не прочитал"""
+    scope = _read_state_scope(message)
+    unread = db.query(ReadState).filter(
+        scope, ReadState.user_id != message.user_id, ReadState.last_read_message_id < message.id)
+    unread.update({ReadState.unread_count: case(
+        (ReadState.unread_count > 0, ReadState.unread_count - 1), else_=0)}, synchronize_session=False)
+    mentioned = _mentioned_user_ids(db, message.content)
+    if mentioned:
+        unread.filter(ReadState.user_id.in_(mentioned)).update({ReadState.mention_count: case(
+            (ReadState.mention_count > 0, ReadState.mention_count - 1), else_=0)}, synchronize_session=False)
+
+def mark_read(user_id, channel_id=None, dm_channel_id=None, message_id=None):
+    """Сдвинуть метку прочтения до message_id (по умолчанию — до последнего сообщения).
+
+    Счетчик непрочитанного пересчитывается по сообщениям после метки;
+    упоминания сбрасываются, когда прочитано все.
+    """
+    db = SessionLocal()
+    try:
+        if channel_id is not None:
+            scope = {'channel_id': channel_id}
+        else:
+            scope = {'dm_channel_id': dm_channel_id}
+        if message_id is None:
+            message_id = db.query(func.max(Message.id)).filter_by(**scope).scalar() or 0
+        state = db.query(ReadState).filter_by(user_id=user_id, **scope).first()
+        if state is None:
+            state = ReadState(user_id=user_id, mention_count=0, **scope)
+            db.add(state)
+        elif state.last_read_message_id >= message_id:
+            return state.unread_count, state.mention_count
+        state.last_read_message_id = message_id
+        state.unread_count = db.query(func.count(Message.id)).filter_by(**scope).filter(
+            Message.id > message_id, Message.user_id != user_id).scalar()
+        if state.unread_count == 0:
+            state.mention_count = 0
+        else:
+            state.mention_count = min(state.mention_count or 0, state.unread_count)
+        db.commit()
+        return state.unread_count, state.mention_count
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def get_badges(user_id):
+    """Бейджи по всем гильдиям и DM пользователя одним запросом по счетчикам"""
+    db = ReadSessionLocal()
+    try:
+        rows = db.query(
+            ReadState.channel_id, ReadState.dm_channel_id, Channel.guild_id,
+            ReadState.unread_count, ReadState.mention_count,
+        ).outerjoin(Channel, Channel.id == ReadState.channel_id).filter(
+            ReadState.user_id == user_id,
+            (ReadState.unread_count > 0) | (ReadState.mention_count > 0),
+        ).all()
+    finally:
+        db.close()
+    badges = {'guilds': {}, 'channels': {}, 'dms': {}}
+    for channel_id, dm_channel_id, guild_id, unread, mentions in rows:
+        counters = {'unread': unread, 'mentions': mentions}
+        if channel_id is not None:
+            badges['channels'][channel_id] = counters
+            guild = badges['guilds'].setdefault(guild_id, {'unread': 0, 'mentions': 0})
+            guild['unread'] += unread
+            guild['mentions'] += mentions
+        else:
+            badges['dms'][dm_channel_id] = counters
+    return badges
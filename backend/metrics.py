@@ -0,0 +1,405 @@
+import bisect
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter as _Tally
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Метрики процесса в текстовом формате Prometheus (без prometheus_client):
+# гистограммы задержек HTTP и сокет-событий, число и время SQL-запросов на
+# запрос, попадания кэшей, состояние пулов соединений. Значения копятся в
+# памяти процесса; при нескольких воркерах Prometheus опрашивает каждый.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(labels: Dict[str, object]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + '}'
+
+def _format_value(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Монотонный счетчик с метками"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, dict(zip(self.labelnames, labels)), value) for labels, value in items]
+
+class Histogram:
+    """Гистограмма с фиксированными границами корзин (le), суммой и числом наблюдений"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, *labels) -> int:
+        state = self._values.get(labels)
+        return state[2] if state else 0
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, list(state[0]), state[1], state[2]) for labels, state in self._values.items()]
+        result = []
+        for labels, counts, total, count in items:
+            base = dict(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                result.append((self.name + '_bucket', dict(base, le=_format_value(float(bound))), cumulative))
+            result.append((self.name + '_bucket', dict(base, le='+Inf'), count))
+            result.append((self.name + '_sum', base, total))
+            result.append((self.name + '_count', base, count))
+        return result
+
+class Registry:
+    """Метрики процесса и функции-сборщики значений чужих объектов (кэш, пулы, fanout)"""
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = {}
+
+    def counter(self, name, help, labelnames=()) -> Counter:
+        metric = Counter(name, help, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def register_collector(self, key: str, func: Callable[[], Iterable[tuple]]) -> None:
+        """func() -> [(имя, тип, описание, [(метки, значение), ...]), ...]; повторная регистрация заменяет"""
+        self.collectors[key] = func
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        for key, func in list(self.collectors.items()):
+            try:
+                families = list(func())
+            except Exception as e:
+                print(f"[metrics] Сборщик {key} упал: {e}")
+                continue
+            for name, kind, help, samples in families:
+                lines.append(f'# HELP {name} {help}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+registry = Registry()
+
+HTTP_LATENCY = registry.histogram('http_request_duration_seconds', 'Время обработки HTTP-запроса',
+                                  ('method', 'endpoint', 'status'))
+SOCKET_LATENCY = registry.histogram('socket_event_duration_seconds', 'Время обработки сокет-события',
+                                    ('event',))
+DB_QUERIES = registry.counter('db_queries_total', 'Выполнено SQL-запросов')
+DB_QUERY_SECONDS = registry.counter('db_query_duration_seconds_total', 'Суммарное время SQL-запросов')
+REQUEST_QUERIES = registry.histogram('db_queries_per_request', 'SQL-запросов на HTTP-запрос или сокет-событие',
+                                     ('kind', 'name'), QUERY_COUNT_BUCKETS)
+REQUEST_QUERY_SECONDS = registry.histogram('db_query_seconds_per_request',
+                                           'Время SQL-запросов на HTTP-запрос или сокет-событие',
+                                           ('kind', 'name'))
+
+# ---------------------------
+# SQL: число и время запросов
+# ---------------------------
+
+class RequestStats:
+    __slots__ = ('queries', 'query_seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+
+_current_stats = ContextVar('request_db_stats', default=None)
+_installed = False
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+def _finish_query(conn):
+    starts = conn.info.get('metrics_query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    DB_QUERIES.inc()
+    DB_QUERY_SECONDS.inc(amount=elapsed)
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.query_seconds += elapsed
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _finish_query(conn)
+
+def _handle_error(exception_context):
+    if exception_context.connection is not None:
+        _finish_query(exception_context.connection)
+
+def install() -> None:
+    """Подписаться на выполнение запросов всех движков (один раз на процесс)"""
+    global _installed
+    if not _installed:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+        _installed = True
+
+@contextmanager
+def measure(kind: str, name: str):
+    """Учесть SQL-запросы блока в гистограммах на запрос; возвращает RequestStats"""
+    install()
+    stats = RequestStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+        REQUEST_QUERIES.observe(stats.queries, kind, name)
+        REQUEST_QUERY_SECONDS.observe(stats.query_seconds, kind, name)
+
+@contextmanager
+def socket_event(name: str):
+    """Задержка и SQL-запросы обработчика сокет-события"""
+    started = time.perf_counter()
+    try:
+        with measure('socket', name):
+            yield
+    finally:
+        SOCKET_LATENCY.observe(time.perf_counter() - started, name)
+
+# ---------------------------
+# Сборщики: кэши, пулы соединений
+# ---------------------------
+
+_engines = {}
+
+def track_engine(name: str, engine) -> None:
+    """Показывать состояние пула соединений движка в /metrics"""
+    _engines[name] = engine
+
+def _pool_samples():
+    gauges = {'size': [], 'checked_out': [], 'checked_in': [], 'overflow': []}
+    for name, engine in list(_engines.items()):
+        pool = engine.pool
+        for key, method in (('size', 'size'), ('checked_out', 'checkedout'),
+                            ('checked_in', 'checkedin'), ('overflow', 'overflow')):
+            # У SQLite-пулов части методов нет, а у SingletonThreadPool
+            # size — это число (pool_size), а не метод
+            value = getattr(pool, method, None)
+            if callable(value):
+                gauges[key].append(({'engine': name}, value()))
+    return [(f'db_pool_{key}', 'gauge', f'Пул соединений: {key}', samples)
+            for key, samples in gauges.items() if samples]
+
+registry.register_collector('db_pool', _pool_samples)
+
+def _cache_family(caches: Dict[str, object]):
+    hits = [({'cache': name}, c.hits) for name, c in caches.items()]
+    misses = [({'cache': name}, c.misses) for name, c in caches.items()]
+    ratio = [({'cache': name}, c.hits / (c.hits + c.misses) if c.hits + c.misses else 0.0)
+             for name, c in caches.items()]
+    size = [({'cache': name}, len(c)) for name, c in caches.items()]
+    return [
+        ('cache_hits_total', 'counter', 'Попадания в кэш', hits),
+        ('cache_misses_total', 'counter', 'Промахи кэша', misses),
+        ('cache_hit_ratio', 'gauge', 'Доля попаданий с запуска процесса', ratio),
+        ('cache_entries', 'gauge', 'Записей в кэше', size),
+    ]
+
+def _default_collectors():
+    from cache import cache
+    from tokens import verified_tokens
+    from passwords import pool
+    from models import router
+
+    registry.register_collector('cache', lambda: _cache_family({'simple': cache, 'verified_tokens': verified_tokens}))
+    registry.register_collector('db_router', lambda: [
+        ('db_reads_total', 'counter', 'Чтения через ReadSessionLocal по цели',
+         [({'target': 'replica'}, router.replica_reads), ({'target': 'primary'}, router.primary_reads)]),
+    ])
+    registry.register_collector('password_hashing', lambda: [
+        ('password_hash_pending', 'gauge', 'Задачи хеширования в работе и в очереди', [({}, pool.pending)]),
+        ('password_hash_rejected_total', 'counter', 'Задачи хеширования, отклоненные из-за переполнения',
+         [({}, pool.rejected)]),
+    ])
+
+# ---------------------------
+# Выборочный профилировщик
+# ---------------------------
+
+def _os_module(name):
+    """Настоящий модуль threading/time, даже если eventlet подменил их"""
+    try:
+        from eventlet import patcher
+    except ImportError:
+        return __import__(name)
+    return patcher.original(name)
+
+class SamplingProfiler:
+    """Профилировщик одного потока: отдельный ОС-поток раз в interval снимает
+    его стек; результат — свернутые стеки («a;b;c N») для flamegraph/speedscope.
+
+    Под eventlet все гринлеты живут в одном ОС-потоке, поэтому в выборку
+    попадают и другие запросы, выполнявшиеся в это время.
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = _Tally()
+        self._stop = None
+        self._thread = None
+
+    def _sample(self):
+        sleep = _os_module('time').sleep
+        while not self._stop.is_set():
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.stacks[';'.join(reversed(stack))] += 1
+            sleep(self.interval)
+
+    def start(self) -> 'SamplingProfiler':
+        threading_ = _os_module('threading')
+        self._stop = threading_.Event()
+        self._thread = threading_.Thread(target=self._sample, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> 'SamplingProfiler':
+        self._stop.set()
+        self._thread.join()
+        return self
+
+    def collapsed(self) -> str:
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+def current_thread_id() -> int:
+    return _os_module('threading').get_ident()
+
+# ---------------------------
+# Flask
+# ---------------------------
+
+def _endpoint_label(request) -> str:
+    # Шаблон маршрута, а не путь: /api/messages/<int:chat_id>, без id в метках
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+def init_metrics(app, engines: Optional[Dict[str, object]] = None) -> None:
+    """/metrics в формате Prometheus и замеры каждого HTTP-запроса.
+
+    Заголовок X-Profile со значением PROFILING_TOKEN включает выборочный
+    профилировщик для одного запроса: свернутые стеки пишутся в
+    PROFILE_DIR/<id>.txt, id возвращается в заголовке X-Profile-Id.
+    """
+    from flask import g, request, Response
+    from config import Config
+
+    install()
+    _default_collectors()
+    for name, engine in (engines or {}).items():
+        track_engine(name, engine)
+
+    @app.before_request
+    def _start_metrics():
+        g._metrics_started = time.perf_counter()
+        g._metrics_stats = RequestStats()
+        g._metrics_token = _current_stats.set(g._metrics_stats)
+        if Config.PROFILING_TOKEN and request.headers.get('X-Profile') == Config.PROFILING_TOKEN:
+            g._profiler = SamplingProfiler(current_thread_id(), Config.PROFILING_INTERVAL).start()
+
+    @app.after_request
+    def _finish_profile(response):
+        g._metrics_status = response.status_code
+        profiler = g.pop('_profiler', None)
+        if profiler is not None:
+            profile_id = uuid.uuid4().hex[:12]
+            os.makedirs(Config.PROFILE_DIR, exist_ok=True)
+            with open(os.path.join(Config.PROFILE_DIR, f'{profile_id}.txt'), 'w', encoding='utf-8') as f:
+                f.write(profiler.stop().collapsed())
+            response.headers['X-Profile-Id'] = profile_id
+            print(f"[metrics] Профиль {request.method} {request.path}: {Config.PROFILE_DIR}/{profile_id}.txt")
+        return response
+
+    @app.teardown_request
+    def _record_metrics(exc=None):
+        started = g.pop('_metrics_started', None)
+        if started is None:
+            return
+        _current_stats.reset(g.pop('_metrics_token'))
+        profiler = g.pop('_profiler', None)
+        if profiler is not None:
+            profiler.stop()
+        stats = g.pop('_metrics_stats')
+        endpoint = _endpoint_label(request)
+        status = g.pop('_metrics_status', 500)
+        HTTP_LATENCY.observe(time.perf_counter() - started, request.method, endpoint, str(status))
+        REQUEST_QUERIES.observe(stats.queries, 'http', endpoint)
+        REQUEST_QUERY_SECONDS.observe(stats.query_seconds, 'http', endpoint)
+
+    @app.route('/metrics')
+    def metrics():
+        if Config.METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {Config.METRICS_TOKEN}':
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
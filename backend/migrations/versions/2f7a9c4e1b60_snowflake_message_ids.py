@@ -0,0 +1,74 @@
+"""Snowflake message ids
+
+Revision ID: 2f7a9c4e1b60
+Revises: 9d2b6e0c5f18
+Create Date: 2025-10-10 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2f7a9c4e1b60'
+down_revision = '9d2b6e0c5f18'
+branch_labels = None
+depends_on = None
+
+# (старый индекс, новый индекс, колонка контейнера)
+MESSAGE_INDEXES = [
+    ('ix_message_channel_timestamp', 'ix_message_channel_id', 'channel_id'),
+    ('ix_message_dm_channel_timestamp', 'ix_message_dm_channel_id', 'dm_channel_id'),
+    ('ix_message_chat_timestamp', 'ix_message_chat_id', 'chat_id'),
+]
+
+# Колонки, хранящие id сообщения: snowflake не помещается в INTEGER
+MESSAGE_ID_COLUMNS = [
+    ('message', 'id'),
+    ('file', 'message_id'),
+    ('poll', 'message_id'),
+    ('read_state', 'last_read_message_id'),
+    ('dm_inbox', 'last_message_id'),
+    ('message_archive', 'first_id'),
+    ('message_archive', 'last_id'),
+]
+
+
+def _columns(inspector, table):
+    if table not in inspector.get_table_names():
+        return None
+    return {c['name'] for c in inspector.get_columns(table)}
+
+
+def _swap_indexes(old_key, new_key, second):
+    inspector = sa.inspect(op.get_bind())
+    columns = _columns(inspector, 'message')
+    if columns is None:
+        return
+    existing = {i['name'] for i in inspector.get_indexes('message')}
+    for names in MESSAGE_INDEXES:
+        old, new, column = names[old_key], names[new_key], names[2]
+        if old in existing:
+            op.drop_index(old, table_name='message')
+        if new not in existing and {column, second} <= columns:
+            op.create_index(new, 'message', [column, second], unique=False)
+
+
+def upgrade():
+    bind = op.get_bind()
+    _swap_indexes(0, 1, 'id')
+    # SQLite хранит INTEGER как 64-битное целое, менять тип нужно только на PostgreSQL
+    if bind.dialect.name != 'postgresql':
+        return
+    inspector = sa.inspect(bind)
+    for table, column in MESSAGE_ID_COLUMNS:
+        if column in (_columns(inspector, table) or ()):
+            op.alter_column(table, column, type_=sa.BigInteger(), existing_type=sa.Integer())
+    if 'id' in (_columns(inspector, 'message') or ()):
+        # Id назначает приложение, последовательность больше не нужна
+        op.alter_column('message', 'id', server_default=None)
+
+
+def downgrade():
+    # Тип колонок не возвращается: snowflake-id уже не помещаются в INTEGER
+    _swap_indexes(1, 0, 'timestamp')
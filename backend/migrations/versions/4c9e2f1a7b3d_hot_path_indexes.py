@@ -0,0 +1,69 @@
+"""Hot path indexes
+
+Revision ID: 4c9e2f1a7b3d
+Revises: 68a47c737796
+Create Date: 2025-10-02 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c9e2f1a7b3d'
+down_revision = '68a47c737796'
+branch_labels = None
+depends_on = None
+
+
+# (имя индекса, таблица, колонки). Пары PollVote(poll_id, user_id),
+# DMChannel(user1_id, user2_id), ReadState(user_id, ...) уже покрыты
+# уникальными ограничениями uq_poll_vote_choice, uq_dm_channel_pair и
+# uq_read_state_*, отдельный индекс для них только замедлил бы запись.
+INDEXES = [
+    ('ix_message_channel_timestamp', 'message', ['channel_id', 'timestamp']),
+    ('ix_message_dm_channel_timestamp', 'message', ['dm_channel_id', 'timestamp']),
+    ('ix_message_chat_timestamp', 'message', ['chat_id', 'timestamp']),
+    ('ix_guild_owner_id', 'guild', ['owner_id']),
+    ('ix_channel_guild_position', 'channel', ['guild_id', 'position']),
+    ('ix_category_guild_position', 'category', ['guild_id', 'position']),
+    ('ix_role_guild_position', 'role', ['guild_id', 'position']),
+    ('ix_custom_emoji_guild_name', 'custom_emoji', ['guild_id', 'name']),
+    ('ix_sticker_guild_name', 'sticker', ['guild_id', 'name']),
+    # Архивирование: сообщения старше порога, кроме тех, на которые ссылаются опросы и файлы
+    ('ix_message_timestamp', 'message', ['timestamp']),
+    ('ix_poll_message_id', 'poll', ['message_id']),
+    ('ix_file_message_id', 'file', ['message_id']),
+]
+
+
+def _existing(inspector):
+    tables = set(inspector.get_table_names())
+    indexes = {
+        table: {ix['name'] for ix in inspector.get_indexes(table)}
+        for table in tables
+    }
+    return tables, indexes
+
+
+def upgrade():
+    # Таблицы гильдий/каналов создаются db.create_all(), а не предыдущими
+    # миграциями, поэтому индексы создаются только для существующих таблиц
+    # и колонок, повторный запуск безопасен.
+    inspector = sa.inspect(op.get_bind())
+    tables, indexes = _existing(inspector)
+    for name, table, columns in INDEXES:
+        if table not in tables or name in indexes[table]:
+            continue
+        table_columns = {col['name'] for col in inspector.get_columns(table)}
+        if not set(columns) <= table_columns:
+            continue
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    tables, indexes = _existing(inspector)
+    for name, table, _ in reversed(INDEXES):
+        if table in tables and name in indexes[table]:
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,43 @@
+"""Message archive
+
+Revision ID: 9d2b6e0c5f18
+Revises: 4c9e2f1a7b3d
+Create Date: 2025-10-03 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d2b6e0c5f18'
+down_revision = '4c9e2f1a7b3d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'message_archive' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table('message_archive',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('channel_id', sa.Integer(), nullable=True),
+    sa.Column('dm_channel_id', sa.Integer(), nullable=True),
+    sa.Column('period', sa.String(length=7), nullable=False),
+    sa.Column('first_id', sa.Integer(), nullable=False),
+    sa.Column('last_id', sa.Integer(), nullable=False),
+    sa.Column('first_at', sa.DateTime(), nullable=False),
+    sa.Column('last_at', sa.DateTime(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('payload', sa.LargeBinary(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_message_archive_channel', 'message_archive', ['channel_id', 'last_id'], unique=False)
+    op.create_index('ix_message_archive_dm_channel', 'message_archive', ['dm_channel_id', 'last_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_message_archive_dm_channel', table_name='message_archive')
+    op.drop_index('ix_message_archive_channel', table_name='message_archive')
+    op.drop_table('message_archive')
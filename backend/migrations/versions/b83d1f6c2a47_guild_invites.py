@@ -0,0 +1,41 @@
+"""Guild invites
+
+Revision ID: b83d1f6c2a47
+Revises: 2f7a9c4e1b60
+Create Date: 2025-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b83d1f6c2a47'
+down_revision = '2f7a9c4e1b60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'invite' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table('invite',
+    sa.Column('code', sa.String(length=16), nullable=False),
+    sa.Column('guild_id', sa.Integer(), nullable=False),
+    sa.Column('creator_id', sa.Integer(), nullable=True),
+    sa.Column('max_uses', sa.Integer(), nullable=True),
+    sa.Column('uses', sa.Integer(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['creator_id'], ['user.id'], ),
+    sa.ForeignKeyConstraint(['guild_id'], ['guild.id'], ),
+    sa.PrimaryKeyConstraint('code')
+    )
+    op.create_index(op.f('ix_invite_guild_id'), 'invite', ['guild_id'], unique=False)
+    op.create_index(op.f('ix_invite_expires_at'), 'invite', ['expires_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_invite_expires_at'), table_name='invite')
+    op.drop_index(op.f('ix_invite_guild_id'), table_name='invite')
+    op.drop_table('invite')
@@ -0,0 +1,37 @@
+"""Guild members
+
+Revision ID: d41c7b9e3a58
+Revises: b83d1f6c2a47
+Create Date: 2025-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41c7b9e3a58'
+down_revision = 'b83d1f6c2a47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'guild_member' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table('guild_member',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('guild_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('joined_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['guild_id'], ['guild.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('guild_id', 'user_id', name='uq_guild_member')
+    )
+    op.create_index(op.f('ix_guild_member_user_id'), 'guild_member', ['user_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_guild_member_user_id'), table_name='guild_member')
+    op.drop_table('guild_member')
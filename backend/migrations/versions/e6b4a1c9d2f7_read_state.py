@@ -0,0 +1,58 @@
+"""Read state
+
+Revision ID: e6b4a1c9d2f7
+Revises: d41c7b9e3a58
+Create Date: 2025-10-20 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6b4a1c9d2f7'
+down_revision = 'd41c7b9e3a58'
+branch_labels = None
+depends_on = None
+
+
+# Все читатели канала (DM) для bump_read_states/drop_read_states
+INDEXES = [
+    ('ix_read_state_channel_user', ['channel_id', 'user_id']),
+    ('ix_read_state_dm_user', ['dm_channel_id', 'user_id']),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'read_state' not in inspector.get_table_names():
+        op.create_table('read_state',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('channel_id', sa.Integer(), nullable=True),
+        sa.Column('dm_channel_id', sa.Integer(), nullable=True),
+        sa.Column('last_read_message_id', sa.BigInteger(), nullable=False),
+        sa.Column('unread_count', sa.Integer(), nullable=False),
+        sa.Column('mention_count', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['channel_id'], ['channel.id'], ),
+        sa.ForeignKeyConstraint(['dm_channel_id'], ['dm_channel.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'channel_id', name='uq_read_state_channel'),
+        sa.UniqueConstraint('user_id', 'dm_channel_id', name='uq_read_state_dm')
+        )
+        existing = set()
+    else:
+        existing = {ix['name'] for ix in inspector.get_indexes('read_state')}
+    for name, columns in INDEXES:
+        if name not in existing:
+            op.create_index(name, 'read_state', columns, unique=False)
+
+
+def downgrade():
+    # Таблица могла существовать до этой ревизии (db.create_all), удаляем только индексы
+    existing = {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes('read_state')}
+    for name, _ in reversed(INDEXES):
+        if name in existing:
+            op.drop_index(name, table_name='read_state')
@@ -0,0 +1,126 @@
+"""DM inbox and canonical DM pairs
+
+Revision ID: f2c8d5a1e9b3
+Revises: e6b4a1c9d2f7
+Create Date: 2025-10-21 12:00:00.000000
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c8d5a1e9b3'
+down_revision = 'e6b4a1c9d2f7'
+branch_labels = None
+depends_on = None
+
+DM_PREVIEW_LENGTH = 100
+
+dm_channel = sa.table('dm_channel', sa.column('id'), sa.column('user1_id'), sa.column('user2_id'),
+                      sa.column('created_at'))
+message = sa.table('message', sa.column('id'), sa.column('dm_channel_id'), sa.column('content'),
+                   sa.column('timestamp'))
+read_state = sa.table('read_state', sa.column('user_id'), sa.column('dm_channel_id'),
+                      sa.column('last_read_message_id'), sa.column('unread_count'), sa.column('mention_count'))
+dm_inbox = sa.table('dm_inbox', sa.column('user_id'), sa.column('dm_channel_id'), sa.column('other_user_id'),
+                    sa.column('last_message_id'), sa.column('last_message_preview'), sa.column('last_message_at'))
+
+
+def _canonicalize_pairs(bind, tables):
+    """Одна строка dm_channel на пару, user1_id < user2_id.
+
+    Дубликаты пары (a, b) и (b, a) сливаются в канал с меньшим id: сообщения
+    переносятся, их метки прочтения и строки списка DM удаляются.
+    """
+    kept = {}
+    for dm_id, user1_id, user2_id in bind.execute(
+            sa.select(dm_channel.c.id, dm_channel.c.user1_id, dm_channel.c.user2_id).order_by(dm_channel.c.id)):
+        pair = (min(user1_id, user2_id), max(user1_id, user2_id))
+        if pair not in kept:
+            kept[pair] = (dm_id, user1_id > user2_id)
+            continue
+        keep_id = kept[pair][0]
+        bind.execute(message.update().where(message.c.dm_channel_id == dm_id).values(dm_channel_id=keep_id))
+        for table, name in ((read_state, 'read_state'), (dm_inbox, 'dm_inbox')):
+            if name in tables:
+                bind.execute(table.delete().where(table.c.dm_channel_id == dm_id))
+        bind.execute(dm_channel.delete().where(dm_channel.c.id == dm_id))
+    for (low, high), (dm_id, swapped) in kept.items():
+        if swapped:
+            bind.execute(dm_channel.update().where(dm_channel.c.id == dm_id).values(user1_id=low, user2_id=high))
+    return kept
+
+
+def _backfill(bind, kept, has_read_state):
+    """Строки dm_inbox (и метки прочтения DM) для каналов, у которых их нет"""
+    inboxed = {tuple(row) for row in bind.execute(sa.select(dm_inbox.c.user_id, dm_inbox.c.dm_channel_id))}
+    read = set()
+    if has_read_state:
+        read = {tuple(row) for row in bind.execute(
+            sa.select(read_state.c.user_id, read_state.c.dm_channel_id).where(read_state.c.dm_channel_id.isnot(None)))}
+    for (low, high), (dm_id, _) in kept.items():
+        last = bind.execute(
+            sa.select(message.c.id, message.c.content, message.c.timestamp)
+            .where(message.c.dm_channel_id == dm_id).order_by(message.c.id.desc()).limit(1)
+        ).first()
+        created_at = bind.execute(sa.select(dm_channel.c.created_at).where(dm_channel.c.id == dm_id)).scalar()
+        for user_id, other_id in ((low, high), (high, low)):
+            if (user_id, dm_id) not in inboxed:
+                bind.execute(dm_inbox.insert().values(
+                    user_id=user_id, dm_channel_id=dm_id, other_user_id=other_id,
+                    last_message_id=last.id if last else None,
+                    last_message_preview=last.content[:DM_PREVIEW_LENGTH] if last else None,
+                    last_message_at=(last.timestamp if last else None) or created_at or datetime.utcnow(),
+                ))
+            if has_read_state and (user_id, dm_id) not in read:
+                bind.execute(read_state.insert().values(
+                    user_id=user_id, dm_channel_id=dm_id,
+                    last_read_message_id=0, unread_count=0, mention_count=0))
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    tables = set(inspector.get_table_names())
+    if 'dm_channel' not in tables:
+        # Таблицы DM создаст db.create_all() уже в нужной форме
+        return
+    kept = _canonicalize_pairs(bind, tables)
+    if 'uq_dm_channel_pair' not in {uq['name'] for uq in inspector.get_unique_constraints('dm_channel')}:
+        with op.batch_alter_table('dm_channel') as batch_op:
+            batch_op.create_unique_constraint('uq_dm_channel_pair', ['user1_id', 'user2_id'])
+
+    if 'dm_inbox' not in tables:
+        op.create_table('dm_inbox',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('dm_channel_id', sa.Integer(), nullable=False),
+        sa.Column('other_user_id', sa.Integer(), nullable=False),
+        sa.Column('last_message_id', sa.BigInteger(), nullable=True),
+        sa.Column('last_message_preview', sa.String(length=100), nullable=True),
+        sa.Column('last_message_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['dm_channel_id'], ['dm_channel.id'], ),
+        sa.ForeignKeyConstraint(['other_user_id'], ['user.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'dm_channel_id', name='uq_dm_inbox_channel')
+        )
+        op.create_index('ix_dm_inbox_user_recent', 'dm_inbox', ['user_id', 'last_message_at'], unique=False)
+        existing = set()
+    else:
+        existing = {ix['name'] for ix in inspector.get_indexes('dm_inbox')}
+    if 'ix_dm_inbox_dm_channel' not in existing:
+        op.create_index('ix_dm_inbox_dm_channel', 'dm_inbox', ['dm_channel_id'], unique=False)
+    _backfill(bind, kept, 'read_state' in tables)
+
+
+def downgrade():
+    # Таблица могла существовать до этой ревизии (db.create_all), пары остаются
+    # каноничными: удаляем только индекс
+    inspector = sa.inspect(op.get_bind())
+    if 'dm_inbox' in inspector.get_table_names() and \
+            'ix_dm_inbox_dm_channel' in {ix['name'] for ix in inspector.get_indexes('dm_inbox')}:
+        op.drop_index('ix_dm_inbox_dm_channel', table_name='dm_inbox')
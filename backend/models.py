@@ -1,8 +1,68 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
 from datetime import datetime
+from config import Config
+from sqlite_tuning import configure_sqlite, sqlite_pragmas
+from db_router import ReplicaRouter, track_writes, current_actor
+from snowflake import next_message_id
+import uuid
 
 db = SQLAlchemy()
 
+# Сессии вне контекста Flask (модули guilds/messages/users, фоновые задачи планировщика)
+def _primary_engine(url):
+    primary = create_engine(url)
+    if Config.SQLITE_TUNING:
+        configure_sqlite(primary, sqlite_pragmas(Config))
+    return primary
+
+engine = _primary_engine(Config.SQLALCHEMY_DATABASE_URI)
+SessionLocal = sessionmaker(bind=engine)
+
+def bind_database(url: str):
+    """Перенаправить SessionLocal на БД приложения.
+
+    create_app вызывает ее с SQLALCHEMY_DATABASE_URI приложения, чтобы
+    Flask-SQLAlchemy и SessionLocal всегда работали с одной БД.
+    """
+    global engine
+    bound = SessionLocal.kw.get("bind")
+    if bound is None or bound.url.render_as_string(hide_password=False) != url:
+        engine = _primary_engine(url)
+        SessionLocal.configure(bind=engine)
+    return SessionLocal.kw["bind"]
+
+# Реплики для чтения (DATABASE_REPLICA_URLS); без них все читает основная БД
+def _replica_engine(url):
+    replica = create_engine(url)
+    if Config.SQLITE_TUNING:
+        configure_sqlite(replica, sqlite_pragmas(Config), write_gate=False)
+    return replica
+
+router = ReplicaRouter([_replica_engine(url) for url in Config.SQLALCHEMY_REPLICA_URIS],
+                       sticky_seconds=Config.REPLICA_STICKY_SECONDS)
+track_writes(SessionLocal, router)
+
+def ReadSessionLocal():
+    """Сессия только для чтения: реплика или основная БД (после своей записи)"""
+    replica = router.reader_for(current_actor.get())
+    return SessionLocal(bind=replica) if replica is not None else SessionLocal()
+
+# Дружба (симметричная связь пользователей)
+friendship = db.Table(
+    "friendship",
+    db.Column("user_id", db.Integer, db.ForeignKey("user.id"), primary_key=True),
+    db.Column("friend_id", db.Integer, db.ForeignKey("user.id"), primary_key=True),
+)
+
+# Права ролей
+role_permission = db.Table(
+    "role_permission",
+    db.Column("role_id", db.Integer, db.ForeignKey("role.id"), primary_key=True),
+    db.Column("permission_id", db.Integer, db.ForeignKey("permission.id"), primary_key=True),
+)
+
 # Пользователь
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -11,6 +71,11 @@ class User(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     messages = db.relationship("Message", backref="user", lazy=True)
+    friends = db.relationship(
+        "User", secondary=friendship, lazy=True,
+        primaryjoin="User.id == friendship.c.user_id",
+        secondaryjoin="User.id == friendship.c.friend_id",
+    )
 
     def __repr__(self):
         return f"<User {self.username}>"
@@ -28,12 +93,320 @@ class Chat(db.Model):
 
 # Сообщение
 class Message(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
+    __table_args__ = (
+        # История канала/DM/чата: фильтр по контейнеру + порядок по id (id растут со временем)
+        db.Index("ix_message_channel_id", "channel_id", "id"),
+        db.Index("ix_message_dm_channel_id", "dm_channel_id", "id"),
+        db.Index("ix_message_chat_id", "chat_id", "id"),
+        # Архивирование выбирает сообщения старше порога (archive.py)
+        db.Index("ix_message_timestamp", "timestamp"),
+    )
+
+    # Snowflake-id выдается приложением до INSERT (snowflake.py)
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=False, default=next_message_id)
     content = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
+    pinned = db.Column(db.Boolean, default=False, nullable=False)
+
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
-    chat_id = db.Column(db.Integer, db.ForeignKey("chat.id"), nullable=False)
+    # Сообщение принадлежит ровно одному из: чату, каналу гильдии или DM
+    chat_id = db.Column(db.Integer, db.ForeignKey("chat.id"), nullable=True)
+    channel_id = db.Column(db.Integer, db.ForeignKey("channel.id"), nullable=True)
+    dm_channel_id = db.Column(db.Integer, db.ForeignKey("dm_channel.id"), nullable=True)
 
     def __repr__(self):
         return f"<Message {self.content[:20]}>"
+
+# Архивный сегмент истории: до ARCHIVE_SEGMENT_SIZE сообщений одного канала
+# или DM за один месяц в сжатом колоночном виде (zlib + MessagePack).
+# Только для чтения; пагинация истории читает его прозрачно (archive.py).
+class MessageArchive(db.Model):
+    __table_args__ = (
+        db.Index("ix_message_archive_channel", "channel_id", "last_id"),
+        db.Index("ix_message_archive_dm_channel", "dm_channel_id", "last_id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    channel_id = db.Column(db.Integer, db.ForeignKey("channel.id"), nullable=True)
+    dm_channel_id = db.Column(db.Integer, db.ForeignKey("dm_channel.id"), nullable=True)
+    period = db.Column(db.String(7), nullable=False)  # "ГГГГ-ММ"
+    first_id = db.Column(db.BigInteger, nullable=False)
+    last_id = db.Column(db.BigInteger, nullable=False)
+    first_at = db.Column(db.DateTime, nullable=False)
+    last_at = db.Column(db.DateTime, nullable=False)
+    count = db.Column(db.Integer, nullable=False)
+    payload = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<MessageArchive {self.channel_id or self.dm_channel_id}:{self.period} x{self.count}>"
+
+# Гильдия
+class Guild(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    owner_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    owner = db.relationship("User", backref="owned_guilds")
+    channels = db.relationship("Channel", backref="guild", lazy=True, cascade="all, delete-orphan")
+    categories = db.relationship("Category", backref="guild", lazy=True, cascade="all, delete-orphan")
+    roles = db.relationship("Role", backref="guild", lazy=True, cascade="all, delete-orphan")
+    invites = db.relationship("Invite", backref="guild", lazy=True, cascade="all, delete-orphan")
+    members = db.relationship("GuildMember", backref="guild", lazy=True, cascade="all, delete-orphan")
+
+    def __repr__(self):
+        return f"<Guild {self.name}>"
+
+# Участник гильдии (вход по приглашению). Владелец строкой не хранится — его
+# гильдии известны по Guild.owner_id
+class GuildMember(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint("guild_id", "user_id", name="uq_guild_member"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    guild_id = db.Column(db.Integer, db.ForeignKey("guild.id"), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False, index=True)
+    joined_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<GuildMember {self.guild_id}:{self.user_id}>"
+
+# Приглашение в гильдию: поиск по коду — первичному ключу. uses растет атомарным
+# UPDATE с условием на max_uses и expires_at; истекшие и исчерпанные строки
+# удаляет фоновая чистка (guilds.purge_invites)
+class Invite(db.Model):
+    code = db.Column(db.String(16), primary_key=True)
+    guild_id = db.Column(db.Integer, db.ForeignKey("guild.id"), nullable=False, index=True)
+    creator_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=True)
+    max_uses = db.Column(db.Integer, nullable=True)
+    uses = db.Column(db.Integer, default=0, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=True, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<Invite {self.code} guild={self.guild_id} {self.uses}/{self.max_uses}>"
+
+# Категория каналов
+class Category(db.Model):
+    __table_args__ = (
+        db.Index("ix_category_guild_position", "guild_id", "position"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    guild_id = db.Column(db.Integer, db.ForeignKey("guild.id"), nullable=False)
+    position = db.Column(db.Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f"<Category {self.name}>"
+
+# Канал гильдии
+class Channel(db.Model):
+    __table_args__ = (
+        db.Index("ix_channel_guild_position", "guild_id", "position"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    guild_id = db.Column(db.Integer, db.ForeignKey("guild.id"), nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey("category.id"), nullable=True)
+    type = db.Column(db.String(20), default="text", nullable=False)
+    position = db.Column(db.Integer, default=0, nullable=False)
+    read_only = db.Column(db.Boolean, default=False, nullable=False)
+
+    messages = db.relationship("Message", backref="channel", lazy=True)
+
+    def __repr__(self):
+        return f"<Channel {self.name}>"
+
+# Личный канал двух пользователей. Пара хранится упорядоченной
+# (user1_id < user2_id), поэтому поиск канала — одна проба уникального индекса.
+class DMChannel(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint("user1_id", "user2_id", name="uq_dm_channel_pair"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user1_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    user2_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    messages = db.relationship("Message", backref="dm_channel", lazy=True)
+
+    def __repr__(self):
+        return f"<DMChannel {self.user1_id}:{self.user2_id}>"
+
+# Строка списка DM пользователя: собеседник и последнее сообщение.
+# Обновляется при каждом сообщении в DM, список читается одним запросом по индексу.
+class DMInbox(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "dm_channel_id", name="uq_dm_inbox_channel"),
+        db.Index("ix_dm_inbox_user_recent", "user_id", "last_message_at"),
+        # Новое сообщение DM обновляет строки обоих собеседников по dm_channel_id
+        db.Index("ix_dm_inbox_dm_channel", "dm_channel_id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    dm_channel_id = db.Column(db.Integer, db.ForeignKey("dm_channel.id"), nullable=False)
+    other_user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    last_message_id = db.Column(db.BigInteger, nullable=True)
+    last_message_preview = db.Column(db.String(100), nullable=True)
+    # До первого сообщения — время создания канала, чтобы сортировка не зависела от NULL
+    last_message_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    other_user = db.relationship("User", foreign_keys=[other_user_id])
+
+    def __repr__(self):
+        return f"<DMInbox {self.user_id}:{self.dm_channel_id}>"
+
+# Роль в гильдии
+class Role(db.Model):
+    __table_args__ = (
+        db.Index("ix_role_guild_position", "guild_id", "position"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    guild_id = db.Column(db.Integer, db.ForeignKey("guild.id"), nullable=False)
+    color = db.Column(db.String(7), default="#99aab5")
+    position = db.Column(db.Integer, default=0, nullable=False)
+
+    permissions = db.relationship("Permission", secondary=role_permission, lazy=True)
+
+    def __repr__(self):
+        return f"<Role {self.name}>"
+
+# Право
+class Permission(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    description = db.Column(db.String(255))
+
+    def __repr__(self):
+        return f"<Permission {self.name}>"
+
+# Кастомный эмодзи гильдии
+class CustomEmoji(db.Model):
+    __table_args__ = (
+        db.Index("ix_custom_emoji_guild_name", "guild_id", "name"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(32), nullable=False)
+    guild_id = db.Column(db.Integer, db.ForeignKey("guild.id"), nullable=False)
+    file_path = db.Column(db.String(255), nullable=False)
+    created_by = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    animated = db.Column(db.Boolean, default=False, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<CustomEmoji {self.name}>"
+
+# Стикер гильдии
+class Sticker(db.Model):
+    __table_args__ = (
+        db.Index("ix_sticker_guild_name", "guild_id", "name"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(32), nullable=False)
+    guild_id = db.Column(db.Integer, db.ForeignKey("guild.id"), nullable=False)
+    file_path = db.Column(db.String(255), nullable=False)
+    description = db.Column(db.String(100))
+    created_by = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<Sticker {self.name}>"
+
+# Загруженный файл
+class File(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    filename = db.Column(db.String(255), nullable=False)
+    path = db.Column(db.String(500), nullable=False)
+    mimetype = db.Column(db.String(100))
+    size = db.Column(db.Integer)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"))
+    message_id = db.Column(db.BigInteger, db.ForeignKey("message.id"), nullable=True, index=True)
+    uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    user = db.relationship("User")
+
+    def __repr__(self):
+        return f"<File {self.filename}>"
+
+# Метка прочтения канала или DM пользователем с денормализованными счетчиками.
+# unread_count/mention_count поддерживаются инкрементально при создании и
+# удалении сообщений, поэтому бейджи читаются без подсчета сообщений.
+class ReadState(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "channel_id", name="uq_read_state_channel"),
+        db.UniqueConstraint("user_id", "dm_channel_id", name="uq_read_state_dm"),
+        # bump_read_states и drop_read_states обновляют всех читателей канала:
+        # уникальные ограничения начинаются с user_id и для этого не подходят
+        db.Index("ix_read_state_channel_user", "channel_id", "user_id"),
+        db.Index("ix_read_state_dm_user", "dm_channel_id", "user_id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    channel_id = db.Column(db.Integer, db.ForeignKey("channel.id"), nullable=True)
+    dm_channel_id = db.Column(db.Integer, db.ForeignKey("dm_channel.id"), nullable=True)
+    last_read_message_id = db.Column(db.BigInteger, default=0, nullable=False)
+    unread_count = db.Column(db.Integer, default=0, nullable=False)
+    mention_count = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<ReadState {self.user_id}:{self.channel_id or self.dm_channel_id} unread={self.unread_count}>"
+
+
+# Опрос (варианты хранятся в options как [{"id", "text"}], счетчики — в PollOption)
+class Poll(db.Model):
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    message_id = db.Column(db.BigInteger, db.ForeignKey("message.id"), nullable=False, index=True)
+    question = db.Column(db.String(300), nullable=False)
+    options = db.Column(db.JSON, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=True)
+    allow_multiple = db.Column(db.Boolean, default=False, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Заполняются планировщиком в момент expires_at: {"t": всего, "v": [голоса по порядку options]}
+    closed_at = db.Column(db.DateTime, nullable=True)
+    final_results = db.Column(db.JSON, nullable=True)
+
+    counters = db.relationship("PollOption", backref="poll", lazy=True, cascade="all, delete-orphan")
+    votes = db.relationship("PollVote", backref="poll", lazy=True, cascade="all, delete-orphan")
+
+    def __repr__(self):
+        return f"<Poll {self.question[:20]}>"
+
+# Счетчик голосов варианта опроса (одна строка на вариант, инкремент атомарным UPDATE)
+class PollOption(db.Model):
+    poll_id = db.Column(db.String(36), db.ForeignKey("poll.id"), primary_key=True)
+    option_id = db.Column(db.String(8), primary_key=True)
+    votes = db.Column(db.Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f"<PollOption {self.poll_id}:{self.option_id}={self.votes}>"
+
+# Голос в опросе
+class PollVote(db.Model):
+    __table_args__ = (
+        # choice_slot = "" для опросов с одним ответом и option_id для множественных,
+        # поэтому одна и та же уникальность запрещает и повторный голос, и дубль варианта
+        db.UniqueConstraint("poll_id", "user_id", "choice_slot", name="uq_poll_vote_choice"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    poll_id = db.Column(db.String(36), db.ForeignKey("poll.id"), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    option_id = db.Column(db.String(8), nullable=False)
+    choice_slot = db.Column(db.String(8), nullable=False, default="")
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<PollVote {self.poll_id}:{self.user_id}->{self.option_id}>"
@@ -1,31 +0,0 @@
-from datetime import datetime
-from argon2 import PasswordHasher
-from sqlalchemy.orm import validates
-from ..extensions import db
-
-ph = PasswordHasher()
-
-
-class User(db.Model):
-    __tablename__ = "users"
-
-    id = db.Column(db.Integer, primary_key=True)
-    email = db.Column(db.String(255), unique=True, nullable=False)
-    username = db.Column(db.String(50), unique=True, nullable=False)
-    password_hash = db.Column(db.String(255), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-
-    @validates("email")
-    def validate_email(self, key, email):
-        if "@" not in email:
-            raise ValueError("Invalid email")
-        return email
-
-    def set_password(self, password: str):
-        self.password_hash = ph.hash(password)
-
-    def check_password(self, password: str) -> bool:
-        try:
-            return ph.verify(self.password_hash, password)
-        except Exception:
-            return False
@@ -0,0 +1,157 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Tuple
+from config import Config
+
+# Единый алгоритм для новых хешей: argon2 | pbkdf2 | scrypt
+PASSWORD_HASH_ALGORITHM = Config.PASSWORD_HASH_ALGORITHM
+
+class HashingBusy(Exception):
+    """Очередь хеширования переполнена — клиенту стоит повторить позже"""
+
+def _eventlet_patched() -> bool:
+    try:
+        from eventlet import patcher
+    except ImportError:
+        return False
+    return patcher.is_monkey_patched('thread')
+
+class HashingPool:
+    """Ограниченный пул для CPU-тяжелого хеширования паролей.
+
+    Под eventlet задачи уходят в eventlet.tpool (настоящие ОС-потоки), чтобы
+    не блокировать цикл событий; без eventlet — в обычный ThreadPoolExecutor.
+    Если в работе и в очереди уже max_workers + max_queue задач, новая
+    отклоняется HashingBusy вместо бесконечного роста очереди.
+    """
+
+    def __init__(self, max_workers: int = 4, max_queue: int = 64):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._rejected = 0
+        self._executor = None
+        self._tpool = None
+
+    @property
+    def pending(self) -> int:
+        """Задачи в работе и в очереди"""
+        return self._pending
+
+    @property
+    def rejected(self) -> int:
+        """Сколько задач отклонено из-за переполнения"""
+        return self._rejected
+
+    def _acquire(self):
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                raise HashingBusy('Слишком много запросов на хеширование')
+            self._pending += 1
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+
+    def run(self, func: Callable, *args):
+        """Выполнить func(*args) в пуле и дождаться результата"""
+        self._acquire()
+        try:
+            if _eventlet_patched():
+                if self._tpool is None:
+                    from eventlet import tpool
+                    tpool.set_num_threads(self.max_workers)
+                    self._tpool = tpool
+                return self._tpool.execute(func, *args)
+            if self._executor is None:
+                with self._lock:
+                    if self._executor is None:
+                        self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='pwhash')
+            return self._executor.submit(func, *args).result()
+        finally:
+            self._release()
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+# Глобальный пул хеширования
+pool = HashingPool(Config.PASSWORD_HASH_WORKERS, Config.PASSWORD_HASH_QUEUE)
+
+_argon2_hasher = None
+
+def _argon2():
+    # argon2-cffi импортируется лениво, чтобы не тормозить старт процессов
+    global _argon2_hasher
+    if _argon2_hasher is None:
+        from argon2 import PasswordHasher
+        _argon2_hasher = PasswordHasher()
+    return _argon2_hasher
+
+def identify_hash(stored_hash: str) -> Optional[str]:
+    """Определить схему хеша: argon2, bcrypt (flask-bcrypt), pbkdf2/scrypt (werkzeug)"""
+    if not stored_hash:
+        return None
+    if stored_hash.startswith('$argon2'):
+        return 'argon2'
+    if stored_hash.startswith(('$2a$', '$2b$', '$2y$')):
+        return 'bcrypt'
+    if stored_hash.startswith('pbkdf2:'):
+        return 'pbkdf2'
+    if stored_hash.startswith('scrypt:'):
+        return 'scrypt'
+    return None
+
+def _hash_sync(password: str) -> str:
+    if PASSWORD_HASH_ALGORITHM == 'argon2':
+        return _argon2().hash(password)
+    from werkzeug.security import generate_password_hash
+    return generate_password_hash(password, method=PASSWORD_HASH_ALGORITHM)
+
+def _verify_sync(stored_hash: str, password: str) -> Tuple[bool, bool]:
+    """Проверить пароль. Возвращает (верный, нужен_перехеш)"""
+    scheme = identify_hash(stored_hash)
+    if scheme == 'argon2':
+        from argon2.exceptions import VerificationError, InvalidHashError
+        try:
+            _argon2().verify(stored_hash, password)
+        except (VerificationError, InvalidHashError):
+            return False, False
+        return True, PASSWORD_HASH_ALGORITHM != 'argon2' or _argon2().check_needs_rehash(stored_hash)
+    if scheme == 'bcrypt':
+        import bcrypt
+        try:
+            ok = bcrypt.checkpw(password.encode('utf-8'), stored_hash.encode('utf-8'))
+        except ValueError:
+            # Поврежденный хеш (неверная соль)
+            return False, False
+        return ok, ok
+    if scheme in ('pbkdf2', 'scrypt'):
+        from werkzeug.security import check_password_hash
+        ok = check_password_hash(stored_hash, password)
+        return ok, ok and scheme != PASSWORD_HASH_ALGORITHM
+    return False, False
+
+def _verify_and_rehash(stored_hash: str, password: str) -> Tuple[bool, Optional[str]]:
+    ok, needs_rehash = _verify_sync(stored_hash, password)
+    if ok and needs_rehash:
+        return True, _hash_sync(password)
+    return ok, None
+
+def hash_password(password: str) -> str:
+    """Захешировать пароль настроенным алгоритмом (в пуле, может бросить HashingBusy)"""
+    return pool.run(_hash_sync, password)
+
+def verify_password(stored_hash: str, password: str) -> Tuple[bool, Optional[str]]:
+    """Проверить пароль в пуле.
+
+    Возвращает (верный, новый_хеш). Новый хеш не None, если пароль верен, а
+    сохраненный хеш сделан устаревшим алгоритмом или параметрами — его нужно
+    записать пользователю вместо старого. Может бросить HashingBusy.
+    """
+    if not password:
+        return False, None
+    return pool.run(_verify_and_rehash, stored_hash, password)
@@ -0,0 +1,304 @@
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+ONLINE = 'online'
+IDLE = 'idle'
+OFFLINE = 'offline'
+
+PRESENCE_FLUSH_INTERVAL = 1.0
+
+def _iter_bits(value: int):
+    """Индексы установленных битов числа"""
+    while value:
+        low = value & -value
+        yield low.bit_length() - 1
+        value ^= low
+
+class GuildPresence:
+    """Присутствие участников гильдии как два битсета (online и idle).
+
+    Каждому участнику выдается номер бита; статус занимает 2 бита на
+    участника вместо словаря. Разница с последней рассылкой считается
+    XOR-ом битсетов, поэтому flush стоит O(участники / 64), а не O(n) событий.
+    """
+
+    __slots__ = ('index', 'members', 'free', 'online', 'idle', 'sent_online', 'sent_idle')
+
+    def __init__(self):
+        self.index = {}
+        self.members = []
+        self.free = []
+        self.online = 0
+        self.idle = 0
+        self.sent_online = 0
+        self.sent_idle = 0
+
+    def add(self, user_id: int) -> int:
+        bit = self.index.get(user_id)
+        if bit is not None:
+            return bit
+        if self.free:
+            bit = self.free.pop()
+            self.members[bit] = user_id
+        else:
+            bit = len(self.members)
+            self.members.append(user_id)
+        self.index[user_id] = bit
+        return bit
+
+    def remove(self, user_id: int) -> None:
+        bit = self.index.pop(user_id, None)
+        if bit is None:
+            return
+        mask = ~(1 << bit)
+        self.online &= mask
+        self.idle &= mask
+        # Снятый участник уже не получит diff, поэтому убираем его и из отправленного
+        self.sent_online &= mask
+        self.sent_idle &= mask
+        self.members[bit] = None
+        self.free.append(bit)
+
+    def set_status(self, user_id: int, status: str) -> None:
+        bit = self.index.get(user_id)
+        if bit is None:
+            return
+        mask = 1 << bit
+        self.online &= ~mask
+        self.idle &= ~mask
+        if status == ONLINE:
+            self.online |= mask
+        elif status == IDLE:
+            self.idle |= mask
+
+    def snapshot(self) -> dict:
+        return {
+            ONLINE: [self.members[i] for i in _iter_bits(self.online)],
+            IDLE: [self.members[i] for i in _iter_bits(self.idle)],
+        }
+
+    def diff(self) -> Optional[dict]:
+        """Изменения с прошлой рассылки (или None), отправленное состояние обновляется"""
+        changed = (self.online ^ self.sent_online) | (self.idle ^ self.sent_idle)
+        if not changed:
+            return None
+        result = {ONLINE: [], IDLE: [], OFFLINE: []}
+        for bit in _iter_bits(changed):
+            mask = 1 << bit
+            if self.online & mask:
+                result[ONLINE].append(self.members[bit])
+            elif self.idle & mask:
+                result[IDLE].append(self.members[bit])
+            else:
+                result[OFFLINE].append(self.members[bit])
+        self.sent_online = self.online
+        self.sent_idle = self.idle
+        return result
+
+class PresenceTracker:
+    """Присутствие по сокет-соединениям и индикаторы набора текста.
+
+    Изменения не рассылаются сразу: они копятся в битсетах гильдий и
+    множестве «грязных» гильдий/каналов, а flush() раз в
+    PRESENCE_FLUSH_INTERVAL отдает один пакет diff на гильдию. Так
+    несколько переходов одного пользователя схлопываются в итоговый статус,
+    а гильдия на 10k участников получает одно событие за интервал.
+    """
+
+    def __init__(self, idle_after: float = 60, offline_after: float = 180, typing_ttl: float = 8,
+                 clock: Callable[[], float] = time.time):
+        self.idle_after = idle_after
+        self.offline_after = offline_after
+        self.typing_ttl = typing_ttl
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._sid_user = {}
+        self._user_sids = {}
+        self._last_seen = {}
+        self._away = set()
+        self._status = {}
+        self._guilds = {}
+        self._user_guilds = {}
+        self._dirty_guilds = set()
+        self._typing = {}
+        self._typing_sent = {}
+
+    # Соединения и heartbeat
+
+    def connect(self, sid: str, user_id: int) -> None:
+        with self._lock:
+            self._sid_user[sid] = user_id
+            self._user_sids.setdefault(user_id, set()).add(sid)
+            self._last_seen[user_id] = self.clock()
+            self._away.discard(user_id)
+            self._set_status(user_id, ONLINE)
+
+    def disconnect(self, sid: str) -> Optional[int]:
+        with self._lock:
+            user_id = self._sid_user.pop(sid, None)
+            if user_id is None:
+                return None
+            sids = self._user_sids.get(user_id)
+            if sids is not None:
+                sids.discard(sid)
+                if not sids:
+                    # Последнее соединение пользователя закрыто
+                    del self._user_sids[user_id]
+                    self._last_seen.pop(user_id, None)
+                    self._away.discard(user_id)
+                    self._set_status(user_id, OFFLINE)
+                    self._clear_typing(user_id)
+            return user_id
+
+    def heartbeat(self, sid: str, away: bool = False) -> None:
+        """Отметка активности; away=True — клиент сообщает, что вкладка неактивна"""
+        with self._lock:
+            user_id = self._sid_user.get(sid)
+            if user_id is None:
+                return
+            self._last_seen[user_id] = self.clock()
+            if away:
+                self._away.add(user_id)
+            else:
+                self._away.discard(user_id)
+            self._set_status(user_id, IDLE if away else ONLINE)
+
+    def user_for_sid(self, sid: str) -> Optional[int]:
+        return self._sid_user.get(sid)
+
+    def status(self, user_id: int) -> str:
+        return self._status.get(user_id, OFFLINE)
+
+    def _set_status(self, user_id, status):
+        if self._status.get(user_id, OFFLINE) == status:
+            return
+        if status == OFFLINE:
+            self._status.pop(user_id, None)
+        else:
+            self._status[user_id] = status
+        for guild_id in self._user_guilds.get(user_id, ()):
+            self._guilds[guild_id].set_status(user_id, status)
+            self._dirty_guilds.add(guild_id)
+
+    def _sweep(self, now):
+        # Пользователи без heartbeat становятся idle, затем offline (зависшие соединения)
+        for user_id, last_seen in list(self._last_seen.items()):
+            silent = now - last_seen
+            if silent > self.offline_after:
+                self._set_status(user_id, OFFLINE)
+            elif silent > self.idle_after or user_id in self._away:
+                self._set_status(user_id, IDLE)
+
+    # Участники гильдий
+
+    def add_member(self, guild_id: int, user_id: int) -> None:
+        with self._lock:
+            guild = self._guilds.setdefault(guild_id, GuildPresence())
+            guild.add(user_id)
+            self._user_guilds.setdefault(user_id, set()).add(guild_id)
+            status = self._status.get(user_id, OFFLINE)
+            if status != OFFLINE:
+                guild.set_status(user_id, status)
+                self._dirty_guilds.add(guild_id)
+
+    def set_guild_members(self, guild_id: int, user_ids) -> None:
+        for user_id in user_ids:
+            self.add_member(guild_id, user_id)
+
+    def tracks_guild(self, guild_id: int) -> bool:
+        return guild_id in self._guilds
+
+    def remove_member(self, guild_id: int, user_id: int) -> None:
+        with self._lock:
+            guild = self._guilds.get(guild_id)
+            if guild is not None:
+                guild.remove(user_id)
+            guilds = self._user_guilds.get(user_id)
+            if guilds is not None:
+                guilds.discard(guild_id)
+                if not guilds:
+                    del self._user_guilds[user_id]
+
+    def snapshot(self, guild_id: int) -> dict:
+        """Текущее присутствие гильдии для первичной загрузки списка участников"""
+        with self._lock:
+            guild = self._guilds.get(guild_id)
+            result = guild.snapshot() if guild is not None else {ONLINE: [], IDLE: []}
+        result['guild_id'] = guild_id
+        return result
+
+    # Индикаторы набора текста
+
+    def start_typing(self, channel_id: int, user_id: int) -> None:
+        with self._lock:
+            self._typing.setdefault(channel_id, {})[user_id] = self.clock() + self.typing_ttl
+
+    def stop_typing(self, channel_id: int, user_id: int) -> None:
+        with self._lock:
+            self._typing.get(channel_id, {}).pop(user_id, None)
+
+    def _clear_typing(self, user_id):
+        for typers in self._typing.values():
+            typers.pop(user_id, None)
+
+    # Рассылка
+
+    def flush(self) -> List[Tuple[str, str, dict]]:
+        """Собрать накопленные изменения: список (комната, событие, данные)"""
+        events = []
+        with self._lock:
+            now = self.clock()
+            self._sweep(now)
+            for guild_id in self._dirty_guilds:
+                diff = self._guilds[guild_id].diff()
+                if diff is not None:
+                    diff['guild_id'] = guild_id
+                    events.append((f"guild:{guild_id}", 'presence_update', diff))
+            self._dirty_guilds.clear()
+
+            for channel_id in list(self._typing):
+                typers = self._typing[channel_id]
+                for user_id in [u for u, expires in typers.items() if expires <= now]:
+                    del typers[user_id]
+                current = frozenset(typers)
+                if current != self._typing_sent.get(channel_id, frozenset()):
+                    events.append((f"channel:{channel_id}", 'typing',
+                                   {'channel_id': channel_id, 'users': sorted(current)}))
+                    self._typing_sent[channel_id] = current
+                if not typers:
+                    del self._typing[channel_id]
+                    self._typing_sent.pop(channel_id, None)
+        return events
+
+# Глобальный трекер присутствия
+presence = PresenceTracker()
+
+def load_guild_presence(user_id: int, rooms) -> None:
+    """Участие пользователя в гильдиях его комнат (guild:<id>) — при подключении сокета"""
+    from models import SessionLocal
+
+    db = SessionLocal()
+    try:
+        guild_presence(db, user_id, rooms)
+    finally:
+        db.close()
+
+def guild_presence(db, user_id: int, rooms, tracker: Optional[PresenceTracker] = None) -> None:
+    """Гильдии, которых трекер еще не знает, загружаются целиком (владелец и
+    guild_member), в остальные добавляется только сам пользователь"""
+    from models import Guild, GuildMember
+
+    tracker = tracker or presence
+    guild_ids = [int(room.split(':', 1)[1]) for room in rooms if room.startswith('guild:')]
+    missing = [gid for gid in guild_ids if not tracker.tracks_guild(gid)]
+    if missing:
+        members = {gid: set() for gid in missing}
+        owners = db.query(Guild.id, Guild.owner_id).filter(Guild.id.in_(missing))
+        joined = db.query(GuildMember.guild_id, GuildMember.user_id).filter(GuildMember.guild_id.in_(missing))
+        for gid, member_id in owners.union_all(joined):
+            members[gid].add(member_id)
+        for gid, member_ids in members.items():
+            tracker.set_guild_members(gid, sorted(member_ids))
+    for gid in guild_ids:
+        tracker.add_member(gid, user_id)
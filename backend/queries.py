@@ -0,0 +1,141 @@
+import os
+import re
+import sys
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Сколько одинаковых запросов за запрос/задачу считается N+1
+N_PLUS_ONE_THRESHOLD = 5
+
+_current_log = ContextVar('query_log', default=None)
+_installed = False
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_BIND_RE = re.compile(r"%\(\w+\)s|%s|:\w+|\?|__\[POSTCOMPILE_\w+\]")
+_SPACE_RE = re.compile(r"\s+")
+
+def fingerprint(statement: str) -> str:
+    """Нормализованный текст запроса: литералы и параметры заменены на ?, списки IN схлопнуты"""
+    text = _STRING_RE.sub('?', statement)
+    text = _BIND_RE.sub('?', text)
+    text = _NUMBER_RE.sub('?', text)
+    text = _PLACEHOLDER_LIST_RE.sub('(...)', text)
+    return _SPACE_RE.sub(' ', text).strip()
+
+_SKIP_PATHS = (os.sep + 'sqlalchemy' + os.sep, os.sep + 'flask_sqlalchemy' + os.sep, __file__)
+_HELPER_CODES = set()
+
+def query_helper(func):
+    """Помощник, выполняющий запросы за другую функцию (общая часть sync/async):
+    в журналах запрос приписывается не ему, а вызвавшей его функции"""
+    _HELPER_CODES.add(func.__code__)
+    return func
+
+def _outer_frame(skip: int, skip_files: Tuple[str, ...] = ()):
+    frame = sys._getframe(skip + 1)
+    skipped = _SKIP_PATHS + skip_files
+    while frame is not None:
+        if frame.f_code not in _HELPER_CODES and not any(part in frame.f_code.co_filename for part in skipped):
+            return frame
+        frame = frame.f_back
+    return None
+
+def call_site(skip: int = 2) -> str:
+    """Ближайший кадр стека вне SQLAlchemy и этого модуля: «файл:строка в функции»"""
+    frame = _outer_frame(skip)
+    if frame is None:
+        return '?'
+    return f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno} in {frame.f_code.co_name}"
+
+def caller_name(skip: int = 2, skip_files: Tuple[str, ...] = ()) -> str:
+    """Функция приложения, выполнившая запрос: «messages.get_messages»"""
+    frame = _outer_frame(skip, skip_files)
+    if frame is None:
+        return '?'
+    module = frame.f_globals.get('__name__', '?').rsplit('.', 1)[-1]
+    return f"{module}.{frame.f_code.co_name}"
+
+class QueryLog:
+    """Запросы, выполненные внутри track_queries(): отпечаток и место вызова"""
+
+    __slots__ = ('entries',)
+
+    def __init__(self):
+        self.entries = []
+
+    def __len__(self):
+        return len(self.entries)
+
+    def record(self, statement: str) -> None:
+        self.entries.append((fingerprint(statement), call_site(3)))
+
+    def statements(self) -> List[str]:
+        return [fp for fp, _ in self.entries]
+
+    def repeated(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> List[Tuple[str, int, List[str]]]:
+        """Подозрения на N+1: (отпечаток, сколько раз, места вызова)"""
+        counts = Counter(fp for fp, _ in self.entries)
+        result = []
+        for fp, count in counts.items():
+            if count >= threshold and fp.upper().startswith('SELECT'):
+                sites = sorted({site for entry_fp, site in self.entries if entry_fp == fp})
+                result.append((fp, count, sites))
+        return result
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    log = _current_log.get()
+    if log is not None:
+        log.record(statement)
+
+def install() -> None:
+    """Подписаться на выполнение запросов всех движков (один раз на процесс)"""
+    global _installed
+    if not _installed:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        _installed = True
+
+@contextmanager
+def track_queries():
+    """Считать запросы в блоке: with track_queries() as log: ...; len(log)"""
+    install()
+    log = QueryLog()
+    token = _current_log.set(log)
+    try:
+        yield log
+    finally:
+        _current_log.reset(token)
+
+def report_n_plus_one(log: QueryLog, label: str, threshold: int = N_PLUS_ONE_THRESHOLD) -> list:
+    suspects = log.repeated(threshold)
+    for fp, count, sites in suspects:
+        print(f"[queries] Возможный N+1 в {label}: {count} раз «{fp[:160]}» из {', '.join(sites)}")
+    return suspects
+
+def init_query_tracking(app, threshold: Optional[int] = None) -> None:
+    """Детектор N+1 для Flask: в debug/testing (или при QUERY_TRACKING) запросы
+    каждого HTTP-запроса собираются и повторяющиеся SELECT логируются с местом вызова"""
+    install()
+    limit = threshold or app.config.get('N_PLUS_ONE_THRESHOLD', N_PLUS_ONE_THRESHOLD)
+
+    @app.before_request
+    def _start_query_log():
+        from flask import g
+        if app.debug or app.testing or app.config.get('QUERY_TRACKING'):
+            g._query_log = QueryLog()
+            g._query_log_token = _current_log.set(g._query_log)
+
+    @app.teardown_request
+    def _finish_query_log(exc=None):
+        from flask import g, request
+        log = g.pop('_query_log', None)
+        if log is None:
+            return
+        _current_log.reset(g.pop('_query_log_token'))
+        report_n_plus_one(log, request.endpoint or request.path, limit)
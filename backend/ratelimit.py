@@ -0,0 +1,213 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, NamedTuple, Optional
+
+SLIDING_WINDOW = 'sliding_window'
+TOKEN_BUCKET = 'token_bucket'
+
+class RateLimitResult(NamedTuple):
+    """Результат проверки лимита"""
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_after: float
+    retry_after: float
+
+    def headers(self) -> dict:
+        """Стандартные заголовки X-RateLimit-* (и Retry-After при отказе)"""
+        headers = {
+            'X-RateLimit-Limit': str(self.limit),
+            'X-RateLimit-Remaining': str(self.remaining),
+            'X-RateLimit-Reset': str(int(math.ceil(self.reset_after))),
+        }
+        if not self.allowed:
+            headers['Retry-After'] = str(max(1, int(math.ceil(self.retry_after))))
+        return headers
+
+# Общая математика алгоритмов (используется и памятью, и Redis)
+
+def _sliding_window_result(allowed, limit, window, prev, curr, elapsed):
+    """Скользящее окно как взвешенная сумма текущего и предыдущего фиксированных окон.
+
+    Оценка prev * (1 - elapsed / window) + curr не дает удвоенного всплеска на
+    границе окон, а хранит всего два счетчика на ключ.
+    """
+    weight = 1 - elapsed / window
+    estimated = prev * weight + curr
+    remaining = max(0, int(limit - math.ceil(estimated)))
+    reset_after = window - elapsed
+    retry_after = 0.0
+    if not allowed:
+        if curr <= limit - 1 and prev > 0:
+            retry_after = window * (1 - (limit - 1 - curr) / prev) - elapsed
+        else:
+            # Текущее окно уже заполнено: ждем следующее, где curr станет prev
+            retry_after = (window - elapsed) + window * (1 - (limit - 1) / curr)
+        retry_after = max(retry_after, 0.0)
+    return RateLimitResult(allowed, limit, remaining, reset_after, retry_after)
+
+def _token_bucket_result(allowed, limit, window, tokens):
+    """Token bucket: емкость limit, пополнение limit токенов за window секунд"""
+    rate = limit / window
+    retry_after = 0.0 if allowed else (1 - tokens) / rate
+    reset_after = (limit - tokens) / rate
+    return RateLimitResult(allowed, limit, int(tokens), reset_after, retry_after)
+
+class MemoryBackend:
+    """In-memory хранилище с ограниченным числом ключей.
+
+    Ключи лежат в OrderedDict в порядке последнего обращения: при переполнении
+    вытесняется самый давно неактивный, а purge_idle срезает простаивающие
+    ключи с начала словаря, не просматривая активные.
+    """
+
+    def __init__(self, max_keys: int = 10000, clock: Callable[[], float] = time.time):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._state = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._state)
+
+    def _touch(self, key, value, now):
+        self._state[key] = (now, value)
+        self._state.move_to_end(key)
+        while len(self._state) > self.max_keys:
+            self._state.popitem(last=False)
+
+    def sliding_window(self, key: str, limit: int, window: float) -> RateLimitResult:
+        with self._lock:
+            now = self.clock()
+            cur_start = math.floor(now / window) * window
+            _, (start, prev, curr) = self._state.get(key, (now, (cur_start, 0, 0)))
+            if start != cur_start:
+                prev = curr if start == cur_start - window else 0
+                curr = 0
+            elapsed = now - cur_start
+            allowed = prev * (1 - elapsed / window) + curr + 1 <= limit
+            if allowed:
+                curr += 1
+            self._touch(key, (cur_start, prev, curr), now)
+        return _sliding_window_result(allowed, limit, window, prev, curr, elapsed)
+
+    def token_bucket(self, key: str, limit: int, window: float) -> RateLimitResult:
+        with self._lock:
+            now = self.clock()
+            _, (tokens, last) = self._state.get(key, (now, (float(limit), now)))
+            tokens = min(float(limit), tokens + (now - last) * limit / window)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._touch(key, (tokens, now), now)
+        return _token_bucket_result(allowed, limit, window, tokens)
+
+    def purge_idle(self, max_idle: float = 300) -> int:
+        """Удалить ключи, к которым не обращались дольше max_idle секунд"""
+        removed = 0
+        with self._lock:
+            threshold = self.clock() - max_idle
+            while self._state:
+                key, (last_seen, _) = next(iter(self._state.items()))
+                if last_seen > threshold:
+                    break
+                del self._state[key]
+                removed += 1
+        return removed
+
+    def reset(self) -> None:
+        with self._lock:
+            self._state.clear()
+
+# Lua-скрипты выполняются в Redis атомарно, поэтому лимит общий для всех воркеров
+SLIDING_WINDOW_LUA = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cur_start = math.floor(now / window) * window
+local cur_key = KEYS[1] .. ':' .. cur_start
+local prev_key = KEYS[1] .. ':' .. (cur_start - window)
+local curr = tonumber(redis.call('GET', cur_key) or '0')
+local prev = tonumber(redis.call('GET', prev_key) or '0')
+local elapsed = now - cur_start
+local allowed = 0
+if prev * (1 - elapsed / window) + curr + 1 <= limit then
+    curr = redis.call('INCR', cur_key)
+    redis.call('PEXPIRE', cur_key, math.ceil(window * 2000))
+    allowed = 1
+end
+return {allowed, curr, prev, tostring(elapsed)}
+"""
+
+TOKEN_BUCKET_LUA = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or limit
+local ts = tonumber(state[2]) or now
+tokens = math.min(limit, tokens + (now - ts) * limit / window)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(window * 1000))
+return {allowed, tostring(tokens)}
+"""
+
+class RedisBackend:
+    """Общее для кластера хранилище в Redis (атомарные Lua-скрипты)"""
+
+    def __init__(self, client, prefix: str = 'rl:', clock: Callable[[], float] = time.time):
+        self.client = client
+        self.prefix = prefix
+        self.clock = clock
+        self._sliding = client.register_script(SLIDING_WINDOW_LUA)
+        self._bucket = client.register_script(TOKEN_BUCKET_LUA)
+
+    def sliding_window(self, key: str, limit: int, window: float) -> RateLimitResult:
+        allowed, curr, prev, elapsed = self._sliding(
+            keys=[self.prefix + key], args=[limit, window, self.clock()]
+        )
+        return _sliding_window_result(bool(allowed), limit, window, int(prev), int(curr), float(elapsed))
+
+    def token_bucket(self, key: str, limit: int, window: float) -> RateLimitResult:
+        allowed, tokens = self._bucket(keys=[self.prefix + key], args=[limit, window, self.clock()])
+        return _token_bucket_result(bool(allowed), limit, window, float(tokens))
+
+    def purge_idle(self, max_idle: float = 300) -> int:
+        # Redis сам удаляет ключи по PEXPIRE
+        return 0
+
+class RateLimiter:
+    """Фасад над алгоритмом и хранилищем"""
+
+    def __init__(self, backend=None, algorithm: str = SLIDING_WINDOW):
+        if algorithm not in (SLIDING_WINDOW, TOKEN_BUCKET):
+            raise ValueError(f'Неизвестный алгоритм: {algorithm}')
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.algorithm = algorithm
+
+    def hit(self, key: str, limit: int, window: float) -> RateLimitResult:
+        """Учесть запрос по ключу и вернуть решение.
+
+        При недоступности Redis запрос пропускается (fail-open), чтобы сбой
+        хранилища лимитов не ронял весь API.
+        """
+        try:
+            return getattr(self.backend, self.algorithm)(key, limit, window)
+        except Exception as e:
+            print(f"[ratelimit] Хранилище лимитов недоступно: {e}")
+            return RateLimitResult(True, limit, limit, window, 0.0)
+
+def create_limiter(storage_url: Optional[str] = None, algorithm: str = SLIDING_WINDOW,
+                   max_keys: int = 10000) -> RateLimiter:
+    """Создать лимитер: memory:// (по умолчанию) или redis://..."""
+    if storage_url and storage_url.startswith(('redis://', 'rediss://', 'unix://')):
+        import redis
+        return RateLimiter(RedisBackend(redis.Redis.from_url(storage_url)), algorithm)
+    return RateLimiter(MemoryBackend(max_keys=max_keys), algorithm)
@@ -3,29 +3,31 @@ from flask_jwt_extended import (
     create_access_token,
     create_refresh_token,
     jwt_required,
+    get_jwt,
     get_jwt_identity,
+    decode_token,
 )
-from ..extensions import db
-from ..models.user import User
+from models import db, User
+from passwords import hash_password, verify_password
+# Тот же список, что проверяет JWT-менеджер (tokens.jwt) и подключение сокетов
+from tokens import revocations
 
 bp = Blueprint("auth", __name__, url_prefix="/api/auth")
 
 
 @bp.post("/register")
 def register():
-    data = request.get_json()
-    email = data.get("email")
+    data = request.get_json(silent=True) or {}
     username = data.get("username")
     password = data.get("password")
 
-    if not email or not username or not password:
+    if not username or not password:
         return jsonify({"error": "Missing fields"}), 400
 
-    if User.query.filter((User.email == email) | (User.username == username)).first():
+    if User.query.filter_by(username=username).first():
         return jsonify({"error": "User already exists"}), 400
 
-    user = User(email=email, username=username)
-    user.set_password(password)
+    user = User(username=username, password=hash_password(password))
     db.session.add(user)
     db.session.commit()
 
@@ -34,16 +36,20 @@ def register():
 
 @bp.post("/login")
 def login():
-    data = request.get_json()
-    email = data.get("email")
-    password = data.get("password")
-
-    user = User.query.filter_by(email=email).first()
-    if not user or not user.check_password(password):
+    data = request.get_json(silent=True) or {}
+    user = User.query.filter_by(username=data.get("username")).first()
+    if not user:
+        return jsonify({"error": "Invalid credentials"}), 401
+    ok, new_hash = verify_password(user.password, data.get("password") or "")
+    if not ok:
         return jsonify({"error": "Invalid credentials"}), 401
+    if new_hash:
+        user.password = new_hash
+        db.session.commit()
 
-    access = create_access_token(identity=user.id)
-    refresh = create_refresh_token(identity=user.id)
+    # sub в JWT — строка; сокеты и обработчики приводят его к int
+    access = create_access_token(identity=str(user.id))
+    refresh = create_refresh_token(identity=str(user.id))
 
     return jsonify({"access": access, "refresh": refresh, "user": {"id": user.id, "username": user.username}})
 
@@ -59,4 +65,15 @@ def refresh():
 @bp.post("/logout")
 @jwt_required()
 def logout():
+    claims = get_jwt()
+    revocations.revoke(claims["jti"], claims["exp"])
+    # Refresh-токен из тела запроса отзываем вместе с access
+    refresh_token = (request.get_json(silent=True) or {}).get("refresh")
+    if refresh_token:
+        try:
+            refresh_claims = decode_token(refresh_token)
+        except Exception:
+            refresh_claims = None
+        if refresh_claims and refresh_claims.get("sub") == claims.get("sub"):
+            revocations.revoke(refresh_claims["jti"], refresh_claims["exp"])
     return jsonify({"message": "Logged out"})
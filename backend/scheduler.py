@@ -0,0 +1,140 @@
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable, Hashable, Optional
+
+class Scheduler:
+    """Легковесный in-process планировщик отложенных задач на куче.
+
+    Задачи хранятся в min-куче по времени срабатывания, поэтому один фоновый
+    поток спит ровно до ближайшей задачи, а не опрашивает все таймеры.
+    Отмена ленивая: запись помечается отмененной и выбрасывается при извлечении.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._jobs = {}
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+
+    def schedule_at(self, when: float, func: Callable, *args, key: Optional[Hashable] = None,
+                    interval: Optional[float] = None, **kwargs) -> Hashable:
+        """Запланировать вызов func(*args, **kwargs) на момент when (time.time())"""
+        with self._cond:
+            if key is None:
+                key = ('job', next(self._counter))
+            else:
+                self._cancel_locked(key)
+            entry = [when, next(self._counter), key, func, args, kwargs, interval, False]
+            self._jobs[key] = entry
+            heapq.heappush(self._heap, entry)
+            self._cond.notify()
+        return key
+
+    def schedule_in(self, delay: float, func: Callable, *args, key: Optional[Hashable] = None, **kwargs) -> Hashable:
+        """Запланировать вызов через delay секунд"""
+        return self.schedule_at(time.time() + max(delay, 0), func, *args, key=key, **kwargs)
+
+    def every(self, interval: float, func: Callable, *args, key: Optional[Hashable] = None, **kwargs) -> Hashable:
+        """Вызывать func каждые interval секунд"""
+        return self.schedule_at(time.time() + interval, func, *args, key=key, interval=interval, **kwargs)
+
+    def cancel(self, key: Hashable) -> bool:
+        """Отменить задачу по ключу"""
+        with self._cond:
+            return self._cancel_locked(key)
+
+    def _cancel_locked(self, key):
+        entry = self._jobs.pop(key, None)
+        if entry is None:
+            return False
+        entry[-1] = True
+        return True
+
+    def pending(self) -> int:
+        """Количество активных задач"""
+        with self._cond:
+            return len(self._jobs)
+
+    def next_run(self) -> Optional[float]:
+        """Время ближайшей задачи"""
+        with self._cond:
+            self._drop_cancelled()
+            return self._heap[0][0] if self._heap else None
+
+    def _drop_cancelled(self):
+        while self._heap and self._heap[0][-1]:
+            heapq.heappop(self._heap)
+
+    def _pop_due(self, now):
+        due = []
+        with self._cond:
+            self._drop_cancelled()
+            while self._heap and self._heap[0][0] <= now:
+                entry = heapq.heappop(self._heap)
+                if entry[-1]:
+                    continue
+                when, _, key, func, args, kwargs, interval, _ = entry
+                if interval:
+                    # Периодическая задача переставляется от планового времени, без дрейфа
+                    next_when = when + interval
+                    if next_when <= now:
+                        next_when = now + interval
+                    new_entry = [next_when, next(self._counter), key, func, args, kwargs, interval, False]
+                    self._jobs[key] = new_entry
+                    heapq.heappush(self._heap, new_entry)
+                else:
+                    del self._jobs[key]
+                due.append((func, args, kwargs))
+                self._drop_cancelled()
+        return due
+
+    def run_pending(self, now: Optional[float] = None) -> int:
+        """Выполнить все задачи, срок которых наступил. Возвращает их количество"""
+        if now is None:
+            now = time.time()
+        due = self._pop_due(now)
+        for func, args, kwargs in due:
+            try:
+                func(*args, **kwargs)
+            except Exception as e:
+                print(f"[scheduler] Ошибка в задаче {getattr(func, '__name__', func)}: {e}")
+        return len(due)
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                if not self._running:
+                    return
+                self._drop_cancelled()
+                timeout = None
+                if self._heap:
+                    timeout = self._heap[0][0] - time.time()
+                if timeout is None or timeout > 0:
+                    self._cond.wait(timeout)
+                    continue
+            self.run_pending()
+
+    def start(self) -> None:
+        """Запустить фоновый поток планировщика (повторный вызов безопасен)"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._loop, name='scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Остановить фоновый поток"""
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+# Глобальный экземпляр планировщика
+scheduler = Scheduler()
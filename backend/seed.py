@@ -1,32 +1,25 @@
-# minimal seed script to create demo users and a server with a channel
+# minimal seed script to create demo users and a guild with a channel
 from app import create_app
-from extensions import db
-from models.user import User
-from models.server import Server
-from models.channel import Channel
-from models.member import Member
+from models import db, User, Guild, Channel, GuildMember
+from passwords import hash_password
 
 app = create_app()
 
 with app.app_context():
     db.create_all()
     if not User.query.filter_by(username='alice').first():
-        u1 = User(email='alice@example.com', username='alice')
-        u1.set_password('password')
-        u2 = User(email='bob@example.com', username='bob')
-        u2.set_password('password')
+        u1 = User(username='alice', password=hash_password('password'))
+        u2 = User(username='bob', password=hash_password('password'))
         db.session.add_all([u1, u2])
         db.session.commit()
-        s = Server(name='Demo Server', owner_id=u1.id)
-        db.session.add(s)
+        g = Guild(name='Demo Server', owner_id=u1.id)
+        db.session.add(g)
         db.session.commit()
-        c = Channel(server_id=s.id, name='general')
+        c = Channel(guild_id=g.id, name='general')
         db.session.add(c)
+        # Владелец — участник по owner_id, в guild_member только остальные
+        db.session.add(GuildMember(guild_id=g.id, user_id=u2.id))
         db.session.commit()
-        m1 = Member(user_id=u1.id, server_id=s.id, role='owner')
-        m2 = Member(user_id=u2.id, server_id=s.id, role='member')
-        db.session.add_all([m1, m2])
-        db.session.commit()
-        print('Seeded demo users and server.')
+        print('Seeded demo users and guild.')
     else:
         print('Already seeded.')
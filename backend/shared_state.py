@@ -0,0 +1,164 @@
+import json
+import threading
+import uuid
+from typing import Callable, Dict, Optional, Set
+
+from config import Config
+
+# Общее состояние воркеров (supervisor.py): то, что раньше жило в глобальных
+# словарях модулей. memory:// — состояние процесса (один воркер), redis://... —
+# общее для всех воркеров хоста: наборы (SADD/SREM атомарны) и pub/sub для
+# рассылки событий сокетов по комнатам, клиенты которых подключены к другим воркерам.
+
+# Идентификатор процесса: свои же сообщения pub/sub пропускаются
+PROCESS_ID = uuid.uuid4().hex
+
+class MemorySetMap:
+    """Набор строк на ключ в памяти процесса"""
+
+    def __init__(self):
+        self._sets: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, key, member) -> None:
+        with self._lock:
+            self._sets.setdefault(str(key), set()).add(str(member))
+
+    def discard(self, key, member) -> bool:
+        """Удалить элемент; True — если он был (ровно у одного из конкурирующих вызовов)"""
+        with self._lock:
+            members = self._sets.get(str(key))
+            if members is None or str(member) not in members:
+                return False
+            members.discard(str(member))
+            if not members:
+                del self._sets[str(key)]
+            return True
+
+    def contains(self, key, member) -> bool:
+        return str(member) in self._sets.get(str(key), ())
+
+    def members(self, key) -> Set[str]:
+        with self._lock:
+            return set(self._sets.get(str(key), ()))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._sets.clear()
+
+class RedisSetMap:
+    """Набор строк на ключ в Redis: <prefix><name>:<key>"""
+
+    def __init__(self, client, prefix: str):
+        self._redis = client
+        self._prefix = prefix
+
+    def _key(self, key) -> str:
+        return f"{self._prefix}{key}"
+
+    def add(self, key, member) -> None:
+        self._redis.sadd(self._key(key), str(member))
+
+    def discard(self, key, member) -> bool:
+        return bool(self._redis.srem(self._key(key), str(member)))
+
+    def contains(self, key, member) -> bool:
+        return bool(self._redis.sismember(self._key(key), str(member)))
+
+    def members(self, key) -> Set[str]:
+        return {m.decode() if isinstance(m, bytes) else m for m in self._redis.smembers(self._key(key))}
+
+    def clear(self) -> None:
+        keys = list(self._redis.scan_iter(match=self._prefix + '*', count=1000))
+        if keys:
+            self._redis.delete(*keys)
+
+class MemoryState:
+    """Один процесс: наборы в памяти, рассылка между воркерами не нужна"""
+
+    url = 'memory://'
+
+    def __init__(self):
+        self._maps = {}
+
+    def set_map(self, name: str) -> MemorySetMap:
+        return self._maps.setdefault(name, MemorySetMap())
+
+    def publish(self, channel: str, data: dict) -> None:
+        pass
+
+    def subscribe(self, channel: str, handler: Callable[[dict], None]) -> None:
+        pass
+
+    def ping(self) -> bool:
+        return True
+
+class RedisState:
+    """Состояние в Redis, общее для всех воркеров хоста"""
+
+    def __init__(self, client, url: str, namespace: str = 'shared:'):
+        self._redis = client
+        self.url = url
+        self.namespace = namespace
+        self._handlers: Dict[str, list] = {}
+        self._listener = None
+        self._lock = threading.Lock()
+
+    def set_map(self, name: str) -> RedisSetMap:
+        return RedisSetMap(self._redis, f"{self.namespace}{name}:")
+
+    def publish(self, channel: str, data: dict) -> None:
+        message = json.dumps({'origin': PROCESS_ID, 'data': data}, ensure_ascii=False, separators=(',', ':'))
+        try:
+            self._redis.publish(self.namespace + channel, message)
+        except Exception as e:
+            print(f"[shared_state] Не удалось опубликовать в {channel}: {e}")
+
+    def subscribe(self, channel: str, handler: Callable[[dict], None]) -> None:
+        """handler(data) для сообщений других процессов; слушатель — один поток на процесс"""
+        with self._lock:
+            self._handlers.setdefault(self.namespace + channel, []).append(handler)
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='shared-state', daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        subscribed = set()
+        while True:
+            with self._lock:
+                pending = [c for c in self._handlers if c not in subscribed]
+            if pending:
+                pubsub.subscribe(*pending)
+                subscribed.update(pending)
+            message = pubsub.get_message(timeout=1.0)
+            if message is None:
+                continue
+            channel = message['channel'].decode() if isinstance(message['channel'], bytes) else message['channel']
+            try:
+                envelope = json.loads(message['data'])
+            except (TypeError, ValueError):
+                continue
+            if envelope.get('origin') == PROCESS_ID:
+                continue
+            for handler in self._handlers.get(channel, ()):
+                try:
+                    handler(envelope['data'])
+                except Exception as e:
+                    print(f"[shared_state] Ошибка обработчика {channel}: {e}")
+
+    def ping(self) -> bool:
+        try:
+            return bool(self._redis.ping())
+        except Exception:
+            return False
+
+def create_shared_state(url: Optional[str] = None):
+    """memory:// (по умолчанию) или redis://..."""
+    if url and url.startswith(('redis://', 'rediss://', 'unix://')):
+        import redis
+        return RedisState(redis.Redis.from_url(url), url)
+    return MemoryState()
+
+# Глобальное состояние процесса
+shared = create_shared_state(Config.SHARED_STATE_URL)
@@ -0,0 +1,221 @@
+import hashlib
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config import Config
+from queries import fingerprint, caller_name
+
+# Журнал медленных запросов: запрос дольше порога учитывается по отпечатку
+# (нормализованный SQL) вместе с формой параметров, вызывающей функцией
+# приложения и, вне продакшена, планом EXPLAIN. Агрегат по отпечаткам
+# показывает главных виновников за время жизни процесса.
+
+MAX_FINGERPRINTS = 500
+MAX_CALLERS = 10
+
+def _type_name(value) -> str:
+    if value is None:
+        return 'null'
+    if isinstance(value, (list, tuple, set, frozenset)):
+        inner = sorted({_type_name(v) for v in value}) or ['?']
+        return f"list[{'|'.join(inner)}]*{len(value)}"
+    return type(value).__name__
+
+def param_shape(parameters, executemany: bool = False) -> str:
+    """Форма параметров без значений: {name: int, ids: list[int]*5} или (int, str)"""
+    if executemany:
+        rows = list(parameters or ())
+        return f"[{len(rows)} x {param_shape(rows[0]) if rows else '?'}]"
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f"{k}: {_type_name(v)}" for k, v in parameters.items()) + '}'
+    if isinstance(parameters, (list, tuple)):
+        return '(' + ', '.join(_type_name(v) for v in parameters) + ')'
+    return '()'
+
+class SlowQuery:
+    """Агрегат медленных выполнений одного отпечатка"""
+
+    __slots__ = ('fingerprint', 'count', 'total_ms', 'max_ms', 'first_seen', 'last_seen',
+                 'callers', 'shapes', 'sample', 'plan')
+
+    def __init__(self, fp: str, statement: str):
+        self.fingerprint = fp
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.first_seen = self.last_seen = datetime.utcnow()
+        self.callers = Counter()
+        self.shapes = Counter()
+        self.sample = statement
+        self.plan = None
+
+    @property
+    def id(self) -> str:
+        return hashlib.sha1(self.fingerprint.encode('utf-8')).hexdigest()[:12]
+
+    def as_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'fingerprint': self.fingerprint,
+            'count': self.count,
+            'total_ms': round(self.total_ms, 1),
+            'avg_ms': round(self.total_ms / self.count, 1) if self.count else 0.0,
+            'max_ms': round(self.max_ms, 1),
+            'first_seen': self.first_seen.isoformat(),
+            'last_seen': self.last_seen.isoformat(),
+            'callers': self.callers.most_common(MAX_CALLERS),
+            'param_shapes': self.shapes.most_common(3),
+            'plan': self.plan,
+        }
+
+class SlowQueryLog:
+    """Медленные запросы всех движков процесса, сгруппированные по отпечатку"""
+
+    def __init__(self, threshold_ms: float = 200, explain: bool = False,
+                 max_fingerprints: int = MAX_FINGERPRINTS):
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self.max_fingerprints = max_fingerprints
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._installed = False
+
+    def install(self) -> None:
+        if not self._installed:
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+            self._installed = True
+
+    def uninstall(self) -> None:
+        if self._installed:
+            event.remove(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.remove(Engine, 'after_cursor_execute', self._after_cursor_execute)
+            self._installed = False
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('slow_query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('slow_query_start')
+        if not starts:
+            return
+        elapsed_ms = (time.perf_counter() - starts.pop()) * 1000
+        if elapsed_ms >= self.threshold_ms:
+            self.record(conn, statement, parameters, elapsed_ms, executemany)
+
+    def record(self, conn, statement: str, parameters, elapsed_ms: float, executemany: bool = False) -> SlowQuery:
+        fp = fingerprint(statement)
+        caller = caller_name(2, skip_files=(__file__,))
+        shape = param_shape(parameters, executemany)
+        with self._lock:
+            entry = self._entries.get(fp)
+            if entry is None:
+                if len(self._entries) >= self.max_fingerprints:
+                    self._evict()
+                entry = self._entries[fp] = SlowQuery(fp, statement)
+            entry.count += 1
+            entry.total_ms += elapsed_ms
+            entry.max_ms = max(entry.max_ms, elapsed_ms)
+            entry.last_seen = datetime.utcnow()
+            entry.callers[caller] += 1
+            entry.shapes[shape] += 1
+            need_plan = self.explain and entry.plan is None and not executemany
+        if need_plan and conn is not None:
+            entry.plan = explain_plan(conn, statement, parameters)
+        print(f"[slow_query] {elapsed_ms:.0f} мс в {caller}: {fp[:200]} {shape}")
+        return entry
+
+    def _evict(self):
+        # Вытесняем отпечаток с наименьшим суммарным временем
+        victim = min(self._entries.values(), key=lambda e: e.total_ms)
+        del self._entries[victim.fingerprint]
+
+    def top(self, limit: int = 20, by: str = 'total_ms') -> List[dict]:
+        with self._lock:
+            entries = sorted(self._entries.values(), key=lambda e: getattr(e, by), reverse=True)[:limit]
+            return [e.as_dict() for e in entries]
+
+    def by_caller(self) -> Counter:
+        """Число медленных запросов по вызывающей функции"""
+        totals = Counter()
+        with self._lock:
+            for entry in self._entries.values():
+                totals.update(entry.callers)
+        return totals
+
+    def reset(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def report(self, limit: int = 5) -> None:
+        for entry in self.top(limit):
+            callers = ', '.join(name for name, _ in entry['callers'][:3])
+            print(f"[slow_query] {entry['count']} раз, всего {entry['total_ms']:.0f} мс, "
+                  f"макс {entry['max_ms']:.0f} мс ({callers}): {entry['fingerprint'][:160]}")
+
+def explain_plan(conn, statement: str, parameters) -> Optional[List[str]]:
+    """План запроса на том же соединении в обход событий SQLAlchemy; только SELECT"""
+    if not statement.lstrip().upper().startswith('SELECT'):
+        return None
+    dialect = conn.dialect.name
+    if dialect == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    elif dialect in ('postgresql', 'mysql'):
+        prefix = 'EXPLAIN '
+    else:
+        return None
+    cursor = conn.connection.cursor()
+    try:
+        if dialect == 'postgresql':
+            # Ошибка внутри транзакции PostgreSQL прервала бы ее целиком
+            cursor.execute('SAVEPOINT slow_query_explain')
+        try:
+            cursor.execute(prefix + statement, parameters)
+            rows = cursor.fetchall()
+        except Exception as e:
+            if dialect == 'postgresql':
+                cursor.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+            return [f"EXPLAIN не выполнен: {e}"]
+        if dialect == 'postgresql':
+            cursor.execute('RELEASE SAVEPOINT slow_query_explain')
+        if dialect == 'sqlite':
+            return [str(row[-1]) for row in rows]  # (id, parent, notused, detail)
+        if dialect == 'postgresql':
+            return [str(row[0]) for row in rows]
+        return [' '.join(str(v) for v in row) for row in rows]
+    finally:
+        cursor.close()
+
+slow_queries = SlowQueryLog(Config.SLOW_QUERY_MS, Config.SLOW_QUERY_EXPLAIN)
+
+def init_slow_query_log(app=None) -> SlowQueryLog:
+    """Включить журнал (при SLOW_QUERY_MS > 0), периодический отчет и /metrics/slow-queries"""
+    if Config.SLOW_QUERY_MS <= 0:
+        return slow_queries
+    slow_queries.install()
+    from scheduler import scheduler
+    from metrics import registry
+    registry.register_collector('slow_queries', lambda: [
+        ('db_slow_queries_total', 'counter', f'Запросы дольше {Config.SLOW_QUERY_MS} мс по вызывающей функции',
+         [({'caller': caller}, count) for caller, count in slow_queries.by_caller().items()]),
+    ])
+    scheduler.every(Config.SLOW_QUERY_REPORT_INTERVAL, slow_queries.report, key='slow_query_report')
+    if app is not None:
+        from flask import jsonify, request
+
+        @app.route('/metrics/slow-queries')
+        def slow_query_report():
+            if Config.METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {Config.METRICS_TOKEN}':
+                return jsonify({'error': 'Unauthorized'}), 401
+            by = request.args.get('by', 'total_ms')
+            if by not in ('total_ms', 'max_ms', 'count'):
+                by = 'total_ms'
+            return jsonify({'threshold_ms': slow_queries.threshold_ms,
+                            'queries': slow_queries.top(request.args.get('limit', 20, type=int), by)})
+    return slow_queries
@@ -0,0 +1,75 @@
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, List
+
+# 64-битный id: 41 бит миллисекунд от SNOWFLAKE_EPOCH (~69 лет),
+# 10 бит номера воркера, 12 бит счетчика в пределах миллисекунды.
+# Id монотонно растут со временем, поэтому сортировка и курсоры
+# пагинации работают по первичному ключу без колонки timestamp.
+SNOWFLAKE_EPOCH_MS = 1735689600000  # 2025-01-01T00:00:00Z
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+TIMESTAMP_SHIFT = WORKER_BITS + SEQUENCE_BITS
+
+class SnowflakeGenerator:
+    """Генератор k-сортируемых id на стороне приложения.
+
+    Id известен до INSERT, поэтому пачку сообщений можно вставить одним
+    запросом. Если системные часы отступили назад, генератор продолжает от
+    последней выданной миллисекунды, а не выдает меньший id.
+    """
+
+    def __init__(self, worker_id: int = 0, clock: Callable[[], float] = time.time):
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f"worker_id должен быть в диапазоне 0..{MAX_WORKER_ID}")
+        self.worker_id = worker_id
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._sequence = 0
+
+    def _now_ms(self):
+        return int(self.clock() * 1000) - SNOWFLAKE_EPOCH_MS
+
+    def next_id(self) -> int:
+        with self._lock:
+            now = max(self._now_ms(), self._last_ms)
+            if now == self._last_ms:
+                self._sequence = (self._sequence + 1) & MAX_SEQUENCE
+                if self._sequence == 0:
+                    # 4096 id за миллисекунду исчерпаны — занимаем следующую
+                    now = self._last_ms + 1
+            else:
+                self._sequence = 0
+            self._last_ms = now
+            return (now << TIMESTAMP_SHIFT) | (self.worker_id << SEQUENCE_BITS) | self._sequence
+
+    def next_ids(self, count: int) -> List[int]:
+        return [self.next_id() for _ in range(count)]
+
+def snowflake_time(snowflake: int) -> datetime:
+    """Момент создания id (UTC, без tzinfo — как остальные DateTime в моделях)"""
+    ms = (snowflake >> TIMESTAMP_SHIFT) + SNOWFLAKE_EPOCH_MS
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).replace(tzinfo=None)
+
+def snowflake_for_time(moment: datetime) -> int:
+    """Наименьший id момента moment (UTC) — граница курсора «до/после времени»"""
+    ms = int(moment.replace(tzinfo=timezone.utc).timestamp() * 1000) - SNOWFLAKE_EPOCH_MS
+    return max(ms, 0) << TIMESTAMP_SHIFT
+
+def to_wire(snowflake) -> str:
+    """Id для JSON: строкой, иначе JavaScript теряет точность выше 2^53"""
+    return str(snowflake) if snowflake is not None else None
+
+def _default_generator():
+    from config import Config
+    return SnowflakeGenerator(Config.SNOWFLAKE_WORKER_ID)
+
+# Глобальный генератор id процесса
+snowflakes = _default_generator()
+
+def next_message_id() -> int:
+    return snowflakes.next_id()
@@ -0,0 +1,143 @@
+import threading
+from typing import Iterable, Optional
+
+from shared_state import shared
+
+class SocketSession:
+    """Данные, привязанные к сокету при подключении"""
+
+    __slots__ = ('sid', 'user_id', 'rooms', 'wire_format')
+
+    def __init__(self, sid: str, user_id: int, rooms: Iterable[str], wire_format: str = 'json'):
+        self.sid = sid
+        self.user_id = user_id
+        self.rooms = set(rooms)
+        self.wire_format = wire_format
+
+    def can_access(self, room: str) -> bool:
+        return room in self.rooms
+
+# Изменения прав сокетов для других воркеров (shared_state): у пользователя
+# могут быть сокеты на нескольких воркерах, каждый применяет изменение к своим
+ACCESS_CHANNEL = 'socket_access'
+
+class SocketSessionRegistry:
+    """Реестр аутентифицированных сокетов: sid -> SocketSession.
+
+    Пользователь и множество разрешенных комнат определяются один раз при
+    подключении, дальше обработчики событий проверяют доступ поиском в
+    множестве, без повторной аутентификации и запросов к БД. Когда права
+    меняются (создана гильдия, канал, DM), grant_room/revoke_room обновляют
+    уже открытые сокеты пользователя — на этом воркере и, через state
+    (shared_state), на остальных.
+    """
+
+    RELAYED = ('grant_room', 'revoke_room', 'grant_room_to_holders', 'revoke_rooms_from_holders')
+
+    def __init__(self, state=None):
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._user_sids = {}
+        self._state = state
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def bind(self, sid: str, user_id: int, rooms: Iterable[str], wire_format: str = 'json') -> SocketSession:
+        sess = SocketSession(sid, user_id, rooms, wire_format)
+        sess.rooms.add(f"user:{user_id}")
+        with self._lock:
+            self._sessions[sid] = sess
+            self._user_sids.setdefault(user_id, set()).add(sid)
+        return sess
+
+    def unbind(self, sid: str) -> Optional[SocketSession]:
+        with self._lock:
+            sess = self._sessions.pop(sid, None)
+            if sess is not None:
+                sids = self._user_sids.get(sess.user_id)
+                if sids is not None:
+                    sids.discard(sid)
+                    if not sids:
+                        del self._user_sids[sess.user_id]
+        return sess
+
+    def get(self, sid: str) -> Optional[SocketSession]:
+        return self._sessions.get(sid)
+
+    def sids_for_user(self, user_id: int) -> set:
+        with self._lock:
+            return set(self._user_sids.get(user_id, ()))
+
+    def _relay(self, op: str, *args) -> None:
+        if self._state is not None:
+            self._state.publish(ACCESS_CHANNEL, {'op': op, 'args': list(args)})
+
+    def apply_relayed(self, data: dict) -> None:
+        """Изменение прав, опубликованное другим воркером (обработчик ACCESS_CHANNEL)"""
+        if data.get('op') in self.RELAYED:
+            getattr(self, data['op'])(*data.get('args', ()), relay=False)
+
+    def grant_room(self, user_id: int, room: str, relay: bool = True) -> None:
+        """Разрешить комнату всем открытым сокетам пользователя"""
+        with self._lock:
+            for sid in self._user_sids.get(user_id, ()):
+                self._sessions[sid].rooms.add(room)
+        if relay:
+            self._relay('grant_room', user_id, room)
+
+    def revoke_room(self, user_id: int, room: str, relay: bool = True) -> None:
+        """Запретить комнату всем открытым сокетам пользователя"""
+        with self._lock:
+            for sid in self._user_sids.get(user_id, ()):
+                self._sessions[sid].rooms.discard(room)
+        if relay:
+            self._relay('revoke_room', user_id, room)
+
+    def grant_room_to_holders(self, held: str, room: str, relay: bool = True) -> None:
+        """Разрешить room всем сокетам, у которых есть held (новый канал — участникам гильдии)"""
+        with self._lock:
+            for sess in self._sessions.values():
+                if held in sess.rooms:
+                    sess.rooms.add(room)
+        if relay:
+            self._relay('grant_room_to_holders', held, room)
+
+    def revoke_rooms_from_holders(self, held: str, rooms: Iterable[str], relay: bool = True) -> None:
+        """Запретить rooms всем сокетам, у которых есть held (удалена гильдия)"""
+        rooms = set(rooms)
+        with self._lock:
+            for sess in self._sessions.values():
+                if held in sess.rooms:
+                    sess.rooms -= rooms
+        if relay:
+            self._relay('revoke_rooms_from_holders', held, sorted(rooms))
+
+def load_authorized_rooms(user_id: int) -> set:
+    """Комнаты, доступные пользователю: гильдии, которыми он владеет или в которых
+    состоит, их каналы и его DM"""
+    from models import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return authorized_rooms(db, user_id)
+    finally:
+        db.close()
+
+def authorized_rooms(db, user_id: int) -> set:
+    from models import Guild, GuildMember, Channel, DMInbox
+
+    owned = db.query(Guild.id).filter(Guild.owner_id == user_id)
+    joined = db.query(GuildMember.guild_id).filter(GuildMember.user_id == user_id)
+    guild_ids = [gid for (gid,) in owned.union(joined)]
+    channel_ids = []
+    if guild_ids:
+        channel_ids = [cid for (cid,) in db.query(Channel.id).filter(Channel.guild_id.in_(guild_ids))]
+    dm_ids = [dm_id for (dm_id,) in db.query(DMInbox.dm_channel_id).filter(DMInbox.user_id == user_id)]
+    rooms = {f"guild:{gid}" for gid in guild_ids}
+    rooms.update(f"channel:{cid}" for cid in channel_ids)
+    rooms.update(f"dm:{dm_id}" for dm_id in dm_ids)
+    return rooms
+
+# Глобальный реестр сокет-сессий; изменения прав расходятся по воркерам через shared
+socket_sessions = SocketSessionRegistry(shared)
@@ -1,21 +1,275 @@
-from flask_socketio import emit, join_room, leave_room
-from ..extensions import socketio
+from functools import wraps
+from flask import session, request
+from flask_jwt_extended import decode_token
+from flask_socketio import emit, join_room, leave_room, disconnect
+from extensions import socketio
+from models import SessionLocal
+from emojis_stickers_polls import vote_poll, get_poll_results, on_poll_closed, poll_room
+from presence import presence, load_guild_presence, PRESENCE_FLUSH_INTERVAL
+from scheduler import scheduler
+from socket_sessions import socket_sessions, load_authorized_rooms, ACCESS_CHANNEL
+from tokens import revocations
+from fanout import (FanoutManager, FANOUT_PUMP_INTERVAL, merge_presence_diffs, ROOM_CHANNEL,
+                    encode_room_event, decode_room_event)
+from messages import get_messages, history_rows, HISTORY_COLUMNS
+from wire import WirePayload, WIRE_FORMATS, JSON, pack_rows
+from db_router import acting_as
+from snowflake import next_message_id, to_wire
+from metrics import registry, socket_event
+from shared_state import shared
+
+NAMESPACE = "/chat"
+
+
+def _send(sid, event, payload):
+    sess = socket_sessions.get(sid)
+    wire_format = sess.wire_format if sess is not None else JSON
+    socketio.emit(event, payload.encode(wire_format), to=sid, namespace=NAMESPACE)
+
+
+def _transport_depth(sid):
+    # Глубина исходящей очереди Engine.IO конкретного клиента
+    server = socketio.server
+    eio_sid = server.manager.eio_sid_from_sid(sid, NAMESPACE)
+    eio_socket = server.eio.sockets.get(eio_sid) if eio_sid else None
+    return eio_socket.queue.qsize() if eio_socket is not None else 0
+
+
+def _disconnect_slow(sid):
+    socketio.server.disconnect(sid, namespace=NAMESPACE)
+
+
+fanout = FanoutManager(_send, _transport_depth, _disconnect_slow)
+scheduler.every(FANOUT_PUMP_INTERVAL, fanout.pump, key="fanout_pump")
+registry.register_collector("fanout", lambda: [
+    (f"fanout_{key}", "counter" if key in ("sent", "dropped", "coalesced", "slow_disconnects") else "gauge",
+     f"Очереди рассылки сокетам: {key}", [({}, value)])
+    for key, value in fanout.stats().items()
+])
+
+
+def publish_room(room, event, payload, merge=None, relay=True, **kwargs):
+    """Разослать событие участникам комнаты через очереди fanout.
+
+    Участники комнаты на других воркерах получают событие через общее
+    состояние (pub/sub), их воркеры рассылают его своим сокетам.
+    """
+    if relay:
+        shared.publish(ROOM_CHANNEL, encode_room_event(room, event, payload, merge, **kwargs))
+    sids = [sid for sid, _ in socketio.server.manager.get_participants(NAMESPACE, room)]
+    if merge is not None:
+        kwargs["merge"] = lambda old, new: WirePayload(merge(old.data, new.data))
+    fanout.publish_many(sids, event, WirePayload(payload), **kwargs)
+
+
+def relay_room_event(data):
+    room, event, payload, kwargs = decode_room_event(data)
+    publish_room(room, event, payload, relay=False, **kwargs)
+
+
+shared.subscribe(ROOM_CHANNEL, relay_room_event)
+# Права сокетов, измененные на других воркерах (реестр под блокировкой)
+shared.subscribe(ACCESS_CHANNEL, socket_sessions.apply_relayed)
+
+
+def emit_to_client(event, payload):
+    """Ответ текущему клиенту в выбранном им формате (JSON или MessagePack)"""
+    sess = socket_sessions.get(request.sid)
+    emit(event, WirePayload(payload).encode(sess.wire_format if sess is not None else JSON))
+
+
+def authenticate_socket(auth):
+    """Пользователь сокета: access JWT из auth.token или Flask-сессия"""
+    token = (auth or {}).get("token") if isinstance(auth, dict) else None
+    if token:
+        try:
+            claims = decode_token(token)
+        except Exception:
+            return None
+        if claims.get("type") != "access" or revocations.is_revoked(claims["jti"]):
+            return None
+        return int(claims["sub"])
+    return session.get("user_id")
+
+
+def authenticated(f):
+    """Передает обработчику SocketSession, привязанную при подключении"""
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        sess = socket_sessions.get(request.sid)
+        if sess is None:
+            disconnect()
+            return
+        with acting_as(sess.user_id), socket_event(f.__name__.replace("handle_", "", 1)):
+            return f(sess, *args, **kwargs)
+    return wrapper
 
 
 @socketio.on("connect", namespace="/chat")
-def handle_connect():
-    emit("system", {"message": "Connected to chat"})
+def handle_connect(auth=None):
+    user_id = authenticate_socket(auth)
+    if not user_id:
+        raise ConnectionRefusedError("unauthorized")
+    # Клиент может запросить бинарный формат: auth = {token, format: "msgpack"}
+    wire_format = (auth or {}).get("format", JSON) if isinstance(auth, dict) else JSON
+    if wire_format not in WIRE_FORMATS:
+        wire_format = JSON
+    rooms = load_authorized_rooms(user_id)
+    socket_sessions.bind(request.sid, user_id, rooms, wire_format)
+    join_room(f"user:{user_id}")
+    # Статус пользователя рассылается во все его гильдии, даже без presence_subscribe
+    load_guild_presence(user_id, rooms)
+    presence.connect(request.sid, user_id)
+    emit_to_client("system", {"message": "Connected to chat"})
+
+
+@socketio.on("disconnect", namespace="/chat")
+def handle_disconnect():
+    socket_sessions.unbind(request.sid)
+    presence.disconnect(request.sid)
+    fanout.forget(request.sid)
 
 
 @socketio.on("join", namespace="/chat")
-def handle_join(data):
+@authenticated
+def handle_join(sess, data):
     room = data.get("room")
+    if not sess.can_access(room):
+        emit_to_client("permission_error", {"room": room, "error": "Нет доступа к комнате"})
+        return
     join_room(room)
-    emit("system", {"message": f"Joined room {room}"}, to=room)
+    publish_room(room, "system", {"message": f"Joined room {room}"})
+
+
+@socketio.on("leave", namespace="/chat")
+@authenticated
+def handle_leave(sess, data):
+    leave_room(data.get("room"))
 
 
 @socketio.on("message", namespace="/chat")
-def handle_message(data):
+@authenticated
+def handle_message(sess, data):
     room = data.get("room")
+    if not sess.can_access(room):
+        emit_to_client("permission_error", {"room": room, "error": "Нет доступа к комнате"})
+        return
     msg = data.get("message")
-    emit("message", {"room": room, "message": msg}, to=room)
+    # Snowflake-id служит порядковым номером события: клиент сортирует и убирает дубли по нему
+    publish_room(room, "message", {"id": to_wire(next_message_id()), "room": room,
+                                   "user_id": sess.user_id, "message": msg})
+
+
+@socketio.on("history", namespace="/chat")
+@authenticated
+def handle_history(sess, data):
+    channel_id = data.get("channel_id")
+    if not sess.can_access(f"channel:{channel_id}"):
+        emit_to_client("permission_error", {"room": f"channel:{channel_id}", "error": "Нет доступа к комнате"})
+        return
+    limit = min(int(data.get("limit", 50)), 100)
+    before = int(data["before"]) if data.get("before") else None
+    msgs = get_messages(channel_id, limit=limit, offset=int(data.get("offset", 0)), before=before)
+    # Колоночная форма: имена полей передаются один раз на страницу истории
+    payload = pack_rows(history_rows(msgs), HISTORY_COLUMNS)
+    payload["channel_id"] = channel_id
+    emit_to_client("history", payload)
+
+
+# Присутствие и набор текста: изменения копятся и рассылаются пакетами раз в интервал
+
+@socketio.on("heartbeat", namespace="/chat")
+@authenticated
+def handle_heartbeat(sess, data=None):
+    presence.heartbeat(sess.sid, away=bool((data or {}).get("away")))
+
+
+@socketio.on("presence_subscribe", namespace="/chat")
+@authenticated
+def handle_presence_subscribe(sess, data):
+    guild_id = data.get("guild_id")
+    if not sess.can_access(f"guild:{guild_id}"):
+        return
+    presence.add_member(guild_id, sess.user_id)
+    join_room(f"guild:{guild_id}")
+    emit_to_client("presence_snapshot", presence.snapshot(guild_id))
+
+
+@socketio.on("typing", namespace="/chat")
+@authenticated
+def handle_typing(sess, data):
+    channel_id = data.get("channel_id")
+    if not sess.can_access(f"channel:{channel_id}"):
+        return
+    if data.get("stop"):
+        presence.stop_typing(channel_id, sess.user_id)
+    else:
+        presence.start_typing(channel_id, sess.user_id)
+
+
+def flush_presence():
+    # Присутствие и набор текста некритичны: при отставании клиента сливаются или отбрасываются
+    for room, event, payload in presence.flush():
+        if event == "presence_update":
+            publish_room(room, event, payload, critical=False,
+                         coalesce_key=(event, payload["guild_id"]), merge=merge_presence_diffs)
+        else:
+            publish_room(room, event, payload, critical=False, coalesce_key=(event, room))
+
+
+scheduler.every(PRESENCE_FLUSH_INTERVAL, flush_presence, key="presence_flush")
+
+
+# Опросы: клиент подписывается на комнату poll:<id> и получает живые результаты.
+# Доступ к опросу — доступ к каналу (или DM) его сообщения
+
+def _poll_access_error(sess, db, poll_id):
+    room = poll_room(db, poll_id)
+    if room is None:
+        emit_to_client("poll_error", {"poll_id": poll_id, "error": "Опрос не найден"})
+        return True
+    if not sess.can_access(room):
+        emit_to_client("permission_error", {"room": f"poll:{poll_id}", "error": "Нет доступа к комнате"})
+        return True
+    return False
+
+
+@socketio.on("poll_subscribe", namespace="/chat")
+@authenticated
+def handle_poll_subscribe(sess, data):
+    poll_id = data.get("poll_id")
+    db = SessionLocal()
+    try:
+        if _poll_access_error(sess, db, poll_id):
+            return
+        results = get_poll_results(db, poll_id)
+    finally:
+        db.close()
+    if results is None:
+        emit_to_client("poll_error", {"poll_id": poll_id, "error": "Опрос не найден"})
+        return
+    join_room(f"poll:{poll_id}")
+    emit_to_client("poll_results", results)
+
+
+@socketio.on("poll_vote", namespace="/chat")
+@authenticated
+def handle_poll_vote(sess, data):
+    poll_id = data.get("poll_id")
+    db = SessionLocal()
+    try:
+        if _poll_access_error(sess, db, poll_id):
+            return
+        results, error = vote_poll(db, poll_id, sess.user_id, str(data.get("option_id")))
+    finally:
+        db.close()
+    if error:
+        emit_to_client("poll_error", {"poll_id": poll_id, "error": error})
+        return
+    publish_room(f"poll:{poll_id}", "poll_results", results, critical=False,
+                 coalesce_key=("poll_results", poll_id))
+
+
+@on_poll_closed
+def broadcast_poll_closed(results):
+    publish_room(f"poll:{results['poll_id']}", "poll_closed", results)
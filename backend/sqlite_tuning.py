@@ -0,0 +1,141 @@
+import threading
+import weakref
+from contextlib import contextmanager, nullcontext
+from typing import Optional
+
+from sqlalchemy import event
+
+# Профиль SQLite для одноузловых установок. WAL: читатели не блокируются
+# писателем; synchronous=NORMAL в WAL теряет при сбое питания только последние
+# транзакции, но не портит БД; busy_timeout — ожидание блокировки вместо
+# мгновенного «database is locked».
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64000,  # в КБ (отрицательное значение), т.е. ~64MB на соединение
+    'temp_store': 'MEMORY',
+}
+
+# Интервал wal_checkpoint(TRUNCATE) + PRAGMA optimize, секунды
+SQLITE_MAINTENANCE_INTERVAL = 300
+
+_WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'CREATE', 'DROP', 'ALTER')
+
+# Очереди писателей по движкам
+_gates = weakref.WeakKeyDictionary()
+
+def sqlite_pragmas(config) -> dict:
+    """PRAGMA из настроек Config (SQLITE_*)"""
+    return {
+        'busy_timeout': config.SQLITE_BUSY_TIMEOUT_MS,
+        'mmap_size': config.SQLITE_MMAP_SIZE,
+        'cache_size': -config.SQLITE_CACHE_SIZE_KB,
+    }
+
+def is_sqlite(engine) -> bool:
+    return engine.dialect.name == 'sqlite'
+
+def _is_memory(engine) -> bool:
+    database = engine.url.database
+    return not database or database == ':memory:' or engine.url.query.get('mode') == 'memory'
+
+class WriteGate:
+    """Очередь писателей SQLite внутри процесса.
+
+    У SQLite один писатель на БД; конкурирующие писатели крутятся в
+    busy-handler и могут получить «database is locked». Здесь пишущие
+    транзакции ждут своей очереди на блокировке процесса: соединение берет
+    ее перед первым INSERT/UPDATE/DELETE (pysqlite начинает транзакцию именно
+    там) и отдает, когда возвращается в пул после COMMIT/ROLLBACK. Чтение
+    через WAL идет параллельно и блокировку не трогает.
+    """
+
+    def __init__(self, timeout: float = 5.0):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.timeouts = 0
+
+    def acquire(self, info: dict) -> None:
+        if info.get('write_gate'):
+            return
+        if self._lock.acquire(timeout=self.timeout):
+            info['write_gate'] = True
+            self.acquired += 1
+        else:
+            # Не держим запрос вечно: дальше решает busy_timeout самой SQLite
+            self.timeouts += 1
+
+    def release(self, info: dict) -> None:
+        if info.pop('write_gate', False):
+            self._lock.release()
+
+    @contextmanager
+    def exclusive(self):
+        """Занять очередь писателей вне соединения (для обслуживания БД)"""
+        acquired = self._lock.acquire(timeout=self.timeout)
+        try:
+            yield
+        finally:
+            if acquired:
+                self._lock.release()
+
+def configure_sqlite(engine, pragmas: Optional[dict] = None, write_gate: bool = True) -> Optional[WriteGate]:
+    """Применить профиль к движку SQLite: PRAGMA на каждое новое соединение и очередь писателей"""
+    if not is_sqlite(engine):
+        return None
+    settings = dict(SQLITE_PRAGMAS, **(pragmas or {}))
+    if _is_memory(engine):
+        # WAL и mmap не применимы к БД в памяти
+        settings.pop('journal_mode', None)
+        settings.pop('mmap_size', None)
+
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in settings.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+    if not write_gate:
+        return None
+    gate = WriteGate(timeout=settings.get('busy_timeout', 5000) / 1000)
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _queue_writer(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip()[:7].upper().startswith(_WRITE_STATEMENTS):
+            gate.acquire(conn.info)
+
+    @event.listens_for(engine.pool, 'checkin')
+    def _release_writer(dbapi_connection, connection_record):
+        gate.release(connection_record.info)
+
+    @event.listens_for(engine.pool, 'invalidate')
+    def _release_invalidated(dbapi_connection, connection_record, exception):
+        gate.release(connection_record.info)
+
+    _gates[engine] = gate
+    return gate
+
+def write_gate_for(engine) -> Optional[WriteGate]:
+    return _gates.get(engine)
+
+def sqlite_maintenance(engine) -> dict:
+    """Перенести WAL в основной файл и обрезать его, обновить статистику планировщика"""
+    gate = _gates.get(engine)
+    with (gate.exclusive() if gate is not None else nullcontext()):
+        with engine.connect() as conn:
+            busy, log_frames, checkpointed = conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)").one()
+            conn.exec_driver_sql("PRAGMA optimize")
+    return {'busy': busy, 'log_frames': log_frames, 'checkpointed': checkpointed}
+
+def schedule_sqlite_maintenance(engine, interval: float = SQLITE_MAINTENANCE_INTERVAL):
+    """Периодическое обслуживание через общий планировщик"""
+    from scheduler import scheduler
+    if not is_sqlite(engine) or _is_memory(engine):
+        return None
+    return scheduler.every(interval, sqlite_maintenance, engine, key=f"sqlite_maintenance:{engine.url.database}")
@@ -0,0 +1,294 @@
+"""
+Запуск N воркеров на одном Linux-хосте за общим портом.
+
+Супервизор слушает --port и проксирует TCP-соединения воркерам на
+127.0.0.1:<base-port + i>. Маршрут липкий: ключ — адрес клиента (первый из
+X-Forwarded-For, если супервизор за nginx), воркер выбирается rendezvous-
+хешированием среди здоровых. Все запросы Engine.IO одного клиента (polling и
+upgrade до WebSocket) попадают в один воркер; при выходе воркера из ротации
+переезжают только его клиенты.
+
+Каждый воркер получает WORKER_INDEX, свой SNOWFLAKE_WORKER_ID и
+SINGLETON_JOBS=1 только для воркера 0 (архив, чистка приглашений, обслуживание SQLite).
+Состояние, общее для воркеров (заявки в друзья, кэш с приглашениями, события
+комнат и права сокетов), — в SHARED_STATE_URL=redis://..., без него больше
+одного воркера не запускается; он же по умолчанию используется для лимитов
+запросов и отзыва JWT.
+
+Супервизор раз в --health-interval секунд опрашивает GET /health каждого
+воркера, после --max-failures неудач подряд выводит воркер из ротации и
+перезапускает упавшие процессы. Сводка — GET /health/workers на общем порту.
+
+Запуск (из backend/):
+    python supervisor.py --workers 4 --port 5000 [--host 0.0.0.0] [--base-port 5100] [--mode eventlet|asgi]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import List, Optional
+
+from config import Config
+
+HEAD_LIMIT = 64 * 1024
+WORKERS_PATH = b"/health/workers"
+
+class Worker:
+    def __init__(self, index: int, port: int):
+        self.index = index
+        self.port = port
+        self.process: Optional[subprocess.Popen] = None
+        self.started_at = 0.0
+        self.healthy = False
+        self.failures = 0
+        self.restarts = 0
+        self.connections = 0
+        self.last_health = None
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def as_dict(self) -> dict:
+        return {
+            "index": self.index,
+            "port": self.port,
+            "pid": self.process.pid if self.process else None,
+            "alive": self.alive,
+            "healthy": self.healthy,
+            "failures": self.failures,
+            "restarts": self.restarts,
+            "connections": self.connections,
+            "health": self.last_health,
+        }
+
+def rendezvous(key: str, workers: List[Worker]) -> Optional[Worker]:
+    """Воркер с наибольшим hash(key, index): ключ остается на своем воркере, пока тот в ротации"""
+    best, best_score = None, -1
+    for worker in workers:
+        score = int.from_bytes(hashlib.blake2b(f"{key}:{worker.index}".encode(), digest_size=8).digest(), 'big')
+        if score > best_score:
+            best, best_score = worker, score
+    return best
+
+def client_key(head: bytes, peer) -> str:
+    for line in head.split(b"\r\n")[1:]:
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"x-forwarded-for" and value.strip():
+            return value.split(b",")[0].strip().decode("latin-1")
+    return peer[0] if peer else "?"
+
+class Supervisor:
+    def __init__(self, workers: int, host: str, port: int, base_port: int, mode: str = "eventlet",
+                 health_interval: float = 2.0, max_failures: int = 3):
+        self.host = host
+        self.port = port
+        self.mode = mode
+        self.health_interval = health_interval
+        self.max_failures = max_failures
+        self.workers = [Worker(i, base_port + i) for i in range(workers)]
+        self._stopping = False
+
+    def worker_env(self, worker: Worker) -> dict:
+        env = dict(os.environ)
+        env.update({
+            "WORKER_INDEX": str(worker.index),
+            "WORKER_PORT": str(worker.port),
+            "SNOWFLAKE_WORKER_ID": str((int(os.getenv("SNOWFLAKE_WORKER_ID", 0)) + worker.index) % 1024),
+            "SINGLETON_JOBS": "1" if worker.index == 0 else "0",
+            "SOCKETIO": "1",
+        })
+        shared_url = Config.SHARED_STATE_URL
+        if shared_url.startswith(("redis://", "rediss://", "unix://")):
+            env.setdefault("RATE_LIMIT_STORAGE_URL", shared_url)
+            env.setdefault("JWT_REVOCATION_REDIS_URL", shared_url)
+        return env
+
+    def worker_command(self, worker: Worker) -> List[str]:
+        if self.mode == "asgi":
+            return [sys.executable, "-m", "uvicorn", "asgi:create_asgi_app", "--factory",
+                    "--host", "127.0.0.1", "--port", str(worker.port), "--log-level", "warning"]
+        return [sys.executable, os.path.abspath(__file__), "worker"]
+
+    def spawn(self, worker: Worker) -> None:
+        worker.process = subprocess.Popen(self.worker_command(worker), env=self.worker_env(worker),
+                                          cwd=os.path.dirname(os.path.abspath(__file__)))
+        worker.started_at = time.time()
+        worker.healthy = False
+        worker.failures = 0
+        print(f"[supervisor] Воркер {worker.index} запущен: pid {worker.process.pid}, порт {worker.port}")
+
+    def pick(self, key: str) -> Optional[Worker]:
+        healthy = [w for w in self.workers if w.healthy and w.alive]
+        return rendezvous(key, healthy or [w for w in self.workers if w.alive])
+
+    # ---------------------------
+    # Прокси
+    # ---------------------------
+
+    async def handle_client(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            writer.close()
+            return
+        request_line = head.split(b"\r\n", 1)[0].split(b" ")
+        if len(request_line) > 1 and request_line[1] == WORKERS_PATH:
+            await self.respond_status(writer)
+            return
+        worker = self.pick(client_key(head, peer))
+        if worker is None:
+            writer.write(b"HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            await writer.drain()
+            writer.close()
+            return
+        try:
+            upstream_reader, upstream_writer = await asyncio.open_connection("127.0.0.1", worker.port)
+        except OSError:
+            worker.healthy = False
+            writer.write(b"HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            await writer.drain()
+            writer.close()
+            return
+        worker.connections += 1
+        upstream_writer.write(head)
+        try:
+            await asyncio.gather(self.pipe(reader, upstream_writer), self.pipe(upstream_reader, writer))
+        finally:
+            worker.connections -= 1
+
+    @staticmethod
+    async def pipe(reader, writer):
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def respond_status(self, writer):
+        body = json.dumps({"workers": [w.as_dict() for w in self.workers],
+                           "healthy": sum(1 for w in self.workers if w.healthy)}, ensure_ascii=False).encode()
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nConnection: close\r\n"
+                     + f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+        await writer.drain()
+        writer.close()
+
+    # ---------------------------
+    # Здоровье и перезапуск
+    # ---------------------------
+
+    async def probe(self, worker: Worker) -> Optional[dict]:
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection("127.0.0.1", worker.port), 2.0)
+            writer.write(b"GET /health HTTP/1.0\r\nHost: 127.0.0.1\r\n\r\n")
+            await writer.drain()
+            response = await asyncio.wait_for(reader.read(), 2.0)
+            writer.close()
+        except (OSError, asyncio.TimeoutError):
+            return None
+        status_line, _, rest = response.partition(b"\r\n")
+        _, _, body = rest.partition(b"\r\n\r\n")
+        try:
+            health = json.loads(body)
+        except ValueError:
+            health = None
+        return health if b" 200 " in status_line + b" " else dict(health or {}, status="error")
+
+    async def monitor(self):
+        while not self._stopping:
+            for worker in self.workers:
+                if not worker.alive:
+                    worker.healthy = False
+                    # Падающий при старте воркер перезапускается не чаще раза в 1, 2, 4 ... 30 с
+                    if time.time() - worker.started_at < min(30, 2 ** worker.restarts):
+                        continue
+                    print(f"[supervisor] Воркер {worker.index} завершился с кодом {worker.process.returncode}, перезапуск")
+                    worker.restarts += 1
+                    self.spawn(worker)
+                    continue
+                health = await self.probe(worker)
+                worker.last_health = health
+                if health is not None and health.get("status") == "ok":
+                    if not worker.healthy:
+                        print(f"[supervisor] Воркер {worker.index} в ротации")
+                    worker.healthy, worker.failures = True, 0
+                else:
+                    worker.failures += 1
+                    if worker.healthy and worker.failures >= self.max_failures:
+                        worker.healthy = False
+                        print(f"[supervisor] Воркер {worker.index} выведен из ротации: {health}")
+            await asyncio.sleep(self.health_interval)
+
+    def stop(self):
+        self._stopping = True
+        for worker in self.workers:
+            if worker.alive:
+                worker.process.terminate()
+        for worker in self.workers:
+            if worker.process is not None:
+                try:
+                    worker.process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    worker.process.kill()
+
+    async def serve(self):
+        if len(self.workers) > 1 and not Config.SHARED_STATE_URL.startswith(("redis://", "rediss://", "unix://")):
+            # memory:// не рассылает события комнат и изменения прав сокетов между процессами
+            raise SystemExit("[supervisor] Несколько воркеров требуют SHARED_STATE_URL=redis://...")
+        for worker in self.workers:
+            self.spawn(worker)
+        server = await asyncio.start_server(self.handle_client, self.host, self.port, limit=HEAD_LIMIT)
+        loop = asyncio.get_running_loop()
+        stopped = asyncio.Event()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stopped.set)
+        print(f"[supervisor] {len(self.workers)} воркеров ({self.mode}) за {self.host}:{self.port}")
+        monitor = asyncio.create_task(self.monitor())
+        async with server:
+            await stopped.wait()
+        monitor.cancel()
+        self.stop()
+
+def run_worker():
+    """Воркер eventlet: Flask + Socket.IO на 127.0.0.1:WORKER_PORT"""
+    import eventlet
+    eventlet.monkey_patch()
+    from app import create_app
+    from scheduler import scheduler
+
+    app = create_app()
+    scheduler.start()
+    app.extensions["socketio"].run(app, host="127.0.0.1", port=int(os.environ["WORKER_PORT"]), log_output=False)
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "worker":
+        run_worker()
+        return
+    parser = argparse.ArgumentParser(description="Несколько воркеров за общим портом с липкими сессиями")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--base-port", type=int, default=5100)
+    parser.add_argument("--mode", choices=("eventlet", "asgi"), default="eventlet")
+    parser.add_argument("--health-interval", type=float, default=2.0)
+    parser.add_argument("--max-failures", type=int, default=3)
+    args = parser.parse_args()
+    supervisor = Supervisor(args.workers, args.host, args.port, args.base_port, args.mode,
+                            args.health_interval, args.max_failures)
+    asyncio.run(supervisor.serve())
+
+if __name__ == "__main__":
+    main()
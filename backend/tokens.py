@@ -0,0 +1,169 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+from flask_jwt_extended import JWTManager
+
+REVOKED_KEY_PREFIX = 'jwt:revoked:'
+REVOKED_CHANNEL = 'jwt:revoked'
+
+class RevocationList:
+    """Список отозванных JTI в памяти процесса.
+
+    Проверка на каждом запросе и событии сокета — O(1) поиск в словаре без
+    обращения к БД. JTI хранится только до истечения exp самого токена, после
+    чего токен и так невалиден, поэтому список не растет бесконечно.
+    При подключенном Redis отзыв пишется туда (ключ с TTL + pub/sub), а каждый
+    процесс загружает существующие отзывы при старте и слушает канал.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self.clock = clock
+        self._revoked = {}
+        self._lock = threading.Lock()
+        self._redis = None
+        self._listener = None
+
+    def __len__(self):
+        return len(self._revoked)
+
+    def _add_local(self, jti: str, exp: float) -> None:
+        with self._lock:
+            self._revoked[jti] = exp
+
+    def revoke(self, jti: str, exp: float) -> None:
+        """Отозвать токен до момента exp (unix time)"""
+        self._add_local(jti, exp)
+        if self._redis is None:
+            return
+        ttl = int(exp - self.clock()) + 1
+        if ttl <= 0:
+            return
+        try:
+            self._redis.set(REVOKED_KEY_PREFIX + jti, int(exp), ex=ttl)
+            self._redis.publish(REVOKED_CHANNEL, f"{jti}:{int(exp)}")
+        except Exception as e:
+            print(f"[tokens] Не удалось синхронизировать отзыв через Redis: {e}")
+
+    def is_revoked(self, jti: str) -> bool:
+        exp = self._revoked.get(jti)
+        if exp is None:
+            return False
+        if exp <= self.clock():
+            # Токен истек сам, запись больше не нужна
+            with self._lock:
+                self._revoked.pop(jti, None)
+            return False
+        return True
+
+    def purge_expired(self) -> int:
+        """Удалить записи об уже истекших токенах"""
+        now = self.clock()
+        with self._lock:
+            expired = [jti for jti, exp in self._revoked.items() if exp <= now]
+            for jti in expired:
+                del self._revoked[jti]
+        return len(expired)
+
+    def connect_redis(self, client) -> None:
+        """Подключить Redis: загрузить текущие отзывы и подписаться на новые"""
+        self._redis = client
+        try:
+            for key in client.scan_iter(match=REVOKED_KEY_PREFIX + '*', count=1000):
+                key = key.decode() if isinstance(key, bytes) else key
+                exp = client.get(key)
+                if exp is not None:
+                    self._add_local(key[len(REVOKED_KEY_PREFIX):], float(exp))
+        except Exception as e:
+            print(f"[tokens] Не удалось загрузить отозванные токены из Redis: {e}")
+            return
+        self._listener = threading.Thread(target=self._listen, name='jwt-revocations', daemon=True)
+        self._listener.start()
+
+    def _listen(self):
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(REVOKED_CHANNEL)
+        for message in pubsub.listen():
+            data = message.get('data')
+            if isinstance(data, bytes):
+                data = data.decode()
+            jti, _, exp = str(data).rpartition(':')
+            if jti:
+                self._add_local(jti, float(exp))
+
+class VerifiedTokenCache:
+    """LRU-кэш уже проверенных токенов: токен -> декодированный payload.
+
+    Повторное декодирование и проверка подписи того же токена пропускаются до
+    его exp. Отзыв проверяется отдельно на каждом запросе (RevocationList),
+    поэтому кэш не продлевает жизнь отозванным токенам.
+    """
+
+    def __init__(self, max_size: int = 10000, clock: Callable[[], float] = time.time):
+        self.max_size = max_size
+        self.clock = clock
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, token: str) -> Optional[dict]:
+        with self._lock:
+            item = self._items.get(token)
+            if item is None:
+                self.misses += 1
+                return None
+            payload, exp = item
+            if exp is not None and exp <= self.clock():
+                del self._items[token]
+                self.misses += 1
+                return None
+            self._items.move_to_end(token)
+            self.hits += 1
+            return payload
+
+    def set(self, token: str, payload: dict) -> None:
+        with self._lock:
+            self._items[token] = (payload, payload.get('exp'))
+            self._items.move_to_end(token)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+class CachingJWTManager(JWTManager):
+    """JWTManager, который не декодирует повторно уже проверенные токены"""
+
+    def _decode_jwt_from_config(self, encoded_token, csrf_value=None, allow_expired=False):
+        # CSRF-проверка (cookie-режим) и allow_expired требуют полного декодирования
+        if csrf_value is not None or allow_expired:
+            return super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+        payload = verified_tokens.get(encoded_token)
+        if payload is None:
+            payload = super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+            verified_tokens.set(encoded_token, payload)
+        return payload
+
+# Глобальные экземпляры
+revocations = RevocationList()
+verified_tokens = VerifiedTokenCache()
+# Подключается в create_app: выдача токенов (routes/auth.py), HTTP и сокеты /chat
+jwt = CachingJWTManager()
+
+@jwt.token_in_blocklist_loader
+def check_token_revoked(jwt_header, jwt_payload):
+    return revocations.is_revoked(jwt_payload["jti"])
+
+def init_token_revocation(redis_url: Optional[str] = None) -> None:
+    """Включить синхронизацию отзывов через Redis и периодическую чистку"""
+    from scheduler import scheduler
+
+    if redis_url:
+        import redis
+        revocations.connect_redis(redis.Redis.from_url(redis_url))
+    scheduler.every(300, revocations.purge_expired, key='jwt_revocations_purge')
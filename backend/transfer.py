@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Потоковый экспорт и импорт данных в NDJSON (опционально gzip).
+
+Одна строка — одна запись: {"table": "message", "row": {...}}. Таблицы идут в
+порядке внешних ключей, поэтому файл импортируется в пустую БД любой
+поддерживаемой СУБД (SQLite ↔ PostgreSQL) с сохранением id.
+
+Память не зависит от объема истории: чтение идет серверным курсором
+(yield_per) с упорядочиванием по первичному ключу, запись в файл и вставка в
+БД — пачками. После каждой пачки сохраняется checkpoint, и прерванный
+экспорт или импорт продолжается с него при повторном запуске.
+
+Запуск:
+    python transfer.py export history.ndjson.gz [--guild ID] [--channel ID] [--batch N]
+    python transfer.py import history.ndjson.gz [--batch N]
+"""
+
+import gzip
+import json
+import os
+import sys
+from datetime import datetime
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import DateTime, select, text
+
+from config import Config
+from models import (SessionLocal, User, Chat, Guild, Category, Channel, DMChannel, DMInbox,
+                    Message, MessageArchive, File, ReadState)
+from archive import decode_segment
+
+FORMAT_VERSION = 1
+
+# Пароль пользователя, экспортированного без секретов: не совпадает ни с одним хешем
+NO_PASSWORD = "!"
+
+# Полный экспорт в порядке внешних ключей
+FULL_EXPORT = [User, Chat, Guild, Category, Channel, DMChannel, MessageArchive, Message, File,
+               DMInbox, ReadState]
+
+TABLES = {model.__table__.name: model.__table__ for model in FULL_EXPORT if model is not MessageArchive}
+
+def _record(table: str, row: dict) -> dict:
+    return {"table": table, "row": {
+        key: value.isoformat() if isinstance(value, datetime) else value for key, value in row.items()
+    }}
+
+def _encode_chunk(records: List[dict], compressed: bool) -> bytes:
+    data = "".join(json.dumps(r, ensure_ascii=False, separators=(",", ":")) + "\n" for r in records).encode("utf-8")
+    # Каждая пачка — отдельный gzip-member: файл читается gzip.open целиком,
+    # а после обрезки по checkpoint остается корректным
+    return gzip.compress(data, 6) if compressed else data
+
+def _load_checkpoint(path: str) -> Optional[dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _save_checkpoint(path: str, state: dict):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+# ---------------------------
+# ЭКСПОРТ
+# ---------------------------
+
+def _scope_filters(guild_id=None, channel_id=None) -> dict:
+    """WHERE для каждой таблицы экспорта; None — таблица не экспортируется"""
+    if guild_id is None and channel_id is None:
+        return {model: None for model in FULL_EXPORT}
+    channels = select(Channel.id).where(Channel.guild_id == guild_id)
+    if channel_id is not None:
+        channels = channels.where(Channel.id == channel_id)
+    messages = select(Message.id).where(Message.channel_id.in_(channels))
+    return {
+        Guild: Guild.id == guild_id,
+        Category: Category.guild_id == guild_id,
+        Channel: Channel.id.in_(channels),
+        MessageArchive: MessageArchive.channel_id.in_(channels),
+        Message: Message.channel_id.in_(channels),
+        File: File.message_id.in_(messages),
+    }
+
+def _user_records(db, user_ids, seen: set, include_secrets: bool) -> List[dict]:
+    """Авторы записей пачки, еще не попавшие в экспорт (только для экспорта гильдии/канала)"""
+    missing = {uid for uid in user_ids if uid is not None} - seen
+    if not missing:
+        return []
+    seen.update(missing)
+    rows = db.execute(select(User.__table__).where(User.id.in_(missing)).order_by(User.id)).mappings()
+    return [_user_record(dict(row), include_secrets) for row in rows]
+
+def _user_record(row: dict, include_secrets: bool) -> dict:
+    if not include_secrets:
+        row.pop("password", None)
+    return _record("user", row)
+
+def iter_export(guild_id=None, channel_id=None, include_secrets: bool = True,
+                batch_size: int = Config.TRANSFER_BATCH_SIZE,
+                resume: Optional[dict] = None) -> Iterator[Tuple[str, object, List[dict]]]:
+    """Пачки записей экспорта: (таблица, последний ключ, записи).
+
+    resume — {"stage", "last_key"} из checkpoint: продолжить после этого ключа.
+    Архивные сегменты разворачиваются в обычные записи message.
+    """
+    scoped = guild_id is not None or channel_id is not None
+    if scoped and guild_id is None:
+        reader = SessionLocal()
+        try:
+            guild_id = reader.execute(select(Channel.guild_id).where(Channel.id == channel_id)).scalar()
+        finally:
+            reader.close()
+        if guild_id is None:
+            raise ValueError(f"Канал {channel_id} не найден")
+    filters = _scope_filters(guild_id, channel_id)
+    stages = [model for model in FULL_EXPORT if model in filters]
+    if resume:
+        stages = stages[[m.__table__.name for m in stages].index(resume["stage"]):]
+    seen_users = set()
+    db = SessionLocal()
+    try:
+        conn = db.connection()
+        for model in stages:
+            table = model.__table__
+            stmt = select(table).order_by(table.c.id)
+            if filters[model] is not None:
+                stmt = stmt.where(filters[model])
+            if resume and resume["stage"] == table.name:
+                stmt = stmt.where(table.c.id > resume["last_key"])
+            if model is MessageArchive:
+                # Сегмент — до ARCHIVE_SEGMENT_SIZE сообщений, читаем по одному
+                result = conn.execution_options(yield_per=1).execute(stmt)
+                for segment in result.mappings():
+                    scope = {"channel_id": segment["channel_id"], "dm_channel_id": segment["dm_channel_id"],
+                             "chat_id": None}
+                    rows = [dict(row, **scope) for row in decode_segment(segment["payload"])]
+                    records = [_record("message", row) for row in rows]
+                    if scoped:
+                        records = _user_records(db, {r["user_id"] for r in rows}, seen_users,
+                                                include_secrets) + records
+                    yield table.name, segment["id"], records
+                continue
+            result = conn.execution_options(yield_per=batch_size).execute(stmt)
+            for partition in result.mappings().partitions():
+                rows = [dict(row) for row in partition]
+                if model is User:
+                    records = [_user_record(row, include_secrets) for row in rows]
+                else:
+                    records = [_record(table.name, row) for row in rows]
+                if scoped:
+                    authors = {row.get("user_id", row.get("owner_id")) for row in rows}
+                    records = _user_records(db, authors, seen_users, include_secrets) + records
+                yield table.name, rows[-1]["id"], records
+    finally:
+        db.close()
+
+def iter_export_chunks(guild_id=None, channel_id=None, include_secrets: bool = False,
+                       batch_size: int = Config.TRANSFER_BATCH_SIZE, compressed: bool = True) -> Iterator[bytes]:
+    """Экспорт как поток байтов (для HTTP-ответа), без checkpoint"""
+    yield _encode_chunk([_meta(guild_id, channel_id)], compressed)
+    for _, _, records in iter_export(guild_id, channel_id, include_secrets, batch_size):
+        yield _encode_chunk(records, compressed)
+
+def _meta(guild_id, channel_id) -> dict:
+    return {"table": "_meta", "row": {"version": FORMAT_VERSION, "exported_at": datetime.utcnow().isoformat(),
+                                      "guild_id": guild_id, "channel_id": channel_id}}
+
+def export_ndjson(path: str, guild_id=None, channel_id=None, include_secrets: bool = True,
+                  batch_size: int = Config.TRANSFER_BATCH_SIZE, checkpoint_path: Optional[str] = None,
+                  on_batch: Optional[Callable[[str, int], None]] = None) -> int:
+    """Экспортировать в файл (.gz — со сжатием). Возвращает число записанных записей.
+
+    Если рядом лежит checkpoint прерванного экспорта, файл обрезается до последней
+    сохраненной пачки и экспорт продолжается с нее. on_batch(таблица, записей) —
+    вызывается после каждой сохраненной пачки.
+    """
+    checkpoint_path = checkpoint_path or path + ".checkpoint"
+    compressed = path.endswith(".gz")
+    scope = {"guild_id": guild_id, "channel_id": channel_id}
+    state = _load_checkpoint(checkpoint_path)
+    if state and state["scope"] != scope:
+        raise ValueError(f"Checkpoint {checkpoint_path} относится к другому экспорту: {state['scope']}")
+    written = state["written"] if state else 0
+    with open(path, "r+b" if state else "wb") as out:
+        if state:
+            out.truncate(state["offset"])
+            out.seek(state["offset"])
+        else:
+            out.write(_encode_chunk([_meta(guild_id, channel_id)], compressed))
+        for stage, last_key, records in iter_export(guild_id, channel_id, include_secrets, batch_size, resume=state):
+            out.write(_encode_chunk(records, compressed))
+            out.flush()
+            os.fsync(out.fileno())
+            written += len(records)
+            _save_checkpoint(checkpoint_path, {"scope": scope, "stage": stage, "last_key": last_key,
+                                               "offset": out.tell(), "written": written})
+            if on_batch:
+                on_batch(stage, len(records))
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return written
+
+# ---------------------------
+# ИМПОРТ
+# ---------------------------
+
+def _insert_ignore(table, dialect: str):
+    """INSERT, пропускающий уже существующие строки: повтор пачки после сбоя безопасен"""
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        return insert(table).on_conflict_do_nothing()
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        return insert(table).on_conflict_do_nothing()
+    return table.insert().prefix_with("IGNORE")
+
+def _row_converter(table):
+    columns = set(table.c.keys())
+    datetimes = {c.name for c in table.c if isinstance(c.type, DateTime)}
+
+    def convert(row: dict) -> dict:
+        row = {key: value for key, value in row.items() if key in columns}
+        for key in datetimes & row.keys():
+            if row[key] is not None:
+                row[key] = datetime.fromisoformat(row[key])
+        if table.name == "user" and not row.get("password"):
+            row["password"] = NO_PASSWORD
+        return row
+    return convert
+
+def _reset_sequences(db, tables):
+    """PostgreSQL: сдвинуть последовательности id за импортированные значения"""
+    for name in tables:
+        if name == "message":
+            continue  # id сообщений — snowflake, последовательности нет
+        db.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('\"{name}\"', 'id'), COALESCE(MAX(id), 1)) FROM \"{name}\""))
+
+def import_ndjson(path: str, batch_size: int = Config.TRANSFER_BATCH_SIZE,
+                  checkpoint_path: Optional[str] = None,
+                  on_batch: Optional[Callable[[str, int], None]] = None) -> int:
+    """Импортировать файл экспорта. Возвращает число обработанных записей.
+
+    Записи вставляются пачками по batch_size строк одной таблицы, каждая
+    пачка — одна транзакция. Номер последней вставленной строки файла
+    сохраняется в checkpoint; повторный запуск пропускает уже вставленное.
+    """
+    checkpoint_path = checkpoint_path or path + ".checkpoint"
+    state = _load_checkpoint(checkpoint_path)
+    done_lines = state["line"] if state else 0
+    opener = gzip.open if path.endswith(".gz") else open
+    db = SessionLocal()
+    dialect = db.get_bind().dialect.name
+    converters, statements, touched = {}, {}, set()
+    imported = 0
+    batch, batch_table, batch_end = [], None, done_lines
+
+    def flush():
+        nonlocal batch, imported
+        if not batch:
+            return
+        db.execute(statements[batch_table], batch)
+        db.commit()
+        imported += len(batch)
+        _save_checkpoint(checkpoint_path, {"line": batch_end})
+        if on_batch:
+            on_batch(batch_table, len(batch))
+        batch = []
+
+    try:
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                if line_no <= done_lines or not line.strip():
+                    continue
+                record = json.loads(line)
+                name = record["table"]
+                if name not in TABLES:
+                    continue  # _meta и таблицы, которых нет в этой версии схемы
+                if name != batch_table or len(batch) >= batch_size:
+                    flush()
+                    batch_table = name
+                if name not in converters:
+                    converters[name] = _row_converter(TABLES[name])
+                    statements[name] = _insert_ignore(TABLES[name], dialect)
+                touched.add(name)
+                batch.append(converters[name](record["row"]))
+                batch_end = line_no
+        flush()
+        if dialect == "postgresql":
+            _reset_sequences(db, touched)
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return imported
+
+def main(argv):
+    import argparse
+    parser = argparse.ArgumentParser(description="Потоковый экспорт/импорт истории в NDJSON")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("path", help="файл .ndjson или .ndjson.gz")
+    parser.add_argument("--guild", type=int, help="экспортировать только гильдию")
+    parser.add_argument("--channel", type=int, help="экспортировать только канал")
+    parser.add_argument("--batch", type=int, default=Config.TRANSFER_BATCH_SIZE)
+    parser.add_argument("--no-secrets", action="store_true", help="не экспортировать хеши паролей")
+    args = parser.parse_args(argv)
+
+    def progress(table, count):
+        print(f"[transfer] {table}: +{count}")
+
+    if args.command == "export":
+        total = export_ndjson(args.path, args.guild, args.channel, not args.no_secrets, args.batch,
+                              on_batch=progress)
+    else:
+        total = import_ndjson(args.path, args.batch, on_batch=progress)
+    print(f"[transfer] {args.command}: {total} записей")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,12 +1,15 @@
 import uuid
-from werkzeug.security import generate_password_hash
-from models import User, SessionLocal
-from sqlalchemy.orm import joinedload
+from models import User, SessionLocal, ReadSessionLocal, friendship
+from sqlalchemy import case, func
+from sqlalchemy.orm import joinedload, load_only
+from passwords import hash_password, HashingBusy
+from shared_state import shared
 
 users = {}
-friendships = {}
-friend_requests_in = {}
-friend_requests_out = {}
+# Заявки в друзья и принятые связи; общие для воркеров при SHARED_STATE_URL=redis://
+friendships = shared.set_map("friendships")
+friend_requests_in = shared.set_map("friend_requests_in")
+friend_requests_out = shared.set_map("friend_requests_out")
 
 # CRUD пользователя
 
@@ -15,7 +18,12 @@ def create_user(username, password):
     if db.query(User).filter_by(username=username).first():
         db.close()
         return False, 'Пользователь уже существует'
-    user = User(username=username, password=generate_password_hash(password))
+    try:
+        password_hash = hash_password(password)
+    except HashingBusy:
+        db.close()
+        return False, 'Сервер перегружен, повторите попытку позже'
+    user = User(username=username, password=password_hash)
     db.add(user)
     db.commit()
     db.refresh(user)
@@ -23,7 +31,7 @@ def create_user(username, password):
     return True, user
 
 def get_user(username):
-    db = SessionLocal()
+    db = ReadSessionLocal()
     user = db.query(User).filter_by(username=username).first()
     db.close()
     return user
@@ -52,7 +60,7 @@ def set_user_note(owner, target, note):
     return True
 
 def search_users(query):
-    db = SessionLocal()
+    db = ReadSessionLocal()
     users = db.query(User).filter(User.username.ilike(f'%{query}%')).all()
     db.close()
     return [u.username for u in users]
@@ -62,54 +70,55 @@ def search_users(query):
 MAX_FRIENDS = 1000
 
 def add_friend(sender, receiver):
-    db = SessionLocal()
-    sender_user = db.query(User).filter_by(username=sender).first()
-    receiver_user = db.query(User).filter_by(username=receiver).first()
     if sender == receiver:
-        db.close()
         return False, 'Нельзя добавить себя'
-    if not receiver_user:
+    db = SessionLocal()
+    # Оба пользователя одним запросом, только id
+    found = dict(db.query(User.username, User.id).filter(User.username.in_((sender, receiver))))
+    sender_id, receiver_id = found.get(sender), found.get(receiver)
+    if not sender_id or not receiver_id:
         db.close()
         return False, 'Пользователь не найден'
-    if len(sender_user.friends) >= MAX_FRIENDS:
+    # Число друзей и наличие получателя среди них — агрегатом, без загрузки списка друзей
+    friend_count, already = db.query(
+        func.count(),
+        func.coalesce(func.max(case((friendship.c.friend_id == receiver_id, 1), else_=0)), 0),
+    ).select_from(friendship).filter(friendship.c.user_id == sender_id).one()
+    if friend_count >= MAX_FRIENDS:
         db.close()
         return False, f'Лимит друзей: {MAX_FRIENDS}'
-    if receiver_user in sender_user.friends:
+    if already:
         db.close()
         return False, 'Уже в друзьях'
-    sender_user.friends.append(receiver_user)
+    db.execute(friendship.insert().values(user_id=sender_id, friend_id=receiver_id))
     db.commit()
     db.close()
     return True, None
 
 def accept_friend(receiver, sender):
-    friendships.setdefault(sender, set())
-    friendships.setdefault(receiver, set())
-    if sender in friend_requests_in[receiver]:
-        friendships[sender].add(receiver)
-        friendships[receiver].add(sender)
-        friend_requests_in[receiver].discard(sender)
-        friend_requests_out[sender].discard(receiver)
+    if friend_requests_in.discard(receiver, sender):
+        friendships.add(sender, receiver)
+        friendships.add(receiver, sender)
+        friend_requests_out.discard(sender, receiver)
         return True
     return False
 
 def remove_friend(user1, user2):
-    friendships.setdefault(user1, set())
-    friendships.setdefault(user2, set())
-    friendships[user1].discard(user2)
-    friendships[user2].discard(user1)
+    friendships.discard(user1, user2)
+    friendships.discard(user2, user1)
     return True
 
 def decline_friend(receiver, sender):
-    if sender in friend_requests_in.get(receiver, set()):
-        friend_requests_in[receiver].discard(sender)
-        friend_requests_out[sender].discard(receiver)
+    if friend_requests_in.discard(receiver, sender):
+        friend_requests_out.discard(sender, receiver)
         return True
     return False
 
 def get_friends(username):
-    db = SessionLocal()
-    user = db.query(User).options(joinedload(User.friends)).filter_by(username=username).first()
+    db = ReadSessionLocal()
+    user = db.query(User).options(
+        load_only(User.id), joinedload(User.friends).load_only(User.username)
+    ).filter_by(username=username).first()
     if not user:
         db.close()
         return []
@@ -118,4 +127,4 @@ def get_friends(username):
     return friends
 
 def get_friend_requests(username):
-    return list(friend_requests_in.get(username, set()))
+    return list(friend_requests_in.members(username))
@@ -0,0 +1,264 @@
+from datetime import datetime
+from flask import Blueprint, request, jsonify, session, Response, stream_with_context
+from sqlalchemy import or_
+from sqlalchemy.orm import joinedload
+from models import db, User, Chat, Message, Guild, Channel, DMChannel
+from passwords import hash_password, verify_password, HashingBusy
+from messages import get_badges, mark_read, get_dm_inbox
+from guilds import create_invite, resolve_invite, use_invite, is_member, MAX_INVITE_USES, MAX_INVITE_HOURS
+from snowflake import to_wire
+
+# HTTP API; регистрируется фабрикой create_app (app.py) по строке "views:api"
+api = Blueprint("api", __name__)
+
+@api.app_errorhandler(HashingBusy)
+def hashing_busy(e):
+    # Пул хеширования переполнен: отвечаем 503 вместо очереди без предела
+    return jsonify({"error": "Server busy, try again later"}), 503, {"Retry-After": "1"}
+
+# ---------------------------
+# ROUTES
+# ---------------------------
+
+@api.route("/")
+def home():
+    return {"message": "Hello from Oleg Messenger!"}
+
+# ---------------------------
+# AUTH
+# ---------------------------
+@api.route("/api/register", methods=["POST"])
+def register():
+    data = request.json
+    if not data.get("username") or not data.get("password"):
+        return jsonify({"error": "Missing fields"}), 400
+    
+    if User.query.filter_by(username=data["username"]).first():
+        return jsonify({"error": "User already exists"}), 400
+    
+    hashed_pw = hash_password(data["password"])
+    new_user = User(username=data["username"], password=hashed_pw)
+    db.session.add(new_user)
+    db.session.commit()
+    
+    return jsonify({"message": "User registered successfully"})
+
+@api.route("/api/login", methods=["POST"])
+def login():
+    data = request.json
+    user = User.query.filter_by(username=data.get("username")).first()
+    if not user:
+        return jsonify({"error": "Invalid credentials"}), 401
+    ok, new_hash = verify_password(user.password, data.get("password"))
+    if not ok:
+        return jsonify({"error": "Invalid credentials"}), 401
+    if new_hash:
+        user.password = new_hash
+        db.session.commit()
+    
+    session["user_id"] = user.id
+    return jsonify({"message": "Login successful", "user_id": user.id})
+
+@api.route("/api/logout", methods=["POST"])
+def logout():
+    session.pop("user_id", None)
+    return jsonify({"message": "Logged out"})
+
+# ---------------------------
+# CHATS
+# ---------------------------
+@api.route("/api/chats", methods=["GET"])
+def get_chats():
+    chats = Chat.query.all()
+    return jsonify([{"id": c.id, "name": c.name} for c in chats])
+
+@api.route("/api/chats", methods=["POST"])
+def create_chat():
+    data = request.json
+    if not data.get("name"):
+        return jsonify({"error": "Chat name required"}), 400
+    
+    new_chat = Chat(name=data["name"])
+    db.session.add(new_chat)
+    db.session.commit()
+    
+    return jsonify({"message": "Chat created", "id": new_chat.id})
+
+# ---------------------------
+# MESSAGES
+# ---------------------------
+@api.route("/api/messages/<int:chat_id>", methods=["GET"])
+def get_messages(chat_id):
+    # Автор подгружается тем же запросом (JOIN), из него нужно только имя
+    messages = Message.query.options(
+        joinedload(Message.user).load_only(User.username)
+    ).filter_by(chat_id=chat_id).order_by(Message.id).all()
+    return jsonify([
+        {"id": to_wire(m.id), "user": m.user.username, "content": m.content, "timestamp": m.timestamp.isoformat()}
+        for m in messages
+    ])
+
+@api.route("/api/messages/<int:chat_id>", methods=["POST"])
+def send_message(chat_id):
+    if "user_id" not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    data = request.json
+    new_msg = Message(content=data.get("content"), user_id=session["user_id"], chat_id=chat_id)
+    db.session.add(new_msg)
+    db.session.commit()
+    
+    return jsonify({"message": "Message sent", "id": to_wire(new_msg.id)})
+
+@api.route("/api/messages/<int:msg_id>", methods=["PUT"])
+def edit_message(msg_id):
+    msg = Message.query.get_or_404(msg_id)
+    if msg.user_id != session.get("user_id"):
+        return jsonify({"error": "Unauthorized"}), 403
+    
+    data = request.json
+    msg.content = data.get("content", msg.content)
+    db.session.commit()
+    return jsonify({"message": "Message updated"})
+
+@api.route("/api/messages/<int:msg_id>", methods=["DELETE"])
+def delete_message(msg_id):
+    msg = Message.query.get_or_404(msg_id)
+    if msg.user_id != session.get("user_id"):
+        return jsonify({"error": "Unauthorized"}), 403
+    
+    db.session.delete(msg)
+    db.session.commit()
+    return jsonify({"message": "Message deleted"})
+
+# ---------------------------
+# READ STATE
+# ---------------------------
+@api.route("/api/badges", methods=["GET"])
+def badges():
+    if "user_id" not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify(get_badges(session["user_id"]))
+
+@api.route("/api/dms", methods=["GET"])
+def dm_inbox():
+    if "user_id" not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    # Следующая страница: ?before=<last_message_at>&before_id=<dm_channel_id> последней строки
+    before = None
+    if request.args.get("before"):
+        try:
+            before = (datetime.fromisoformat(request.args["before"]), int(request.args["before_id"]))
+        except (KeyError, ValueError):
+            return jsonify({"error": "before and before_id required"}), 400
+    return jsonify(get_dm_inbox(session["user_id"], limit=min(request.args.get("limit", 50, type=int), 100),
+                                before=before))
+
+@api.route("/api/read-state", methods=["POST"])
+def ack_read_state():
+    if "user_id" not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    data = request.json or {}
+    channel_id = data.get("channel_id") or None
+    dm_channel_id = data.get("dm_channel_id") or None
+    if not channel_id and not dm_channel_id:
+        return jsonify({"error": "channel_id or dm_channel_id required"}), 400
+    
+    user_id = session["user_id"]
+    if channel_id:
+        # Канал гильдии — владельцу и участникам
+        guild_id = db.session.query(Channel.guild_id).filter_by(id=channel_id).scalar()
+        allowed = guild_id is not None and is_member(db.session, guild_id, user_id)
+    else:
+        # DM — только двум собеседникам
+        allowed = db.session.query(DMChannel.id).filter(
+            DMChannel.id == dm_channel_id,
+            or_(DMChannel.user1_id == user_id, DMChannel.user2_id == user_id)).first() is not None
+    if not allowed:
+        return jsonify({"error": "Forbidden"}), 403
+    
+    unread, mentions = mark_read(user_id, channel_id=channel_id,
+                                 dm_channel_id=dm_channel_id, message_id=data.get("message_id"))
+    return jsonify({"unread": unread, "mentions": mentions})
+
+# ---------------------------
+# INVITES
+# ---------------------------
+def _in_range(value, types, limit):
+    """Число из JSON в (0, limit]; строки и true/false не принимаются"""
+    return isinstance(value, types) and not isinstance(value, bool) and 0 < value <= limit
+
+@api.route("/api/guilds/<int:guild_id>/invites", methods=["POST"])
+def create_guild_invite(guild_id):
+    if "user_id" not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    guild = db.session.get(Guild, guild_id)
+    if not guild or guild.owner_id != session["user_id"]:
+        return jsonify({"error": "Forbidden"}), 403
+    
+    data = request.get_json(silent=True) or {}
+    max_uses = data.get("max_uses")
+    if max_uses is not None and not _in_range(max_uses, int, MAX_INVITE_USES):
+        return jsonify({"success": False, "error": f"max_uses must be an integer from 1 to {MAX_INVITE_USES}"}), 400
+    expires_hours = data.get("expires_hours")
+    if expires_hours is not None and not _in_range(expires_hours, (int, float), MAX_INVITE_HOURS):
+        return jsonify({"success": False, "error": f"expires_hours must be a number above 0 and up to {MAX_INVITE_HOURS}"}), 400
+    invite, error = create_invite(guild_id, guild.owner.username,
+                                  max_age=max(int(expires_hours * 3600), 1) if expires_hours is not None else None,
+                                  max_uses=max_uses)
+    if error:
+        return jsonify({"success": False, "error": error}), 400
+    return jsonify({
+        "success": True,
+        "code": invite.code,
+        "guild_id": guild_id,
+        "expires_at": invite.expires_at.isoformat() + "Z" if invite.expires_at else None,
+        "max_uses": invite.max_uses,
+        "uses": invite.uses,
+    }), 201
+
+@api.route("/api/invites/<code>", methods=["GET"])
+def get_invite(code):
+    guild_id = resolve_invite(code)
+    if guild_id is None:
+        return jsonify({"error": "Invite not found"}), 404
+    return jsonify({"code": code, "guild_id": guild_id})
+
+@api.route("/api/invites/join", methods=["POST"])
+def join_invite():
+    if "user_id" not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    code = ((request.get_json(silent=True) or {}).get("code") or "").strip()
+    if not code:
+        return jsonify({"success": False, "error": "code required"}), 400
+    
+    user = db.session.get(User, session["user_id"])
+    guild_id, error = use_invite(code, user.username)
+    if error:
+        return jsonify({"success": False, "error": error}), 404
+    return jsonify({"success": True, "message": "Successfully joined guild", "guild_id": guild_id})
+
+# ---------------------------
+# EXPORT
+# ---------------------------
+@api.route("/api/guilds/<int:guild_id>/export", methods=["GET"])
+def export_guild(guild_id):
+    """История гильдии (или одного канала) потоком NDJSON.gz, без хешей паролей"""
+    if "user_id" not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    guild = db.session.get(Guild, guild_id)
+    if not guild or guild.owner_id != session["user_id"]:
+        return jsonify({"error": "Forbidden"}), 403
+    
+    # Модуль экспорта нужен редко — загружается при первом экспорте, а не при старте
+    from transfer import iter_export_chunks
+
+    channel_id = request.args.get("channel_id", type=int)
+    name = f"guild-{guild_id}" + (f"-channel-{channel_id}" if channel_id else "")
+    return Response(stream_with_context(iter_export_chunks(guild_id, channel_id)),
+                    mimetype="application/gzip",
+                    headers={"Content-Disposition": f"attachment; filename={name}.ndjson.gz"})
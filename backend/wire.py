@@ -0,0 +1,53 @@
+from datetime import date, datetime
+from typing import Any, Iterable, Sequence
+
+import msgpack
+
+JSON = 'json'
+MSGPACK = 'msgpack'
+WIRE_FORMATS = (JSON, MSGPACK)
+
+def _default(obj):
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f'Тип {type(obj).__name__} не поддерживается')
+
+def packb(obj: Any) -> bytes:
+    """Закодировать объект в MessagePack"""
+    return msgpack.packb(obj, use_bin_type=True, default=_default)
+
+def unpackb(data: bytes) -> Any:
+    """Декодировать MessagePack"""
+    return msgpack.unpackb(data, raw=False)
+
+def pack_rows(rows: Iterable[dict], columns: Sequence[str]) -> dict:
+    """Колоночная форма списка словарей: ключи передаются один раз, а не в каждой строке"""
+    return {'columns': list(columns), 'rows': [[row.get(col) for col in columns] for row in rows]}
+
+def unpack_rows(packed: dict) -> list:
+    columns = packed['columns']
+    return [dict(zip(columns, row)) for row in packed['rows']]
+
+class WirePayload:
+    """Данные события с ленивым кэшем кодировок.
+
+    При рассылке в комнату полезная нагрузка кодируется один раз на формат,
+    а не на каждого получателя.
+    """
+
+    __slots__ = ('data', '_encoded')
+
+    def __init__(self, data: Any):
+        self.data = data
+        self._encoded = {}
+
+    def encode(self, wire_format: str = JSON):
+        if wire_format != MSGPACK:
+            # JSON сериализует сам Socket.IO
+            return self.data
+        encoded = self._encoded.get(wire_format)
+        if encoded is None:
+            encoded = self._encoded[wire_format] = packb(self.data)
+        return encoded
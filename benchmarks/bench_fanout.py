@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Нагрузка на рассылку сообщений комнаты: задержка fan-out от публикации до
+доставки каждому подписчику (p50/p99), отдельно для быстрых и медленных
+клиентов.
+
+Два режима:
+
+- по умолчанию — в процессе: FanoutManager (backend/fanout.py) с
+  имитацией транспорта Engine.IO. Быстрые клиенты забирают события сразу,
+  медленные — с ограниченной скоростью; насос очередей работает с
+  интервалом FANOUT_PUMP_INTERVAL, как в приложении. Сервер не нужен.
+
+- --url — живой сервер: N клиентов python-socketio подключаются к /chat с
+  access-токенами из --tokens (по одному на строку), входят в --room, один
+  из них отправляет сообщения с меткой времени, остальные меряют задержку
+  получения. Клиенты и сервер должны работать на одном хосте (общие часы).
+
+Запуск: python benchmarks/bench_fanout.py [--clients 500] [--slow 0.05] [--rate 50] [--seconds 5]
+        python benchmarks/bench_fanout.py --url http://localhost:5000 --tokens tokens.txt --room channel:1
+        [--json fanout.json] [--compare baseline.json]
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from benchutil import arg, percentile, save_results, compare
+from backend.fanout import FanoutManager, FANOUT_PUMP_INTERVAL
+
+def latency_summary(name, latencies, expected):
+    return {
+        "name": name,
+        "delivered": len(latencies),
+        "delivery_ratio": len(latencies) / expected if expected else 0.0,
+        "p50_us": percentile(latencies, 0.50) * 1e6,
+        "p99_us": percentile(latencies, 0.99) * 1e6,
+        "max_us": max(latencies) * 1e6 if latencies else 0.0,
+    }
+
+def run_inprocess(clients, slow_share, rate, seconds, slow_rate=20.0):
+    """Имитация: транспорт — очередь на клиента, которую клиент разбирает со своей скоростью"""
+    transport = {f"sid{i}": deque() for i in range(clients)}
+    slow = {sid for i, sid in enumerate(transport) if i < int(clients * slow_share)}
+    delivered = {"fast": [], "slow": []}
+    disconnected = set()
+    lock = threading.Lock()
+
+    def send(sid, event, payload):
+        transport[sid].append(payload["sent_at"])
+
+    fanout = FanoutManager(send, lambda sid: len(transport[sid]), disconnected.add)
+    stop = threading.Event()
+
+    def consume():
+        # Быстрые клиенты разбирают транспорт целиком, медленные — slow_rate событий/с
+        slow_budget = {sid: 0.0 for sid in slow}
+        last = time.perf_counter()
+        while not stop.is_set():
+            now = time.perf_counter()
+            budget_step, last = slow_rate * (now - last), now
+            batch = {"fast": [], "slow": []}
+            for sid, q in transport.items():
+                if sid in slow:
+                    slow_budget[sid] = min(slow_budget[sid] + budget_step, 1.0)
+                    if q and slow_budget[sid] >= 1.0:
+                        slow_budget[sid] -= 1.0
+                        batch["slow"].append(now - q.popleft())
+                else:
+                    while q:
+                        batch["fast"].append(now - q.popleft())
+            with lock:
+                delivered["fast"].extend(batch["fast"])
+                delivered["slow"].extend(batch["slow"])
+            time.sleep(0.001)
+
+    def pump():
+        while not stop.is_set():
+            fanout.pump()
+            time.sleep(FANOUT_PUMP_INTERVAL)
+
+    workers = [threading.Thread(target=consume), threading.Thread(target=pump)]
+    for t in workers:
+        t.start()
+    sids = list(transport)
+    published = 0
+    interval = 1.0 / rate
+    deadline = time.perf_counter() + seconds
+    next_at = time.perf_counter()
+    while time.perf_counter() < deadline:
+        fanout.publish_many([sid for sid in sids if sid not in disconnected], "message",
+                            {"sent_at": time.perf_counter(), "message": "сообщение"})
+        published += 1
+        next_at += interval
+        time.sleep(max(0.0, next_at - time.perf_counter()))
+    time.sleep(FANOUT_PUMP_INTERVAL * 4)
+    stop.set()
+    for t in workers:
+        t.join()
+    fast_count = clients - len(slow)
+    return [
+        latency_summary("fanout: быстрые клиенты", delivered["fast"], published * fast_count),
+        latency_summary("fanout: медленные клиенты", delivered["slow"], published * len(slow)),
+    ], dict(fanout.stats(), published=published)
+
+def run_socket(url, tokens, room, rate, seconds):
+    """Живой сервер: первый токен отправляет, все остальные получают"""
+    import socketio
+
+    latencies = []
+    lock = threading.Lock()
+    clients = []
+    for token in tokens:
+        client = socketio.Client(reconnection=False)
+
+        def on_message(data):
+            try:
+                sent_at = json.loads(data["message"])["bench_sent_at"]
+            except (TypeError, ValueError, KeyError):
+                return
+            with lock:
+                latencies.append(time.time() - sent_at)
+
+        client.on("message", on_message, namespace="/chat")
+        client.connect(url, namespaces=["/chat"], auth={"token": token}, transports=["websocket"])
+        client.emit("join", {"room": room}, namespace="/chat")
+        clients.append(client)
+    time.sleep(1.0)
+    sender, receivers = clients[0], len(clients) - 1
+    published = 0
+    interval = 1.0 / rate
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        sender.emit("message", {"room": room, "message": json.dumps({"bench_sent_at": time.time()})},
+                    namespace="/chat")
+        published += 1
+        time.sleep(interval)
+    time.sleep(2.0)
+    for client in clients:
+        client.disconnect()
+    # Отправитель сам в комнате и тоже получает свои сообщения
+    return [latency_summary("socket: доставка в комнату", latencies, published * (receivers + 1))], \
+        {"published": published, "clients": len(clients)}
+
+def print_table(results, stats):
+    header = f"{'клиенты':<30}{'доставлено':>12}{'доля':>8}{'p50, мкс':>12}{'p99, мкс':>12}{'max, мкс':>12}"
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        print(f"{r['name']:<30}{r['delivered']:>12}{r['delivery_ratio']:>8.2f}"
+              f"{r['p50_us']:>12.0f}{r['p99_us']:>12.0f}{r['max_us']:>12.0f}")
+    print("\n" + ", ".join(f"{k}={v}" for k, v in stats.items()))
+
+def main():
+    rate = arg('--rate', 50.0)
+    seconds = arg('--seconds', 5.0)
+    if '--url' in sys.argv:
+        with open(arg('--tokens', 'tokens.txt'), 'r', encoding='utf-8') as f:
+            tokens = [line.strip() for line in f if line.strip()]
+        params = {"url": arg('--url', ''), "clients": len(tokens), "room": arg('--room', 'channel:1'),
+                  "rate": rate, "seconds": seconds}
+        results, stats = run_socket(params["url"], tokens, params["room"], rate, seconds)
+    else:
+        params = {"clients": arg('--clients', 500), "slow": arg('--slow', 0.05), "rate": rate, "seconds": seconds}
+        results, stats = run_inprocess(params["clients"], params["slow"], rate, seconds)
+    print(f"Fan-out: {params}")
+    print_table(results, stats)
+    if '--json' in sys.argv:
+        save_results(sys.argv[sys.argv.index('--json') + 1], "fanout", results, params)
+    if '--compare' in sys.argv:
+        compare(sys.argv[sys.argv.index('--compare') + 1], results, metrics=("delivery_ratio", "p50_us", "p99_us"))
+
+if __name__ == '__main__':
+    main()
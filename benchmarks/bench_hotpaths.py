@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарки горячих путей бэкенда на синтетической БД (datagen.py):
+messages.create_message, messages.get_messages (первая страница и курсор
+вглубь истории), guilds.check_user_permission, cache.cached (попадание и
+промах) и JSON-сериализация страницы истории.
+
+Для каждого бенчмарка — операций/с, среднее, p50 и p99 задержки одного
+вызова. Результаты сохраняются в JSON с коммитом и параметрами, --compare
+печатает изменение относительно прошлого прогона.
+
+Запуск: python benchmarks/bench_hotpaths.py [--scale small] [--number 500]
+        [--json hotpaths.json] [--compare baseline.json]
+"""
+
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+# Модули бэкенда создают движок при импорте; БД бенчмарка подключается ниже
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine
+
+from benchutil import arg, summarize, timed, save_results, compare
+from datagen import generate, scale_params
+
+def history_rows(msgs):
+    # Те же поля, что отдает /api/messages и событие history
+    return [{
+        "id": str(m.id), "user_id": m.user_id, "username": m.user.username, "content": m.content,
+        "timestamp": m.timestamp.isoformat() if m.timestamp else None, "pinned": m.pinned,
+    } for m in msgs]
+
+def run(params, number, seed=42):
+    from models import SessionLocal, Guild, User
+    from messages import create_message, get_messages
+    from guilds import check_user_permission
+    from cache import cached, cache
+    from sqlite_tuning import configure_sqlite
+
+    tmpdir = tempfile.mkdtemp()
+    engine = create_engine(f"sqlite:///{os.path.join(tmpdir, 'bench.db')}")
+    configure_sqlite(engine)
+    try:
+        summary = generate(engine, seed=seed, **params)
+        SessionLocal.configure(bind=engine)
+        rnd = random.Random(seed)
+        channel_id = summary["hot_channel_id"]
+        users = summary["users"]
+        db = SessionLocal()
+        guild_id, owner_id = db.query(Guild.id, Guild.owner_id).first()
+        owner = db.query(User.username).filter_by(id=owner_id).scalar()
+        stranger = f"user{owner_id % users + 1}"
+        db.close()
+        page = get_messages(channel_id, limit=50)
+        deep_cursor = get_messages(channel_id, limit=1, offset=min(1000, summary["messages"] // 4))
+        before = deep_cursor[0].id if deep_cursor else None
+        rows = history_rows(page)
+
+        @cached(ttl=300, key_prefix="bench")
+        def lookup(key):
+            return {"id": key, "name": f"user{key}"}
+
+        miss_keys = iter(range(10 ** 9))
+        benchmarks = [
+            ("messages.create_message",
+             lambda: create_message(channel_id, f"user{rnd.randint(1, users)}", "сообщение бенчмарка")),
+            ("messages.get_messages (первая страница)", lambda: get_messages(channel_id, limit=50)),
+            ("messages.get_messages (курсор)", lambda: get_messages(channel_id, limit=50, before=before)),
+            ("guilds.check_user_permission (владелец)",
+             lambda: check_user_permission(guild_id, owner, "manage_messages")),
+            ("guilds.check_user_permission (участник)",
+             lambda: check_user_permission(guild_id, stranger, "manage_messages")),
+            ("cache.cached (попадание)", lambda: lookup(7)),
+            ("cache.cached (промах)", lambda: lookup(next(miss_keys))),
+            ("json (страница истории)", lambda: json.dumps(rows, sort_keys=True)),
+        ]
+        results = []
+        for name, fn in benchmarks:
+            results.append(dict(name=name, **summarize(timed(fn, number))))
+        cache.clear()
+        return summary, results
+    finally:
+        engine.dispose()
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+def print_table(results):
+    header = f"{'бенчмарк':<44}{'оп/с':>10}{'сред, мкс':>12}{'p50, мкс':>12}{'p99, мкс':>12}"
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        print(f"{r['name']:<44}{r['ops_per_sec']:>10.0f}{r['mean_us']:>12.1f}"
+              f"{r['p50_us']:>12.1f}{r['p99_us']:>12.1f}")
+
+def main():
+    params = scale_params()
+    number = arg('--number', 500)
+    summary, results = run(params, number, seed=arg('--seed', 42))
+    print(f"Данные: {summary['users']} пользователей, {summary['channels']} каналов, "
+          f"{summary['messages']} сообщений (сгенерированы за {summary['seconds']:.1f} с)")
+    print_table(results)
+    if '--json' in sys.argv:
+        save_results(sys.argv[sys.argv.index('--json') + 1], "hotpaths", results,
+                     dict(params, number=number))
+    if '--compare' in sys.argv:
+        compare(sys.argv[sys.argv.index('--compare') + 1], results)
+
+if __name__ == '__main__':
+    main()
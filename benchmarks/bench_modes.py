@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Сравнение режимов сервера на одном воркере: eventlet (Flask-SocketIO,
+синхронный SQLAlchemy) и asyncio (asgi.py: ASGI, AsyncServer, асинхронные
+сессии). Оба сервера запускаются по очереди на одной синтетической БД
+(datagen.py, SQLite), затем асинхронные клиенты python-socketio:
+
+1. подключаются к /chat, пока не наберется --clients или не истечет
+   --connect-timeout — сколько соединений держит один воркер;
+2. все подключенные клиенты запрашивают history горячего канала в цикле
+   --seconds секунд (запрос — ответ) — запросов/с и p50/p99 задержки;
+3. отправитель шлет message в комнату — p50/p99 доставки остальным.
+
+Запуск: python benchmarks/bench_modes.py [--clients 1000] [--seconds 10] [--scale small]
+        [--modes eventlet,asgi] [--json modes.json] [--compare baseline.json]
+"""
+
+import asyncio
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine
+
+from benchutil import arg, percentile, save_results, compare
+from datagen import generate, scale_params
+
+BACKEND = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+SERVERS = {
+    "eventlet": [sys.executable, "-c",
+                 "import eventlet; eventlet.monkey_patch()\n"
+                 "import os, app\n"
+                 "from scheduler import scheduler\n"
+                 "a = app.create_app({'SOCKETIO': True})\n"
+                 "scheduler.start()\n"
+                 "a.extensions['socketio'].run(a, host='127.0.0.1', port=int(os.environ['BENCH_PORT']), log_output=False)"],
+    "asgi": [sys.executable, "-m", "uvicorn", "asgi:create_asgi_app", "--factory", "--host", "127.0.0.1",
+             "--port", "{port}", "--log-level", "warning"],
+}
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def wait_for_port(port, timeout=30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Сервер не открыл порт {port} за {timeout} с")
+
+def prepare_db(tmpdir, params):
+    """Синтетическая БД и access-токен владельца гильдии горячего канала"""
+    path = os.path.join(tmpdir, "modes.db")
+    engine = create_engine(f"sqlite:///{path}")
+    summary = generate(engine, **params)
+    with engine.connect() as conn:
+        owner_id = conn.exec_driver_sql(
+            "SELECT guild.owner_id FROM channel JOIN guild ON guild.id = channel.guild_id WHERE channel.id = ?",
+            (summary["hot_channel_id"],)).scalar()
+    engine.dispose()
+
+    from flask import Flask
+    from flask_jwt_extended import JWTManager, create_access_token
+    from config import Config
+
+    token_app = Flask("bench")
+    token_app.config.from_object(Config)
+    JWTManager(token_app)
+    with token_app.app_context():
+        token = create_access_token(identity=str(owner_id))
+    return f"sqlite:///{path}", token, summary["hot_channel_id"]
+
+async def load(url, token, channel_id, clients, seconds, connect_timeout, rate):
+    import socketio
+
+    room = f"channel:{channel_id}"
+    connected = []
+
+    async def connect_one():
+        client = socketio.AsyncClient(reconnection=False)
+        client.history_done = asyncio.Event()
+        client.on("history", lambda data: client.history_done.set(), namespace="/chat")
+        try:
+            await client.connect(url, namespaces=["/chat"], auth={"token": token}, transports=["websocket"],
+                                 wait_timeout=connect_timeout)
+            await client.emit("join", {"room": room}, namespace="/chat")
+        except Exception:
+            return None
+        return client
+
+    started = time.perf_counter()
+    deadline = started + connect_timeout
+    while len(connected) < clients and time.perf_counter() < deadline:
+        batch = await asyncio.gather(*(connect_one() for _ in range(min(50, clients - len(connected)))))
+        ok = [c for c in batch if c is not None]
+        connected.extend(ok)
+        if not ok:
+            break
+    connect_seconds = time.perf_counter() - started
+
+    history = []
+    stop_at = time.perf_counter() + seconds
+
+    async def history_loop(client):
+        while time.perf_counter() < stop_at and client.connected:
+            client.history_done.clear()
+            sent = time.perf_counter()
+            await client.emit("history", {"channel_id": channel_id, "limit": 50}, namespace="/chat")
+            try:
+                await asyncio.wait_for(client.history_done.wait(), timeout=10)
+            except asyncio.TimeoutError:
+                continue
+            history.append(time.perf_counter() - sent)
+
+    await asyncio.gather(*(history_loop(c) for c in connected))
+    alive = sum(1 for c in connected if c.connected)
+
+    # Доставка сообщений комнаты: метка времени отправителя в тексте
+    delivery = []
+
+    def on_message(data):
+        try:
+            delivery.append(time.time() - float(data["message"]))
+        except (TypeError, ValueError, KeyError):
+            pass
+
+    for client in connected:
+        client.on("message", on_message, namespace="/chat")
+    if connected:
+        for _ in range(int(rate * 2)):
+            await connected[0].emit("message", {"room": room, "message": str(time.time())}, namespace="/chat")
+            await asyncio.sleep(1.0 / rate)
+        await asyncio.sleep(2.0)
+    await asyncio.gather(*(c.disconnect() for c in connected), return_exceptions=True)
+    return {
+        "connected": len(connected),
+        "alive": alive,
+        "connect_seconds": connect_seconds,
+        "history_rps": len(history) / seconds,
+        "history_p50_ms": percentile(history, 0.50) * 1000,
+        "history_p99_ms": percentile(history, 0.99) * 1000,
+        "delivery_p50_ms": percentile(delivery, 0.50) * 1000,
+        "delivery_p99_ms": percentile(delivery, 0.99) * 1000,
+    }
+
+def run_mode(mode, database_url, token, channel_id, clients, seconds, connect_timeout, rate):
+    port = free_port()
+    cmd = [part.format(port=port) for part in SERVERS[mode]]
+    env = dict(os.environ, DATABASE_URL=database_url, BENCH_PORT=str(port), SLOW_QUERY_MS="0")
+    server = subprocess.Popen(cmd, cwd=BACKEND, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        result = asyncio.run(load(f"http://127.0.0.1:{port}", token, channel_id, clients, seconds,
+                                  connect_timeout, rate))
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+    return dict(name=f"mode: {mode}", **result)
+
+def main():
+    params = scale_params()
+    clients = arg('--clients', 1000)
+    seconds = arg('--seconds', 10.0)
+    connect_timeout = arg('--connect-timeout', 30.0)
+    rate = arg('--rate', 20.0)
+    modes = arg('--modes', 'eventlet,asgi').split(',')
+    tmpdir = tempfile.mkdtemp()
+    try:
+        database_url, token, channel_id = prepare_db(tmpdir, params)
+        results = [run_mode(mode, database_url, token, channel_id, clients, seconds, connect_timeout, rate)
+                   for mode in modes]
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    print(f"Режимы сервера, 1 воркер: clients={clients}, seconds={seconds}, {params}")
+    header = (f"{'режим':<16}{'подкл.':>8}{'живых':>8}{'history/с':>11}{'p50, мс':>10}{'p99, мс':>10}"
+              f"{'доставка p50':>14}{'p99':>10}")
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        print(f"{r['name']:<16}{r['connected']:>8}{r['alive']:>8}{r['history_rps']:>11.0f}"
+              f"{r['history_p50_ms']:>10.1f}{r['history_p99_ms']:>10.1f}"
+              f"{r['delivery_p50_ms']:>14.1f}{r['delivery_p99_ms']:>10.1f}")
+    run_params = dict(params, clients=clients, seconds=seconds, rate=rate)
+    if '--json' in sys.argv:
+        save_results(sys.argv[sys.argv.index('--json') + 1], "modes", results, run_params)
+    if '--compare' in sys.argv:
+        compare(sys.argv[sys.argv.index('--compare') + 1], results,
+                metrics=("connected", "history_rps", "history_p99_ms", "delivery_p99_ms"))
+
+if __name__ == '__main__':
+    main()
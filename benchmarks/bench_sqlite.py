@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк SQLite под конкурентной нагрузкой: профиль по умолчанию
+(rollback journal, synchronous=FULL) против профиля sqlite_tuning
+(WAL, synchronous=NORMAL, mmap, очередь писателей).
+
+Писатели вставляют сообщения по одному с COMMIT (как отправка в чат),
+читатели читают последние 50 сообщений канала. Считаются операции в
+секунду, p99 задержки и ошибки «database is locked».
+
+Запуск: python benchmarks/bench_sqlite.py [--seconds 5] [--readers 8] [--writers 4] [--json results.json]
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from backend.sqlite_tuning import configure_sqlite, sqlite_maintenance
+
+SCHEMA = """
+CREATE TABLE message (
+    id INTEGER PRIMARY KEY,
+    channel_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    timestamp REAL NOT NULL
+)
+"""
+
+def arg(name, default):
+    if name in sys.argv:
+        return type(default)(sys.argv[sys.argv.index(name) + 1])
+    return default
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+def make_engine(path, tuned):
+    # timeout pysqlite по умолчанию 5с — тот же busy timeout, что и в профиле
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False},
+                           pool_size=32, max_overflow=0)
+    if tuned:
+        configure_sqlite(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(SCHEMA)
+        conn.exec_driver_sql("CREATE INDEX ix_message_channel ON message (channel_id, id)")
+        conn.execute(text("INSERT INTO message (channel_id, user_id, content, timestamp) "
+                          "VALUES (:c, :u, :t, :ts)"),
+                     [{"c": i % 10, "u": i % 100, "t": f"сообщение {i}", "ts": time.time()} for i in range(20000)])
+    return engine
+
+def run_profile(name, tuned, seconds, readers, writers):
+    tmpdir = tempfile.mkdtemp()
+    engine = make_engine(os.path.join(tmpdir, 'bench.db'), tuned)
+    stop = threading.Event()
+    lock = threading.Lock()
+    stats = {"reads": [], "writes": [], "errors": 0}
+
+    def writer(n):
+        latencies, errors, i = [], 0, 0
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                with engine.begin() as conn:
+                    conn.execute(text("INSERT INTO message (channel_id, user_id, content, timestamp) "
+                                      "VALUES (:c, :u, :t, :ts)"),
+                                 {"c": i % 10, "u": n, "t": "новое сообщение", "ts": time.time()})
+                latencies.append(time.perf_counter() - started)
+            except OperationalError:
+                errors += 1
+            i += 1
+        with lock:
+            stats["writes"].extend(latencies)
+            stats["errors"] += errors
+
+    def reader(n):
+        latencies, errors = [], 0
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text("SELECT id, user_id, content FROM message WHERE channel_id = :c "
+                                      "ORDER BY id DESC LIMIT 50"), {"c": n % 10}).all()
+                latencies.append(time.perf_counter() - started)
+            except OperationalError:
+                errors += 1
+        with lock:
+            stats["reads"].extend(latencies)
+            stats["errors"] += errors
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    threads += [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    if tuned:
+        sqlite_maintenance(engine)
+    engine.dispose()
+    shutil.rmtree(tmpdir, ignore_errors=True)
+    return {
+        "profile": name,
+        "reads_per_sec": len(stats["reads"]) / seconds,
+        "writes_per_sec": len(stats["writes"]) / seconds,
+        "read_p99_ms": percentile(stats["reads"], 0.99) * 1000,
+        "write_p99_ms": percentile(stats["writes"], 0.99) * 1000,
+        "locked_errors": stats["errors"],
+    }
+
+def main():
+    seconds = arg('--seconds', 5.0)
+    readers = arg('--readers', 8)
+    writers = arg('--writers', 4)
+    results = [run_profile(name, tuned, seconds, readers, writers)
+               for name, tuned in (("default", False), ("tuned", True))]
+    print(f"SQLite: {readers} читателей, {writers} писателей, {seconds:.0f} с на профиль")
+    header = f"{'профиль':<10}{'чтений/с':>12}{'записей/с':>12}{'p99 чт, мс':>13}{'p99 зап, мс':>13}{'locked':>8}"
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        print(f"{r['profile']:<10}{r['reads_per_sec']:>12.0f}{r['writes_per_sec']:>12.0f}"
+              f"{r['read_p99_ms']:>13.2f}{r['write_p99_ms']:>13.2f}{r['locked_errors']:>8}")
+    if '--json' in sys.argv:
+        path = sys.argv[sys.argv.index('--json') + 1]
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\nРезультаты сохранены в {path}")
+
+if __name__ == '__main__':
+    main()
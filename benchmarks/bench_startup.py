@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Время холодного старта бэкенда: каждый замер — новый процесс интерпретатора
+(как при загрузке воркера или запуске тестов).
+
+- import app — импорт модуля app.py;
+- create_app — импорт и фабрика приложения (TESTING, без фоновых задач);
+- first request — то же плюс первый GET / через тестовый клиент;
+- import heavy — сколько модулей из HEAVY_MODULES загружено после create_app.
+
+--importtime печатает самые медленные импорты (python -X importtime) для
+create_app — с чего начинать, если старт снова замедлился.
+
+Запуск: python benchmarks/bench_startup.py [--number 10] [--importtime]
+        [--json startup.json] [--compare baseline.json]
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from benchutil import arg, summarize, save_results, compare
+
+BACKEND = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+# Модули, которые не должны загружаться при старте, а только по требованию
+HEAVY_MODULES = ("flask_migrate", "alembic", "flask_socketio", "argon2", "bcrypt", "transfer")
+
+STAGES = {
+    "import app": "import app",
+    "create_app": "import app; app.create_app({'TESTING': True})",
+    "first request": "import app; app.create_app({'TESTING': True}).test_client().get('/')",
+}
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+def child_env():
+    env = dict(os.environ)
+    # БД в памяти: замеряется старт, а не подключение к серверу БД
+    env.setdefault("DATABASE_URL", "sqlite://")
+    return env
+
+def run_stage(code, extra_args=()):
+    out = subprocess.run([sys.executable, *extra_args, "-c", CHILD.format(code=code, heavy=HEAVY_MODULES)],
+                         cwd=BACKEND, env=child_env(), capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1]), out.stderr
+
+def measure(number):
+    results = []
+    heavy = []
+    for name, code in STAGES.items():
+        run_stage(code)  # прогрев: .pyc и файловый кэш ОС
+        latencies = []
+        for _ in range(number):
+            sample, _ = run_stage(code)
+            latencies.append(sample["seconds"])
+            heavy = sample["heavy"] if name == "create_app" else heavy
+        row = summarize(latencies)
+        results.append({"name": f"startup: {name}", "mean_ms": row["mean_us"] / 1000,
+                        "p50_ms": row["p50_us"] / 1000, "p99_ms": row["p99_us"] / 1000})
+    return results, heavy
+
+def importtime(top=15):
+    """Самые медленные импорты create_app по собственному времени модуля"""
+    _, stderr = run_stage(STAGES["create_app"], ("-X", "importtime"))
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = [part.strip() for part in line[len("import time:"):].split("|")]
+        rows.append((int(self_us), int(cumulative_us), module))
+    print(f"\n{'модуль':<50}{'свое, мс':>12}{'всего, мс':>12}")
+    for self_us, cumulative_us, module in sorted(rows, reverse=True)[:top]:
+        print(f"{module.strip():<50}{self_us / 1000:>12.1f}{cumulative_us / 1000:>12.1f}")
+
+def main():
+    number = arg('--number', 10)
+    params = {"number": number, "database_url": child_env()["DATABASE_URL"]}
+    results, heavy = measure(number)
+    print(f"Холодный старт: {params}")
+    header = f"{'этап':<30}{'среднее, мс':>14}{'p50, мс':>12}{'p99, мс':>12}"
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        print(f"{r['name']:<30}{r['mean_ms']:>14.1f}{r['p50_ms']:>12.1f}{r['p99_ms']:>12.1f}")
+    print(f"\nТяжелые модули после create_app: {', '.join(heavy) or 'нет'}")
+    if '--importtime' in sys.argv:
+        importtime()
+    if '--json' in sys.argv:
+        save_results(sys.argv[sys.argv.index('--json') + 1], "startup", results, dict(params, heavy=heavy))
+    if '--compare' in sys.argv:
+        compare(sys.argv[sys.argv.index('--compare') + 1], results, metrics=("mean_ms", "p50_ms", "p99_ms"))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк форматов сокет-событий /chat: JSON против MessagePack,
+с permessage-deflate и без. Сравнивает байты на проводе и CPU на
+кодирование/декодирование для типичной смеси событий.
+
+Запуск: python benchmarks/bench_wire.py [--json results.json]
+"""
+
+import json
+import os
+import random
+import sys
+import timeit
+import zlib
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from backend.wire import packb, unpackb, pack_rows
+
+HISTORY_COLUMNS = ("id", "user_id", "username", "content", "timestamp", "pinned")
+
+def make_events(seed=42):
+    """Типичная смесь событий: сообщение, страница истории, diff присутствия, набор текста"""
+    rnd = random.Random(seed)
+    words = ['привет', 'как', 'дела', 'ok', 'сегодня', 'релиз', 'тест', 'lol', 'созвон', 'в', '15:00']
+    start = datetime(2025, 9, 1, 12, 0, 0)
+    history = [{
+        "id": 100000 + i,
+        "user_id": rnd.randint(1, 500),
+        "username": f"user{rnd.randint(1, 500)}",
+        "content": ' '.join(rnd.choice(words) for _ in range(rnd.randint(3, 20))),
+        "timestamp": (start + timedelta(seconds=17 * i)).isoformat(),
+        "pinned": False,
+    } for i in range(50)]
+    users = list(range(1, 10001))
+    rnd.shuffle(users)
+    presence = {"guild_id": 7, "online": users[:600], "idle": users[600:800], "offline": users[800:1000]}
+    return {
+        "message": {"room": "channel:12", "user_id": 42, "message": history[0]["content"]},
+        "history (dicts)": {"channel_id": 12, "messages": history},
+        "history (columns)": dict(pack_rows(history, HISTORY_COLUMNS), channel_id=12),
+        "presence_update": presence,
+        "typing": {"channel_id": 12, "users": [42, 43]},
+    }
+
+def json_encode(data):
+    # Так же, как сериализует python-socketio
+    return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+def json_decode(raw):
+    return json.loads(raw)
+
+def deflate(raw):
+    # permessage-deflate: raw deflate без заголовка zlib
+    compressor = zlib.compressobj(wbits=-15)
+    return compressor.compress(raw) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+def measure(fn, arg, number):
+    return min(timeit.repeat(lambda: fn(arg), number=number, repeat=3)) / number * 1e6
+
+def run(number=200):
+    results = []
+    for name, data in make_events().items():
+        as_json = json_encode(data)
+        as_msgpack = packb(data)
+        assert unpackb(as_msgpack) == json_decode(as_json)
+        results.append({
+            "event": name,
+            "json_bytes": len(as_json),
+            "msgpack_bytes": len(as_msgpack),
+            "json_deflate_bytes": len(deflate(as_json)),
+            "msgpack_deflate_bytes": len(deflate(as_msgpack)),
+            "json_encode_us": measure(json_encode, data, number),
+            "json_decode_us": measure(json_decode, as_json, number),
+            "msgpack_encode_us": measure(packb, data, number),
+            "msgpack_decode_us": measure(unpackb, as_msgpack, number),
+        })
+    return results
+
+def print_table(results):
+    header = f"{'событие':<20}{'json':>8}{'mpack':>8}{'json+df':>9}{'mpack+df':>10}" \
+             f"{'json enc/dec, мкс':>22}{'mpack enc/dec, мкс':>22}"
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        print(f"{r['event']:<20}{r['json_bytes']:>8}{r['msgpack_bytes']:>8}"
+              f"{r['json_deflate_bytes']:>9}{r['msgpack_deflate_bytes']:>10}"
+              f"{r['json_encode_us']:>11.1f}/{r['json_decode_us']:<10.1f}"
+              f"{r['msgpack_encode_us']:>11.1f}/{r['msgpack_decode_us']:<10.1f}")
+
+def main():
+    results = run()
+    print_table(results)
+    if '--json' in sys.argv:
+        path = sys.argv[sys.argv.index('--json') + 1]
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\nРезультаты сохранены в {path}")
+
+if __name__ == '__main__':
+    main()
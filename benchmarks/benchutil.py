@@ -0,0 +1,96 @@
+"""
+Общие функции бенчмарков: аргументы командной строки, перцентили,
+сохранение результатов в JSON с метаданными и сравнение двух прогонов.
+
+Формат файла результатов:
+    {"meta": {"benchmark", "commit", "python", "platform", "started_at", "params"},
+     "results": [{"name": ..., <метрики>}, ...]}
+"""
+
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+def arg(name, default):
+    if name in sys.argv:
+        return type(default)(sys.argv[sys.argv.index(name) + 1])
+    return default
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+def summarize(latencies, elapsed=None):
+    """Сводка по задержкам в секундах: операций/с, среднее, p50, p99 (мкс)"""
+    total = elapsed if elapsed is not None else sum(latencies)
+    return {
+        "ops": len(latencies),
+        "ops_per_sec": len(latencies) / total if total else 0.0,
+        "mean_us": sum(latencies) / len(latencies) * 1e6 if latencies else 0.0,
+        "p50_us": percentile(latencies, 0.50) * 1e6,
+        "p99_us": percentile(latencies, 0.99) * 1e6,
+    }
+
+def timed(fn, number, warmup=10):
+    """Вызвать fn number раз, вернуть задержки каждого вызова (с)"""
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    for _ in range(number):
+        started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+def git_commit():
+    root = os.path.join(os.path.dirname(__file__), '..')
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=root,
+                             capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def save_results(path, benchmark, results, params=None):
+    data = {
+        "meta": {
+            "benchmark": benchmark,
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "started_at": datetime.utcnow().isoformat(timespec="seconds"),
+            "params": params or {},
+        },
+        "results": results,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    print(f"\nРезультаты сохранены в {path}")
+
+def compare(baseline_path, results, metrics=("ops_per_sec", "p50_us", "p99_us")):
+    """Напечатать изменение метрик относительно сохраненного прогона"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    old = {r["name"]: r for r in baseline["results"]}
+    print(f"\nСравнение с {baseline_path} (коммит {baseline['meta'].get('commit')})")
+    header = f"{'бенчмарк':<44}" + "".join(f"{m:>16}" for m in metrics)
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        before = old.get(r["name"])
+        if before is None:
+            continue
+        cells = []
+        for m in metrics:
+            if not before.get(m):
+                cells.append(f"{'—':>16}")
+                continue
+            delta = (r[m] - before[m]) / before[m] * 100
+            cells.append(f"{delta:>+15.1f}%")
+        print(f"{r['name']:<44}" + "".join(cells))
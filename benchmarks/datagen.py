@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Генератор синтетических данных для бенчмарков и нагрузочных тестов:
+пользователи, гильдии, каналы и сообщения в заданном масштабе.
+
+Распределение приближено к реальному: активность каналов и авторов
+неравномерна (небольшая доля каналов получает большую часть сообщений),
+сообщения идут по времени, id — snowflake, соответствующие времени.
+Генерация детерминирована для данного seed.
+
+Запуск: python benchmarks/datagen.py --db bench.db [--scale small|medium|large]
+        [--users N] [--guilds N] [--channels N] [--messages N] [--seed N]
+"""
+
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from sqlalchemy import create_engine
+
+from benchutil import arg
+
+# channels — каналов на гильдию
+SCALES = {
+    "small": {"users": 200, "guilds": 10, "channels": 5, "messages": 20000},
+    "medium": {"users": 5000, "guilds": 200, "channels": 10, "messages": 500000},
+    "large": {"users": 50000, "guilds": 2000, "channels": 20, "messages": 5000000},
+}
+
+WORDS = ['привет', 'как', 'дела', 'ok', 'сегодня', 'релиз', 'тест', 'lol', 'созвон', 'в', '15:00',
+         'ревью', 'деплой', 'баг', 'починил', 'спасибо', 'завтра', 'норм']
+
+# Пароль сгенерированных пользователей: не совпадает ни с одним хешем (вход невозможен)
+NO_PASSWORD = "!"
+
+def _skewed(rnd, n):
+    """Индекс 0..n-1 с тяжелым хвостом: первые элементы выбираются чаще"""
+    return int(rnd.paretovariate(1.16)) % n if n else 0
+
+def generate(engine, users, guilds, channels, messages, seed=42, days=30, batch=5000, verbose=False):
+    """Заполнить пустую БД. Возвращает сводку: число строк и id для бенчмарков.
+
+    channels — каналов на гильдию. Сообщения равномерно распределены по
+    последним days дням.
+    """
+    from models import db as models_db, User, Guild, Channel, Message
+    from snowflake import SnowflakeGenerator
+
+    rnd = random.Random(seed)
+    models_db.metadata.create_all(engine)
+    started = time.perf_counter()
+    channel_ids = []
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {"id": i, "username": f"user{i}", "password": NO_PASSWORD} for i in range(1, users + 1)])
+        conn.execute(Guild.__table__.insert(), [
+            {"id": g, "name": f"guild{g}", "owner_id": rnd.randint(1, users)} for g in range(1, guilds + 1)])
+        rows = []
+        for g in range(1, guilds + 1):
+            for position in range(channels):
+                channel_ids.append(len(channel_ids) + 1)
+                rows.append({"id": channel_ids[-1], "name": f"c{position}", "guild_id": g,
+                             "type": "text", "position": position, "read_only": False})
+        conn.execute(Channel.__table__.insert(), rows)
+
+    # Горячие каналы и авторы — случайные, а не первые по id
+    hot_channels = channel_ids[:]
+    rnd.shuffle(hot_channels)
+    authors = list(range(1, users + 1))
+    rnd.shuffle(authors)
+
+    start = datetime.utcnow() - timedelta(days=days)
+    step = days * 86400 / max(messages, 1)
+    clock_now = [0.0]
+    ids = SnowflakeGenerator(0, clock=lambda: clock_now[0])
+    epoch = datetime(1970, 1, 1)
+    for offset in range(0, messages, batch):
+        rows = []
+        for i in range(offset, min(offset + batch, messages)):
+            moment = start + timedelta(seconds=i * step)
+            clock_now[0] = (moment - epoch).total_seconds()
+            text = ' '.join(rnd.choice(WORDS) for _ in range(rnd.randint(2, 25)))
+            if rnd.random() < 0.05:
+                text = f"@user{rnd.randint(1, users)} {text}"
+            rows.append({"id": ids.next_id(), "content": text, "timestamp": moment, "pinned": False,
+                         "user_id": authors[_skewed(rnd, users)],
+                         "channel_id": hot_channels[_skewed(rnd, len(hot_channels))]})
+        with engine.begin() as conn:
+            conn.execute(Message.__table__.insert(), rows)
+        if verbose:
+            print(f"[datagen] сообщений: {offset + len(rows)}/{messages}")
+    return {
+        "users": users, "guilds": guilds, "channels": len(channel_ids), "messages": messages,
+        "hot_channel_id": hot_channels[0], "seconds": time.perf_counter() - started,
+    }
+
+def scale_params(default_scale="small"):
+    """Параметры масштаба из --scale и переопределения отдельных значений"""
+    params = dict(SCALES[arg('--scale', default_scale)])
+    for key in params:
+        params[key] = arg(f'--{key}', params[key])
+    return params
+
+def main():
+    path = arg('--db', 'bench.db')
+    if os.path.exists(path):
+        print(f"{path} уже существует, генератор заполняет только пустую БД")
+        sys.exit(1)
+    params = scale_params()
+    engine = create_engine(f"sqlite:///{path}")
+    summary = generate(engine, seed=arg('--seed', 42), verbose=True, **params)
+    engine.dispose()
+    print(f"[datagen] {summary['users']} пользователей, {summary['guilds']} гильдий, "
+          f"{summary['channels']} каналов, {summary['messages']} сообщений за {summary['seconds']:.1f} с")
+
+if __name__ == '__main__':
+    main()
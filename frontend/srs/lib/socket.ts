@@ -1,17 +1,44 @@
 import { io, Socket } from 'socket.io-client'
+import { decode } from '@msgpack/msgpack'
 
 let chatSocket: Socket | null = null
 let rtcSocket: Socket | null = null
 
-export function initSockets(userId:string){
+// binary: сервер шлет события /chat в MessagePack вместо JSON (меньше байт на историю и presence)
+let chatBinary = false
+
+// Сервер аутентифицирует сокет один раз при подключении по access-токену
+export function initSockets(token:string, opts:{ binary?: boolean } = {}){
   if(!chatSocket){
-    chatSocket = io('/chat', { auth: { userId }, transports: ['websocket'] })
+    chatBinary = !!opts.binary
+    chatSocket = io('/chat', {
+      auth: { token, format: chatBinary ? 'msgpack' : 'json' },
+      transports: ['websocket']
+    })
   }
   if(!rtcSocket){
-    rtcSocket = io('/rtc', { auth: { userId }, transports: ['websocket'] })
+    rtcSocket = io('/rtc', { auth: { token }, transports: ['websocket'] })
   }
   return { chatSocket, rtcSocket }
 }
 
+// Декодирует полезную нагрузку независимо от выбранного формата
+export function decodePayload<T = any>(payload:any): T {
+  if(payload instanceof ArrayBuffer || ArrayBuffer.isView(payload)){
+    return decode(payload as ArrayBuffer) as T
+  }
+  return payload as T
+}
+
+// Разворачивает колоночную историю {columns, rows} в массив объектов
+export function unpackRows<T = any>(packed:{ columns:string[], rows:any[][] }): T[] {
+  return packed.rows.map(row => Object.fromEntries(packed.columns.map((c, i) => [c, row[i]])) as T)
+}
+
+export function onChat<T = any>(event:string, handler:(data:T)=>void){
+  chatSocket?.on(event, (payload:any) => handler(decodePayload<T>(payload)))
+}
+
+export function isChatBinary(){ return chatBinary }
 export function getChatSocket(){ return chatSocket }
 export function getRTCsocket(){ return rtcSocket }
@@ -14,7 +14,7 @@ export default function ChatPage({ user }:{user:any}){
     async function init(){
       const s = await listServers(String(user.id))
       setServers(s)
-      initSockets(String(user.id))
+      initSockets(localStorage.getItem('access_token') || '')
       const socket = getChatSocket()
       socket?.on('message:new', (m:any)=>{
         if(m.channel_id === activeChannel) setMessages(prev => [...prev, m])
@@ -0,0 +1,50 @@
+"""
+Общая основа тестов, которым нужна своя SQLite БД.
+
+Импорты — как в коде backend/ (from models import ...), поэтому тест и
+сервисные модули работают с одним SessionLocal.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from sqlalchemy import create_engine
+from models import db as models_db, SessionLocal
+
+class DatabaseTestCase(unittest.TestCase):
+    """Временная файловая SQLite БД со схемой models, к которой привязан SessionLocal.
+
+    tearDown возвращает SessionLocal прежнюю привязку, так что следующий тест
+    не пишет в удаленный файл.
+    """
+
+    database_name = 'test.db'
+
+    def make_engine(self, name):
+        return create_engine(f"sqlite:///{os.path.join(self.tmpdir, name)}",
+                             connect_args={"timeout": 30, "check_same_thread": False})
+
+    def create_database(self, name):
+        """Еще одна БД со схемой models в каталоге теста; закрывается после теста"""
+        engine = self.make_engine(name)
+        models_db.metadata.create_all(engine)
+        self.addCleanup(engine.dispose)
+        return engine
+
+    def setUp(self):
+        """Настройка перед каждым тестом: отдельная БД для SessionLocal"""
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir, ignore_errors=True)
+        self.database_url = f"sqlite:///{os.path.join(self.tmpdir, self.database_name)}"
+        self.engine = self.create_database(self.database_name)
+        self._original_bind = SessionLocal.kw.get("bind")
+        SessionLocal.configure(bind=self.engine)
+
+    def tearDown(self):
+        """Очистка после каждого теста"""
+        SessionLocal.configure(bind=self._original_bind)
@@ -25,11 +25,64 @@ def run_backend_tests():
     from test_messages import TestMessages
     from test_guilds import TestGuilds
     from test_integration import TestIntegration
+    from test_polls import TestPolls
+    from test_scheduler import TestScheduler
+    from test_ratelimit import TestRateLimit
+    from test_passwords import TestPasswords
+    from test_tokens import TestTokens, TestAuthRoutes
+    from test_presence import TestPresence
+    from test_socket_sessions import TestSocketSessions
+    from test_fanout import TestFanout
+    from test_wire import TestWire
+    from test_read_state import TestReadState
+    from test_dm_inbox import TestDMInbox
+    from test_query_budgets import TestQueryBudgets
+    from test_sqlite_tuning import TestSqliteTuning
+    from test_indexes import TestIndexes
+    from test_replicas import TestReplicas
+    from test_archive import TestArchive
+    from test_snowflake import TestSnowflake, TestSnowflakeMessages
+    from test_transfer import TestTransfer
+    from test_metrics import TestMetrics
+    from test_slow_queries import TestSlowQueries
+    from test_app_factory import TestAppFactory
+    from test_async_db import TestAsyncDB, TestAsgiSocket
+    from test_shared_state import TestSharedState
+    from test_invites import TestInvites
+    from test_socket_server import TestSocketServer
     
     backend_suite.addTest(unittest.makeSuite(TestAuth))
     backend_suite.addTest(unittest.makeSuite(TestMessages))
     backend_suite.addTest(unittest.makeSuite(TestGuilds))
     backend_suite.addTest(unittest.makeSuite(TestIntegration))
+    backend_suite.addTest(unittest.makeSuite(TestPolls))
+    backend_suite.addTest(unittest.makeSuite(TestScheduler))
+    backend_suite.addTest(unittest.makeSuite(TestRateLimit))
+    backend_suite.addTest(unittest.makeSuite(TestPasswords))
+    backend_suite.addTest(unittest.makeSuite(TestTokens))
+    backend_suite.addTest(unittest.makeSuite(TestAuthRoutes))
+    backend_suite.addTest(unittest.makeSuite(TestPresence))
+    backend_suite.addTest(unittest.makeSuite(TestSocketSessions))
+    backend_suite.addTest(unittest.makeSuite(TestFanout))
+    backend_suite.addTest(unittest.makeSuite(TestWire))
+    backend_suite.addTest(unittest.makeSuite(TestReadState))
+    backend_suite.addTest(unittest.makeSuite(TestDMInbox))
+    backend_suite.addTest(unittest.makeSuite(TestQueryBudgets))
+    backend_suite.addTest(unittest.makeSuite(TestSqliteTuning))
+    backend_suite.addTest(unittest.makeSuite(TestIndexes))
+    backend_suite.addTest(unittest.makeSuite(TestReplicas))
+    backend_suite.addTest(unittest.makeSuite(TestArchive))
+    backend_suite.addTest(unittest.makeSuite(TestSnowflake))
+    backend_suite.addTest(unittest.makeSuite(TestSnowflakeMessages))
+    backend_suite.addTest(unittest.makeSuite(TestTransfer))
+    backend_suite.addTest(unittest.makeSuite(TestMetrics))
+    backend_suite.addTest(unittest.makeSuite(TestSlowQueries))
+    backend_suite.addTest(unittest.makeSuite(TestAppFactory))
+    backend_suite.addTest(unittest.makeSuite(TestAsyncDB))
+    backend_suite.addTest(unittest.makeSuite(TestAsgiSocket))
+    backend_suite.addTest(unittest.makeSuite(TestSharedState))
+    backend_suite.addTest(unittest.makeSuite(TestInvites))
+    backend_suite.addTest(unittest.makeSuite(TestSocketServer))
     
     # Запускаем тесты
     runner = unittest.TextTestRunner(verbosity=2)
@@ -0,0 +1,79 @@
+import unittest
+import sys
+import os
+import json
+import subprocess
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from tests.db_case import DatabaseTestCase
+import models
+from app import create_app
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+def loaded_modules(code, modules):
+    """Какие из modules загружены после code в новом интерпретаторе"""
+    script = f"import json, sys\n{code}\nprint(json.dumps([m for m in {modules!r} if m in sys.modules]))"
+    env = dict(os.environ, DATABASE_URL="sqlite://")
+    out = subprocess.run([sys.executable, "-c", script], cwd=BACKEND, env=env,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+class TestAppFactory(DatabaseTestCase):
+
+    def setUp(self):
+        """Настройка перед каждым тестом: своя БД приложения, отдельная от БД SessionLocal"""
+        super().setUp()
+        self.config = {
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(self.tmpdir, 'app.db')}",
+        }
+
+    def test_routes_registered(self):
+        """Тест: фабрика подключает блюпринт API и служебные маршруты"""
+        app = create_app(self.config)
+        rules = {rule.rule for rule in app.url_map.iter_rules()}
+        for path in ('/', '/api/login', '/api/auth/login', '/api/auth/logout',
+                     '/api/messages/<int:chat_id>', '/metrics'):
+            self.assertIn(path, rules)
+        response = app.test_client().get('/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_apps_are_independent(self):
+        """Тест: каждое приложение получает свою конфигурацию"""
+        first = create_app(dict(self.config, SECRET_KEY='first'))
+        second = create_app(dict(self.config, SECRET_KEY='second', BLUEPRINTS=()))
+        self.assertEqual(first.config['SECRET_KEY'], 'first')
+        self.assertEqual(second.config['SECRET_KEY'], 'second')
+        self.assertNotIn('api', second.blueprints)
+
+    def test_config_database_reaches_sessions(self):
+        """Тест: SQLALCHEMY_DATABASE_URI из config — одна БД для Flask-SQLAlchemy и SessionLocal"""
+        app = create_app(self.config)
+        url = self.config['SQLALCHEMY_DATABASE_URI']
+        session = models.SessionLocal()
+        self.assertEqual(str(session.get_bind().url), url)
+        session.close()
+        with app.app_context():
+            self.assertEqual(str(models.db.engine.url), url)
+
+    def test_sockets_use_flat_modules(self):
+        """Тест: обработчики /chat работают с теми же модулями, что и остальной код"""
+        loaded = loaded_modules("import app; app.create_app({'TESTING': True, 'SOCKETIO': True})",
+                                ("sockets.events", "backend.sockets.events", "backend.extensions", "backend.scheduler"))
+        self.assertEqual(loaded, ["sockets.events"])
+
+    def test_import_is_lazy(self):
+        """Тест: импорт app.py не тянет модели и маршруты"""
+        loaded = loaded_modules("import app", ("models", "views", "flask_sqlalchemy", "metrics"))
+        self.assertEqual(loaded, [])
+
+    def test_heavy_imports_deferred(self):
+        """Тест: миграции, Socket.IO, хеширование и экспорт не загружаются при старте"""
+        loaded = loaded_modules("import app; app.create_app({'TESTING': True})",
+                                ("flask_migrate", "alembic", "flask_socketio", "argon2", "bcrypt", "transfer"))
+        self.assertEqual(loaded, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import unittest
+import sys
+import os
+from datetime import datetime, timedelta
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from tests.db_case import DatabaseTestCase
+from models import SessionLocal, User, Guild, Channel, Message, MessageArchive
+from archive import archive_messages, encode_segment, decode_segment
+from messages import get_messages, get_messages_count, edit_message, pin_message
+
+class TestArchive(DatabaseTestCase):
+
+    def setUp(self):
+        """Настройка перед каждым тестом: канал с историей за три месяца"""
+        super().setUp()
+        db = SessionLocal()
+        user = User(username="alice", password="x")
+        db.add(user)
+        db.flush()
+        guild = Guild(name="Гильдия", owner_id=user.id)
+        db.add(guild)
+        db.flush()
+        channel = Channel(name="general", guild_id=guild.id)
+        db.add(channel)
+        db.flush()
+        start = datetime(2025, 1, 20)
+        db.add_all([Message(channel_id=channel.id, user_id=user.id, content=f"сообщение {i}",
+                            timestamp=start + timedelta(hours=12 * i), pinned=False) for i in range(150)])
+        db.commit()
+        self.channel_id = channel.id
+        db.close()
+        # Все, что раньше 1 марта, уходит в архив
+        self.cutoff = datetime(2025, 3, 1)
+
+    def _contents(self, msgs):
+        return [m.content for m in msgs]
+
+    def test_archive_moves_old_messages_by_month(self):
+        """Тест: старые сообщения уходят в сегменты по месяцам и не больше segment_size"""
+        before = self._contents(get_messages(self.channel_id, limit=200))
+        archived = archive_messages(older_than=self.cutoff, segment_size=20)
+        db = SessionLocal()
+        hot = db.query(Message).count()
+        segments = db.query(MessageArchive).order_by(MessageArchive.first_id).all()
+        db.close()
+        self.assertEqual(archived + hot, 150)
+        self.assertTrue(all(s.count <= 20 for s in segments))
+        self.assertEqual({s.period for s in segments}, {"2025-01", "2025-02"})
+        self.assertEqual(get_messages_count(self.channel_id), 150)
+        self.assertEqual(self._contents(get_messages(self.channel_id, limit=200)), before)
+
+    def test_pagination_across_tiers(self):
+        """Тест: страницы истории непрерывны на границе горячей таблицы и архива"""
+        expected = self._contents(get_messages(self.channel_id, limit=200))
+        archive_messages(older_than=self.cutoff, segment_size=20)
+        pages = []
+        for offset in range(0, 150, 25):
+            page = get_messages(self.channel_id, limit=25, offset=offset)
+            self.assertEqual(len(page), 25)
+            pages.extend(page)
+        self.assertEqual(self._contents(pages), expected)
+        self.assertEqual(pages[-1].user.username, "alice")
+
+    def test_pagination_with_pins_older_than_archive(self):
+        """Тест: закрепленные сообщения старше архива стоят на своих местах при любой пагинации"""
+        history = get_messages(self.channel_id, limit=200)
+        # Самое старое и два февральских: остаются в горячей таблице среди архивных
+        for offset in (149, 120, 100):
+            pin_message(self.channel_id, history[offset].id)
+        expected = self._contents(history)
+        archive_messages(older_than=self.cutoff, segment_size=20)
+        for size in (7, 25):
+            pages = []
+            for offset in range(0, 150, size):
+                pages.extend(get_messages(self.channel_id, limit=size, offset=offset))
+            self.assertEqual(self._contents(pages), expected)
+        pages, before = [], None
+        while True:
+            page = get_messages(self.channel_id, limit=25, before=before)
+            if not page:
+                break
+            pages.extend(page)
+            before = page[-1].id
+        self.assertEqual(self._contents(pages), expected)
+        self.assertTrue(pages[-1].pinned)
+        self.assertEqual(get_messages(self.channel_id, limit=10, offset=150), [])
+
+    def test_archived_messages_are_read_only_and_pins_stay_hot(self):
+        """Тест: закрепленные сообщения не архивируются, архивные нельзя изменить"""
+        oldest = get_messages(self.channel_id, limit=1, offset=149)[0]
+        second = get_messages(self.channel_id, limit=1, offset=148)[0]
+        pin_message(self.channel_id, second.id)
+        archive_messages(older_than=self.cutoff)
+        self.assertFalse(edit_message(self.channel_id, oldest.id, "новый текст"))
+        db = SessionLocal()
+        self.assertIsNotNone(db.query(Message).filter_by(id=second.id).first())
+        db.close()
+
+    def test_segment_is_compressed(self):
+        """Тест: сегмент сжимается и восстанавливается без потерь"""
+        rows = [{"id": i, "user_id": 1, "content": "одинаковый текст сообщения",
+                 "timestamp": datetime(2025, 1, 1, 12, i % 60).isoformat(), "pinned": False}
+                for i in range(1000)]
+        payload = encode_segment(rows)
+        self.assertLess(len(payload), sum(len(r["content"].encode()) for r in rows) / 5)
+        decoded = decode_segment(payload)
+        self.assertEqual(decoded[5]["content"], rows[5]["content"])
+        self.assertEqual(decoded[5]["timestamp"], datetime(2025, 1, 1, 12, 5))
+
+if __name__ == '__main__':
+    unittest.main()
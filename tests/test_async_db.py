@@ -0,0 +1,165 @@
+import asyncio
+import unittest
+import sys
+import os
+from unittest import mock
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from tests.db_case import DatabaseTestCase
+import models
+from models import SessionLocal, User, Guild, Channel, GuildMember
+from async_db import async_url, init_async_db, run_session, dispose_async_db
+from messages import create_message_async, get_messages_async, get_messages, history_rows, create_message
+from emojis_stickers_polls import create_poll, _expire_poll
+from socket_sessions import authorized_rooms, socket_sessions
+from presence import PresenceTracker, guild_presence, ONLINE
+from wire import JSON
+
+class TestAsyncDB(DatabaseTestCase, unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        """Настройка перед каждым тестом: одна БД для синхронных и асинхронных сессий"""
+        super().setUp()
+        db = SessionLocal()
+        user = User(username="alice", password="x")
+        db.add(user)
+        db.flush()
+        guild = Guild(name="Гильдия", owner_id=user.id)
+        db.add(guild)
+        db.flush()
+        channel = Channel(name="general", guild_id=guild.id)
+        db.add(channel)
+        db.commit()
+        self.user_id, self.guild_id, self.channel_id = user.id, guild.id, channel.id
+        db.close()
+        init_async_db(self.database_url)
+
+    async def asyncTearDown(self):
+        await dispose_async_db()
+
+    def test_async_url(self):
+        """Тест: URL основной БД переводится на асинхронный драйвер"""
+        self.assertEqual(async_url("sqlite:///x.db").drivername, "sqlite+aiosqlite")
+        self.assertEqual(async_url("postgresql+psycopg2://u:p@h/db").drivername, "postgresql+psycopg")
+        self.assertEqual(async_url("postgresql+asyncpg://u:p@h/db").drivername, "postgresql+asyncpg")
+        with self.assertRaises(ValueError):
+            async_url("mysql://u:p@h/db")
+
+    async def test_messages_shared_with_sync(self):
+        """Тест: асинхронные создание и история видны синхронному коду и наоборот"""
+        for i in range(3):
+            message = await create_message_async(self.channel_id, "alice", f"сообщение {i}")
+            self.assertIsNotNone(message)
+        self.assertIsNone(await create_message_async(self.channel_id, "nobody", "текст"))
+        msgs = await get_messages_async(self.channel_id, limit=2)
+        self.assertEqual([m.content for m in msgs], ["сообщение 2", "сообщение 1"])
+        self.assertEqual([m.id for m in msgs], [m.id for m in get_messages(self.channel_id, limit=2)])
+        rows = history_rows(msgs)
+        self.assertEqual(rows[0]["username"], "alice")
+        self.assertIsInstance(rows[0]["id"], str)
+
+    async def test_authorized_rooms(self):
+        """Тест: права комнат сокета загружаются через асинхронную сессию"""
+        rooms = await run_session(authorized_rooms, self.user_id)
+        self.assertEqual(rooms, {f"guild:{self.guild_id}", f"channel:{self.channel_id}"})
+
+    async def test_guild_presence_loaded_on_connect(self):
+        """Тест: при подключении гильдия загружается в трекер присутствия со всеми участниками"""
+        db = SessionLocal()
+        bob = User(username="bob", password="x")
+        db.add(bob)
+        db.flush()
+        db.add(GuildMember(guild_id=self.guild_id, user_id=bob.id))
+        db.commit()
+        bob_id = bob.id
+        db.close()
+        tracker = PresenceTracker()
+        rooms = await run_session(authorized_rooms, self.user_id)
+        await run_session(guild_presence, self.user_id, rooms, tracker)
+        self.assertTrue(tracker.tracks_guild(self.guild_id))
+        # Участник, еще не подключавшийся, уже в гильдии: его статус попадет в рассылку
+        tracker.connect("bob-sid", bob_id)
+        self.assertEqual(tracker.snapshot(self.guild_id)[ONLINE], [bob_id])
+
+class TestAsgiSocket(DatabaseTestCase, unittest.IsolatedAsyncioTestCase):
+    """Обработчики /chat режима asyncio (asgi.py), вызванные напрямую по sid"""
+
+    def setUp(self):
+        """Настройка перед каждым тестом: гильдия с опросом, сокеты владельца и гостя"""
+        super().setUp()
+        db = SessionLocal()
+        owner = User(username="owner", password="x")
+        guest = User(username="guest", password="x")
+        db.add_all([owner, guest])
+        db.flush()
+        guild = Guild(name="Гильдия", owner_id=owner.id)
+        db.add(guild)
+        db.flush()
+        channel = Channel(name="general", guild_id=guild.id)
+        db.add(channel)
+        db.commit()
+        self.user_id, self.guest_id = owner.id, guest.id
+        message = create_message(channel.id, "owner", "Опрос")
+        poll, _ = create_poll(db, message.id, "Вопрос?", ["Да", "Нет"])
+        self.poll_id = poll.id
+        rooms = authorized_rooms(db, self.user_id)
+        db.close()
+        import asgi
+        self.asgi = asgi
+        asgi.create_asgi_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': self.database_url})
+        socket_sessions.bind("owner-sid", self.user_id, rooms, JSON)
+        socket_sessions.bind("guest-sid", self.guest_id, set(), JSON)
+        self.addCleanup(socket_sessions.unbind, "owner-sid")
+        self.addCleanup(socket_sessions.unbind, "guest-sid")
+        self.emitted = []
+
+        async def emit(event, payload, to=None, namespace=None):
+            self.emitted.append((to, event, payload))
+
+        for patcher in (mock.patch.object(asgi.sio, "emit", emit),
+                        mock.patch.object(asgi.sio, "enter_room", mock.AsyncMock()),
+                        mock.patch.object(asgi, "publish_room")):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def asyncTearDown(self):
+        self.asgi._loop = None
+        await dispose_async_db()
+
+    def handler(self, event):
+        return self.asgi.sio.handlers[self.asgi.NAMESPACE][event]
+
+    async def test_poll_handlers(self):
+        """Тест: подписка и голос в опросе — с проверкой доступа к каналу, как в синхронном режиме"""
+        await self.handler("poll_subscribe")("guest-sid", {"poll_id": self.poll_id})
+        await self.handler("poll_vote")("guest-sid", {"poll_id": self.poll_id, "option_id": "1"})
+        self.assertEqual([event for _, event, _ in self.emitted], ["permission_error", "permission_error"])
+        self.emitted.clear()
+        await self.handler("poll_subscribe")("owner-sid", {"poll_id": self.poll_id})
+        self.assertEqual([(to, event) for to, event, _ in self.emitted], [("owner-sid", "poll_results")])
+        self.asgi.sio.enter_room.assert_awaited_with("owner-sid", f"poll:{self.poll_id}", namespace="/chat")
+        await self.handler("poll_vote")("owner-sid", {"poll_id": self.poll_id, "option_id": "1"})
+        room, event, results = self.asgi.publish_room.call_args.args
+        self.assertEqual((room, event, results["total_votes"]), (f"poll:{self.poll_id}", "poll_results", 1))
+        await self.handler("poll_vote")("owner-sid", {"poll_id": self.poll_id, "option_id": "2"})
+        self.assertEqual(self.emitted[-1][1], "poll_error")
+
+    async def test_socket_writes_pin_reads_to_primary(self):
+        """Тест: запись из сокет-события (асинхронная сессия) отмечается за пользователем сокета"""
+        models.router.set_replicas([self.create_database('replica.db')])
+        self.addCleanup(models.router.set_replicas, [])
+        await self.handler("poll_vote")("owner-sid", {"poll_id": self.poll_id, "option_id": "1"})
+        self.assertTrue(models.router.is_sticky(self.user_id))
+        self.assertFalse(models.router.is_sticky(self.guest_id))
+
+    async def test_poll_closed_broadcast(self):
+        """Тест: закрытие опроса в потоке планировщика рассылается в цикле событий"""
+        self.asgi._loop = asyncio.get_running_loop()
+        await asyncio.to_thread(_expire_poll, self.poll_id)
+        await asyncio.sleep(0)
+        room, event, results = self.asgi.publish_room.call_args.args
+        self.assertEqual((room, event, results["poll_id"]), (f"poll:{self.poll_id}", "poll_closed", self.poll_id))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+import sys
+import os
+import threading
+from datetime import datetime
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from tests.db_case import DatabaseTestCase
+from models import SessionLocal, User, DMChannel, DMInbox
+from messages import create_dm_channel, create_dm_message, get_dm_channel_by_users, get_dm_inbox
+
+class TestDMInbox(DatabaseTestCase):
+
+    def setUp(self):
+        """Настройка перед каждым тестом: отдельная SQLite БД для SessionLocal"""
+        super().setUp()
+        db = SessionLocal()
+        users = [User(username=name, password="x") for name in ("alice", "bob", "carol")]
+        db.add_all(users)
+        db.commit()
+        self.ids = {u.username: u.id for u in users}
+        db.close()
+
+    def test_pair_is_canonical(self):
+        """Тест: DM канал один на пару независимо от порядка пользователей"""
+        dm_id, _ = create_dm_channel("bob", "alice")
+        again_id, _ = create_dm_channel("alice", "bob")
+        self.assertEqual(dm_id, again_id)
+        dm = get_dm_channel_by_users("bob", "alice")
+        self.assertEqual((dm.user1_id, dm.user2_id), (self.ids["alice"], self.ids["bob"]))
+        db = SessionLocal()
+        self.assertEqual(db.query(DMChannel).count(), 1)
+        self.assertEqual(db.query(DMInbox).count(), 2)
+        db.close()
+
+    def test_inbox_sorted_by_recency(self):
+        """Тест: список DM отсортирован по последнему сообщению и содержит превью"""
+        with_bob, _ = create_dm_channel("alice", "bob")
+        with_carol, _ = create_dm_channel("alice", "carol")
+        create_dm_message(with_carol, "carol", "привет")
+        create_dm_message(with_bob, "bob", "x" * 300)
+        inbox = get_dm_inbox(self.ids["alice"])
+        self.assertEqual([row["dm_channel_id"] for row in inbox], [with_bob, with_carol])
+        self.assertEqual(inbox[0]["username"], "bob")
+        self.assertEqual(len(inbox[0]["last_message_preview"]), 100)
+        self.assertEqual(inbox[0]["unread"], 1)
+        self.assertEqual(inbox[1]["last_message_preview"], "привет")
+
+    def test_inbox_is_per_user(self):
+        """Тест: у каждого участника своя строка с собеседником"""
+        dm_id, _ = create_dm_channel("alice", "bob")
+        message = create_dm_message(dm_id, "alice", "как дела?")
+        inbox = get_dm_inbox(self.ids["bob"])
+        self.assertEqual(len(inbox), 1)
+        self.assertEqual(inbox[0]["username"], "alice")
+        self.assertEqual(inbox[0]["last_message_id"], message.id)
+        self.assertEqual(get_dm_inbox(self.ids["carol"]), [])
+
+    def test_self_dm_rejected(self):
+        """Тест: DM с самим собой не создается и не дублирует строки списка"""
+        self.assertEqual(create_dm_channel("alice", "alice"), (None, "Нельзя создать DM с самим собой"))
+        db = SessionLocal()
+        self.assertEqual(db.query(DMChannel).count(), 0)
+        self.assertEqual(db.query(DMInbox).count(), 0)
+        db.close()
+
+    def test_concurrent_create_returns_one_channel(self):
+        """Стресс-тест: параллельное создание DM одной пары возвращает один и тот же канал"""
+        results = []
+        barrier = threading.Barrier(8)
+
+        def worker(i):
+            barrier.wait()
+            pair = ("alice", "bob") if i % 2 else ("bob", "alice")
+            results.append(create_dm_channel(*pair)[0])
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(set(results)), 1)
+        self.assertIsNotNone(results[0])
+        db = SessionLocal()
+        self.assertEqual(db.query(DMChannel).count(), 1)
+        self.assertEqual(db.query(DMInbox).count(), 2)
+        db.close()
+
+    def test_inbox_cursor_keeps_equal_timestamps(self):
+        """Тест: постраничный список не теряет DM с одинаковым временем последнего сообщения"""
+        dm_ids = [create_dm_channel("alice", name)[0] for name in ("bob", "carol")]
+        db = SessionLocal()
+        db.query(DMInbox).update({DMInbox.last_message_at: datetime(2025, 1, 1)})
+        db.commit()
+        db.close()
+        first = get_dm_inbox(self.ids["alice"], limit=1)
+        cursor = (datetime.fromisoformat(first[0]["last_message_at"]), first[0]["dm_channel_id"])
+        second = get_dm_inbox(self.ids["alice"], limit=1, before=cursor)
+        self.assertEqual([row["dm_channel_id"] for row in first + second], sorted(dm_ids, reverse=True))
+        self.assertEqual(get_dm_inbox(self.ids["alice"], limit=1,
+                                      before=(cursor[0], second[0]["dm_channel_id"])), [])
+
+if __name__ == '__main__':
+    unittest.main()
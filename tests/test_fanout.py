@@ -0,0 +1,115 @@
+import unittest
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from backend.fanout import FanoutManager, merge_presence_diffs
+
+class FakeTransport:
+    """Транспорт, который «не успевает» отправлять, пока не вызван drain()"""
+    def __init__(self):
+        self.sent = []
+        self.depth = {}
+        self.disconnected = []
+    
+    def send(self, sid, event, payload):
+        self.sent.append((sid, event, payload))
+        self.depth[sid] = self.depth.get(sid, 0) + 1
+    
+    def transport_depth(self, sid):
+        return self.depth.get(sid, 0)
+    
+    def drain(self, sid):
+        self.depth[sid] = 0
+    
+    def disconnect(self, sid):
+        self.disconnected.append(sid)
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+    
+    def __call__(self):
+        return self.now
+
+class TestFanout(unittest.TestCase):
+    
+    def setUp(self):
+        """Настройка перед каждым тестом"""
+        self.transport = FakeTransport()
+        self.clock = FakeClock()
+        self.fanout = FanoutManager(
+            self.transport.send, self.transport.transport_depth, self.transport.disconnect,
+            max_queue=4, transport_high_water=2, slow_grace=10, clock=self.clock
+        )
+    
+    def test_fast_client_gets_events_directly(self):
+        """Тест: быстрый клиент получает события без задержки"""
+        self.fanout.publish('a', 'message', 1)
+        self.transport.drain('a')
+        self.fanout.publish('a', 'message', 2)
+        self.assertEqual([p for _, _, p in self.transport.sent], [1, 2])
+        self.assertEqual(self.fanout.depth('a'), 0)
+    
+    def test_slow_client_is_queued_and_pumped_in_order(self):
+        """Тест: при заполненном транспорте события ждут и уходят по порядку"""
+        for i in range(4):
+            self.fanout.publish('a', 'message', i)
+        self.assertEqual(len(self.transport.sent), 2)
+        self.assertEqual(self.fanout.depth('a'), 2)
+        self.transport.drain('a')
+        self.assertEqual(self.fanout.pump(), 2)
+        self.assertEqual([p for _, _, p in self.transport.sent], [0, 1, 2, 3])
+    
+    def test_noncritical_events_are_coalesced(self):
+        """Тест: ожидающие некритичные события с одним ключом сливаются"""
+        self.fanout.publish('a', 'message', 'm1')
+        self.fanout.publish('a', 'message', 'm2')
+        for users in ([1], [1, 2], [2]):
+            self.fanout.publish('a', 'typing', users, critical=False, coalesce_key=('typing', 5))
+        self.assertEqual(self.fanout.depth('a'), 1)
+        self.assertEqual(self.fanout.stats()['coalesced'], 2)
+        self.transport.drain('a')
+        self.fanout.pump()
+        self.assertEqual(self.transport.sent[-1], ('a', 'typing', [2]))
+    
+    def test_full_queue_drops_noncritical_then_disconnects(self):
+        """Тест: переполнение отбрасывает некритичное, затем отключает клиента"""
+        self.fanout.publish('a', 'message', 0)
+        self.fanout.publish('a', 'message', 1)
+        self.fanout.publish('a', 'presence', 'p', critical=False)
+        for i in range(3):
+            self.fanout.publish('a', 'message', 10 + i)
+        self.assertFalse(self.fanout.publish('a', 'presence', 'p2', critical=False))
+        self.assertEqual(self.fanout.stats()['dropped'], 1)
+        # Критичное событие вытесняет некритичное
+        self.assertTrue(self.fanout.publish('a', 'message', 20))
+        self.assertEqual(self.fanout.stats()['dropped'], 2)
+        # Вытеснять больше нечего — клиент отключается
+        self.assertFalse(self.fanout.publish('a', 'message', 21))
+        self.assertEqual(self.transport.disconnected, ['a'])
+        self.assertEqual(self.fanout.stats()['slow_disconnects'], 1)
+    
+    def test_persistently_slow_client_is_disconnected(self):
+        """Тест: клиент, не разгребающий очередь дольше slow_grace, отключается"""
+        for i in range(3):
+            self.fanout.publish('a', 'message', i)
+        self.fanout.pump()
+        self.clock.now = 5
+        self.fanout.pump()
+        self.assertEqual(self.transport.disconnected, [])
+        self.clock.now = 11
+        self.fanout.pump()
+        self.assertEqual(self.transport.disconnected, ['a'])
+    
+    def test_merge_presence_diffs(self):
+        """Тест: при слиянии diff присутствия побеждает последний статус"""
+        merged = merge_presence_diffs(
+            {'guild_id': 1, 'online': [1, 2], 'idle': [], 'offline': [3]},
+            {'guild_id': 1, 'online': [3], 'idle': [], 'offline': [1]}
+        )
+        self.assertEqual(sorted(merged['online']), [2, 3])
+        self.assertEqual(merged['offline'], [1])
+
+if __name__ == '__main__':
+    unittest.main()
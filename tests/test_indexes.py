@@ -0,0 +1,143 @@
+import unittest
+import sys
+import os
+import random
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from sqlalchemy import create_engine, func, select, update
+from models import (db as models_db, User, Guild, Channel, Category, Role, Message, DMChannel, DMInbox,
+                    CustomEmoji, Poll, PollVote, ReadState, File)
+
+class TestIndexes(unittest.TestCase):
+    """EXPLAIN QUERY PLAN горячих запросов на заполненной БД: только поиск по индексу"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.engine = create_engine(f"sqlite:///{os.path.join(cls.tmpdir, 'indexes.db')}")
+        models_db.metadata.create_all(cls.engine)
+        rnd = random.Random(7)
+        start = datetime(2025, 1, 1)
+        users, guilds, channels = 500, 100, 1000
+        with cls.engine.begin() as conn:
+            conn.execute(User.__table__.insert(), [
+                {"id": i, "username": f"user{i}", "password": "x"} for i in range(1, users + 1)])
+            conn.execute(Guild.__table__.insert(), [
+                {"id": g, "name": f"g{g}", "owner_id": rnd.randint(1, users)} for g in range(1, guilds + 1)])
+            conn.execute(Channel.__table__.insert(), [
+                {"id": c, "name": f"c{c}", "guild_id": (c % guilds) + 1, "type": "text",
+                 "position": c // guilds, "read_only": False} for c in range(1, channels + 1)])
+            conn.execute(Category.__table__.insert(), [
+                {"name": f"cat{i}", "guild_id": (i % guilds) + 1, "position": i // guilds} for i in range(500)])
+            conn.execute(Role.__table__.insert(), [
+                {"name": f"role{i}", "guild_id": (i % guilds) + 1, "position": i // guilds} for i in range(1000)])
+            conn.execute(CustomEmoji.__table__.insert(), [
+                {"name": f"e{i}", "guild_id": (i % guilds) + 1, "file_path": "x.png", "created_by": 1,
+                 "animated": False} for i in range(2000)])
+            conn.execute(DMChannel.__table__.insert(), [
+                {"id": d, "user1_id": d, "user2_id": d + 1} for d in range(1, users)])
+            conn.execute(Message.__table__.insert(), [{
+                "id": i + 1, "content": "сообщение", "user_id": rnd.randint(1, users), "pinned": False,
+                "timestamp": start + timedelta(seconds=i),
+                "channel_id": rnd.randint(1, channels) if i % 4 else None,
+                "dm_channel_id": None if i % 4 else rnd.randint(1, users - 1),
+            } for i in range(50000)])
+            conn.execute(Poll.__table__.insert(), [
+                {"id": f"poll{p}", "message_id": p + 1, "question": "?", "options": [], "allow_multiple": False}
+                for p in range(200)])
+            conn.execute(PollVote.__table__.insert(), [
+                {"poll_id": f"poll{i % 200}", "user_id": (i // 200) + 1, "option_id": "1", "choice_slot": ""}
+                for i in range(20000)])
+            conn.execute(ReadState.__table__.insert(), [
+                {"user_id": (i % users) + 1, "channel_id": i // users + 1, "last_read_message_id": 0,
+                 "unread_count": 0, "mention_count": 0} for i in range(20000)])
+            conn.execute(ReadState.__table__.insert(), [
+                {"user_id": d + k, "dm_channel_id": d, "last_read_message_id": 0,
+                 "unread_count": 0, "mention_count": 0} for d in range(1, users) for k in (0, 1)])
+            conn.execute(DMInbox.__table__.insert(), [
+                {"user_id": d + k, "dm_channel_id": d, "other_user_id": d + 1 - k, "last_message_at": start}
+                for d in range(1, users) for k in (0, 1)])
+            conn.execute(File.__table__.insert(), [
+                {"filename": f"f{i}.png", "path": f"f{i}.png", "user_id": 1, "message_id": i * 10 + 1}
+                for i in range(2000)])
+            conn.exec_driver_sql("ANALYZE")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.engine.dispose()
+        shutil.rmtree(cls.tmpdir, ignore_errors=True)
+
+    def _plan(self, stmt):
+        sql = str(stmt.compile(self.engine, compile_kwargs={"literal_binds": True}))
+        with self.engine.connect() as conn:
+            return [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+
+    def assertIndexScan(self, stmt, table, index=None, sorted_by_index=False):
+        plan = self._plan(stmt)
+        text = "\n".join(plan)
+        full_scans = [step for step in plan if step.split()[:2] == ["SCAN", table]]
+        self.assertEqual(full_scans, [], f"Полный просмотр {table}:\n{text}")
+        self.assertIn("USING", text, text)
+        if index:
+            self.assertIn(index, text)
+        if sorted_by_index:
+            self.assertNotIn("TEMP B-TREE", text, f"Сортировка без индекса:\n{text}")
+
+    def test_message_history(self):
+        """Тест: история канала и DM — поиск и сортировка по индексу, курсор по id"""
+        self.assertIndexScan(
+            select(Message).filter_by(channel_id=10).order_by(Message.id.desc()).limit(50),
+            "message", "ix_message_channel_id", sorted_by_index=True)
+        self.assertIndexScan(
+            select(Message).filter_by(dm_channel_id=10).filter(Message.id < 40000)
+            .order_by(Message.id.desc()).limit(50),
+            "message", "ix_message_dm_channel_id", sorted_by_index=True)
+
+    def test_guild_lookups(self):
+        """Тест: роли, категории, каналы, эмодзи и гильдии владельца — по индексам guild_id/owner_id"""
+        self.assertIndexScan(select(Role).filter_by(guild_id=3).order_by(Role.position),
+                             "role", "ix_role_guild_position", sorted_by_index=True)
+        self.assertIndexScan(select(Category).filter_by(guild_id=3).order_by(Category.position),
+                             "category", "ix_category_guild_position", sorted_by_index=True)
+        self.assertIndexScan(select(func.count(Channel.id)).filter(Channel.guild_id == 3),
+                             "channel", "ix_channel_guild_position")
+        self.assertIndexScan(select(CustomEmoji).filter(CustomEmoji.guild_id == 3),
+                             "custom_emoji", "ix_custom_emoji_guild_name")
+        self.assertIndexScan(select(Guild.id).filter(Guild.owner_id == 5), "guild", "ix_guild_owner_id")
+
+    def test_unique_pairs(self):
+        """Тест: голос в опросе, пара DM и read state — по уникальным индексам"""
+        self.assertIndexScan(select(PollVote).filter_by(poll_id="poll3", user_id=7), "poll_vote")
+        self.assertIndexScan(select(DMChannel).filter_by(user1_id=4, user2_id=5), "dm_channel")
+        self.assertIndexScan(select(ReadState).filter(ReadState.user_id == 4), "read_state")
+
+    def test_message_references(self):
+        """Тест: опрос и файлы сообщения, старые сообщения для архива — по индексам"""
+        self.assertIndexScan(select(Poll).filter(Poll.message_id == 5), "poll", "ix_poll_message_id")
+        self.assertIndexScan(select(File).filter(File.message_id.in_([11, 21])), "file", "ix_file_message_id")
+        self.assertIndexScan(select(Message.id).filter(Message.timestamp < datetime(2025, 1, 1, 0, 10)),
+                             "message", "ix_message_timestamp")
+
+    def test_write_paths(self):
+        """Тест: счетчики непрочитанного и список DM при новом сообщении обновляются по индексам"""
+        for scope, index in ((ReadState.channel_id == 10, "ix_read_state_channel_user"),
+                             (ReadState.dm_channel_id == 10, "ix_read_state_dm_user")):
+            self.assertIndexScan(
+                update(ReadState).where(scope, ReadState.user_id != 3)
+                .values(unread_count=ReadState.unread_count + 1),
+                "read_state", index)
+            self.assertIndexScan(
+                update(ReadState).where(scope, ReadState.user_id != 3, ReadState.last_read_message_id < 40000)
+                .values(unread_count=ReadState.unread_count - 1),
+                "read_state", index)
+        self.assertIndexScan(
+            update(DMInbox).where(DMInbox.dm_channel_id == 10)
+            .values(last_message_id=40000, last_message_preview="текст", last_message_at=datetime(2025, 2, 1)),
+            "dm_inbox", "ix_dm_inbox_dm_channel")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,175 @@
+import unittest
+import sys
+import os
+import threading
+from datetime import datetime, timedelta
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from tests.db_case import DatabaseTestCase
+from models import SessionLocal, User, Guild, Channel, Invite
+from guilds import (create_invite, resolve_invite, use_invite, delete_invite, purge_invites,
+                    get_members, remove_member)
+from socket_sessions import load_authorized_rooms
+from cache import cache, get_cached_invite
+from app import create_app
+
+class TestInvites(DatabaseTestCase):
+
+    def setUp(self):
+        """Настройка перед каждым тестом: отдельная файловая SQLite БД"""
+        super().setUp()
+        db = SessionLocal()
+        owner = User(username="owner", password="x")
+        db.add(owner)
+        db.add_all([User(username=f"user{i}", password="x") for i in range(20)])
+        db.flush()
+        guild = Guild(name="Гильдия", owner_id=owner.id)
+        db.add(guild)
+        db.commit()
+        self.guild_id, self.owner_id = guild.id, owner.id
+        db.close()
+        cache.clear()
+
+    def _set(self, code, **values):
+        db = SessionLocal()
+        db.query(Invite).filter_by(code=code).update(values)
+        db.commit()
+        db.close()
+
+    def test_create_and_resolve(self):
+        """Тест: код хранится в БД, гильдия по коду берется из кэша"""
+        invite, error = create_invite(self.guild_id, "owner", max_age=3600, max_uses=5)
+        self.assertIsNone(error)
+        self.assertEqual(len(invite.code), 8)
+        self.assertEqual(get_cached_invite(invite.code)["guild_id"], self.guild_id)
+        cache.clear()
+        self.assertEqual(resolve_invite(invite.code), self.guild_id)
+        self.assertIsNotNone(get_cached_invite(invite.code))
+        self.assertIsNone(resolve_invite("missing"))
+        self.assertEqual(create_invite(99999, "owner"), (None, 'Гильдия не найдена'))
+
+    def test_use_without_guild_id(self):
+        """Тест: вход только по коду, uses растет"""
+        invite, _ = create_invite(self.guild_id, "owner")
+        self.assertEqual(use_invite(invite.code, "user1"), (self.guild_id, None))
+        self.assertEqual(use_invite(invite.code, "user2"), (self.guild_id, None))
+        db = SessionLocal()
+        self.assertEqual(db.get(Invite, invite.code).uses, 2)
+        db.close()
+        self.assertEqual(use_invite(invite.code, "nobody"), (None, 'Пользователь не найден'))
+
+    def test_membership_persisted(self):
+        """Тест: вход сохраняет участие, сокет получает гильдию и ее каналы; повторный вход не тратит код"""
+        db = SessionLocal()
+        channel = Channel(name="general", guild_id=self.guild_id)
+        db.add(channel)
+        db.commit()
+        channel_id = channel.id
+        user_id = db.query(User.id).filter_by(username="user1").scalar()
+        db.close()
+        invite, _ = create_invite(self.guild_id, "owner", max_uses=1)
+        self.assertEqual(use_invite(invite.code, "user1"), (self.guild_id, None))
+        self.assertEqual(use_invite(invite.code, "user1"), (self.guild_id, None))
+        self.assertEqual(get_members(self.guild_id), ["user1"])
+        self.assertEqual(load_authorized_rooms(user_id), {f"guild:{self.guild_id}", f"channel:{channel_id}"})
+        self.assertTrue(remove_member(self.guild_id, "user1"))
+        self.assertEqual(load_authorized_rooms(user_id), set())
+
+    def test_expired_invite_rejected(self):
+        """Тест: истекшее приглашение не принимается, даже если кэш его помнит"""
+        invite, _ = create_invite(self.guild_id, "owner", max_age=3600)
+        self._set(invite.code, expires_at=datetime.utcnow() - timedelta(seconds=1))
+        self.assertIsNotNone(get_cached_invite(invite.code))
+        self.assertEqual(use_invite(invite.code, "user1"), (None, 'Приглашение недействительно'))
+        self.assertIsNone(get_cached_invite(invite.code))
+        self.assertIsNone(resolve_invite(invite.code))
+
+    def test_concurrent_uses_respect_limit(self):
+        """Стресс-тест: параллельные входы не превышают max_uses"""
+        invite, _ = create_invite(self.guild_id, "owner", max_uses=3)
+        results = []
+        barrier = threading.Barrier(10)
+
+        def worker(i):
+            barrier.wait()
+            results.append(use_invite(invite.code, f"user{i}")[0])
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(results.count(self.guild_id), 3)
+        db = SessionLocal()
+        self.assertEqual(db.get(Invite, invite.code).uses, 3)
+        db.close()
+
+    def test_concurrent_joins_of_one_user(self):
+        """Стресс-тест: параллельные входы одного пользователя — одно участие и одно использование"""
+        invite, _ = create_invite(self.guild_id, "owner", max_uses=5)
+        results = []
+        barrier = threading.Barrier(8)
+
+        def worker():
+            barrier.wait()
+            results.append(use_invite(invite.code, "user1"))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(results, [(self.guild_id, None)] * 8)
+        self.assertEqual(get_members(self.guild_id), ["user1"])
+        db = SessionLocal()
+        self.assertEqual(db.get(Invite, invite.code).uses, 1)
+        db.close()
+
+    def test_invite_params_validated(self):
+        """Тест: отрицательные, нулевые и строковые max_uses/expires_hours — 400"""
+        client = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': self.database_url}).test_client()
+        with client.session_transaction() as flask_session:
+            flask_session["user_id"] = self.owner_id
+        url = f'/api/guilds/{self.guild_id}/invites'
+        for body in ({"max_uses": -1}, {"max_uses": 0}, {"max_uses": "5"}, {"max_uses": 1.5},
+                     {"max_uses": True}, {"expires_hours": -2}, {"expires_hours": 0},
+                     {"expires_hours": "24"}, {"expires_hours": 10 ** 9}):
+            response = client.post(url, json=body)
+            self.assertEqual(response.status_code, 400, body)
+            self.assertFalse(response.get_json()["success"])
+        response = client.post(url, json={"max_uses": 2, "expires_hours": 0.5})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.get_json()["max_uses"], 2)
+        self.assertIsNotNone(response.get_json()["expires_at"])
+        self.assertEqual(client.post(url, json={}).status_code, 201)
+
+    def test_purge_in_batches(self):
+        """Тест: чистка удаляет истекшие и исчерпанные приглашения пачками, живые остаются"""
+        alive, _ = create_invite(self.guild_id, "owner", max_age=3600, max_uses=2)
+        stale = [create_invite(self.guild_id, "owner", max_age=60)[0].code for _ in range(5)]
+        used_up, _ = create_invite(self.guild_id, "owner", max_uses=1)
+        use_invite(used_up.code, "user1")
+        self.assertEqual(purge_invites(batch_size=2, now=datetime.utcnow() + timedelta(seconds=120)), 6)
+        db = SessionLocal()
+        self.assertEqual([code for (code,) in db.query(Invite.code)], [alive.code])
+        db.close()
+        for code in stale:
+            self.assertIsNone(resolve_invite(code))
+
+    def test_delete_invite_and_guild(self):
+        """Тест: удаление приглашения и гильдии (каскадом) убирает коды"""
+        first, _ = create_invite(self.guild_id, "owner")
+        second, _ = create_invite(self.guild_id, "owner")
+        self.assertTrue(delete_invite(first.code))
+        self.assertFalse(delete_invite(first.code))
+        self.assertIsNone(resolve_invite(first.code))
+        db = SessionLocal()
+        db.delete(db.get(Guild, self.guild_id))
+        db.commit()
+        self.assertEqual(db.query(Invite).count(), 0)
+        db.close()
+        self.assertEqual(use_invite(second.code, "user1"), (None, 'Приглашение недействительно'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+import sys
+import os
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import QueuePool
+from metrics import (Registry, measure, track_engine, registry, SamplingProfiler,
+                     current_thread_id, REQUEST_QUERIES, _cache_family, _pool_samples)
+from cache import SimpleCache
+
+def busy_loop(seconds):
+    deadline = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < deadline:
+        total += 1
+    return total
+
+class TestMetrics(unittest.TestCase):
+
+    def test_histogram_exposition(self):
+        """Тест: гистограмма выводится с накопительными корзинами, суммой и числом"""
+        reg = Registry()
+        latency = reg.histogram('demo_seconds', 'Демо', ('endpoint',), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 3.0):
+            latency.observe(value, '/api/x')
+        hits = reg.counter('demo_total', 'Демо счетчик')
+        hits.inc(amount=2)
+        output = reg.render()
+        self.assertIn('# TYPE demo_seconds histogram', output)
+        self.assertIn('demo_seconds_bucket{endpoint="/api/x",le="0.1"} 1', output)
+        self.assertIn('demo_seconds_bucket{endpoint="/api/x",le="1.0"} 3', output)
+        self.assertIn('demo_seconds_bucket{endpoint="/api/x",le="+Inf"} 4', output)
+        self.assertIn('demo_seconds_count{endpoint="/api/x"} 4', output)
+        self.assertIn('demo_total 2', output)
+
+    def test_queries_counted_per_request(self):
+        """Тест: запросы блока measure попадают в его статистику и гистограмму"""
+        engine = create_engine("sqlite://")
+        before = REQUEST_QUERIES.count('socket', 'demo')
+        with measure('socket', 'demo') as stats:
+            with engine.connect() as conn:
+                for _ in range(3):
+                    conn.execute(text("SELECT 1"))
+        self.assertEqual(stats.queries, 3)
+        self.assertGreater(stats.query_seconds, 0)
+        self.assertEqual(REQUEST_QUERIES.count('socket', 'demo'), before + 1)
+        # Запросы вне блока не учитываются в нем
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        self.assertEqual(stats.queries, 3)
+        engine.dispose()
+
+    def test_cache_and_pool_collectors(self):
+        """Тест: доля попаданий кэша и состояние пула соединений"""
+        cache = SimpleCache()
+        cache.set('a', 1)
+        cache.get('a')
+        cache.get('a')
+        cache.get('b')
+        families = {name: samples for name, _, _, samples in _cache_family({'demo': cache})}
+        self.assertEqual(families['cache_hits_total'], [({'cache': 'demo'}, 2)])
+        self.assertAlmostEqual(families['cache_hit_ratio'][0][1], 2 / 3)
+        # SQLite в памяти получает SingletonThreadPool: size у него — число, а не метод
+        memory = create_engine("sqlite:///:memory:")
+        engine = create_engine("sqlite://", poolclass=QueuePool)
+        track_engine('memory', memory)
+        track_engine('demo', engine)
+        with engine.connect():
+            families = {name: samples for name, _, _, samples in _pool_samples()}
+        self.assertIn(({'engine': 'demo'}, 1), families['db_pool_checked_out'])
+        self.assertNotIn('memory', {labels['engine'] for labels, _ in families['db_pool_size']})
+        self.assertIn('db_pool_checked_out', registry.render())
+        engine.dispose()
+        memory.dispose()
+
+    def test_sampling_profiler(self):
+        """Тест: профилировщик снимает стеки потока в свернутом формате"""
+        profiler = SamplingProfiler(current_thread_id(), interval=0.001).start()
+        busy_loop(0.1)
+        collapsed = profiler.stop().collapsed()
+        self.assertIn('busy_loop', collapsed)
+        self.assertIn('test_sampling_profiler', collapsed.splitlines()[0])
+
+if __name__ == '__main__':
+    unittest.main()
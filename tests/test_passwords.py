@@ -0,0 +1,77 @@
+import unittest
+import sys
+import os
+import threading
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from werkzeug.security import generate_password_hash
+import passwords
+from passwords import HashingPool, HashingBusy, hash_password, verify_password, identify_hash
+
+class TestPasswords(unittest.TestCase):
+    
+    def test_hash_and_verify(self):
+        """Тест: хеш настроенным алгоритмом проверяется без перехеша"""
+        stored = hash_password("secret")
+        self.assertEqual(identify_hash(stored), passwords.PASSWORD_HASH_ALGORITHM)
+        self.assertEqual(verify_password(stored, "secret"), (True, None))
+        self.assertEqual(verify_password(stored, "wrong"), (False, None))
+    
+    def test_legacy_hash_is_rehashed(self):
+        """Тест: устаревший werkzeug-хеш прозрачно перехешируется при входе"""
+        legacy = generate_password_hash("secret", method="pbkdf2")
+        ok, new_hash = verify_password(legacy, "secret")
+        self.assertTrue(ok)
+        if passwords.PASSWORD_HASH_ALGORITHM != "pbkdf2":
+            self.assertIsNotNone(new_hash)
+            self.assertEqual(identify_hash(new_hash), passwords.PASSWORD_HASH_ALGORITHM)
+            self.assertEqual(verify_password(new_hash, "secret"), (True, None))
+        # Неверный пароль перехеш не запускает
+        self.assertEqual(verify_password(legacy, "wrong"), (False, None))
+
+    def test_bcrypt_hash_is_rehashed(self):
+        """Тест: хеш flask-bcrypt ($2b$) проверяется и перехешируется настроенным алгоритмом"""
+        legacy = "$2b$04$NNj.ZR7pDLGbAk5uJ38f0.TTRV8vTaJopbcEkXAyS62mGGw7R2TfK"  # "legacy-secret"
+        self.assertEqual(identify_hash(legacy), "bcrypt")
+        ok, new_hash = verify_password(legacy, "legacy-secret")
+        self.assertTrue(ok)
+        self.assertEqual(identify_hash(new_hash), passwords.PASSWORD_HASH_ALGORITHM)
+        self.assertEqual(verify_password(new_hash, "legacy-secret"), (True, None))
+        self.assertEqual(verify_password(legacy, "wrong"), (False, None))
+        # Поврежденный bcrypt-хеш — неудачная проверка, а не исключение
+        self.assertEqual(verify_password("$2b$04$" + "!" * 53, "legacy-secret"), (False, None))
+
+    def test_pool_rejects_when_queue_is_full(self):
+        """Тест: переполненный пул отклоняет задачи вместо роста очереди"""
+        pool = HashingPool(max_workers=1, max_queue=1)
+        release = threading.Event()
+        started = threading.Barrier(3)
+        results = []
+        
+        def blocked():
+            release.wait(5)
+            return 'done'
+        
+        def submit():
+            started.wait()
+            results.append(pool.run(blocked))
+        
+        threads = [threading.Thread(target=submit) for _ in range(2)]
+        for t in threads:
+            t.start()
+        started.wait()
+        while pool.pending < 2:
+            pass
+        with self.assertRaises(HashingBusy):
+            pool.run(blocked)
+        self.assertEqual(pool.rejected, 1)
+        release.set()
+        for t in threads:
+            t.join()
+        self.assertEqual(results, ['done', 'done'])
+        self.assertEqual(pool.pending, 0)
+        pool.shutdown()
+
+if __name__ == '__main__':
+    unittest.main()
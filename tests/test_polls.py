@@ -0,0 +1,145 @@
+import unittest
+import sys
+import os
+import threading
+from datetime import datetime, timedelta
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from tests.db_case import DatabaseTestCase
+from sqlalchemy import func
+from sqlalchemy.orm import sessionmaker
+from models import Poll, PollOption, PollVote
+from emojis_stickers_polls import create_poll, vote_poll, get_poll_results, close_poll, schedule_open_polls
+from scheduler import scheduler
+from cache import cache
+
+class TestPolls(DatabaseTestCase):
+    
+    def setUp(self):
+        """Настройка перед каждым тестом: отдельная файловая SQLite БД"""
+        super().setUp()
+        self.Session = sessionmaker(bind=self.engine)
+        cache.clear()
+    
+    def _create_poll(self, allow_multiple=False):
+        db = self.Session()
+        poll, error = create_poll(db, 1, "Вопрос?", ["Да", "Нет", "Не знаю"], allow_multiple=allow_multiple)
+        self.assertIsNone(error)
+        poll_id = poll.id
+        db.close()
+        return poll_id
+    
+    def test_vote_increments_counter(self):
+        """Тест: голос увеличивает счетчик варианта"""
+        poll_id = self._create_poll()
+        db = self.Session()
+        results, error = vote_poll(db, poll_id, 1, "2")
+        db.close()
+        self.assertIsNone(error)
+        self.assertEqual(results["total_votes"], 1)
+        self.assertEqual([opt["votes"] for opt in results["options"]], [0, 1, 0])
+    
+    def test_single_choice_rejects_second_vote(self):
+        """Тест: в опросе с одним ответом повторный голос запрещен"""
+        poll_id = self._create_poll()
+        db = self.Session()
+        vote_poll(db, poll_id, 1, "1")
+        results, error = vote_poll(db, poll_id, 1, "2")
+        self.assertIsNone(results)
+        self.assertIsNotNone(error)
+        self.assertEqual(db.query(PollVote).count(), 1)
+        db.close()
+    
+    def test_multiple_choice_allows_distinct_options(self):
+        """Тест: множественный опрос принимает разные варианты, но не дубли"""
+        poll_id = self._create_poll(allow_multiple=True)
+        db = self.Session()
+        self.assertIsNone(vote_poll(db, poll_id, 1, "1")[1])
+        self.assertIsNone(vote_poll(db, poll_id, 1, "2")[1])
+        self.assertIsNotNone(vote_poll(db, poll_id, 1, "2")[1])
+        db.close()
+        db = self.Session()
+        self.assertEqual(get_poll_results(db, poll_id)["total_votes"], 2)
+        db.close()
+    
+    def test_close_poll_freezes_results(self):
+        """Тест: закрытие опроса замораживает итоги и запрещает голосование"""
+        poll_id = self._create_poll()
+        db = self.Session()
+        vote_poll(db, poll_id, 1, "1")
+        vote_poll(db, poll_id, 2, "3")
+        results, error = close_poll(db, poll_id)
+        self.assertIsNone(error)
+        self.assertEqual(results["total_votes"], 2)
+        self.assertEqual(db.query(Poll).get(poll_id).final_results, {"t": 2, "v": [1, 0, 1]})
+        
+        results, error = vote_poll(db, poll_id, 3, "2")
+        self.assertIsNone(results)
+        self.assertEqual(error, "Опрос истек")
+        db.close()
+        
+        cache.clear()
+        db = self.Session()
+        self.assertEqual([opt["votes"] for opt in get_poll_results(db, poll_id)["options"]], [1, 0, 1])
+        db.close()
+    
+    def test_expired_poll_rejects_votes_before_close(self):
+        """Тест: истекший, но еще не закрытый планировщиком опрос не принимает голоса"""
+        poll_id = self._create_poll()
+        db = self.Session()
+        db.query(Poll).filter(Poll.id == poll_id).update({Poll.expires_at: datetime.utcnow() - timedelta(seconds=1)})
+        db.commit()
+        results, error = vote_poll(db, poll_id, 1, "1")
+        self.assertIsNone(results)
+        self.assertEqual(error, "Опрос истек")
+        db.close()
+    
+    def test_open_polls_rescheduled(self):
+        """Тест: после перезапуска незакрытые опросы снова стоят в планировщике"""
+        poll_id = self._create_poll()
+        db = self.Session()
+        db.query(Poll).filter(Poll.id == poll_id).update({Poll.expires_at: datetime.utcnow() + timedelta(hours=1)})
+        db.commit()
+        scheduler.cancel(f"poll:{poll_id}")
+        self.assertEqual(schedule_open_polls(db), 1)
+        self.assertTrue(scheduler.cancel(f"poll:{poll_id}"))
+        db.close()
+    
+    def test_concurrent_votes_are_not_lost(self):
+        """Стресс-тест: параллельные голоса не теряются"""
+        poll_id = self._create_poll()
+        voters = 200
+        errors = []
+        
+        def worker(user_ids):
+            db = self.Session()
+            try:
+                for user_id in user_ids:
+                    _, error = vote_poll(db, poll_id, user_id, str(user_id % 3 + 1))
+                    if error:
+                        errors.append(error)
+            finally:
+                db.close()
+        
+        threads = [
+            threading.Thread(target=worker, args=(range(i, voters, 8),))
+            for i in range(8)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        
+        self.assertEqual(errors, [])
+        db = self.Session()
+        total = db.query(func.sum(PollOption.votes)).filter(PollOption.poll_id == poll_id).scalar()
+        self.assertEqual(total, voters)
+        self.assertEqual(db.query(PollVote).filter(PollVote.poll_id == poll_id).count(), voters)
+        for opt in db.query(PollOption).filter(PollOption.poll_id == poll_id):
+            expected = sum(1 for u in range(voters) if str(u % 3 + 1) == opt.option_id)
+            self.assertEqual(opt.votes, expected)
+        db.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from backend.presence import PresenceTracker, GuildPresence, ONLINE, IDLE, OFFLINE
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+    
+    def __call__(self):
+        return self.now
+
+class TestPresence(unittest.TestCase):
+    
+    def setUp(self):
+        """Настройка перед каждым тестом"""
+        self.clock = FakeClock()
+        self.presence = PresenceTracker(idle_after=60, offline_after=180, typing_ttl=8, clock=self.clock)
+        self.presence.set_guild_members(1, [10, 11, 12])
+    
+    def _events(self, name):
+        return [payload for _, event, payload in self.presence.flush() if event == name]
+    
+    def test_changes_are_coalesced_per_flush(self):
+        """Тест: несколько переходов за интервал дают один diff на гильдию"""
+        self.presence.connect('a', 10)
+        self.presence.connect('b', 11)
+        self.presence.disconnect('b')
+        self.presence.heartbeat('a', away=True)
+        self.presence.heartbeat('a')
+        events = self._events('presence_update')
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0][ONLINE], [10])
+        self.assertEqual(events[0][OFFLINE], [])
+        # Без изменений повторный flush ничего не отправляет
+        self.assertEqual(self.presence.flush(), [])
+    
+    def test_multiple_connections_per_user(self):
+        """Тест: пользователь офлайн только после закрытия последнего соединения"""
+        self.presence.connect('a', 10)
+        self.presence.connect('b', 10)
+        self.presence.disconnect('a')
+        self.assertEqual(self.presence.status(10), ONLINE)
+        self.presence.disconnect('b')
+        self.assertEqual(self.presence.status(10), OFFLINE)
+    
+    def test_heartbeat_expiry(self):
+        """Тест: без heartbeat пользователь становится idle, затем offline"""
+        self.presence.connect('a', 10)
+        self.presence.flush()
+        self.clock.now += 61
+        self.assertEqual(self._events('presence_update')[0][IDLE], [10])
+        self.clock.now += 120
+        self.assertEqual(self._events('presence_update')[0][OFFLINE], [10])
+        self.presence.heartbeat('a')
+        self.assertEqual(self._events('presence_update')[0][ONLINE], [10])
+    
+    def test_snapshot(self):
+        """Тест: снимок гильдии содержит только присутствующих"""
+        self.presence.connect('a', 10)
+        self.presence.connect('c', 12)
+        self.presence.heartbeat('c', away=True)
+        snapshot = self.presence.snapshot(1)
+        self.assertEqual(snapshot[ONLINE], [10])
+        self.assertEqual(snapshot[IDLE], [12])
+    
+    def test_typing_indicator_expires(self):
+        """Тест: индикатор набора рассылается пакетом и истекает сам"""
+        self.presence.connect('a', 10)
+        self.presence.start_typing(5, 10)
+        self.presence.start_typing(5, 10)
+        self.assertEqual(self._events('typing'), [{'channel_id': 5, 'users': [10]}])
+        self.assertEqual(self._events('typing'), [])
+        self.clock.now += 9
+        self.assertEqual(self._events('typing'), [{'channel_id': 5, 'users': []}])
+    
+    def test_guild_bitset_reuses_slots(self):
+        """Тест: номера битов освобожденных участников переиспользуются"""
+        guild = GuildPresence()
+        for user_id in range(100):
+            guild.add(user_id)
+        guild.remove(50)
+        self.assertEqual(guild.add(500), 50)
+        guild.set_status(500, ONLINE)
+        self.assertEqual(guild.snapshot()[ONLINE], [500])
+        self.assertEqual(guild.online, 1 << 50)
+
+if __name__ == '__main__':
+    unittest.main()
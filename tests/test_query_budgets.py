@@ -0,0 +1,98 @@
+import unittest
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from tests.db_case import DatabaseTestCase
+from models import SessionLocal, User, Guild, Message
+from queries import track_queries, fingerprint
+from guilds import create_channel
+from users import add_friend, get_friends
+from messages import (create_message, get_messages, create_dm_channel, create_dm_message,
+                      get_dm_inbox, get_badges)
+
+# Бюджет SQL-запросов на вызов. Рост числа запросов — регрессия (обычно N+1):
+# бюджет не зависит от количества строк в таблицах.
+QUERY_BUDGETS = {
+    'create_channel': 5,   # гильдия, COUNT каналов, INSERT канала, INSERT read state участникам, refresh
+    'add_friend': 3,       # оба пользователя, агрегат по дружбе, INSERT
+    'get_friends': 1,
+    'get_messages': 2,     # страница горячей истории + оглавление архива, если страница неполная
+    'create_message': 7,
+    'create_dm_message': 6,
+    'get_dm_inbox': 1,
+    'get_badges': 1,
+}
+
+class TestQueryBudgets(DatabaseTestCase):
+
+    def setUp(self):
+        """Настройка перед каждым тестом: SQLite БД с данными, на которых N+1 заметен"""
+        super().setUp()
+        db = SessionLocal()
+        users = [User(username=f"user{i}", password="x") for i in range(10)]
+        db.add_all(users)
+        db.flush()
+        guild = Guild(name="Гильдия", owner_id=users[0].id)
+        db.add(guild)
+        db.commit()
+        self.guild_id = guild.id
+        db.close()
+        self.channel_id, _ = create_channel(self.guild_id, "general")
+        for i in range(10):
+            create_message(self.channel_id, f"user{i}", f"сообщение {i}")
+        for i in range(2, 8):
+            add_friend("user0", f"user{i}")
+
+    def assertWithinBudget(self, name, func, *args):
+        with track_queries() as log:
+            result = func(*args)
+        self.assertLessEqual(len(log), QUERY_BUDGETS[name],
+                             f"{name}: {len(log)} запросов\n" + "\n".join(log.statements()))
+        return result
+
+    def test_channel_and_friend_budgets(self):
+        """Тест: создание канала и добавление друга не загружают коллекции"""
+        self.assertWithinBudget('create_channel', create_channel, self.guild_id, "random")
+        ok, error = self.assertWithinBudget('add_friend', add_friend, "user0", "user9")
+        self.assertTrue(ok, error)
+        friends = self.assertWithinBudget('get_friends', get_friends, "user0")
+        self.assertEqual(len(friends), 7)
+
+    def test_message_budgets(self):
+        """Тест: чтение истории загружает авторов тем же запросом"""
+        msgs = self.assertWithinBudget('get_messages', get_messages, self.channel_id)
+        self.assertEqual(len({m.user.username for m in msgs}), 10)
+        self.assertWithinBudget('create_message', create_message, self.channel_id, "user1", "@user0 привет")
+
+    def test_dm_and_badge_budgets(self):
+        """Тест: сообщение в DM, список DM и бейджи укладываются в бюджет"""
+        dm_id, _ = create_dm_channel("user0", "user1")
+        self.assertWithinBudget('create_dm_message', create_dm_message, dm_id, "user1", "привет")
+        self.assertWithinBudget('get_dm_inbox', get_dm_inbox, 1)
+        self.assertWithinBudget('get_badges', get_badges, 1)
+
+    def test_detector_reports_lazy_loads(self):
+        """Тест: ленивые загрузки автора в цикле определяются как N+1 с местом вызова"""
+        db = SessionLocal()
+        with track_queries() as log:
+            for message in db.query(Message).all():
+                message.user.username
+        db.close()
+        suspects = log.repeated(threshold=5)
+        self.assertEqual(len(suspects), 1)
+        _, count, sites = suspects[0]
+        self.assertGreaterEqual(count, 5)
+        self.assertIn("test_detector_reports_lazy_loads", sites[0])
+
+    def test_fingerprint_normalizes_literals(self):
+        """Тест: отпечаток не зависит от значений и длины списков IN"""
+        self.assertEqual(
+            fingerprint("SELECT * FROM user WHERE id IN (?, ?, ?) AND name = 'bob'"),
+            fingerprint("SELECT *  FROM user\nWHERE id IN (?, ?) AND name = 'alice'"),
+        )
+        self.assertEqual(fingerprint("SELECT 1 LIMIT 50"), "SELECT ? LIMIT ?")
+
+if __name__ == '__main__':
+    unittest.main()
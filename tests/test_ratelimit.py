@@ -0,0 +1,158 @@
+import unittest
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import math
+from backend.ratelimit import (MemoryBackend, RedisBackend, RateLimiter, SLIDING_WINDOW, TOKEN_BUCKET,
+                               SLIDING_WINDOW_LUA, TOKEN_BUCKET_LUA)
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+    
+    def __call__(self):
+        return self.now
+
+class ScriptRedis:
+    """Заглушка клиента Redis: register_script исполняет те же шаги, что Lua-скрипты, над словарем"""
+    
+    def __init__(self):
+        self.data = {}
+    
+    def register_script(self, script):
+        return {SLIDING_WINDOW_LUA: self._sliding, TOKEN_BUCKET_LUA: self._bucket}[script]
+    
+    def _sliding(self, keys, args):
+        limit, window, now = args
+        cur_start = math.floor(now / window) * window
+        cur_key = f"{keys[0]}:{cur_start}"
+        curr = self.data.get(cur_key, 0)
+        prev = self.data.get(f"{keys[0]}:{cur_start - window}", 0)
+        elapsed = now - cur_start
+        allowed = 0
+        if prev * (1 - elapsed / window) + curr + 1 <= limit:
+            curr = self.data[cur_key] = curr + 1
+            allowed = 1
+        # Как в Redis: числа Lua приходят целыми, дробные — строкой
+        return [allowed, curr, prev, str(elapsed)]
+    
+    def _bucket(self, keys, args):
+        limit, window, now = args
+        tokens, ts = self.data.get(keys[0], (limit, now))
+        tokens = min(limit, tokens + (now - ts) * limit / window)
+        allowed = 0
+        if tokens >= 1:
+            tokens -= 1
+            allowed = 1
+        self.data[keys[0]] = (tokens, now)
+        return [allowed, str(tokens)]
+
+class TestRateLimit(unittest.TestCase):
+    
+    def setUp(self):
+        """Настройка перед каждым тестом"""
+        self.clock = FakeClock()
+        self.backend = MemoryBackend(max_keys=100, clock=self.clock)
+    
+    def test_sliding_window_blocks_over_limit(self):
+        """Тест: скользящее окно отказывает сверх лимита и выставляет заголовки"""
+        limiter = RateLimiter(self.backend, SLIDING_WINDOW)
+        for i in range(5):
+            result = limiter.hit('ip:/api', 5, 60)
+            self.assertTrue(result.allowed)
+        self.assertEqual(result.remaining, 0)
+        result = limiter.hit('ip:/api', 5, 60)
+        self.assertFalse(result.allowed)
+        headers = result.headers()
+        self.assertEqual(headers['X-RateLimit-Limit'], '5')
+        self.assertEqual(headers['X-RateLimit-Remaining'], '0')
+        self.assertIn('Retry-After', headers)
+        self.assertGreaterEqual(int(headers['Retry-After']), 1)
+    
+    def test_sliding_window_prevents_edge_burst(self):
+        """Тест: на границе окон не пропускается удвоенный всплеск"""
+        limiter = RateLimiter(self.backend, SLIDING_WINDOW)
+        self.clock.now = 1019.0  # конец окна [960, 1020)
+        allowed = sum(limiter.hit('k', 10, 60).allowed for _ in range(10))
+        self.assertEqual(allowed, 10)
+        self.clock.now = 1021.0  # начало следующего окна
+        allowed = sum(limiter.hit('k', 10, 60).allowed for _ in range(10))
+        self.assertLessEqual(allowed, 1)
+        # Через полное окно лимит восстанавливается
+        self.clock.now = 1021.0 + 60
+        self.assertTrue(limiter.hit('k', 10, 60).allowed)
+    
+    def test_retry_after_is_accurate(self):
+        """Тест: после ожидания Retry-After запрос проходит"""
+        limiter = RateLimiter(self.backend, SLIDING_WINDOW)
+        self.clock.now = 1030.0
+        for _ in range(3):
+            limiter.hit('k', 3, 60)
+        result = limiter.hit('k', 3, 60)
+        self.assertFalse(result.allowed)
+        self.clock.now += result.retry_after + 0.01
+        self.assertTrue(limiter.hit('k', 3, 60).allowed)
+    
+    def test_token_bucket_refills(self):
+        """Тест: token bucket пополняется со временем"""
+        limiter = RateLimiter(self.backend, TOKEN_BUCKET)
+        for _ in range(6):
+            self.assertTrue(limiter.hit('k', 6, 60).allowed)
+        result = limiter.hit('k', 6, 60)
+        self.assertFalse(result.allowed)
+        self.assertAlmostEqual(result.retry_after, 10.0, places=5)
+        self.clock.now += 10
+        self.assertTrue(limiter.hit('k', 6, 60).allowed)
+        self.assertFalse(limiter.hit('k', 6, 60).allowed)
+    
+    def test_memory_is_bounded(self):
+        """Тест: число ключей ограничено, вытесняются давно неактивные"""
+        limiter = RateLimiter(self.backend)
+        for i in range(500):
+            limiter.hit(f'ip{i}:/api', 10, 60)
+        self.assertEqual(len(self.backend), 100)
+    
+    def test_purge_idle_keys(self):
+        """Тест: простаивающие ключи удаляются"""
+        limiter = RateLimiter(self.backend)
+        limiter.hit('old', 10, 60)
+        self.clock.now += 500
+        limiter.hit('fresh', 10, 60)
+        self.assertEqual(self.backend.purge_idle(300), 1)
+        self.assertEqual(len(self.backend), 1)
+    
+    def test_redis_backend_matches_memory(self):
+        """Тест: Redis-хранилище дает те же решения, остаток и Retry-After, что и память"""
+        redis_backend = RedisBackend(ScriptRedis(), clock=self.clock)
+        for algorithm in (SLIDING_WINDOW, TOKEN_BUCKET):
+            memory = RateLimiter(MemoryBackend(clock=self.clock), algorithm)
+            redis = RateLimiter(redis_backend, algorithm)
+            self.clock.now = 1010.0
+            for step in range(30):
+                self.clock.now += 3.5
+                expected = memory.hit(algorithm, 5, 60)
+                result = redis.hit(algorithm, 5, 60)
+                self.assertEqual(result.headers(), expected.headers(), (algorithm, step))
+                self.assertAlmostEqual(result.retry_after, expected.retry_after, places=6)
+    
+    def test_redis_full_window_headers(self):
+        """Тест: отказ Redis-хранилища при заполненном окне — Remaining 0 и полный Retry-After"""
+        limiter = RateLimiter(RedisBackend(ScriptRedis(), clock=self.clock), SLIDING_WINDOW)
+        self.clock.now = 1020.0  # начало окна
+        for _ in range(3):
+            self.assertTrue(limiter.hit('k', 3, 60).allowed)
+        headers = limiter.hit('k', 3, 60).headers()
+        self.assertEqual(headers['X-RateLimit-Remaining'], '0')
+        self.assertGreaterEqual(int(headers['Retry-After']), 60)
+    
+    def test_backend_failure_fails_open(self):
+        """Тест: при сбое хранилища запрос пропускается"""
+        class BrokenBackend:
+            def sliding_window(self, key, limit, window):
+                raise ConnectionError('redis down')
+        limiter = RateLimiter(BrokenBackend())
+        self.assertTrue(limiter.hit('k', 1, 60).allowed)
+
+if __name__ == '__main__':
+    unittest.main()
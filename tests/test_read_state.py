@@ -0,0 +1,115 @@
+import unittest
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from tests.db_case import DatabaseTestCase
+from models import SessionLocal, User, Guild, ReadState
+from guilds import create_channel, add_member
+from messages import create_message, create_dm_channel, create_dm_message, delete_message, mark_read, get_badges
+from app import create_app
+
+class TestReadState(DatabaseTestCase):
+
+    def setUp(self):
+        """Настройка перед каждым тестом: отдельная SQLite БД для SessionLocal"""
+        super().setUp()
+        db = SessionLocal()
+        self.alice = User(username="alice", password="x")
+        self.bob = User(username="bob", password="x")
+        db.add_all([self.alice, self.bob])
+        db.flush()
+        guild = Guild(name="Гильдия", owner_id=self.bob.id)
+        db.add(guild)
+        db.commit()
+        self.alice_id, self.bob_id, self.guild_id = self.alice.id, self.bob.id, guild.id
+        db.close()
+        self.channel_id, _ = create_channel(self.guild_id, "general")
+
+    def _state(self, user_id, **scope):
+        db = SessionLocal()
+        state = db.query(ReadState).filter_by(user_id=user_id, **scope).first()
+        db.close()
+        return state
+
+    def test_new_message_increments_unread(self):
+        """Тест: новое сообщение увеличивает счетчик у читателей, но не у автора"""
+        create_message(self.channel_id, "alice", "привет")
+        create_message(self.channel_id, "alice", "как дела, @bob?")
+        state = self._state(self.bob_id, channel_id=self.channel_id)
+        self.assertEqual(state.unread_count, 2)
+        self.assertEqual(state.mention_count, 1)
+        create_message(self.channel_id, "bob", "норм")
+        self.assertEqual(self._state(self.bob_id, channel_id=self.channel_id).unread_count, 2)
+
+    def test_delete_decrements_only_unread(self):
+        """Тест: удаление непрочитанного сообщения уменьшает счетчики"""
+        first = create_message(self.channel_id, "alice", "@bob раз")
+        second = create_message(self.channel_id, "alice", "два")
+        delete_message(self.channel_id, first.id)
+        state = self._state(self.bob_id, channel_id=self.channel_id)
+        self.assertEqual((state.unread_count, state.mention_count), (1, 0))
+        mark_read(self.bob_id, channel_id=self.channel_id)
+        delete_message(self.channel_id, second.id)
+        self.assertEqual(self._state(self.bob_id, channel_id=self.channel_id).unread_count, 0)
+
+    def test_mark_read_partial(self):
+        """Тест: метка прочтения в середине оставляет непрочитанными более новые"""
+        first = create_message(self.channel_id, "alice", "@bob раз")
+        create_message(self.channel_id, "alice", "два")
+        create_message(self.channel_id, "alice", "три")
+        self.assertEqual(mark_read(self.bob_id, channel_id=self.channel_id, message_id=first.id), (2, 1))
+        self.assertEqual(mark_read(self.bob_id, channel_id=self.channel_id), (0, 0))
+
+    def test_badges_for_guilds_and_dms(self):
+        """Тест: бейджи агрегируются по гильдиям и DM"""
+        create_message(self.channel_id, "alice", "@bob привет")
+        dm_id, _ = create_dm_channel("alice", "bob")
+        create_dm_message(dm_id, "alice", "лично")
+        create_dm_message(dm_id, "alice", "еще")
+        badges = get_badges(self.bob_id)
+        self.assertEqual(badges["guilds"][self.guild_id], {"unread": 1, "mentions": 1})
+        self.assertEqual(badges["channels"][self.channel_id], {"unread": 1, "mentions": 1})
+        self.assertEqual(badges["dms"][dm_id], {"unread": 2, "mentions": 0})
+        self.assertEqual(get_badges(self.alice_id)["guilds"], {})
+
+    def test_states_seeded_for_all_members(self):
+        """Тест: участник получает счетчики по каналам гильдии, новый канал — всем участникам"""
+        self.assertIsNone(self._state(self.alice_id, channel_id=self.channel_id))
+        self.assertTrue(add_member(self.guild_id, "alice"))
+        self.assertIsNotNone(self._state(self.alice_id, channel_id=self.channel_id))
+        # Повторное добавление не дублирует строки и не падает на uq_read_state_channel
+        self.assertTrue(add_member(self.guild_id, "alice"))
+        random_id, _ = create_channel(self.guild_id, "random")
+        create_message(random_id, "bob", "всем")
+        self.assertEqual(self._state(self.alice_id, channel_id=random_id).unread_count, 1)
+        self.assertEqual(self._state(self.bob_id, channel_id=random_id).unread_count, 0)
+
+    def _ack(self, user_id, **body):
+        client = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': self.database_url}).test_client()
+        with client.session_transaction() as flask_session:
+            flask_session["user_id"] = user_id
+        return client.post('/api/read-state', json=body)
+
+    def test_ack_requires_access(self):
+        """Тест: метку прочтения ставят только участники гильдии и собеседники DM"""
+        create_message(self.channel_id, "bob", "привет")
+        self.assertEqual(self._ack(self.alice_id, channel_id=self.channel_id).status_code, 403)
+        self.assertIsNone(self._state(self.alice_id, channel_id=self.channel_id))
+        add_member(self.guild_id, "alice")
+        response = self._ack(self.alice_id, channel_id=self.channel_id)
+        self.assertEqual((response.status_code, response.get_json()["unread"]), (200, 0))
+
+        db = SessionLocal()
+        carol = User(username="carol", password="x")
+        db.add(carol)
+        db.commit()
+        carol_id = carol.id
+        db.close()
+        dm_id, _ = create_dm_channel("alice", "bob")
+        self.assertEqual(self._ack(carol_id, dm_channel_id=dm_id).status_code, 403)
+        self.assertEqual(self._ack(self.alice_id, dm_channel_id=dm_id).status_code, 200)
+
+if __name__ == '__main__':
+    unittest.main()
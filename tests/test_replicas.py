@@ -0,0 +1,70 @@
+import unittest
+import sys
+import os
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from tests.db_case import DatabaseTestCase
+import models
+from models import SessionLocal, User
+from db_router import ReplicaRouter, acting_as
+from users import get_user
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class TestReplicas(DatabaseTestCase):
+
+    def setUp(self):
+        """Настройка перед каждым тестом: две SQLite БД — основная и «отстающая» реплика"""
+        super().setUp()
+        self.replica = self.create_database('replica.db')
+        self.clock = FakeClock()
+        models.router.clock = self.clock
+        models.router.set_replicas([self.replica])
+
+    def tearDown(self):
+        """Очистка после каждого теста"""
+        models.router.set_replicas([])
+        models.router.clock = time.monotonic
+        super().tearDown()
+
+    def _write_user(self, actor, username):
+        with acting_as(actor):
+            db = SessionLocal()
+            db.add(User(username=username, password="x"))
+            db.commit()
+            db.close()
+
+    def test_reads_go_to_replica(self):
+        """Тест: чтения без своей записи идут на реплику"""
+        self._write_user(1, "alice")
+        with acting_as(2):
+            self.assertIsNone(get_user("alice"))
+        self.assertGreaterEqual(models.router.replica_reads, 1)
+
+    def test_read_your_writes(self):
+        """Тест: автор записи читает основную БД, пока не истечет окно"""
+        self._write_user(1, "alice")
+        with acting_as(1):
+            self.assertIsNotNone(get_user("alice"))
+        self.clock.now += models.router.sticky_seconds + 1
+        with acting_as(1):
+            self.assertIsNone(get_user("alice"))
+
+    def test_round_robin_and_no_replicas(self):
+        """Тест: реплики выбираются по кругу; без реплик читается основная БД"""
+        router = ReplicaRouter(["r1", "r2"], sticky_seconds=5, clock=self.clock)
+        self.assertEqual([router.reader_for() for _ in range(3)], ["r1", "r2", "r1"])
+        router.note_write(42)
+        self.assertIsNone(router.reader_for(42))
+        self.assertEqual(router.reader_for(43), "r2")
+        self.assertIsNone(ReplicaRouter([]).reader_for(1))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+import sys
+import os
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from backend.scheduler import Scheduler
+
+class TestScheduler(unittest.TestCase):
+    
+    def setUp(self):
+        """Настройка перед каждым тестом"""
+        self.scheduler = Scheduler()
+        self.calls = []
+    
+    def tearDown(self):
+        """Очистка после каждого теста"""
+        self.scheduler.stop()
+    
+    def test_jobs_run_in_time_order(self):
+        """Тест: задачи выполняются по времени срабатывания"""
+        self.scheduler.schedule_at(30, self.calls.append, 'c')
+        self.scheduler.schedule_at(10, self.calls.append, 'a')
+        self.scheduler.schedule_at(20, self.calls.append, 'b')
+        self.assertEqual(self.scheduler.run_pending(now=5), 0)
+        self.assertEqual(self.scheduler.run_pending(now=25), 2)
+        self.assertEqual(self.calls, ['a', 'b'])
+        self.assertEqual(self.scheduler.next_run(), 30)
+    
+    def test_cancel_and_reschedule_by_key(self):
+        """Тест: отмена и перепланирование по ключу"""
+        self.scheduler.schedule_at(10, self.calls.append, 'old', key='poll:1')
+        self.scheduler.schedule_at(20, self.calls.append, 'new', key='poll:1')
+        self.assertEqual(self.scheduler.pending(), 1)
+        self.scheduler.run_pending(now=100)
+        self.assertEqual(self.calls, ['new'])
+        
+        self.scheduler.schedule_at(10, self.calls.append, 'x', key='invite:1')
+        self.assertTrue(self.scheduler.cancel('invite:1'))
+        self.assertFalse(self.scheduler.cancel('invite:1'))
+        self.assertEqual(self.scheduler.run_pending(now=100), 0)
+    
+    def test_periodic_job(self):
+        """Тест: периодическая задача переставляется после выполнения"""
+        key = self.scheduler.every(10, self.calls.append, 'tick')
+        first = self.scheduler.next_run()
+        self.scheduler.run_pending(now=first)
+        self.assertEqual(self.scheduler.next_run(), first + 10)
+        self.scheduler.run_pending(now=first + 10)
+        self.assertEqual(self.calls, ['tick', 'tick'])
+        self.scheduler.cancel(key)
+        self.assertIsNone(self.scheduler.next_run())
+    
+    def test_failing_job_does_not_stop_others(self):
+        """Тест: ошибка в задаче не мешает остальным"""
+        self.scheduler.schedule_at(1, lambda: 1 / 0)
+        self.scheduler.schedule_at(2, self.calls.append, 'ok')
+        self.assertEqual(self.scheduler.run_pending(now=3), 2)
+        self.assertEqual(self.calls, ['ok'])
+    
+    def test_background_thread_fires_job(self):
+        """Тест: фоновый поток выполняет задачу вовремя"""
+        self.scheduler.start()
+        self.scheduler.schedule_in(0.05, self.calls.append, 'fired')
+        deadline = time.time() + 2
+        while not self.calls and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.calls, ['fired'])
+
+if __name__ == '__main__':
+    unittest.main()
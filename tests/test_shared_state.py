@@ -0,0 +1,122 @@
+import unittest
+import sys
+import os
+import asyncio
+import json
+import threading
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from tests.db_case import DatabaseTestCase
+from shared_state import MemorySetMap, MemoryState, create_shared_state
+from fanout import encode_room_event, decode_room_event, merge_presence_diffs
+from supervisor import Supervisor, Worker, rendezvous, client_key
+import users
+from app import create_app
+
+class TestSharedState(DatabaseTestCase):
+
+    def setUp(self):
+        """Настройка перед каждым тестом"""
+        super().setUp()
+        users.friendships.clear()
+        users.friend_requests_in.clear()
+        users.friend_requests_out.clear()
+
+    def test_discard_is_atomic(self):
+        """Тест: из конкурирующих удалений одного элемента успешно ровно одно"""
+        sets = MemorySetMap()
+        sets.add(1, "code")
+        results = []
+        barrier = threading.Barrier(8)
+
+        def worker():
+            barrier.wait()
+            results.append(sets.discard(1, "code"))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(results.count(True), 1)
+        self.assertEqual(sets.members(1), set())
+
+    def test_default_state_is_memory(self):
+        """Тест: без redis:// состояние остается в памяти процесса"""
+        state = create_shared_state("memory://")
+        self.assertIsInstance(state, MemoryState)
+        self.assertIs(state.set_map("x"), state.set_map("x"))
+        self.assertTrue(state.ping())
+
+    def test_room_event_round_trip(self):
+        """Тест: событие комнаты переживает JSON и сохраняет функцию и ключ слияния"""
+        data = json.loads(json.dumps(encode_room_event("guild:1", "presence", {"2": "online"},
+                                                       merge=merge_presence_diffs, critical=False,
+                                                       coalesce_key=("presence", 1))))
+        room, event, payload, kwargs = decode_room_event(data)
+        self.assertEqual((room, event, payload), ("guild:1", "presence", {"2": "online"}))
+        self.assertIs(kwargs["merge"], merge_presence_diffs)
+        self.assertFalse(kwargs["critical"])
+        self.assertEqual(kwargs["coalesce_key"], ("presence", 1))
+
+    def test_friend_requests(self):
+        """Тест: заявки в друзья работают через наборы общего состояния"""
+        users.friend_requests_in.add("bob", "alice")
+        users.friend_requests_out.add("alice", "bob")
+        self.assertEqual(users.get_friend_requests("bob"), ["alice"])
+        self.assertTrue(users.accept_friend("bob", "alice"))
+        self.assertFalse(users.accept_friend("bob", "alice"))
+        self.assertEqual(users.friendships.members("alice"), {"bob"})
+        self.assertEqual(users.friend_requests_out.members("alice"), set())
+
+    def test_sticky_routing(self):
+        """Тест: клиент остается на своем воркере, при отказе переезжают только его клиенты"""
+        workers = [Worker(i, 5100 + i) for i in range(4)]
+        keys = [f"10.0.0.{i}" for i in range(200)]
+        before = {key: rendezvous(key, workers).index for key in keys}
+        self.assertEqual(before, {key: rendezvous(key, workers).index for key in keys})
+        self.assertEqual(len(set(before.values())), 4)
+        after = {key: rendezvous(key, workers[:1] + workers[2:]).index for key in keys}
+        for key in keys:
+            if before[key] != 1:
+                self.assertEqual(after[key], before[key])
+            else:
+                self.assertNotEqual(after[key], 1)
+
+    def test_client_key(self):
+        """Тест: ключ маршрута — первый адрес X-Forwarded-For, иначе адрес соединения"""
+        head = b"GET /socket.io/ HTTP/1.1\r\nHost: x\r\nX-Forwarded-For: 1.2.3.4, 10.0.0.1\r\n\r\n"
+        self.assertEqual(client_key(head, ("127.0.0.1", 5555)), "1.2.3.4")
+        self.assertEqual(client_key(b"GET / HTTP/1.1\r\nHost: x\r\n\r\n", ("9.9.9.9", 1)), "9.9.9.9")
+
+    def test_worker_env(self):
+        """Тест: фоновые задачи только у воркера 0, у каждого свой snowflake-id"""
+        supervisor = Supervisor(3, "127.0.0.1", 5000, 5100)
+        envs = [supervisor.worker_env(w) for w in supervisor.workers]
+        self.assertEqual([e["SINGLETON_JOBS"] for e in envs], ["1", "0", "0"])
+        self.assertEqual(len({e["SNOWFLAKE_WORKER_ID"] for e in envs}), 3)
+        self.assertEqual([e["WORKER_PORT"] for e in envs], ["5100", "5101", "5102"])
+
+    def test_multiple_workers_require_redis(self):
+        """Тест: с memory:// супервизор не запускает несколько воркеров"""
+        supervisor = Supervisor(2, "127.0.0.1", 5000, 5100)
+        with self.assertRaises(SystemExit):
+            asyncio.run(supervisor.serve())
+        self.assertTrue(all(w.process is None for w in supervisor.workers))
+
+    def test_health_endpoint(self):
+        """Тест: /health воркера проверяет БД и общее состояние"""
+        app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(self.tmpdir, 'health.db')}",
+        })
+        response = app.test_client().get('/health')
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data["status"], "ok")
+        self.assertEqual(data["checks"], {"database": "ok", "shared_state": "ok"})
+        self.assertEqual(data["shared_state"], "memory://")
+
+if __name__ == '__main__':
+    unittest.main()
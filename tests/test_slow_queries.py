@@ -0,0 +1,83 @@
+import unittest
+import sys
+import os
+import re
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from tests.db_case import DatabaseTestCase
+from models import SessionLocal, User, Guild, Channel
+from slow_queries import SlowQueryLog, param_shape
+from messages import create_message, get_messages
+
+class TestSlowQueries(DatabaseTestCase):
+
+    def setUp(self):
+        """Настройка перед каждым тестом: канал с сообщениями, журнал с нулевым порогом"""
+        super().setUp()
+        db = SessionLocal()
+        user = User(username="alice", password="x")
+        db.add(user)
+        db.flush()
+        guild = Guild(name="Гильдия", owner_id=user.id)
+        db.add(guild)
+        db.flush()
+        channel = Channel(name="general", guild_id=guild.id)
+        db.add(channel)
+        db.commit()
+        self.channel_id = channel.id
+        db.close()
+        for i in range(5):
+            create_message(self.channel_id, "alice", f"сообщение {i}")
+        self.log = SlowQueryLog(threshold_ms=0, explain=True)
+        self.log.install()
+
+    def tearDown(self):
+        """Очистка после каждого теста"""
+        self.log.uninstall()
+        super().tearDown()
+
+    def _history_entry(self):
+        for entry in self.log.top(50):
+            if entry['fingerprint'].startswith('SELECT') and re.search(r'FROM message\b', entry['fingerprint']):
+                return entry
+        self.fail(f"Запрос истории не попал в журнал: {[e['fingerprint'] for e in self.log.top(50)]}")
+
+    def test_aggregates_by_fingerprint_with_caller(self):
+        """Тест: разные страницы истории — один отпечаток с вызывающей функцией"""
+        get_messages(self.channel_id, limit=2)
+        get_messages(self.channel_id, limit=3, offset=1)
+        entry = self._history_entry()
+        self.assertEqual(entry['count'], 2)
+        self.assertEqual(entry['callers'][0][0], 'messages.get_messages')
+        self.assertIn('int', entry['param_shapes'][0][0])
+
+    def test_explain_plan_captured_once(self):
+        """Тест: план EXPLAIN снимается для отпечатка один раз и показывает индекс"""
+        get_messages(self.channel_id)
+        get_messages(self.channel_id)
+        plan = self._history_entry()['plan']
+        self.assertTrue(plan)
+        self.assertIn('ix_message_channel_id', ' '.join(plan))
+
+    def test_threshold_and_reset(self):
+        """Тест: быстрые запросы ниже порога не учитываются"""
+        self.log.threshold_ms = 10000
+        get_messages(self.channel_id)
+        self.assertEqual(self.log.top(), [])
+        self.log.threshold_ms = 0
+        get_messages(self.channel_id)
+        self.assertTrue(self.log.top())
+        self.assertGreater(sum(self.log.by_caller().values()), 0)
+        self.log.reset()
+        self.assertEqual(self.log.top(), [])
+
+    def test_param_shape(self):
+        """Тест: форма параметров без значений"""
+        self.assertEqual(param_shape({"id": 5, "name": "bob", "ids": [1, 2, 3]}),
+                         "{id: int, name: str, ids: list[int]*3}")
+        self.assertEqual(param_shape((1, None)), "(int, null)")
+        self.assertEqual(param_shape([(1, "a"), (2, "b")], executemany=True), "[2 x (int, str)]")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+import sys
+import os
+import threading
+from datetime import datetime
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from tests.db_case import DatabaseTestCase
+from snowflake import (SnowflakeGenerator, snowflake_time, snowflake_for_time, to_wire,
+                       MAX_SEQUENCE, SEQUENCE_BITS, MAX_WORKER_ID)
+from models import SessionLocal, User, Guild, Channel
+from messages import create_message, get_messages
+
+class FakeClock:
+    def __init__(self, now=1760000000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+class TestSnowflake(unittest.TestCase):
+
+    def test_monotonic_within_millisecond(self):
+        """Тест: id в пределах одной миллисекунды растут за счет счетчика"""
+        gen = SnowflakeGenerator(3, clock=FakeClock())
+        ids = gen.next_ids(100)
+        self.assertEqual(ids, sorted(set(ids)))
+        self.assertEqual(ids[-1] - ids[0], 99)
+
+    def test_sequence_overflow_borrows_next_millisecond(self):
+        """Тест: после 4096 id за миллисекунду генератор занимает следующую"""
+        clock = FakeClock()
+        gen = SnowflakeGenerator(0, clock=clock)
+        ids = gen.next_ids(MAX_SEQUENCE + 2)
+        self.assertEqual(ids, sorted(set(ids)))
+        self.assertEqual(snowflake_time(ids[-1]) - snowflake_time(ids[0]),
+                         datetime(2025, 1, 1, 0, 0, 0, 1000) - datetime(2025, 1, 1))
+
+    def test_clock_going_backwards(self):
+        """Тест: откат системных часов не дает меньший id"""
+        clock = FakeClock()
+        gen = SnowflakeGenerator(0, clock=clock)
+        first = gen.next_id()
+        clock.now -= 5
+        self.assertGreater(gen.next_id(), first)
+
+    def test_worker_bits_and_time(self):
+        """Тест: номер воркера и время восстанавливаются из id"""
+        gen = SnowflakeGenerator(MAX_WORKER_ID, clock=FakeClock(1760000000.5))
+        snowflake = gen.next_id()
+        self.assertEqual((snowflake >> SEQUENCE_BITS) & MAX_WORKER_ID, MAX_WORKER_ID)
+        self.assertEqual(snowflake_time(snowflake), datetime.utcfromtimestamp(1760000000.5))
+        self.assertLessEqual(snowflake_for_time(snowflake_time(snowflake)), snowflake)
+        self.assertEqual(to_wire(snowflake), str(snowflake))
+        with self.assertRaises(ValueError):
+            SnowflakeGenerator(MAX_WORKER_ID + 1)
+
+    def test_unique_across_threads(self):
+        """Тест: параллельные потоки не получают одинаковых id"""
+        gen = SnowflakeGenerator(1)
+        results = []
+        threads = [threading.Thread(target=lambda: results.extend(gen.next_ids(2000))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(results)), 8000)
+
+class TestSnowflakeMessages(DatabaseTestCase):
+
+    def setUp(self):
+        """Настройка перед каждым тестом: канал во временной SQLite БД"""
+        super().setUp()
+        db = SessionLocal()
+        user = User(username="alice", password="x")
+        db.add(user)
+        db.flush()
+        guild = Guild(name="Гильдия", owner_id=user.id)
+        db.add(guild)
+        db.flush()
+        channel = Channel(name="general", guild_id=guild.id)
+        db.add(channel)
+        db.commit()
+        self.channel_id = channel.id
+        db.close()
+
+    def test_history_cursor(self):
+        """Тест: сообщения получают snowflake-id, история листается курсором before"""
+        for i in range(30):
+            create_message(self.channel_id, "alice", f"сообщение {i}")
+        newest = get_messages(self.channel_id, limit=10)
+        self.assertGreater(newest[0].id, 1 << 32)
+        self.assertEqual(newest[0].timestamp, snowflake_time(newest[0].id))
+        pages, before = [], None
+        while True:
+            page = get_messages(self.channel_id, limit=10, before=before)
+            if not page:
+                break
+            pages.extend(page)
+            before = page[-1].id
+        self.assertEqual([m.content for m in pages], [f"сообщение {i}" for i in range(29, -1, -1)])
+
+if __name__ == '__main__':
+    unittest.main()
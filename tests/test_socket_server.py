@@ -0,0 +1,162 @@
+import unittest
+import sys
+import os
+import time
+from unittest import mock
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from tests.db_case import DatabaseTestCase
+from flask_jwt_extended import create_access_token
+import models
+from models import SessionLocal, User, Guild, Channel
+from messages import create_message
+from emojis_stickers_polls import create_poll
+from guilds import add_member, remove_member
+from app import create_app
+from scheduler import scheduler
+from presence import presence, ONLINE
+from fanout import FanoutManager
+from wire import unpackb
+
+class TestSocketServer(DatabaseTestCase):
+    """Socket.IO-сервер в том виде, в каком его поднимают app.py и supervisor.py:
+    create_app(SOCKETIO) и общий планировщик из модуля scheduler"""
+
+    def setUp(self):
+        """Настройка перед каждым тестом: владелец, гость, гильдия с каналом и опросом"""
+        super().setUp()
+        db = SessionLocal()
+        owner = User(username="owner", password="x")
+        guest = User(username="guest", password="x")
+        db.add_all([owner, guest])
+        db.flush()
+        guild = Guild(name="Гильдия", owner_id=owner.id)
+        db.add(guild)
+        db.flush()
+        channel = Channel(name="general", guild_id=guild.id)
+        db.add(channel)
+        db.commit()
+        self.user_id, self.guild_id, self.channel_id = owner.id, guild.id, channel.id
+        self.guest_id = guest.id
+        message = create_message(self.channel_id, "owner", "Опрос")
+        poll, _ = create_poll(db, message.id, "Вопрос?", ["Да", "Нет"])
+        self.poll_id = poll.id
+        db.close()
+        self.app = create_app({'TESTING': True, 'SOCKETIO': True, 'SQLALCHEMY_DATABASE_URI': self.database_url})
+        self.socketio = self.app.extensions["socketio"]
+
+    def tearDown(self):
+        """Очистка после каждого теста"""
+        scheduler.stop()
+        super().tearDown()
+
+    def connect(self, user_id=None):
+        with self.app.app_context():
+            token = create_access_token(identity=str(user_id or self.user_id))
+        client = self.socketio.test_client(self.app, namespace="/chat", auth={"token": token})
+        self.assertTrue(client.is_connected("/chat"))
+        client.get_received("/chat")
+        return client
+
+    @staticmethod
+    def wait_for(client, name, timeout=3.0):
+        """Данные событий name, пришедших клиенту до истечения timeout"""
+        deadline = time.time() + timeout
+        while True:
+            # send() приходит как "message" с данными без списка аргументов
+            found = [item["args"] if item["name"] == "message" else item["args"][0]
+                     for item in client.get_received("/chat") if item["name"] == name]
+            if found or time.time() > deadline:
+                return found
+            time.sleep(0.05)
+
+    def test_presence_flushed_by_server_scheduler(self):
+        """Тест: diff присутствия рассылает задача планировщика, который запускает сервер"""
+        client = self.connect()
+        client.emit("presence_subscribe", {"guild_id": self.guild_id}, namespace="/chat")
+        client.get_received("/chat")
+        client.emit("heartbeat", {"away": True}, namespace="/chat")
+        scheduler.start()
+        updates = self.wait_for(client, "presence_update")
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(updates[0]["guild_id"], self.guild_id)
+        self.assertIn(self.user_id, updates[0]["idle"])
+        client.disconnect(namespace="/chat")
+
+    def test_backlog_pumped_by_server_scheduler(self):
+        """Тест: событие, не ушедшее сразу (транспорт занят), доставляет pump планировщика сервера"""
+        client = self.connect()
+        room = f"guild:{self.guild_id}"
+        client.emit("join", {"room": room}, namespace="/chat")
+        client.get_received("/chat")
+        with mock.patch.object(FanoutManager, "_transport_has_room", return_value=False):
+            client.emit("message", {"room": room, "message": "привет"}, namespace="/chat")
+        self.assertEqual(self.wait_for(client, "message", timeout=0), [])
+        scheduler.start()
+        messages = self.wait_for(client, "message")
+        self.assertEqual([m["message"] for m in messages], ["привет"])
+        client.disconnect(namespace="/chat")
+
+    def test_socket_writes_pin_reads_to_primary(self):
+        """Тест: запись из сокет-события отмечается за пользователем сокета (read-your-writes)"""
+        models.router.set_replicas([self.create_database('replica.db')])
+        self.addCleanup(models.router.set_replicas, [])
+        client = self.connect()
+        client.emit("poll_vote", {"poll_id": self.poll_id, "option_id": "1"}, namespace="/chat")
+        self.assertTrue(models.router.is_sticky(self.user_id))
+        self.assertFalse(models.router.is_sticky(self.user_id + 1))
+        client.disconnect(namespace="/chat")
+
+    def test_msgpack_client_gets_errors_in_msgpack(self):
+        """Тест: клиент MessagePack получает system и ошибки в своем формате, а не JSON"""
+        with self.app.app_context():
+            token = create_access_token(identity=str(self.user_id))
+        client = self.socketio.test_client(self.app, namespace="/chat",
+                                           auth={"token": token, "format": "msgpack"})
+        client.emit("join", {"room": "guild:99999"}, namespace="/chat")
+        client.emit("poll_vote", {"poll_id": "missing", "option_id": "1"}, namespace="/chat")
+        received = {item["name"]: item["args"][0] for item in client.get_received("/chat")}
+        self.assertEqual(unpackb(received["system"]), {"message": "Connected to chat"})
+        self.assertEqual(unpackb(received["permission_error"])["room"], "guild:99999")
+        self.assertEqual(unpackb(received["poll_error"])["poll_id"], "missing")
+        client.disconnect(namespace="/chat")
+
+    def test_poll_requires_channel_access(self):
+        """Тест: опрос виден только с доступом к каналу; вход в гильдию открывает его без переподключения"""
+        client = self.connect(self.guest_id)
+        client.emit("poll_subscribe", {"poll_id": self.poll_id}, namespace="/chat")
+        client.emit("poll_vote", {"poll_id": self.poll_id, "option_id": "1"}, namespace="/chat")
+        received = client.get_received("/chat")
+        self.assertEqual([item["name"] for item in received], ["permission_error", "permission_error"])
+        self.assertTrue(add_member(self.guild_id, "guest"))
+        client.emit("poll_subscribe", {"poll_id": self.poll_id}, namespace="/chat")
+        self.assertEqual(self.wait_for(client, "poll_results")[0]["poll_id"], self.poll_id)
+        self.assertTrue(remove_member(self.guild_id, "guest"))
+        client.emit("poll_subscribe", {"poll_id": self.poll_id}, namespace="/chat")
+        self.assertEqual([item["name"] for item in client.get_received("/chat")], ["permission_error"])
+        client.disconnect(namespace="/chat")
+
+    def test_presence_follows_guild_membership(self):
+        """Тест: участие в гильдиях загружается при подключении, исключение убирает из присутствия"""
+        self.assertTrue(add_member(self.guild_id, "guest"))
+        # Вход мог пройти на другом воркере: трекер этого процесса о нем не знает
+        presence.remove_member(self.guild_id, self.guest_id)
+        client = self.connect(self.guest_id)
+        # presence_subscribe гость не отправлял: гильдии известны из guild_member
+        self.assertIn(self.guest_id, presence.snapshot(self.guild_id)[ONLINE])
+        self.assertTrue(remove_member(self.guild_id, "guest"))
+        self.assertNotIn(self.guest_id, presence.snapshot(self.guild_id)[ONLINE])
+        self.assertTrue(add_member(self.guild_id, "guest"))
+        self.assertIn(self.guest_id, presence.snapshot(self.guild_id)[ONLINE])
+        client.disconnect(namespace="/chat")
+
+    def test_health_counts_server_sockets(self):
+        """Тест: /health считает сокеты того реестра, в котором их регистрирует сервер"""
+        client = self.connect()
+        self.assertEqual(self.app.test_client().get('/health').get_json()["sockets"], 1)
+        client.disconnect(namespace="/chat")
+        self.assertEqual(self.app.test_client().get('/health').get_json()["sockets"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
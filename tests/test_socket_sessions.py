@@ -0,0 +1,95 @@
+import unittest
+import sys
+import os
+import json
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from socket_sessions import SocketSessionRegistry, ACCESS_CHANNEL
+
+class LinkedState:
+    """Общее состояние двух воркеров: публикация доставляется подписчикам другого, как Redis pub/sub"""
+
+    def __init__(self):
+        self.peer = None
+        self.handlers = {}
+
+    def publish(self, channel, data):
+        for handler in self.peer.handlers.get(channel, ()):
+            handler(json.loads(json.dumps(data)))
+
+    def subscribe(self, channel, handler):
+        self.handlers.setdefault(channel, []).append(handler)
+
+class TestSocketSessions(unittest.TestCase):
+    
+    def setUp(self):
+        """Настройка перед каждым тестом"""
+        self.registry = SocketSessionRegistry()
+    
+    def test_bind_grants_personal_room(self):
+        """Тест: сокет получает свои комнаты и личную комнату пользователя"""
+        sess = self.registry.bind('sid1', 7, {'guild:1', 'channel:3'})
+        self.assertTrue(sess.can_access('guild:1'))
+        self.assertTrue(sess.can_access('channel:3'))
+        self.assertTrue(sess.can_access('user:7'))
+        self.assertFalse(sess.can_access('channel:4'))
+        self.assertFalse(sess.can_access('user:8'))
+    
+    def test_grant_and_revoke_update_all_user_sockets(self):
+        """Тест: изменение прав применяется ко всем сокетам пользователя"""
+        self.registry.bind('sid1', 7, set())
+        self.registry.bind('sid2', 7, set())
+        other = self.registry.bind('sid3', 8, set())
+        self.registry.grant_room(7, 'dm:5')
+        self.assertTrue(self.registry.get('sid1').can_access('dm:5'))
+        self.assertTrue(self.registry.get('sid2').can_access('dm:5'))
+        self.assertFalse(other.can_access('dm:5'))
+        self.registry.revoke_room(7, 'dm:5')
+        self.assertFalse(self.registry.get('sid1').can_access('dm:5'))
+    
+    def test_rooms_follow_guild_access(self):
+        """Тест: новый канал получают сокеты с доступом к гильдии, удаление гильдии забирает все ее комнаты"""
+        owner = self.registry.bind('sid1', 7, {'guild:1'})
+        member = self.registry.bind('sid2', 8, {'guild:1', 'guild:2'})
+        other = self.registry.bind('sid3', 9, {'guild:2'})
+        self.registry.grant_room_to_holders('guild:1', 'channel:5')
+        self.assertTrue(owner.can_access('channel:5'))
+        self.assertTrue(member.can_access('channel:5'))
+        self.assertFalse(other.can_access('channel:5'))
+        self.registry.revoke_rooms_from_holders('guild:1', ['guild:1', 'channel:5'])
+        self.assertEqual(owner.rooms, {'user:7'})
+        self.assertEqual(member.rooms, {'user:8', 'guild:2'})
+
+    def test_access_changes_reach_other_workers(self):
+        """Тест: изменения прав применяются к сокетам пользователя на другом воркере"""
+        state_a, state_b = LinkedState(), LinkedState()
+        state_a.peer, state_b.peer = state_b, state_a
+        worker_a, worker_b = SocketSessionRegistry(state_a), SocketSessionRegistry(state_b)
+        state_a.subscribe(ACCESS_CHANNEL, worker_a.apply_relayed)
+        state_b.subscribe(ACCESS_CHANNEL, worker_b.apply_relayed)
+        remote = worker_b.bind('sid1', 7, set())
+        worker_a.grant_room(7, 'guild:1')
+        self.assertTrue(remote.can_access('guild:1'))
+        worker_a.grant_room_to_holders('guild:1', 'channel:5')
+        self.assertTrue(remote.can_access('channel:5'))
+        worker_a.revoke_room(7, 'channel:5')
+        self.assertFalse(remote.can_access('channel:5'))
+        worker_a.revoke_rooms_from_holders('guild:1', ['guild:1'])
+        self.assertEqual(remote.rooms, {'user:7'})
+        # Чужие операции не исполняются
+        worker_b.apply_relayed({'op': 'unbind', 'args': ['sid1']})
+        self.assertIs(worker_b.get('sid1'), remote)
+
+    def test_unbind(self):
+        """Тест: отключенный сокет удаляется из реестра"""
+        self.registry.bind('sid1', 7, set())
+        self.registry.bind('sid2', 7, set())
+        self.registry.unbind('sid1')
+        self.assertIsNone(self.registry.get('sid1'))
+        self.assertEqual(self.registry.sids_for_user(7), {'sid2'})
+        self.registry.unbind('sid2')
+        self.assertEqual(self.registry.sids_for_user(7), set())
+        self.assertEqual(len(self.registry), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+import sys
+import os
+import threading
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from tests.db_case import DatabaseTestCase
+from sqlalchemy import text
+from sqlite_tuning import configure_sqlite, sqlite_maintenance, write_gate_for
+from models import SessionLocal, User, Guild, Channel, ReadState
+from guilds import delete_guild
+from messages import create_message
+
+class TestSqliteTuning(DatabaseTestCase):
+
+    database_name = 'tuned.db'
+
+    def make_engine(self, name):
+        engine = super().make_engine(name)
+        self.gate = configure_sqlite(engine, {'busy_timeout': 2000})
+        return engine
+
+    def setUp(self):
+        """Настройка перед каждым тестом: файловая SQLite БД с профилем"""
+        super().setUp()
+        with self.engine.begin() as conn:
+            conn.execute(text("CREATE TABLE item (id INTEGER PRIMARY KEY, value INTEGER NOT NULL)"))
+
+    def test_pragmas_applied_on_connect(self):
+        """Тест: каждое соединение получает WAL, synchronous=NORMAL и busy_timeout"""
+        with self.engine.connect() as conn:
+            self.assertEqual(conn.exec_driver_sql("PRAGMA journal_mode").scalar().lower(), "wal")
+            self.assertEqual(conn.exec_driver_sql("PRAGMA synchronous").scalar(), 1)
+            self.assertEqual(conn.exec_driver_sql("PRAGMA busy_timeout").scalar(), 2000)
+        self.assertIs(write_gate_for(self.engine), self.gate)
+
+    def test_concurrent_writers_are_serialized(self):
+        """Тест: параллельные писатели проходят по очереди без «database is locked»"""
+        errors = []
+
+        def write(n):
+            try:
+                for i in range(50):
+                    with self.engine.begin() as conn:
+                        conn.execute(text("INSERT INTO item (value) VALUES (:v)"), {"v": n * 100 + i})
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=write, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(self.gate.timeouts, 0)
+        with self.engine.connect() as conn:
+            self.assertEqual(conn.execute(text("SELECT COUNT(*) FROM item")).scalar(), 200)
+
+    def test_gate_released_on_rollback_and_reads_not_blocked(self):
+        """Тест: чтение идет при открытой записи, очередь освобождается после отката"""
+        writer = self.engine.connect()
+        trans = writer.begin()
+        writer.execute(text("INSERT INTO item (value) VALUES (1)"))
+        with self.engine.connect() as reader:
+            self.assertEqual(reader.execute(text("SELECT COUNT(*) FROM item")).scalar(), 0)
+        trans.rollback()
+        writer.close()
+        with self.engine.begin() as conn:
+            conn.execute(text("INSERT INTO item (value) VALUES (2)"))
+        self.assertEqual(self.gate.timeouts, 0)
+
+    def test_maintenance_truncates_wal(self):
+        """Тест: checkpoint переносит WAL в основной файл"""
+        with self.engine.begin() as conn:
+            conn.execute(text("INSERT INTO item (value) VALUES (1)"))
+        result = sqlite_maintenance(self.engine)
+        self.assertEqual(result["busy"], 0)
+        self.assertEqual(os.path.getsize(os.path.join(self.tmpdir, 'tuned.db-wal')), 0)
+
+    def test_delete_guild_with_history(self):
+        """Тест: профиль не ломает удаление гильдии с сообщениями и счетчиками непрочитанного"""
+        db = SessionLocal()
+        owner, reader = User(username="owner", password="x"), User(username="reader", password="x")
+        db.add_all([owner, reader])
+        db.flush()
+        guild = Guild(name="Гильдия", owner_id=owner.id)
+        db.add(guild)
+        db.flush()
+        channel = Channel(name="general", guild_id=guild.id)
+        db.add(channel)
+        db.flush()
+        db.add(ReadState(user_id=reader.id, channel_id=channel.id))
+        db.commit()
+        guild_id, channel_id = guild.id, channel.id
+        db.close()
+        self.assertIsNotNone(create_message(channel_id, "owner", "привет"))
+        self.assertTrue(delete_guild(guild_id))
+        db = SessionLocal()
+        self.assertIsNone(db.get(Guild, guild_id))
+        self.assertEqual(db.query(Channel).count(), 0)
+        db.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+import unittest
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from tests.db_case import DatabaseTestCase
+from tokens import RevocationList, VerifiedTokenCache
+from app import create_app
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+    
+    def __call__(self):
+        return self.now
+
+class FakeRedis:
+    """Минимальная замена Redis для проверки синхронизации отзывов"""
+    def __init__(self):
+        self.data = {}
+        self.published = []
+    
+    def set(self, key, value, ex=None):
+        self.data[key] = str(value).encode()
+    
+    def get(self, key):
+        return self.data.get(key)
+    
+    def publish(self, channel, message):
+        self.published.append((channel, message))
+    
+    def scan_iter(self, match=None, count=None):
+        prefix = match.rstrip('*')
+        return [k.encode() for k in self.data if k.startswith(prefix)]
+    
+    def pubsub(self, ignore_subscribe_messages=True):
+        return self
+    
+    def subscribe(self, channel):
+        pass
+    
+    def listen(self):
+        return iter([])
+
+class TestTokens(unittest.TestCase):
+    
+    def setUp(self):
+        """Настройка перед каждым тестом"""
+        self.clock = FakeClock()
+    
+    def test_revoked_until_expiry(self):
+        """Тест: токен отозван до своего exp, затем запись удаляется"""
+        revocations = RevocationList(clock=self.clock)
+        revocations.revoke('jti-1', 1100)
+        self.assertTrue(revocations.is_revoked('jti-1'))
+        self.assertFalse(revocations.is_revoked('jti-2'))
+        self.clock.now = 1100
+        self.assertFalse(revocations.is_revoked('jti-1'))
+        self.assertEqual(len(revocations), 0)
+    
+    def test_purge_expired(self):
+        """Тест: чистка удаляет только истекшие записи"""
+        revocations = RevocationList(clock=self.clock)
+        revocations.revoke('old', 1010)
+        revocations.revoke('new', 2000)
+        self.clock.now = 1500
+        self.assertEqual(revocations.purge_expired(), 1)
+        self.assertTrue(revocations.is_revoked('new'))
+    
+    def test_redis_sync(self):
+        """Тест: отзыв публикуется в Redis и загружается другим процессом"""
+        redis = FakeRedis()
+        first = RevocationList(clock=self.clock)
+        first.connect_redis(redis)
+        first.revoke('jti-1', 1100)
+        self.assertEqual(redis.published, [('jwt:revoked', 'jti-1:1100')])
+        
+        second = RevocationList(clock=self.clock)
+        second.connect_redis(redis)
+        self.assertTrue(second.is_revoked('jti-1'))
+    
+    def test_logout_revocation_reaches_blocklist(self):
+        """Тест: logout, проверка JWT и сокеты работают с одним списком отзывов"""
+        import time
+        import tokens
+        from sockets import events
+        self.assertIs(events.revocations, tokens.revocations)
+        tokens.revocations.revoke("logout-jti", time.time() + 60)
+        self.assertTrue(tokens.check_token_revoked({}, {"jti": "logout-jti"}))
+    
+    def test_verified_cache_hits_until_exp(self):
+        """Тест: кэш проверенных токенов отдает payload до exp"""
+        cache = VerifiedTokenCache(max_size=10, clock=self.clock)
+        cache.set('token', {'sub': 1, 'jti': 'a', 'exp': 1100})
+        self.assertEqual(cache.get('token')['sub'], 1)
+        self.clock.now = 1100
+        self.assertIsNone(cache.get('token'))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+    
+    def test_verified_cache_is_bounded(self):
+        """Тест: размер кэша ограничен"""
+        cache = VerifiedTokenCache(max_size=3, clock=self.clock)
+        for i in range(10):
+            cache.set(f'token{i}', {'exp': 2000})
+        self.assertEqual(len(cache), 3)
+        self.assertIsNone(cache.get('token0'))
+        self.assertIsNotNone(cache.get('token9'))
+
+class TestAuthRoutes(DatabaseTestCase):
+    """Выдача и отзыв JWT через /api/auth (routes/auth.py), как их подключает create_app"""
+
+    def setUp(self):
+        """Настройка перед каждым тестом: приложение с Socket.IO на временной БД"""
+        super().setUp()
+        self.app = create_app({'TESTING': True, 'SOCKETIO': True, 'SQLALCHEMY_DATABASE_URI': self.database_url})
+        self.socketio = self.app.extensions["socketio"]
+        self.client = self.app.test_client()
+        response = self.client.post('/api/auth/register', json={"username": "alice", "password": "secret"})
+        self.assertEqual(response.status_code, 201)
+
+    def login(self):
+        response = self.client.post('/api/auth/login', json={"username": "alice", "password": "secret"})
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()
+
+    def connect(self, token):
+        return self.socketio.test_client(self.app, namespace="/chat", auth={"token": token})
+
+    def test_login_and_refresh(self):
+        """Тест: вход выдает access и refresh, refresh выдает новый access"""
+        self.assertEqual(self.client.post('/api/auth/login', json={"username": "alice", "password": "x"}).status_code, 401)
+        tokens = self.login()
+        response = self.client.post('/api/auth/refresh', headers={"Authorization": f"Bearer {tokens['refresh']}"})
+        self.assertEqual(response.status_code, 200)
+        client = self.connect(response.get_json()["access"])
+        self.assertTrue(client.is_connected("/chat"))
+        client.disconnect(namespace="/chat")
+
+    def test_logout_rejects_token_at_socket_connect(self):
+        """Тест: после logout по HTTP отозванный access не принимается при подключении сокета"""
+        tokens = self.login()
+        client = self.connect(tokens["access"])
+        self.assertTrue(client.is_connected("/chat"))
+        client.disconnect(namespace="/chat")
+        response = self.client.post('/api/auth/logout', json={"refresh": tokens["refresh"]},
+                                    headers={"Authorization": f"Bearer {tokens['access']}"})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(self.connect(tokens["access"]).is_connected("/chat"))
+        # Refresh-токен из тела logout отозван вместе с access
+        response = self.client.post('/api/auth/refresh', headers={"Authorization": f"Bearer {tokens['refresh']}"})
+        self.assertEqual(response.status_code, 401)
+        # Новый вход работает
+        client = self.connect(self.login()["access"])
+        self.assertTrue(client.is_connected("/chat"))
+        client.disconnect(namespace="/chat")
+
+if __name__ == '__main__':
+    unittest.main()
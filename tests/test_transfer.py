@@ -0,0 +1,127 @@
+import unittest
+import sys
+import os
+import gzip
+import json
+from datetime import datetime, timedelta
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from tests.db_case import DatabaseTestCase
+from sqlalchemy import func, select
+from models import (SessionLocal, User, Guild, Channel, Message, MessageArchive,
+                    File, DMChannel)
+from archive import archive_messages
+from transfer import export_ndjson, import_ndjson, NO_PASSWORD
+
+class Interrupted(Exception):
+    pass
+
+class TestTransfer(DatabaseTestCase):
+
+    def setUp(self):
+        """Настройка перед каждым тестом: исходная БД с гильдией, DM, файлами и архивом"""
+        super().setUp()
+        self.target = self.create_database('target.db')
+        db = SessionLocal()
+        users = [User(username=f"user{i}", password=f"hash{i}") for i in range(5)]
+        db.add_all(users)
+        db.flush()
+        guild = Guild(name="Гильдия", owner_id=users[0].id)
+        other = Guild(name="Чужая", owner_id=users[4].id)
+        db.add_all([guild, other])
+        db.flush()
+        channels = [Channel(name=f"c{i}", guild_id=guild.id) for i in range(2)]
+        channels.append(Channel(name="чужой", guild_id=other.id))
+        dm = DMChannel(user1_id=users[0].id, user2_id=users[1].id)
+        db.add_all(channels + [dm])
+        db.flush()
+        start = datetime(2025, 1, 1)
+        db.add_all([Message(channel_id=channels[i % 3].id, user_id=users[i % 4].id, content=f"сообщение {i}",
+                            timestamp=start + timedelta(hours=i), pinned=False) for i in range(300)])
+        db.add_all([Message(dm_channel_id=dm.id, user_id=users[0].id, content=f"лично {i}",
+                            timestamp=start + timedelta(hours=i), pinned=False) for i in range(20)])
+        db.flush()
+        first = db.query(Message).filter_by(channel_id=channels[0].id).order_by(Message.id.desc()).first()
+        db.add(File(filename="a.png", path="uploads/a.png", user_id=users[1].id, message_id=first.id))
+        db.commit()
+        self.guild_id, self.channel_id = guild.id, channels[0].id
+        db.close()
+        # Старая часть истории — в архиве, экспорт должен развернуть его
+        archive_messages(older_than=start + timedelta(days=5), segment_size=30)
+        self.path = os.path.join(self.tmpdir, "export.ndjson.gz")
+
+    def _snapshot(self, engine):
+        with engine.connect() as conn:
+            messages = conn.execute(select(Message.id, Message.content, Message.timestamp, Message.channel_id,
+                                           Message.dm_channel_id).order_by(Message.id)).all()
+            users = conn.execute(select(User.id, User.username, User.password).order_by(User.id)).all()
+            files = conn.execute(select(File.message_id, File.filename)).all()
+        return messages, users, files
+
+    def _hot_and_archived(self):
+        """Все сообщения источника: горячие и архивные"""
+        with self.engine.connect() as conn:
+            hot = conn.execute(select(func.count(Message.id))).scalar()
+            archived = conn.execute(select(func.sum(MessageArchive.count))).scalar()
+        return hot, archived
+
+    def test_full_roundtrip(self):
+        """Тест: полный экспорт с архивом импортируется в пустую БД без потерь"""
+        hot, archived = self._hot_and_archived()
+        self.assertGreater(archived, 0)
+        written = export_ndjson(self.path, batch_size=50)
+        self.assertFalse(os.path.exists(self.path + ".checkpoint"))
+        SessionLocal.configure(bind=self.target)
+        imported = import_ndjson(self.path, batch_size=40)
+        self.assertEqual(imported, written)
+        messages, users, files = self._snapshot(self.target)
+        self.assertEqual(len(messages), hot + archived)
+        self.assertEqual(users[0].password, "hash0")
+        self.assertEqual(len(files), 1)
+        # Повторный импорт ничего не дублирует
+        import_ndjson(self.path)
+        self.assertEqual(self._snapshot(self.target)[0], messages)
+
+    def test_resume_interrupted_export_and_import(self):
+        """Тест: прерванные экспорт и импорт продолжаются с checkpoint"""
+        def interrupt_after(n):
+            calls = []
+            def on_batch(table, count):
+                calls.append(table)
+                if len(calls) == n:
+                    raise Interrupted()
+            return on_batch
+        with self.assertRaises(Interrupted):
+            export_ndjson(self.path, batch_size=25, on_batch=interrupt_after(6))
+        self.assertTrue(os.path.exists(self.path + ".checkpoint"))
+        export_ndjson(self.path, batch_size=25)
+        SessionLocal.configure(bind=self.target)
+        with self.assertRaises(Interrupted):
+            import_ndjson(self.path, batch_size=25, on_batch=interrupt_after(5))
+        import_ndjson(self.path, batch_size=25)
+        hot, archived = self._hot_and_archived()
+        messages, _, _ = self._snapshot(self.target)
+        self.assertEqual(len(messages), hot + archived)
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            ids = [r["row"]["id"] for r in map(json.loads, f) if r["table"] == "message"]
+        self.assertEqual(len(ids), len(set(ids)))
+
+    def test_channel_export_without_secrets(self):
+        """Тест: экспорт канала содержит только его историю и авторов, без хешей паролей"""
+        export_ndjson(self.path, guild_id=self.guild_id, channel_id=self.channel_id, include_secrets=False)
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        tables = {r["table"] for r in records}
+        self.assertEqual(tables, {"_meta", "user", "guild", "channel", "message", "file"})
+        self.assertTrue(all(r["row"]["channel_id"] == self.channel_id
+                            for r in records if r["table"] == "message"))
+        self.assertEqual(sum(r["table"] == "message" for r in records), 100)
+        self.assertTrue(all("password" not in r["row"] for r in records if r["table"] == "user"))
+        SessionLocal.configure(bind=self.target)
+        import_ndjson(self.path)
+        _, users, _ = self._snapshot(self.target)
+        self.assertEqual({u.password for u in users}, {NO_PASSWORD})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+import sys
+import os
+from datetime import datetime
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from backend.wire import packb, unpackb, pack_rows, unpack_rows, WirePayload, JSON, MSGPACK
+
+class TestWire(unittest.TestCase):
+    
+    def test_roundtrip_all_types(self):
+        """Тест: кодирование и декодирование всех типов MessagePack"""
+        data = {
+            "none": None, "t": True, "f": False,
+            "ints": [0, 1, 127, 128, 255, 256, 65535, 65536, 2**32, 2**63 - 1, -1, -32, -33, -128, -129, -2**15 - 1, -2**31 - 1, -2**63],
+            "float": 1.5,
+            "strs": ["", "a" * 31, "b" * 32, "в" * 200, "c" * 70000],
+            "bin": b"\x00\x01\x02",
+            "list16": list(range(20)),
+            "map16": {f"k{i}": i for i in range(20)},
+        }
+        self.assertEqual(unpackb(packb(data)), data)
+    
+    def test_matches_reference_bytes(self):
+        """Тест: байты на проводе по спецификации MessagePack"""
+        self.assertEqual(packb({"a": [1, -1, None]}), b"\x81\xa1a\x93\x01\xff\xc0")
+        self.assertEqual(packb(300), b"\xcd\x01\x2c")
+    
+    def test_datetime_is_encoded_as_isoformat(self):
+        """Тест: datetime кодируется строкой ISO"""
+        ts = datetime(2025, 9, 9, 16, 36, 3)
+        self.assertEqual(unpackb(packb({"ts": ts})), {"ts": ts.isoformat()})
+    
+    def test_columnar_rows(self):
+        """Тест: колоночная форма истории обратима"""
+        rows = [{"id": 1, "content": "a"}, {"id": 2, "content": "b"}]
+        packed = pack_rows(rows, ("id", "content"))
+        self.assertEqual(packed["rows"], [[1, "a"], [2, "b"]])
+        self.assertEqual(unpack_rows(packed), rows)
+    
+    def test_payload_is_encoded_once_per_format(self):
+        """Тест: при рассылке нагрузка кодируется один раз на формат"""
+        payload = WirePayload({"x": 1})
+        self.assertIs(payload.encode(JSON), payload.data)
+        first = payload.encode(MSGPACK)
+        self.assertIs(payload.encode(MSGPACK), first)
+        self.assertEqual(unpackb(first), {"x": 1})
+
+if __name__ == '__main__':
+    unittest.main()